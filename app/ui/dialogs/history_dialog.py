@@ -8,16 +8,22 @@ from pathlib import Path
 from typing import Optional
 from PySide6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem, 
-    QTextEdit, QDialogButtonBox, QWidget, QMessageBox
+    QTextEdit, QDialogButtonBox, QWidget, QMessageBox, QPushButton, QLabel, QLineEdit
 )
 from PySide6.QtCore import Qt
 
 from config.constants import Paths
 from utils.error_handler import ErrorHandler
+from utils.session_index import SessionReader
 
 
 class HistoryDialog(QDialog):
-    """简易历史查看器：按域读取 logs/<domain> 下的 JSONL 历史文件并展示内容（只读）"""
+    """简易历史查看器：按域读取 logs/<domain> 下的历史文件并分页展示内容（只读）
+    
+    通过侧车索引（utils.session_index）按页 seek 读取，大文件打开时不再整文件读入。
+    """
+    
+    PAGE_SIZE = 100
     
     def __init__(self, domain: str, parent: Optional[QWidget] = None):
         super().__init__(parent)
@@ -25,6 +31,8 @@ class HistoryDialog(QDialog):
         self.resize(800, 600)
         self.domain = domain
         self.logger = ErrorHandler.setup_logging("history_dialog")
+        self._reader: Optional[SessionReader] = None
+        self._page_start = 0
         
         self._setup_ui()
         self._load_file_list()
@@ -48,6 +56,29 @@ class HistoryDialog(QDialog):
         
         layout.addLayout(row, 1)
         
+        # 分页
+        pager = QHBoxLayout()
+        self.btn_first = QPushButton("首页")
+        self.btn_prev = QPushButton("上一页")
+        self.btn_next = QPushButton("下一页")
+        self.btn_last = QPushButton("末页")
+        self.page_label = QLabel("")
+        self.time_edit = QLineEdit()
+        self.time_edit.setPlaceholderText("跳转到时间，如 2026-10-01T08")
+        self.btn_jump = QPushButton("跳转")
+        self.btn_first.clicked.connect(lambda: self._show_page(0))
+        self.btn_prev.clicked.connect(lambda: self._show_page(self._page_start - self.PAGE_SIZE))
+        self.btn_next.clicked.connect(lambda: self._show_page(self._page_start + self.PAGE_SIZE))
+        self.btn_last.clicked.connect(self._show_last_page)
+        self.btn_jump.clicked.connect(self._on_jump_time)
+        self.time_edit.returnPressed.connect(self._on_jump_time)
+        for w in (self.btn_first, self.btn_prev, self.btn_next, self.btn_last, self.page_label):
+            pager.addWidget(w)
+        pager.addStretch(1)
+        pager.addWidget(self.time_edit)
+        pager.addWidget(self.btn_jump)
+        layout.addLayout(pager)
+        
         # 按钮
         btns = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
         btns.rejected.connect(self.reject)
@@ -65,12 +96,13 @@ class HistoryDialog(QDialog):
                 self.logger.warning(f"历史目录不存在: {domain_dir}")
                 return
             
-            # 查找JSONL文件
+            # 查找历史文件（侧车索引 *.idx 不列出）
             jsonl_files = list(domain_dir.glob("*.jsonl"))
             log_files = list(domain_dir.glob("*.log"))
+            md_files = list(domain_dir.glob("*.md"))
             
             # 添加到列表
-            all_files = sorted(jsonl_files + log_files, key=lambda f: f.stat().st_mtime, reverse=True)
+            all_files = sorted(jsonl_files + log_files + md_files, key=lambda f: f.stat().st_mtime, reverse=True)
             
             for file_path in all_files:
                 item = QListWidgetItem(file_path.name)
@@ -89,8 +121,10 @@ class HistoryDialog(QDialog):
     
     def _on_select(self, current: Optional[QListWidgetItem], previous: Optional[QListWidgetItem]) -> None:
         """选择文件时的处理"""
+        self._reader = None
         if not current:
             self.viewer.clear()
+            self._update_pager()
             return
         
         file_path = current.data(Qt.ItemDataRole.UserRole)
@@ -101,32 +135,70 @@ class HistoryDialog(QDialog):
             path = Path(file_path)
             if not path.exists():
                 self.viewer.setPlainText(f"文件不存在：{file_path}")
+                self._update_pager()
                 return
             
-            # 读取文件内容
-            with path.open("r", encoding="utf-8") as f:
-                content = f.read()
-            
-            # 如果是JSONL文件，尝试格式化显示
-            if path.suffix.lower() == ".jsonl":
-                formatted_content = self._format_jsonl_content(content)
-                self.viewer.setPlainText(formatted_content)
-            else:
-                self.viewer.setPlainText(content)
-                
-            self.logger.info(f"显示文件内容: {path.name}")
+            # 只加载索引（缺失或落后时增量补齐），内容按页读取；默认显示最新一页
+            self._reader = SessionReader(str(path))
+            self._show_last_page()
+            self.logger.info(f"显示文件内容: {path.name}（共 {len(self._reader)} 条）")
             
         except Exception as e:
             self.logger.exception(f"读取文件失败: {e}")
             self.viewer.setPlainText(f"读取失败：{e}")
+            self._update_pager()
+    
+    def _show_last_page(self) -> None:
+        if self._reader is None:
+            return
+        total = len(self._reader)
+        self._show_page(max(0, (total - 1) // self.PAGE_SIZE * self.PAGE_SIZE))
+    
+    def _show_page(self, start: int) -> None:
+        """显示从第 start 条开始的一页"""
+        if self._reader is None:
+            return
+        total = len(self._reader)
+        start = max(0, min(start, max(0, total - 1)))
+        try:
+            page = self._reader.page(start, self.PAGE_SIZE)
+            self._page_start = start
+            if Path(self._reader.path).suffix.lower() == ".jsonl":
+                content = "".join(e["text"] for e in page)
+                self.viewer.setPlainText(self._format_jsonl_content(content, start + 1))
+            else:
+                self.viewer.setPlainText("".join(e["text"] for e in page))
+        except Exception as e:
+            self.logger.exception(f"读取分页失败: {e}")
+            self.viewer.setPlainText(f"读取失败：{e}")
+        self._update_pager()
+    
+    def _on_jump_time(self) -> None:
+        """跳转到不早于输入时间的第一条记录所在位置"""
+        text = self.time_edit.text().strip()
+        if self._reader is None or not text:
+            return
+        start, _ = self._reader.time_range(since=text)
+        self._show_page(start)
+    
+    def _update_pager(self) -> None:
+        total = len(self._reader) if self._reader is not None else 0
+        start = self._page_start if total else 0
+        end = min(total, start + self.PAGE_SIZE)
+        self.page_label.setText(f"{start + 1 if total else 0}-{end} / {total}")
+        self.btn_first.setEnabled(start > 0)
+        self.btn_prev.setEnabled(start > 0)
+        self.btn_next.setEnabled(end < total)
+        self.btn_last.setEnabled(end < total)
+        self.btn_jump.setEnabled(total > 0)
     
-    def _format_jsonl_content(self, content: str) -> str:
-        """格式化JSONL内容为可读格式"""
+    def _format_jsonl_content(self, content: str, first_no: int = 1) -> str:
+        """格式化JSONL内容为可读格式（first_no 为首条记录的序号，分页时使用）"""
         try:
             lines = content.strip().split('\n')
             formatted_lines = []
             
-            for i, line in enumerate(lines, 1):
+            for i, line in enumerate(lines, first_no):
                 line = line.strip()
                 if not line:
                     continue
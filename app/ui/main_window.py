@@ -27,6 +27,8 @@ if str(ROOT) not in sys.path:
 
 from config.constants import UIConfig, AgentConfig, Paths
 from utils.error_handler import ErrorHandler, ProgressHandler
+from utils.text_chunker import iter_chunks
+from utils.text_reader import iter_text, normalize_lines, open_text, read_text
 from app.services.model_service import ModelService
 from app.services.agent_service import AgentService
 from app.services.notes_agent_service import NotesAgentService
@@ -54,6 +56,9 @@ except ImportError as e:
 # 配置服务（已移除数据库依赖）
 ConfigService = None  # 明确禁止使用数据库
 
+# 灌注时每批嵌入/写入的分段数：分段以生成器产出，内存只与批大小有关
+INGEST_BATCH_CHUNKS = 64
+
 
 class AgentInferWorker(QObject):
     """Agent推理工作线程"""
@@ -1514,12 +1519,7 @@ class MainWindow(QWidget):
             if not ok2 or not collection_name:
                 return
             # 读文件
-            try:
-                with open(src, 'r', encoding='utf-8') as f:
-                    text = f.read()
-            except Exception:
-                with open(src, 'r', encoding='gbk', errors='ignore') as f:
-                    text = f.read()
+            text = read_text(src)
             if not text.strip():
                 QMessageBox.information(self, "提示", "文件为空或无法读取有效文本。")
                 return
@@ -1551,21 +1551,10 @@ class MainWindow(QWidget):
                 )
             )
             # 切块 + 写入
-            def _chunks(s: str, size: int = 800, overlap: int = 80):
-                if size <= 0:
-                    yield s
-                    return
-                i, n = 0, len(s)
-                while i < n:
-                    end = min(i + size, n)
-                    yield s[i:end]
-                    if end >= n:
-                        break
-                    i = max(0, end - overlap)
             import asyncio
             async def _run():
                 added = 0
-                for j, blk in enumerate(_chunks(text)):
+                for j, blk in enumerate(iter_chunks(text, size=800, overlap=80)):
                     content = MemoryContent(
                         content=blk,
                         mime_type=MemoryMimeType.TEXT,
@@ -5952,12 +5941,8 @@ class MainWindow(QWidget):
             total_chunks = 0
             skipped = 0
             # 基础读取与解析函数集合（按可用性优雅降级）
-            def _read_text(path: str) -> str:
-                try:
-                    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                        return f.read()
-                except Exception:
-                    return ''
+            # 编码嗅探读取（BOM/utf-8/GB18030），不再以 errors='ignore' 丢字节
+            _read_text = read_text
             def _read_docx(path: str) -> str:
                 try:
                     from docx import Document  # python-docx
@@ -6030,23 +6015,20 @@ class MainWindow(QWidget):
                     return '\n'.join(out_lines)
                 except Exception:
                     return ''
-            def _read_csv(path: str) -> str:
+            def _iter_csv(path: str):
+                # 逐行产出（单元格以制表符连接），不在内存中拼出全文；一行都没解析出时按文本读取
+                emitted = False
                 try:
                     import csv
+                    with open_text(path, newline='') as f:
+                        for row in csv.reader(f):
+                            emitted = True
+                            yield '\t'.join([str(x) for x in row]) + '\n'
                 except Exception:
-                    return _read_text(path)
-                try:
-                    out_lines = []
-                    with open(path, 'r', encoding='utf-8', errors='ignore', newline='') as f:
-                        reader = csv.reader(f)
-                        for row in reader:
-                            try:
-                                out_lines.append('\t'.join([str(x) for x in row]))
-                            except Exception:
-                                pass
-                    return '\n'.join(out_lines)
-                except Exception:
-                    return _read_text(path)
+                    if not emitted:
+                        yield from iter_text(path)
+            def _read_csv(path: str) -> str:
+                return ''.join(_iter_csv(path)).rstrip('\n')
             def _read_image_ocr(path: str) -> str:
                 # 优先 pytesseract + PIL（需要本机安装 tesseract 可执行）
                 try:
@@ -6086,91 +6068,60 @@ class MainWindow(QWidget):
                 except Exception:
                     return ''
             def _prep_text(s: str) -> str:
-                s = (s or '').replace('\r\n', '\n').replace('\r', '\n')
                 # 轻度清洗：去多余空行，去左右空白
-                lines = [ln.strip() for ln in s.split('\n')]
-                # 合并连续空行
-                out = []
-                last_blank = False
-                for ln in lines:
-                    blank = (ln == '')
-                    if blank and last_blank:
-                        continue
-                    out.append(ln)
-                    last_blank = blank
-                return '\n'.join(out).strip()
-            def _chunk(s: str, size: int = 1500, overlap: int = 100) -> list[str]:
-                s = s or ''
-                if len(s) <= size:
-                    return [s] if s else []
-                chunks = []
-                i = 0
-                L = len(s)
-                while i < L:
-                    end = min(i + size, L)
-                    chunks.append(s[i:end])
-                    if end == L:
-                        break
-                    i = end - overlap if overlap > 0 else end
-                return chunks
+                return ''.join(normalize_lines(s)).strip()
+            def _read_any(path: str, ext: str) -> str:
+                if ext == '.csv':
+                    return _read_csv(path)
+                if ext == '.docx':
+                    return _read_docx(path)
+                if ext == '.pdf':
+                    return _read_pdf(path)
+                if ext == '.xlsx':
+                    return _read_xlsx(path)
+                if ext in ('.png', '.jpg', '.jpeg', '.bmp', '.webp'):
+                    return _read_image_ocr(path)
+                if ext in ('.wav', '.mp3', '.m4a'):
+                    return _read_audio_asr(path)
+                # .txt/.md/.log/.json 及未知类型：按文本读取
+                return _read_text(path)
+            manifest, params = self._ingest_open_manifest(persistence, do_prep, chunk_size, overlap)
+            unchanged = 0
             for fp in files:
+                if manifest is not None:
+                    try:
+                        if manifest.is_unchanged(collection, fp, params):
+                            unchanged += 1
+                            continue
+                    except Exception:
+                        pass
                 ext = os.path.splitext(fp)[1].lower()
-                txt = ''
-                if ext in ('.txt', '.md', '.log'):
-                    txt = _read_text(fp)
-                elif ext == '.json':
-                    txt = _read_text(fp)
-                elif ext == '.csv':
-                    txt = _read_csv(fp)
-                elif ext == '.docx':
-                    txt = _read_docx(fp)
-                elif ext == '.pdf':
-                    txt = _read_pdf(fp)
-                elif ext == '.xlsx':
-                    txt = _read_xlsx(fp)
-                elif ext in ('.png', '.jpg', '.jpeg', '.bmp', '.webp'):
-                    txt = _read_image_ocr(fp)
-                elif ext in ('.wav', '.mp3', '.m4a'):
-                    txt = _read_audio_asr(fp)
+                if do_prep and ext in ('.txt', '.md', '.log'):
+                    # 纯文本：流式读取 + 流式清洗 + 流式分块，不在内存中保留全文及其副本
+                    segs = iter_chunks(normalize_lines(iter_text(fp)), size=chunk_size, overlap=overlap)
+                elif do_prep and ext == '.csv':
+                    # CSV：逐行解析后同样流式清洗与分块
+                    segs = iter_chunks(normalize_lines(_iter_csv(fp)), size=chunk_size, overlap=overlap)
                 else:
-                    # 类型未知：尝试按文本读取
-                    txt = _read_text(fp)
-                if not txt.strip():
+                    txt = _read_any(fp, ext)
+                    if do_prep:
+                        txt = _prep_text(txt)
+                    segs = iter_chunks(txt, size=chunk_size, overlap=overlap) if do_prep else ([txt] if txt.strip() else [])
+                try:
+                    # 分段按批写入；文件变空或无法解析时其旧分段随清单一并删除
+                    written, seen = self._ingest_write_segments(col, manifest, collection, fp, segs, do_prep, base_dir, params)
+                except Exception:
+                    skipped += 1
+                    continue
+                if not seen:
                     skipped += 1
                     try:
                         self.settings_output.append(f"[灌注] 跳过（无法解析或空）：{os.path.basename(fp)}")
                     except Exception:
                         pass
                     continue
-                if do_prep:
-                    txt = _prep_text(txt)
-                segs = _chunk(txt, size=chunk_size, overlap=overlap) if do_prep else [txt]
-                if not segs:
-                    skipped += 1
-                    continue
-                imported_at = datetime.utcnow().isoformat() + 'Z'
-                base_id = str(uuid.uuid4())
-                ids = []
-                docs = []
-                metas = []
-                for idx, seg in enumerate(segs):
-                    ids.append(f"{base_id}-{idx}")
-                    docs.append(seg)
-                    metas.append({
-                        'mode': 'note',
-                        'subtype': 'raw' if not do_prep else 'normalized',
-                        'source_path': os.path.relpath(fp, base_dir),
-                        'imported_at': imported_at,
-                        'segment_index': idx,
-                        'segment_total': len(segs),
-                    })
-                try:
-                    col.add(documents=docs, metadatas=metas, ids=ids)
-                    total_files += 1
-                    total_chunks += len(segs)
-                except Exception:
-                    skipped += 1
-                    continue
+                total_chunks += written
+                total_files += 1
                 # 进度
                 try:
                     pct = int(((total_files + 1) / max(1, len(files))) * 100)
@@ -6182,7 +6133,9 @@ class MainWindow(QWidget):
                     pass
             from PySide6.QtGui import QTextCursor
             self.settings_output.moveCursor(QTextCursor.End)
-            self.settings_output.insertPlainText(f"\n[灌注] 完成：文件={total_files} | 分段={total_chunks} | 跳过={skipped}\n")
+            if manifest is not None:
+                manifest.close()
+            self.settings_output.insertPlainText(f"\n[灌注] 完成：文件={total_files} | 新分段={total_chunks} | 未变化={unchanged} | 跳过={skipped}\n")
             self.settings_output.moveCursor(QTextCursor.End)
         except Exception as e:
             try:
@@ -6196,6 +6149,79 @@ class MainWindow(QWidget):
         except Exception:
             pass
 
+    def _ingest_open_manifest(self, persistence: str, do_prep: bool, chunk_size: int, overlap: int):
+        """打开向量库目录下的增量灌注清单；返回 (manifest|None, 分块参数签名)。"""
+        params = f"prep={int(bool(do_prep))};size={chunk_size};overlap={overlap}"
+        try:
+            from utils.ingest_manifest import IngestManifest
+            return IngestManifest.for_store(persistence), params
+        except Exception:
+            return None, params
+
+    def _ingest_write_segments(self, col, manifest, collection: str, fp: str, segs,
+                               do_prep: bool, base_dir: str, params: str) -> tuple[int, int]:
+        """将单个文件的分段按批写入 Chroma，返回 (新写入的分段数, 分段总数)。
+        segs 可为生成器：每次只取 INGEST_BATCH_CHUNKS 个分段写入，不在内存中保留全部分段。
+        有清单时按内容哈希派生稳定 id，仅写入变化的分段（upsert，中断后重跑幂等），
+        全部写完后再删除旧版本中消失的分段并提交清单（没有分段时旧分段全部删除）；
+        无清单（打开失败）时退回 uuid 全量写入。
+        """
+        import itertools, os, uuid
+        from datetime import datetime
+        imported_at = datetime.utcnow().isoformat() + 'Z'
+        session = None
+        if manifest is not None:
+            try:
+                session = manifest.begin(collection, fp)
+            except Exception:
+                session = None
+        base_id = str(uuid.uuid4())
+        source_path = os.path.relpath(fp, base_dir)
+        it = iter(segs)
+        written = total = 0
+        while True:
+            batch = list(itertools.islice(it, INGEST_BATCH_CHUNKS))
+            if not batch:
+                break
+            if session is not None:
+                added = session.feed(batch)
+                ids, docs, indexes = added.add_ids, added.add_docs, added.add_indexes
+            else:
+                indexes = list(range(total, total + len(batch)))
+                ids, docs = [f"{base_id}-{idx}" for idx in indexes], batch
+            total += len(batch)
+            if not ids:
+                continue
+            metas = [{
+                'mode': 'note',
+                'subtype': 'raw' if not do_prep else 'normalized',
+                'source_path': source_path,
+                'imported_at': imported_at,
+                'segment_index': idx,
+            } for idx in indexes]
+            col.upsert(documents=docs, metadatas=metas, ids=ids)
+            written += len(ids)
+        if session is not None:
+            plan = session.finish()
+            if plan.delete_ids:
+                col.delete(ids=plan.delete_ids)
+            manifest.commit(collection, fp, plan, params)
+        return written, total
+
+    def _ingest_remove_stale(self, col, manifest, collection: str, files: list[str], dir_path: str) -> int:
+        """目录重灌：删除清单中位于 dir_path 下、但本次未出现（已被删除）的文件的分段。"""
+        removed = 0
+        for fp in manifest.stale_files(collection, files, under_dir=dir_path):
+            try:
+                ids = manifest.chunk_ids_of(collection, fp)
+                if ids:
+                    col.delete(ids=ids)
+                manifest.forget(collection, fp)
+                removed += 1
+            except Exception:
+                continue
+        return removed
+
     def _on_settings_vector_ingest_dir(self):
         """选择文件夹，递归导入所有受支持的文件类型。"""
         try:
@@ -6225,7 +6251,7 @@ class MainWindow(QWidget):
             # 故复制最核心处理段（小重复，保持可读性）
             try:
                 # 构造一次性处理：调用内部私有处理器
-                self._ingest_files_batch(files)
+                self._ingest_files_batch(files, dir_path=dir_path)
             except Exception:
                 # 若内部私有处理不存在（首次调用），降级到局部实现
                 pass
@@ -6235,8 +6261,10 @@ class MainWindow(QWidget):
             except Exception:
                 pass
 
-    def _ingest_files_batch(self, files: list[str]):
-        """内部批量导入实现，供目录导入调用。"""
+    def _ingest_files_batch(self, files: list[str], dir_path: str | None = None):
+        """内部批量导入实现，供目录导入调用。
+        给定 dir_path 时，清单中该目录下已不存在的文件的分段会从集合中删除。
+        """
         try:
             import os, uuid
             from datetime import datetime
@@ -6263,90 +6291,59 @@ class MainWindow(QWidget):
             total_chunks = 0
             skipped = 0
             # 由于与上面函数有重复，这里最小复制关键读取器
-            def _read_text(path: str) -> str:
-                try:
-                    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                        return f.read()
-                except Exception:
-                    return ''
-            def _prep_text(s: str) -> str:
-                s = (s or '').replace('\r\n', '\n').replace('\r', '\n')
-                lines = [ln.strip() for ln in s.split('\n')]
-                out = []
-                last_blank = False
-                for ln in lines:
-                    blank = (ln == '')
-                    if blank and last_blank:
-                        continue
-                    out.append(ln)
-                    last_blank = blank
-                return '\n'.join(out).strip()
-            def _chunk(s: str, size: int = 1500, overlap: int = 100) -> list[str]:
-                s = s or ''
-                if len(s) <= size:
-                    return [s] if s else []
-                chunks = []
-                i = 0
-                L = len(s)
-                while i < L:
-                    end = min(i + size, L)
-                    chunks.append(s[i:end])
-                    if end == L:
-                        break
-                    i = end - overlap if overlap > 0 else end
-                return chunks
+            # 编码嗅探读取（BOM/utf-8/GB18030），不再以 errors='ignore' 丢字节
+            _read_text = read_text
             try:
                 self._ingest_cancel = False
                 self._ingest_progress.setValue(0)
             except Exception:
                 pass
+            manifest, params = self._ingest_open_manifest(persistence, do_prep, chunk_size, overlap)
+            unchanged = 0
+            removed = 0
+            cancelled = False
             total_count = len(files)
             for idx_file, fp in enumerate(files):
                 try:
-                    txt = _read_text(fp)
-                    if not txt.strip():
-                        skipped += 1
+                    if manifest is not None and manifest.is_unchanged(collection, fp, params):
+                        unchanged += 1
                         continue
                     if do_prep:
-                        txt = _prep_text(txt)
-                    segs = _chunk(txt, size=chunk_size, overlap=overlap) if do_prep else [txt]
-                    if not segs:
+                        # 流式读取 + 清洗 + 分块，常量内存处理大日志/导出文件
+                        segs = iter_chunks(normalize_lines(iter_text(fp)), size=chunk_size, overlap=overlap)
+                    else:
+                        txt = _read_text(fp)
+                        segs = [txt] if txt.strip() else []
+                    written, seen = self._ingest_write_segments(col, manifest, collection, fp, segs, do_prep, base_dir, params)
+                    if not seen:
                         skipped += 1
                         continue
-                    imported_at = datetime.utcnow().isoformat() + 'Z'
-                    base_id = str(uuid.uuid4())
-                    ids = []
-                    docs = []
-                    metas = []
-                    for idx, seg in enumerate(segs):
-                        ids.append(f"{base_id}-{idx}")
-                        docs.append(seg)
-                        metas.append({
-                            'mode': 'note',
-                            'subtype': 'raw' if not do_prep else 'normalized',
-                            'source_path': os.path.relpath(fp, base_dir),
-                            'imported_at': imported_at,
-                            'segment_index': idx,
-                            'segment_total': len(segs),
-                        })
-                    col.add(documents=docs, metadatas=metas, ids=ids)
+                    total_chunks += written
                     total_files += 1
-                    total_chunks += len(segs)
                     # 进度
                     try:
                         pct = int(((idx_file + 1) / max(1, total_count)) * 100)
                         self._ingest_progress.setValue(pct)
                         if getattr(self, '_ingest_cancel', False):
                             self.settings_output.append('[灌注] 已取消')
+                            cancelled = True
                             break
                     except Exception:
                         pass
                 except Exception:
                     skipped += 1
                     continue
+            if manifest is not None:
+                # 取消时文件列表不完整，不能据此判断删除
+                if dir_path and not cancelled:
+                    try:
+                        removed = self._ingest_remove_stale(col, manifest, collection, files, dir_path)
+                    except Exception:
+                        pass
+                manifest.close()
             from PySide6.QtGui import QTextCursor
             self.settings_output.moveCursor(QTextCursor.End)
-            self.settings_output.insertPlainText(f"\n[导入文件夹] 完成：文件={total_files} | 分段={total_chunks} | 跳过={skipped}\n")
+            self.settings_output.insertPlainText(f"\n[导入文件夹] 完成：文件={total_files} | 新分段={total_chunks} | 未变化={unchanged} | 删除={removed} | 跳过={skipped}\n")
             self.settings_output.moveCursor(QTextCursor.End)
         except Exception as e:
             try:
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from PySide6.QtCore import Qt, QPoint, QSettings, QTimer
+from PySide6.QtCore import Qt, QPoint, QSettings, QTimer, QObject, QThread, Signal, Slot
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QSplitter, QTabWidget,
     QLabel, QTextEdit, QTreeWidget, QTreeWidgetItem,
@@ -16,6 +16,11 @@ import uuid
 import json
 import re
 from utils import logger_sink
+from services.persistence_service import PersistenceBus
+from services.tree_document import TreeDocument
+from services.swimlane_index import SwimlaneIndex
+from services.tree_store import SqliteTreeStore
+from .project_tree_model import ProjectTreeModel, ProjectTreeView
 import copy as _copy
 
 
@@ -38,6 +43,31 @@ class _TitleEditDelegate(QStyledItemDelegate):
             pass
         return editor
 
+# ---------- 后台加载：项目树 JSON 解析 ----------
+class _ProjectLoadWorker(QObject):
+    """在工作线程中取得项目树文档，结果经信号交回 UI 线程。
+    交回的是持久化总线缓存的同一文档（日志模式为 TreeDocument，SQLite 模式为 SqliteTreeStore），
+    页面此后的查询与编辑都作用于它，不再另行解析 JSON。"""
+    finished = Signal(int, str, object)
+    failed = Signal(int, str, str)
+
+    def __init__(self, seq: int, path: Path, pbus: PersistenceBus):
+        super().__init__()
+        self._seq = seq
+        self._path = Path(path)
+        self._pbus = pbus
+
+    @Slot()
+    def run(self):
+        try:
+            root = self._pbus.document(self._path)
+            if root is None:
+                raise ValueError("read_json_failed")
+            self.finished.emit(self._seq, str(self._path), root)
+        except Exception as e:
+            self.failed.emit(self._seq, str(self._path), str(e)[:200])
+
+
 class ProjectPage(QWidget):
     """
     Project 页面原型（方案A + 方案C细化）
@@ -54,12 +84,35 @@ class ProjectPage(QWidget):
         # 本地会话ID（用于MCP日志审计，会话期间保持不变）
         self._session_id = f"{datetime.now().strftime('%Y-%m-%d')}-{str(uuid.uuid4())[:10]}"
         self._new_id_seed = 1  # 新建节点的自增种子（仅前端）
+        # 懒加载：未展开节点的子节点暂存于此（占位子项记录 key），展开时才创建树项
+        self._lazy_children: dict[int, list] = {}
+        self._lazy_seq = 0
+        # 节点 id -> 已创建的树项（_add_json_node 登记；取用时校验，失效项剔除）
+        self._items_by_id: dict[str, QTreeWidgetItem] = {}
+        self._populating = False  # 程序化建树期间：不触发复制去重改ID
+        self._restoring_expansion = False  # 还原展开状态期间：不回写 expanded
+        # 后台加载任务（seq -> (线程, worker)）；只接受最新一次加载的结果
+        self._load_seq = 0
+        self._load_jobs: dict[int, tuple] = {}
+        # Model/View 节点树（设置 project/tree_view=model 时启用，替代 QTreeWidget）
+        self._tree_model = None  # type: ProjectTreeModel | None
+        self.tree_view = None  # type: ProjectTreeView | None
+        # 泳道索引：status -> 有序卡片；加载时建一次，拖放/加入时增量更新
+        self._swimlane_index = None  # type: SwimlaneIndex | None
+        self._swimlane_index_file = None  # type: str | None
+        # 展开状态/泳道等高频小改动走操作日志：每次编辑 O(1) 追加到 <项目文件>.oplog，
+        # 整文件读取前（及退出时）压缩为新快照；上次异常退出遗留的日志在首次读取时重放
+        # 超大项目可在设置中切换为 SQLite 存储（project/storage_backend=sqlite），JSON 仍作为交换格式导出
+        if str(self._settings().value("project/storage_backend", "journal") or "").lower() == "sqlite":
+            self._pbus = PersistenceBus(sqlite=True)
+        else:
+            self._pbus = PersistenceBus(journal=True)
         # 自动保存定时器（详情内容变更后延迟落盘，防抖）
         self._autosave_timer = QTimer(self)
         self._autosave_timer.setSingleShot(True)
         self._autosave_timer.setInterval(1200)  # 1.2s 防抖
         self._autosave_timer.timeout.connect(self._autosave_flush)
-        # 周期性全量保存（每20秒）
+        # 周期性全量保存（每20秒；仅在编辑不逐条持久化的模式下启用）
         self._periodic_save_timer = QTimer(self)
         self._periodic_save_timer.setSingleShot(False)
         self._periodic_save_timer.setInterval(20000)
@@ -75,9 +128,10 @@ class ProjectPage(QWidget):
                 QApplication.instance().aboutToQuit.connect(self._on_app_about_to_quit)
             except Exception:
                 pass
-            # 启动周期性全量保存
+            # 启动周期性全量保存（日志/SQLite 模式下编辑已逐条追加或入库，无需定期整树重写）
             try:
-                self._periodic_save_timer.start()
+                if not (self._pbus.journal or self._pbus.sqlite):
+                    self._periodic_save_timer.start()
             except Exception:
                 pass
         except Exception:
@@ -95,9 +149,6 @@ class ProjectPage(QWidget):
             if not fp or not Path(fp).exists():
                 return
             path = Path(fp)
-            root = self._read_json(path)
-            if root is None:
-                return
 
             # 无条件收集待加入的节点 ID 及对应的树项：
             # - 单项：若当前项是节点项，则加入；否则静默忽略
@@ -106,6 +157,7 @@ class ProjectPage(QWidget):
             data = item.data(0, Qt.ItemDataRole.UserRole) or {}
             if include_children:
                 try:
+                    self._ensure_item_populated(item)
                     for i in range(item.childCount()):
                         ch = item.child(i)
                         d = ch.data(0, Qt.ItemDataRole.UserRole) or {}
@@ -124,54 +176,36 @@ class ProjectPage(QWidget):
             if not targets:
                 return
 
-            # 计算“计划中(planned)”列的下一个排序号
-            try:
-                children = root.get('children') if isinstance(root, dict) else None
-                max_order = -1
-                if isinstance(children, list):
-                    for n in children:
-                        if isinstance(n, dict) and (n.get('status') or 'planned') == 'planned':
-                            try:
-                                ov = int(n.get('kanban_order'))
-                            except Exception:
-                                ov = -1
-                            if ov > max_order:
-                                max_order = ov
-                next_order = max_order + 1
-            except Exception:
-                next_order = 0
-
-            # 写回 JSON：逐个设置 status/kanban_order（默认 status='planned'），不再强制追加任何标签
-            for nid, _tree_it in targets:
-                try:
-                    # 更新 status/kanban_order
-                    self._update_node_in_json(root, nid, {'status': 'planned', 'kanban_order': int(next_order)})
-                    next_order += 1
-                except Exception:
-                    pass
-
-            if not self._write_json_atomic(path, root):
+            # 追加到“计划中(planned)”列末尾：序号由泳道索引分配，只写回被加入的节点
+            index = self._swimlane_ensure_index()
+            if index is None:
+                return
+            changes = {}
+            for nid, tree_it in targets:
+                d = tree_it.data(0, Qt.ItemDataRole.UserRole) or {}
+                title = (d.get('node') or {}).get('topic') if isinstance(d.get('node'), dict) else None
+                changes.update(index.append(nid, 'planned', title))
+            if changes and not self._pbus.save_swimlane_state(path, SwimlaneIndex.to_state(changes), session_id=self._session_id).ok:
+                self._swimlane_index = None
                 return
 
             # 同步树项缓存的节点字段
             for nid, tree_it in targets:
                 try:
+                    if nid not in changes:
+                        continue
                     d = tree_it.data(0, Qt.ItemDataRole.UserRole) or {}
                     node_obj = d.get('node') or {}
                     if isinstance(node_obj, dict):
-                        node_obj['status'] = 'planned'
-                        try:
-                            node_obj['kanban_order'] = int(node_obj.get('kanban_order', 0))
-                        except Exception:
-                            node_obj['kanban_order'] = 0
+                        node_obj['status'], node_obj['kanban_order'] = changes[nid]
                         d['node'] = node_obj
                         tree_it.setData(0, Qt.ItemDataRole.UserRole, d)
                 except Exception:
                     pass
 
-            # 刷新泳道
+            # 刷新泳道（按索引重绘，不重新遍历整棵树）
             try:
-                self._swimlane_load()
+                self._swimlane_render()
             except Exception:
                 pass
 
@@ -268,6 +302,13 @@ class ProjectPage(QWidget):
         self.tree.customContextMenuRequested.connect(self._on_tree_context_menu)
         # 内容在 _populate_tree 中填充
         tab_tree_layout.addWidget(self.tree)
+        # 大项目可切换为 Model/View：不为每个节点创建树项，渲染开销与可见行数成正比
+        if str(self._settings().value("project/tree_view", "widget") or "").lower() == "model":
+            try:
+                self._setup_tree_view(tab_tree_layout)
+            except Exception:
+                self._tree_model = None
+                self.tree_view = None
         self.left_tabs.addTab(tab_tree, "节点树")
 
         # Tab3：泳道（Kanban/过滤汇总）
@@ -314,7 +355,7 @@ class ProjectPage(QWidget):
         tab_swimlane_layout.addLayout(swimlane_cols)
         self.left_tabs.addTab(tab_swimlane, "泳道")
         try:
-            self.btn_swimlane_refresh.clicked.connect(self._swimlane_load)
+            self.btn_swimlane_refresh.clicked.connect(lambda: self._swimlane_load())
         except Exception:
             pass
         try:
@@ -711,9 +752,11 @@ class ProjectPage(QWidget):
             )
             if confirm != QMessageBox.StandardButton.Yes:
                 return
+            removed_ids = self._subtree_ids(item)
             idx = parent.indexOfChild(item)
             if idx >= 0:
                 parent.takeChild(idx)
+            self._forget_nodes(removed_ids)
             self.undo_stack.push(QUndoCommand("删除节点(前端层)"))
             try:
                 logger_sink.log_user_message(self._session_id, f"delete_node: {item.text(0)}")
@@ -764,9 +807,11 @@ class ProjectPage(QWidget):
             if parent is None:
                 return  # 顶层文件项不允许
             self._action_copy(item)
+            removed_ids = self._subtree_ids(item)
             idx = parent.indexOfChild(item)
             if idx >= 0:
                 parent.takeChild(idx)
+            self._forget_nodes(removed_ids)
             self.undo_stack.push(QUndoCommand("剪切节点(前端层)"))
             try:
                 logger_sink.log_user_message(self._session_id, f"cut_node: label={item.text(0)}")
@@ -831,17 +876,17 @@ class ProjectPage(QWidget):
 
             file_path = _resolve_file_path(target_parent)
 
-            # 准备已使用ID集合
-            used_ids = self._gather_used_ids(file_path)
+            # 已占用ID查文档索引；保留原ID的节点随即预留，同一子树内的重复ID也会被改写
+            doc = self._project_doc(file_path)
 
             # 递归重生唯一ID
             def regen_ids(n: dict):
                 try:
                     n_id = n.get('id')
-                    if not isinstance(n_id, str) or not n_id or n_id in used_ids:
-                        new_id = self._generate_unique_id(file_path)
-                        n['id'] = new_id
-                    used_ids.add(n['id'])
+                    if not isinstance(n_id, str) or not n_id or doc is None or doc.taken(n_id):
+                        n['id'] = self._generate_unique_id(file_path)
+                    else:
+                        doc.reserve([n_id])
                     ch = n.get('children')
                     if isinstance(ch, list):
                         for c in ch:
@@ -925,13 +970,15 @@ class ProjectPage(QWidget):
                 logger_sink.log_user_message(self._session_id, f"rename_node: {old} -> {new_text}")
             except Exception:
                 pass
-            # 即时持久化
+            # 即时持久化：只写回该节点标题
             try:
                 self._autosave_flush()
             except Exception:
                 pass
             try:
-                self._save_all_to_file()
+                node_id = ((item.data(0, Qt.ItemDataRole.UserRole) or {}).get('node') or {}).get('id')
+                if node_id:
+                    self._save_node_title(node_id, new_text, item_hint=item)
             except Exception:
                 pass
         except Exception:
@@ -1091,10 +1138,215 @@ class ProjectPage(QWidget):
         except Exception:
             pass
 
+    # ---------- Model/View 节点树 ----------
+    def _setup_tree_view(self, layout: QVBoxLayout):
+        """以 ProjectTreeView 取代 QTreeWidget 显示节点树（多列：标题/状态/ID）。"""
+        self._tree_model = ProjectTreeModel(self)
+        self.tree_view = ProjectTreeView(self)
+        self.tree_view.setModel(self._tree_model)
+        self.tree_view.setItemDelegateForColumn(0, _TitleEditDelegate("新节点", self.tree_view))
+        self.tree_view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.tree_view.customContextMenuRequested.connect(self._on_tree_view_context_menu)
+        self.tree_view.clicked.connect(self._on_tree_view_clicked)
+        self.tree_view.expanded.connect(lambda idx: self._on_tree_view_expansion(idx, True))
+        self.tree_view.collapsed.connect(lambda idx: self._on_tree_view_expansion(idx, False))
+        self._tree_model.nodeEdited.connect(self._on_tree_model_edited)
+        self._tree_model.structureChanged.connect(self._on_tree_model_structure_changed)
+        try:
+            QShortcut(Qt.Key.Key_Delete, self.tree_view, activated=lambda: self._tree_view_delete(self.tree_view.currentIndex()))
+        except Exception:
+            pass
+        self.tree.hide()
+        layout.addWidget(self.tree_view)
+
+    def _load_tree_model(self, file_path: Path, doc: TreeDocument):
+        """将项目树文档装入模型，并沿已展开路径还原展开状态。"""
+        self._tree_model.set_document(doc)
+        prev = self._restoring_expansion
+        self._restoring_expansion = True
+        try:
+            for idx in list(self._tree_model.expanded_indexes()):
+                self.tree_view.setExpanded(idx, True)
+        finally:
+            self._restoring_expansion = prev
+        try:
+            self.tree_view.resizeColumnToContents(0)
+        except Exception:
+            pass
+
+    def _on_tree_view_clicked(self, index):
+        """视图节点点击 -> 右侧详情（与 _on_tree_item_clicked 的节点分支一致）。"""
+        try:
+            self._autosave_flush()
+            node = self._tree_model.node_from_index(index) if index.isValid() else None
+            if not isinstance(node, dict):
+                return
+            self._current_node_id = node.get('id')
+            self.detail_title.setText(node.get('topic') or '')
+            content = node.get('content')
+            self.detail.setPlainText('' if content is None else content)
+            self.detail_node_id_label.setText(f"ID: {node.get('id') or ''}")
+            self.detail_node_id_label.show()
+        except Exception:
+            pass
+
+    def _on_tree_view_expansion(self, index, expanded: bool):
+        if self._restoring_expansion:
+            return
+        try:
+            node = self._tree_model.node_from_index(index)
+            nid = node.get('id') if isinstance(node, dict) else None
+            fp = getattr(self, '_current_project_file', None)
+            if not nid or not fp or not Path(fp).exists():
+                return
+            node['expanded'] = bool(expanded)
+            self._pbus.save_tree_expansion(Path(fp), nid, bool(expanded), session_id=self._session_id)
+        except Exception:
+            pass
+
+    def _on_tree_model_edited(self, node_id: str, fields: dict):
+        """内联编辑（标题/状态）：按字段写回，不重建整棵树。"""
+        try:
+            fp = getattr(self, '_current_project_file', None)
+            if not fp or not Path(fp).exists():
+                return
+            self._pbus.save_node_fields(Path(fp), node_id, fields, session_id=self._session_id, reason="ui.inline_edit")
+            if 'topic' in fields:
+                self._swimlane_sync_title(node_id, fields.get('topic') or '')
+                if node_id == getattr(self, '_current_node_id', None):
+                    self.detail_title.setText(fields.get('topic') or '')
+            if 'status' in fields:
+                node = self._tree_model.document().get(node_id) if self._tree_model.document() is not None else None
+                self._swimlane_sync_status(Path(fp), node_id, fields.get('status'), (node or {}).get('topic'))
+        except Exception:
+            pass
+
+    def _on_tree_model_structure_changed(self, op: dict):
+        """插入/删除/拖放之后按操作逐条持久化（日志模式追加一行，SQLite 模式单条入库）；失败时退回全量保存。"""
+        try:
+            self.undo_stack.push(QUndoCommand("结构变更(视图)"))
+            fp = getattr(self, '_current_project_file', None)
+            if not fp or not Path(fp).exists():
+                return
+            path = Path(fp)
+            kind = op.get('op')
+            if kind == 'insert':
+                res = self._pbus.insert_node(path, op.get('parent'), op.get('node'), op.get('index'), session_id=self._session_id)
+            elif kind == 'delete':
+                res = self._pbus.delete_node(path, op.get('id'), session_id=self._session_id)
+            elif kind == 'move':
+                res = self._pbus.move_node(path, op.get('id'), op.get('parent'), op.get('index'), session_id=self._session_id)
+            else:
+                res = None
+            if res is None or not res.ok:
+                self._save_all_to_file()
+        except Exception:
+            pass
+
+    def _on_tree_view_context_menu(self, pos: QPoint):
+        try:
+            index = self.tree_view.indexAt(pos)
+            menu = QMenu(self)
+            act_new_child = QAction("新建子节点", self)
+            act_new_child.triggered.connect(lambda checked=False, idx=index: self._tree_view_new_node(idx, as_child=True))
+            menu.addAction(act_new_child)
+            if index.isValid():
+                act_new_sibling = QAction("新建同级节点", self)
+                act_new_sibling.triggered.connect(lambda checked=False, idx=index: self._tree_view_new_node(idx, as_child=False))
+                act_delete = QAction("删除", self)
+                act_delete.triggered.connect(lambda checked=False, idx=index: self._tree_view_delete(idx))
+                menu.addAction(act_new_sibling)
+                menu.addSeparator()
+                menu.addAction(act_delete)
+            menu.exec(self.tree_view.viewport().mapToGlobal(pos))
+        except Exception:
+            pass
+
+    def _tree_view_new_node(self, index, as_child: bool = True):
+        try:
+            fp = getattr(self, '_current_project_file', None)
+            if not fp:
+                return
+            index = index.sibling(index.row(), 0) if index.isValid() else index
+            if as_child:
+                parent, row = index, None
+            else:
+                parent, row = index.parent(), index.row() + 1
+            node = {"id": self._generate_unique_id(Path(fp)), "topic": "", "content": "", "children": []}
+            new_index = self._tree_model.insert_node(parent, row, node)
+            if not new_index.isValid():
+                return
+            if parent.isValid():
+                self.tree_view.expand(parent)
+            self.tree_view.setCurrentIndex(new_index)
+            self._current_node_id = node['id']
+            self.detail_title.clear()
+            self.detail.clear()
+            self.tree_view.edit(new_index)
+        except Exception:
+            pass
+
+    def _tree_view_delete(self, index):
+        try:
+            if index is None or not index.isValid():
+                return
+            index = index.sibling(index.row(), 0)
+            label = self._tree_model.data(index)
+            confirm = QMessageBox.question(
+                self,
+                "确认删除",
+                f"确定要删除节点 “{label}” 吗？",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                QMessageBox.StandardButton.No,
+            )
+            if confirm != QMessageBox.StandardButton.Yes:
+                return
+            self._autosave_flush()
+            node = self._tree_model.node_from_index(index)
+            removed_ids = [n['id'] for n in TreeDocument.walk(node, include_root=True) if isinstance(n.get('id'), str)]
+            if self._tree_model.remove_node(index) is not None:
+                self._forget_nodes(removed_ids)
+        except Exception:
+            pass
+
+    def _collect_tree_children(self, path: Path) -> list | None:
+        """取得当前界面中该文件的根 children：Model/View 下直接取文档，否则从树项重建。"""
+        if self._tree_model is not None:
+            doc = self._tree_model.document()
+            root_node = doc.root_node if doc is not None else None
+            if not isinstance(root_node, dict):
+                return None
+            ch = root_node.get('children')
+            # 副本：保存后总线文档不与模型共享节点对象
+            return _copy.deepcopy(ch) if isinstance(ch, list) else []
+        # 定位该文件的顶层项
+        file_item = None
+        for i in range(self.tree.topLevelItemCount()):
+            it = self.tree.topLevelItem(i)
+            data = it.data(0, Qt.ItemDataRole.UserRole) or {}
+            if data.get('type') == 'file' and Path(data.get('path','')) == path:
+                file_item = it
+                break
+        if file_item is None:
+            return None
+        # 从 file_item 的直接子项（节点）重建 children
+        new_children = []
+        for i in range(file_item.childCount()):
+            ch = file_item.child(i)
+            node = self._collect_node_from_item(ch)
+            if node is not None:
+                new_children.append(node)
+        return new_children
+
     def _populate_tree(self):
-        """从 config/projects 选择一个 JSON 节点树文件作为根，递归构建树。"""
+        """从 config/projects 选择一个 JSON 节点树文件作为根，后台解析后构建树。
+        - JSON 解析在工作线程完成，UI 线程只创建可见层级的树项
+        - 子节点按需创建：未展开节点挂一个占位子项，展开时再填充（见 _ensure_item_populated）
+        """
         try:
             self.tree.clear()
+            self._lazy_children.clear()
+            self._items_by_id.clear()
             base = self._base_root()
             projects_dir = base / 'config' / 'projects'
 
@@ -1120,25 +1372,92 @@ class ProjectPage(QWidget):
 
             # 选择当前文件
             file_path = self._resolve_current_project_file(candidates)
-            with open(file_path, 'r', encoding='utf-8') as f:
-                root_node = json.load(f)
+            loading = QTreeWidgetItem([f"{file_path.name}（加载中…）"])
+            loading.setData(0, Qt.ItemDataRole.UserRole, {"type": "loading", "path": str(file_path)})
+            self.tree.addTopLevelItem(loading)
+            self._start_project_load(Path(file_path))
+        except Exception:
+            # 静默失败以免影响UI
+            pass
 
+    def _start_project_load(self, file_path: Path):
+        """启动后台加载；先前未完成的加载结果将被丢弃。"""
+        self._load_seq += 1
+        seq = self._load_seq
+        thread = QThread(self)
+        worker = _ProjectLoadWorker(seq, file_path, self._pbus)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.finished.connect(self._on_project_loaded)
+        worker.failed.connect(self._on_project_load_failed)
+        # 清理
+        worker.finished.connect(thread.quit)
+        worker.failed.connect(thread.quit)
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        thread.finished.connect(lambda s=seq: self._load_jobs.pop(s, None))
+        self._load_jobs[seq] = (thread, worker)
+        thread.start()
+
+    @Slot(int, str, object)
+    def _on_project_loaded(self, seq: int, path: str, root_node: object):
+        """后台解析完成：仅创建顶层与已展开路径上的树项。"""
+        if seq != self._load_seq:
+            return
+        try:
+            file_path = Path(path)
+            if self._current_project_file is not None and Path(self._current_project_file) != file_path:
+                return
+            self._swimlane_index = None
+            store = root_node if isinstance(root_node, SqliteTreeStore) else None
+            if self._tree_model is not None:
+                # 模型建立在自己的 TreeDocument 上（SQLite 模式下导出一次整树，日志模式下复制总线文档）：
+                # 结构修改由模型先改、再经总线逐条持久化，两份文档不能共享节点对象
+                if store is not None:
+                    model_doc = TreeDocument(store.export_tree())
+                elif isinstance(root_node, TreeDocument):
+                    model_doc = TreeDocument(_copy.deepcopy(root_node.root))
+                else:
+                    model_doc = root_node
+                self._load_tree_model(file_path, model_doc)
+                return
+            if isinstance(root_node, TreeDocument):
+                root_node = root_node.root
+            elif store is not None:
+                # SQLite 模式：只取根与第一层，更深的子节点展开时再查询
+                root_id = store.root_id()
+                root_node = dict(store.get(root_id) or {}, children=store.children(root_id))
+            self.tree.clear()
+            self._lazy_children.clear()
+            self._items_by_id.clear()
             # 根节点以文件名展示
             root_item = QTreeWidgetItem([file_path.name])
-            root_item.setExpanded(True)
             # 关键修复：顶层项类型使用 'file'，以匹配 _save_all_to_file 的查找逻辑
-            root_item.setData(0, Qt.ItemDataRole.UserRole, {"type": "file", "path": str(file_path), "node": root_node})
+            # 根节点缓存不含 children（子树由树项/懒加载暂存区承载）
+            root_meta = {k: v for k, v in root_node.items() if k != 'children'} if isinstance(root_node, dict) else root_node
+            root_item.setData(0, Qt.ItemDataRole.UserRole, {"type": "file", "path": str(file_path), "node": root_meta})
             self.tree.addTopLevelItem(root_item)
 
-            # 递归添加 JSON 节点树（根节点的 children 作为显示起点，根本身用文件名展示）
+            # 添加 JSON 节点树（根节点的 children 作为显示起点，根本身用文件名展示）
             if isinstance(root_node, dict) and isinstance(root_node.get('children'), list):
                 for child in root_node['children']:
                     self._add_json_node(root_item, child, file_path)
             else:
                 # 若结构异常，直接以整个根节点显示
                 self._add_json_node(root_item, root_node, file_path)
+            self._set_expanded_quietly(root_item)
+        except Exception:
+            pass
+
+    @Slot(int, str, str)
+    def _on_project_load_failed(self, seq: int, path: str, error: str):
+        if seq != self._load_seq:
+            return
+        try:
+            self.tree.clear()
+            self.tree.addTopLevelItem(QTreeWidgetItem([f"<读取失败> {Path(path).name}"]))
+            logger_sink.log_user_message(self._session_id, f"[LOAD] project_load_failed file={path} error={error}")
         except Exception:
-            # 静默失败以免影响UI
             pass
 
     def _list_project_candidates(self, projects_dir: Path) -> list[Path]:
@@ -1290,32 +1609,25 @@ class ProjectPage(QWidget):
             root = self._read_json(src_path)
             if not isinstance(root, dict):
                 return
-            # 在顶层查找当前文件项
-            file_item = None
-            for i in range(self.tree.topLevelItemCount()):
-                it = self.tree.topLevelItem(i)
-                data = it.data(0, Qt.ItemDataRole.UserRole) or {}
-                if data.get('type') == 'file' and Path(data.get('path','')) == src_path:
-                    file_item = it
-                    break
-            if file_item is None:
+            new_children = self._collect_tree_children(src_path)
+            if new_children is None:
                 return
-            # 重建 children
-            new_children = []
-            for i in range(file_item.childCount()):
-                ch = file_item.child(i)
-                node = self._collect_node_from_item(ch)
-                if node is not None:
-                    new_children.append(node)
             root['children'] = new_children
             # 原子写入到导出路径
             self._write_json_atomic(Path(dst_path), root)
         except Exception:
             pass
 
-    def _add_json_node(self, parent_item: QTreeWidgetItem, node: dict, file_path: Path):
-        """将一个 JSON 节点递归添加到树中。节点显示文本优先 topic 其次 id。"""
+    def _add_json_node(self, parent_item: QTreeWidgetItem, node: dict, file_path: Path, index: int | None = None):
+        """将一个 JSON 节点添加到树中。节点显示文本优先 topic 其次 id。
+        - 持久化为展开（expanded=True）的节点立即创建子项并展开，其余节点的子节点挂在占位子项上，展开时再创建
+        - 程序化插入不视为拖拽复制（不改ID）
+        """
+        prev_populating = self._populating
+        self._populating = True
         try:
+            # 父项尚未填充时先填充，保证新节点排在原有子节点之后
+            self._ensure_item_populated(parent_item)
             if not isinstance(node, dict):
                 label = str(node)
             else:
@@ -1327,30 +1639,125 @@ class ProjectPage(QWidget):
                 item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEditable)
             except Exception:
                 pass
-            # 避免共享引用导致多个节点互相影响：深拷贝 node
+            # 节点缓存不含 children（子节点由子树项或懒加载暂存区承载）；
+            # 避免共享引用导致多个节点互相影响：深拷贝其余字段
+            node_fields = {k: v for k, v in node.items() if k not in ('children', 'has_children')} if isinstance(node, dict) else {}
             try:
-                import copy as _copy
-                node_copy = _copy.deepcopy(node)
+                node_copy = _copy.deepcopy(node_fields)
             except Exception:
-                node_copy = dict(node)
+                node_copy = dict(node_fields)
             item.setData(0, Qt.ItemDataRole.UserRole, {"type": "node", "node": node_copy, "path": str(file_path)})
             # 允许重命名
             item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEditable | Qt.ItemFlag.ItemIsDragEnabled | Qt.ItemFlag.ItemIsDropEnabled | Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable)
-            # 展开状态
-            try:
-                if isinstance(node, dict) and node.get('expanded') is True:
-                    item.setExpanded(True)
-            except Exception:
-                pass
-            parent_item.addChild(item)
-
-            # 递归 children
-            if isinstance(node, dict) and isinstance(node.get('children'), list):
-                for child in node['children']:
-                    self._add_json_node(item, child, file_path)
+            if index is None:
+                parent_item.addChild(item)
+            else:
+                parent_item.insertChild(index, item)
+            if isinstance(node_copy.get('id'), str) and node_copy['id']:
+                self._items_by_id[node_copy['id']] = item
+
+            children = node.get('children') if isinstance(node, dict) else None
+            if children is None and isinstance(node, dict) and node.get('has_children') and isinstance(node.get('id'), str):
+                # SQLite 模式：子节点尚未取出，暂存节点 id，需要时再查询
+                children = node['id']
+            if isinstance(children, (list, str)) and children:
+                if node.get('expanded') is True:
+                    # 仅沿已展开的路径继续创建并还原展开状态
+                    for child in self._resolve_lazy(children, file_path):
+                        self._add_json_node(item, child, file_path)
+                    self._set_expanded_quietly(item)
+                else:
+                    self._set_lazy_children(item, children)
             return item
         except Exception:
             pass
+        finally:
+            self._populating = prev_populating
+
+    # ---------- 懒加载：占位子项 ----------
+    def _set_lazy_children(self, item: QTreeWidgetItem, children: list | str):
+        """为 item 挂一个占位子项，子节点 JSON 暂存于 _lazy_children，展开时再创建树项。
+        SQLite 模式下暂存的是节点 id，展开时经 store.children() 查询一层。"""
+        self._lazy_seq += 1
+        key = self._lazy_seq
+        self._lazy_children[key] = children
+        ph = QTreeWidgetItem([""])
+        ph.setData(0, Qt.ItemDataRole.UserRole, {"type": "placeholder", "key": key})
+        ph.setFlags(Qt.ItemFlag.ItemIsEnabled)
+        item.addChild(ph)
+
+    def _lazy_key(self, item: QTreeWidgetItem | None) -> int | None:
+        """item 尚未填充时返回其占位子项的 key，否则返回 None。"""
+        if item is None or item.childCount() == 0:
+            return None
+        data = item.child(0).data(0, Qt.ItemDataRole.UserRole) or {}
+        if isinstance(data, dict) and data.get('type') == 'placeholder':
+            return data.get('key')
+        return None
+
+    def _lazy_children_of(self, item: QTreeWidgetItem | None) -> list | None:
+        key = self._lazy_key(item)
+        if key is None:
+            return None
+        return self._resolve_lazy(self._lazy_children.get(key), self._resolve_item_file_path(item))
+
+    def _resolve_lazy(self, children: list | str | None, file_path: Path | None = None) -> list:
+        """懒加载暂存值 -> 子节点列表：列表原样返回，节点 id 则查询 SQLite 存储的直接子节点。"""
+        if isinstance(children, str):
+            store = self._project_store(file_path)
+            return store.children(children) if store is not None else []
+        return children or []
+
+    def _project_doc(self, file_path: Path | None = None) -> TreeDocument | SqliteTreeStore | None:
+        """项目文件的树文档：持久化总线按文件缓存的同一对象（加载时交给页面的也是它），
+        get/ids/find_by_topic 等查询走其索引；文件被外部修改时由总线重新加载。"""
+        fp = file_path or self._current_project_file
+        if not fp:
+            return None
+        try:
+            return self._pbus.document(Path(fp))
+        except Exception:
+            return None
+
+    def _project_store(self, file_path: Path | None = None) -> SqliteTreeStore | None:
+        """SQLite 模式下项目文件对应的 SqliteTreeStore；其它模式返回 None。"""
+        if not self._pbus.sqlite:
+            return None
+        doc = self._project_doc(file_path)
+        return doc if isinstance(doc, SqliteTreeStore) else None
+
+    def _ensure_item_populated(self, item: QTreeWidgetItem | None):
+        """将占位子项替换为真实子节点树项（仅一层；持久化为展开的子节点继续向下填充）。"""
+        children = self._lazy_children_of(item)
+        if children is None:
+            return
+        prev_populating = self._populating
+        self._populating = True
+        try:
+            item.takeChild(0)
+            fp = self._resolve_item_file_path(item)
+            for i, child in enumerate(children):
+                self._add_json_node(item, child, fp, index=i)
+        finally:
+            self._populating = prev_populating
+
+    def _set_expanded_quietly(self, item: QTreeWidgetItem):
+        """还原展开状态：不把 expanded 回写文件。"""
+        prev = self._restoring_expansion
+        self._restoring_expansion = True
+        try:
+            item.setExpanded(True)
+        finally:
+            self._restoring_expansion = prev
+
+    def _resolve_item_file_path(self, item: QTreeWidgetItem | None) -> Path:
+        cur = item
+        while cur is not None:
+            d = cur.data(0, Qt.ItemDataRole.UserRole) or {}
+            if d.get('type') == 'file' and d.get('path'):
+                return Path(d.get('path'))
+            cur = cur.parent()
+        return Path(self._current_project_file) if self._current_project_file else Path('.')
 
     # 删除未使用的 _add_category_node（历史遗留，现不再需要）
 
@@ -1399,6 +1806,7 @@ class ProjectPage(QWidget):
                     path = data.get('path')
                     if path and Path(path).exists():
                         try:
+                            self._pbus.flush(Path(path))
                             with open(path, 'r', encoding='utf-8') as f:
                                 content_obj = json.load(f)
                             formatted = json.dumps(content_obj, indent=4, ensure_ascii=False)
@@ -1444,12 +1852,20 @@ class ProjectPage(QWidget):
             pass
 
     def _on_tree_item_expanded(self, item: QTreeWidgetItem):
+        try:
+            self._ensure_item_populated(item)
+        except Exception:
+            pass
+        if self._restoring_expansion:
+            return
         try:
             self._persist_item_expansion(item, True)
         except Exception:
             pass
 
     def _on_tree_item_collapsed(self, item: QTreeWidgetItem):
+        if self._restoring_expansion:
+            return
         try:
             self._persist_item_expansion(item, False)
         except Exception:
@@ -1483,12 +1899,7 @@ class ProjectPage(QWidget):
             fp = _resolve_file_path(item)
             if fp is None or not Path(fp).exists():
                 return
-            root = self._read_json(Path(fp))
-            if root is None:
-                return
-            if not self._update_node_in_json(root, node_id, {"expanded": bool(expanded)}):
-                return
-            if not self._write_json_atomic(Path(fp), root):
+            if not self._pbus.save_tree_expansion(Path(fp), node_id, bool(expanded), session_id=self._session_id).ok:
                 return
             # 同步树项缓存
             try:
@@ -1519,6 +1930,13 @@ class ProjectPage(QWidget):
             nid = data.get('id')
             if not nid:
                 return
+            if self._tree_model is not None:
+                idx = self._tree_model.index_for_id(nid)
+                if idx.isValid():
+                    self.tree_view.setCurrentIndex(idx)
+                    self.tree_view.scrollTo(idx)
+                    self._on_tree_view_clicked(idx)
+                return
             tree_it = self._find_item_by_node_id(nid)
             if tree_it is None:
                 try:
@@ -1635,7 +2053,7 @@ class ProjectPage(QWidget):
                 except Exception:
                     pass
 
-            # 先仅更新该节点标题至 JSON；失败则放弃（不弹框），随后全量保存兜底
+            # 仅更新该节点标题（字段级写回，不整文件重写）；失败则放弃（不弹框）
             try:
                 ok_inline = self._save_node_title(node_id, new_title, item_hint=item)
                 try:
@@ -1647,11 +2065,6 @@ class ProjectPage(QWidget):
                     logger_sink.log_user_message(self._session_id, f"save_node_title_error: id={node_id} err={e}")
                 except Exception:
                     pass
-            # 全量保存，确保children结构一致
-            try:
-                self._save_all_to_file()
-            except Exception:
-                pass
         except Exception:
             pass
 
@@ -1660,6 +2073,14 @@ class ProjectPage(QWidget):
             self._autosave_flush()
             self._save_all_to_file()
             self._save_splitters()
+            # 等待未完成的后台加载线程退出
+            for thread, _worker in list(self._load_jobs.values()):
+                try:
+                    thread.quit()
+                    thread.wait(2000)
+                except Exception:
+                    pass
+            self._pbus.close()
         except Exception:
             pass
 
@@ -1686,69 +2107,39 @@ class ProjectPage(QWidget):
                 logger_sink.log_user_message(self._session_id, f"[AUDIT] detail_before_update: id={node_id} title_len={len(title)} content_len={(len(content) if isinstance(content, str) else 0)} file={fp.name}")
             except Exception:
                 pass
-            root = self._read_json(fp)
-            if root is None:
-                self._last_save_error = "读取项目文件失败。"
-                return False
-            updated = self._update_node_in_json(root, node_id, {"topic": title, "content": content})
-            if not updated:
-                # 若 JSON 中未找到该 id，尝试根据当前树的父节点进行“插入或更新”
-                try:
-                    cur_item = self.tree.currentItem()
-                    if cur_item is not None:
-                        data_cur = cur_item.data(0, Qt.ItemDataRole.UserRole) or {}
-                        # 仅当当前项是“节点”时才尝试 upsert，避免把文件/目录/根项写入为子节点
-                        if data_cur.get('type') != 'node':
-                            self._last_save_error = "当前选中项不是节点，无法写回。请选中具体节点后再保存。"
-                            return False
-                        node_obj = data_cur.get('node') or {}
-                        if isinstance(node_obj, dict):
-                            # 合并标题与内容
-                            node_obj['id'] = node_id
-                            node_obj['topic'] = title
-                            node_obj['content'] = content
-                            # 禁止把根节点作为子节点写回
-                            if node_obj.get('id') == 'root':
-                                self._last_save_error = "根节点不支持作为子节点写回。请选中具体普通节点后再保存。"
-                                return False
-                            parent_item = cur_item.parent()
-                            parent_id = None
-                            if parent_item is not None:
-                                data_parent = parent_item.data(0, Qt.ItemDataRole.UserRole) or {}
-                                parent_node = data_parent.get('node')
-                                if isinstance(parent_node, dict):
-                                    parent_id = parent_node.get('id') or None
-                            # 执行 upsert：parent_id 为 None 表示落到根节点
-                            if not self._upsert_node_in_json(root, parent_id, node_obj):
-                                # 最终兜底：直接附加到根节点 children
-                                try:
-                                    root_node = root[0] if isinstance(root, list) and root else root
-                                    if isinstance(root_node, dict):
-                                        if 'children' not in root_node or not isinstance(root_node['children'], list):
-                                            root_node['children'] = []
-                                        root_node['children'].append(node_obj)
-                                        try:
-                                            logger_sink.log_user_message(self._session_id, f"[AUDIT] detail_upsert_append_to_root: id={node_id} title_len={len(title)} content_len={(len(content) if isinstance(content, str) else 0)}")
-                                        except Exception:
-                                            pass
-                                    else:
-                                        self._last_save_error = "项目根结构异常，无法追加节点。"
-                                        return False
-                                except Exception:
-                                    self._last_save_error = "无法将节点追加到根。"
-                                    return False
-                        else:
-                            self._last_save_error = "当前树节点数据异常。"
-                            return False
-                    else:
-                        self._last_save_error = "未选中任何树节点。"
-                        return False
-                except Exception:
-                    self._last_save_error = "节点插入或更新过程中发生异常。"
+            # 字段级写回（经 PersistenceBus：日志模式追加一条操作，SQLite 模式单行更新），不再整文件读改写
+            fields = {"topic": title, "content": content}
+            self._audit_overwrite_empty(fp, node_id, fields)
+            res = self._pbus.save_node_fields(fp, node_id, fields, session_id=self._session_id, reason="ui.detail")
+            if not res.ok:
+                if res.error != "node_not_found":
+                    self._last_save_error = "写入项目文件失败。"
                     return False
-            if not self._write_json_atomic(fp, root):
-                self._last_save_error = "写入项目文件失败。"
-                return False
+                # 文件中未找到该 id：按当前树的父节点插入
+                cur_item = self.tree.currentItem()
+                if cur_item is None:
+                    self._last_save_error = "未选中任何树节点。"
+                    return False
+                data_cur = cur_item.data(0, Qt.ItemDataRole.UserRole) or {}
+                # 仅当当前项是“节点”时才尝试插入，避免把文件/目录/根项写入为子节点
+                if data_cur.get('type') != 'node':
+                    self._last_save_error = "当前选中项不是节点，无法写回。请选中具体节点后再保存。"
+                    return False
+                node_obj = data_cur.get('node') or {}
+                if not isinstance(node_obj, dict):
+                    self._last_save_error = "当前树节点数据异常。"
+                    return False
+                # 禁止把根节点作为子节点写回
+                if node_id == 'root':
+                    self._last_save_error = "根节点不支持作为子节点写回。请选中具体普通节点后再保存。"
+                    return False
+                node_obj = dict(node_obj, id=node_id, **fields)
+                if not self._insert_missing_node(fp, self._item_parent_id(cur_item), node_obj):
+                    self._last_save_error = "节点插入过程中发生异常。"
+                    return False
+            if self._tree_model is not None:
+                self._tree_model.update_node(node_id, {"topic": title, "content": content})
+            self._swimlane_sync_title(node_id, title)
             # 同步树中与 node_id 对应的项（避免 currentItem 已切换导致误写）
             try:
                 target_item = None
@@ -1808,115 +2199,132 @@ class ProjectPage(QWidget):
 
     # ---------- ID 唯一化与拖拽复制处理 ----------
     def _generate_unique_id(self, file_path: Path, prefix: str = "n-") -> str:
-        """基于当前文件与树中已占用的ID生成唯一ID。"""
-        try:
-            used = self._gather_used_ids(file_path)
-            import uuid as _uuid
-            while True:
-                cand = f"{prefix}{_uuid.uuid4().hex[:8]}"
-                if cand not in used:
-                    return cand
-        except Exception:
-            # 回退：仍返回一次性ID，碰撞概率极低
-            import uuid as _uuid
-            return f"{prefix}{_uuid.uuid4().hex[:8]}"
-
-    def _gather_used_ids(self, file_path: Path) -> set[str]:
-        """收集当前树/文件中所有已使用的ID。"""
-        used: set[str] = set()
-        try:
-            # 1) 来自树（优先，包含未写回的前端态）
-            # 定位该文件顶层项
-            file_item = None
-            for i in range(self.tree.topLevelItemCount()):
-                it = self.tree.topLevelItem(i)
-                data = it.data(0, Qt.ItemDataRole.UserRole) or {}
-                if data.get('type') == 'file' and Path(data.get('path','')) == file_path:
-                    file_item = it
-                    break
-            def walk(item: QTreeWidgetItem | None):
-                if item is None:
-                    return
-                data = item.data(0, Qt.ItemDataRole.UserRole) or {}
-                node = data.get('node') if isinstance(data, dict) else None
-                if isinstance(node, dict):
-                    nid = node.get('id')
-                    if isinstance(nid, str) and nid:
-                        used.add(nid)
-                for j in range(item.childCount()):
-                    walk(item.child(j))
-            if file_item is not None:
-                for j in range(file_item.childCount()):
-                    walk(file_item.child(j))
-            # 2) 来自磁盘（兜底）
-            try:
-                root = self._read_json(file_path)
-                def walk_json(n):
-                    if isinstance(n, dict):
-                        nid = n.get('id')
-                        if isinstance(nid, str) and nid:
-                            used.add(nid)
-                        ch = n.get('children')
-                        if isinstance(ch, list):
-                            for c in ch:
-                                walk_json(c)
-                    elif isinstance(n, list):
-                        for c in n:
-                            walk_json(c)
-                walk_json(root)
-            except Exception:
-                pass
+        """生成唯一ID：查项目文档的 id 索引（SQLite 模式为主键查询），新ID随即预留，
+        尚未写回文件的前端新建节点之间也不会重复。"""
+        try:
+            doc = self._project_doc(file_path)
+            if doc is not None:
+                return doc.new_id(prefix)
         except Exception:
             pass
-        return used
+        # 回退：仍返回一次性ID，碰撞概率极低
+        return f"{prefix}{uuid.uuid4().hex[:8]}"
 
-    def _find_item_by_node_id(self, node_id: str) -> QTreeWidgetItem | None:
-        """在当前树中查找指定 node_id 的项。若未找到返回 None。"""
+    def _find_item_by_node_id(self, node_id: str, reveal: bool = True) -> QTreeWidgetItem | None:
+        """按 id 取已创建的树项（查 _items_by_id，不遍历树）。若未找到返回 None。
+        reveal=True 时，目标位于未填充的子树中则沿文档中的祖先链逐层填充后返回；否则只查找已创建的树项。
+        """
         try:
             if not isinstance(node_id, str) or not node_id:
                 return None
-            # 遍历所有顶层文件项
-            for i in range(self.tree.topLevelItemCount()):
-                root_it = self.tree.topLevelItem(i)
-                # 深度优先遍历
-                stack = [root_it]
-                while stack:
-                    it = stack.pop()
-                    if it is None:
-                        continue
-                    data = it.data(0, Qt.ItemDataRole.UserRole) or {}
-                    node = data.get('node') if isinstance(data, dict) else None
-                    if isinstance(node, dict):
-                        if node.get('id') == node_id:
-                            return it
-                    # 入栈子节点
-                    for j in range(it.childCount()-1, -1, -1):
-                        stack.append(it.child(j))
+            it = self._item_for_id(node_id)
+            if it is not None or not reveal:
+                return it
+            # 自根向下填充祖先（顶层节点加载时即已创建）
+            for anc in reversed(self._ancestor_ids(node_id)):
+                anc_item = self._item_for_id(anc)
+                if anc_item is not None:
+                    self._ensure_item_populated(anc_item)
+            return self._item_for_id(node_id)
         except Exception:
-            pass
+            return None
+
+    def _item_for_id(self, node_id: str) -> QTreeWidgetItem | None:
+        it = self._items_by_id.get(node_id)
+        if it is None:
+            return None
+        try:
+            node = (it.data(0, Qt.ItemDataRole.UserRole) or {}).get('node')
+            if it.treeWidget() is not None and isinstance(node, dict) and node.get('id') == node_id:
+                return it
+        except RuntimeError:
+            pass  # 树项已被 Qt 释放
+        # 已删除或已改 id 的树项
+        self._items_by_id.pop(node_id, None)
         return None
 
-    def _remap_ids_unique(self, node: dict | list, file_path: Path, used_ids: set[str] | None = None) -> dict | list:
+    def _ancestor_ids(self, node_id: str) -> list[str]:
+        """项目文档中 node_id 的祖先 id（由父节点到根）。"""
+        doc = self._project_doc()
+        if isinstance(doc, SqliteTreeStore):
+            return doc.ancestors(node_id)
+        out: list[str] = []
+        p = doc.parent_of(node_id) if doc is not None else None
+        while isinstance(p, dict) and isinstance(p.get('id'), str) and p['id'] not in out:
+            out.append(p['id'])
+            p = doc.parent_of(p['id'])
+        return out
+
+    def _subtree_ids(self, item: QTreeWidgetItem) -> set[str]:
+        """树项对应子树的全部节点 id：已创建的子项，加上文档中该节点的子树（覆盖未填充部分）。"""
+        ids: set[str] = set()
+        stack = [item]
+        while stack:
+            it = stack.pop()
+            node = (it.data(0, Qt.ItemDataRole.UserRole) or {}).get('node')
+            if isinstance(node, dict) and isinstance(node.get('id'), str):
+                ids.add(node['id'])
+            stack.extend(it.child(j) for j in range(it.childCount()))
+        node = (item.data(0, Qt.ItemDataRole.UserRole) or {}).get('node')
+        nid = node.get('id') if isinstance(node, dict) else None
+        doc = self._project_doc(self._resolve_item_file_path(item))
+        if isinstance(nid, str) and doc is not None:
+            if isinstance(doc, SqliteTreeStore):
+                ids.update(doc.subtree_ids(nid))
+            elif doc.get(nid) is not None:
+                ids.update(n['id'] for n in TreeDocument.walk(doc.get(nid), include_root=True) if isinstance(n.get('id'), str))
+        return ids
+
+    def _forget_nodes(self, ids) -> None:
+        """节点被删除/剪切：从 id 映射与泳道索引中移除，泳道有变化时重绘。"""
+        index = self._swimlane_index
+        changed = False
+        for nid in ids:
+            self._items_by_id.pop(nid, None)
+            if index is not None and index.remove(nid):
+                changed = True
+        if changed:
+            self._swimlane_render()
+
+    def _swimlane_sync_title(self, node_id: str, title: str) -> None:
+        """节点标题变更后同步泳道卡片（不重建索引）。"""
+        index = self._swimlane_index
+        if index is not None and index.set_title(node_id, title):
+            self._swimlane_render()
+
+    def _swimlane_sync_status(self, fp: Path, node_id: str, status, title: str | None = None) -> None:
+        """节点状态变更后增量调整泳道索引：移入新列末尾（写回新序号）或移出泳道。"""
+        index = self._swimlane_index
+        if index is None:
+            return
+        if status not in index.statuses:
+            if index.remove(node_id):
+                self._swimlane_render()
+            return
+        if index.status_of(node_id) == status:
+            return
+        changes = index.append(node_id, status, title)
+        if changes and not self._pbus.save_swimlane_state(fp, SwimlaneIndex.to_state(changes), session_id=self._session_id).ok:
+            self._swimlane_index = None
+            return
+        if self._tree_model is not None:
+            for nid, (key, order) in changes.items():
+                self._tree_model.update_node(nid, {'status': key, 'kanban_order': int(order)})
+        self._swimlane_render()
+
+    def _remap_ids_unique(self, node: dict | list, file_path: Path) -> dict | list:
         """递归将节点/子树的ID重写为唯一ID（仅在创建新节点的场景使用）。"""
         try:
-            if used_ids is None:
-                used_ids = self._gather_used_ids(file_path)
             if isinstance(node, dict):
                 new_node = dict(node)
-                old_id = new_node.get('id')
                 # 为根节点也生成新ID（新建/复制的子树）
-                new_id = self._generate_unique_id(file_path)
-                new_node['id'] = new_id
-                used_ids.add(new_id)
+                new_node['id'] = self._generate_unique_id(file_path)
                 ch = new_node.get('children')
                 if isinstance(ch, list):
-                    new_children = []
-                    for sub in ch:
-                        new_children.append(self._remap_ids_unique(sub, file_path, used_ids))
-                    new_node['children'] = new_children
+                    new_node['children'] = [self._remap_ids_unique(sub, file_path) for sub in ch]
                 return new_node
             elif isinstance(node, list):
-                return [self._remap_ids_unique(n, file_path, used_ids) for n in node]
+                return [self._remap_ids_unique(n, file_path) for n in node]
             else:
                 # 基本类型：包裹为新节点
                 return {
@@ -1929,7 +2337,10 @@ class ProjectPage(QWidget):
             return node
 
     def _on_rows_inserted(self, parent_index, first: int, last: int):
-        """拖拽复制后会触发 rowsInserted：对新增项执行去重改ID。拖拽移动不触发插入。"""
+        """拖拽复制后会触发 rowsInserted：对新增项执行去重改ID。拖拽移动不触发插入。
+        程序化建树（加载/展开填充/新建/粘贴）期间忽略。"""
+        if self._populating:
+            return
         try:
             # 定位所属文件路径（向上找到最近的 file 顶层项或使用当前文件）
             def get_file_path_of_item(it: QTreeWidgetItem | None):
@@ -1954,12 +2365,15 @@ class ProjectPage(QWidget):
                 # 对插入的整个子树去重改ID
                 data = item.data(0, Qt.ItemDataRole.UserRole) or {}
                 if data.get('type') == 'node':
-                    node_obj = data.get('node') or {}
+                    # 含未填充子树（拖拽复制会带上占位子项）的完整节点
+                    node_obj = self._collect_node_from_item(item) or data.get('node') or {}
                     unique_node = self._remap_ids_unique(node_obj, Path(fp))
-                    # 更新树项缓存
+                    # 更新树项缓存（不含 children）
                     # 使用深拷贝，避免后续同步时共享引用
-                    data['node'] = _copy.deepcopy(unique_node)
+                    data['node'] = _copy.deepcopy({k: v for k, v in unique_node.items() if k != 'children'}) if isinstance(unique_node, dict) else unique_node
                     item.setData(0, Qt.ItemDataRole.UserRole, data)
+                    if isinstance(unique_node, dict):
+                        self._items_by_id[unique_node['id']] = item
                     # 同步显示名：使用“标题+短ID”格式，避免同名同一化
                     try:
                         self._suppress_item_changed = True
@@ -1969,20 +2383,21 @@ class ProjectPage(QWidget):
                             self._suppress_item_changed = False
                         except Exception:
                             pass
-                    # 递归对子项应用（在 _remap_ids_unique 已处理，这里仅同步到每个子 TreeItem 的缓存）
-                    def sync_children(node_dict: dict, tree_item: QTreeWidgetItem):
-                        ch_list = node_dict.get('children') if isinstance(node_dict, dict) else []
-                        for i in range(min(len(ch_list), tree_item.childCount())):
-                            sub_item = tree_item.child(i)
-                            sub_data = sub_item.data(0, Qt.ItemDataRole.UserRole) or {}
-                            if sub_data.get('type') == 'node':
-                                sub_node = ch_list[i]
-                                # 深拷贝写回，切断潜在共享
-                                sub_data['node'] = _copy.deepcopy(sub_node)
-                                sub_item.setData(0, Qt.ItemDataRole.UserRole, sub_data)
-                                sync_children(sub_node, sub_item)
+                    # 子项按改ID后的子树重建（已展开的路径立即创建，其余挂占位子项）
                     if isinstance(unique_node, dict):
-                        sync_children(unique_node, item)
+                        prev_populating = self._populating
+                        self._populating = True
+                        try:
+                            item.takeChildren()
+                            ch_list = unique_node.get('children')
+                            if isinstance(ch_list, list) and ch_list:
+                                if item.isExpanded():
+                                    for sub_node in ch_list:
+                                        self._add_json_node(item, sub_node, Path(fp))
+                                else:
+                                    self._set_lazy_children(item, ch_list)
+                        finally:
+                            self._populating = prev_populating
         except Exception:
             pass
 
@@ -1995,39 +2410,65 @@ class ProjectPage(QWidget):
                 return False
             if not (str(fp.name).endswith('.subtree.json') or str(fp.name).endswith('.json')):
                 return False
-            root = self._read_json(Path(fp))
-            if root is None:
-                return False
-            if not self._update_node_in_json(root, node_id, {"topic": new_title}):
-                # upsert 到 hint 的父节点
-                if item_hint is not None:
-                    data_cur = item_hint.data(0, Qt.ItemDataRole.UserRole) or {}
-                    if data_cur.get('type') == 'node':
-                        node_obj = data_cur.get('node') or {}
-                        if isinstance(node_obj, dict):
-                            node_obj['id'] = node_id
-                            node_obj['topic'] = new_title
-                            parent_item = item_hint.parent()
-                            parent_id = None
-                            if parent_item is not None:
-                                data_parent = parent_item.data(0, Qt.ItemDataRole.UserRole) or {}
-                                parent_node = data_parent.get('node')
-                                if isinstance(parent_node, dict):
-                                    parent_id = parent_node.get('id') or None
-                            if not self._upsert_node_in_json(root, parent_id, node_obj):
-                                return False
-                        else:
-                            return False
-                    else:
-                        return False
-                else:
+            fields = {"topic": new_title}
+            self._audit_overwrite_empty(Path(fp), node_id, fields)
+            res = self._pbus.save_node_fields(Path(fp), node_id, fields, session_id=self._session_id, reason="ui.title")
+            if not res.ok:
+                if res.error != "node_not_found" or item_hint is None:
                     return False
-            if not self._write_json_atomic(Path(fp), root):
-                return False
+                # 文件中未找到该 id：插入到 hint 的父节点下
+                data_cur = item_hint.data(0, Qt.ItemDataRole.UserRole) or {}
+                node_obj = data_cur.get('node') if data_cur.get('type') == 'node' else None
+                if not isinstance(node_obj, dict):
+                    return False
+                node_obj = dict(node_obj, id=node_id, topic=new_title)
+                if not self._insert_missing_node(Path(fp), self._item_parent_id(item_hint), node_obj):
+                    return False
+            self._swimlane_sync_title(node_id, new_title)
             return True
         except Exception:
             return False
 
+    def _item_parent_id(self, item: QTreeWidgetItem) -> str | None:
+        """树项父节点的 id；父项为文件项（根）时返回 None。"""
+        parent_item = item.parent()
+        if parent_item is None:
+            return None
+        parent_node = (parent_item.data(0, Qt.ItemDataRole.UserRole) or {}).get('node')
+        return (parent_node.get('id') or None) if isinstance(parent_node, dict) else None
+
+    def _insert_missing_node(self, fp: Path, parent_id: str | None, node_obj: dict) -> bool:
+        """把文件中缺失的节点插入到 parent_id 下；父节点也不存在时退回追加到根节点。"""
+        node_obj = {k: v for k, v in node_obj.items() if k != 'children'}
+        try:
+            if (node_obj.get('topic') or '').strip() == '':
+                logger_sink.log_user_message(self._session_id, f"[AUDIT] upsert_append_empty_topic: id={node_obj.get('id')} parent={parent_id}")
+        except Exception:
+            pass
+        if self._pbus.insert_node(fp, parent_id, node_obj, session_id=self._session_id).ok:
+            return True
+        if parent_id is None:
+            return False
+        try:
+            logger_sink.log_user_message(self._session_id, f"[AUDIT] detail_upsert_append_to_root: id={node_obj.get('id')} parent={parent_id}")
+        except Exception:
+            pass
+        return self._pbus.insert_node(fp, None, node_obj, session_id=self._session_id).ok
+
+    def _audit_overwrite_empty(self, fp: Path, node_id: str, fields: dict):
+        """诊断埋点：若将非空旧值覆盖为空字符串，记录一次（按 id 直接取节点，不遍历）。"""
+        try:
+            doc = self._pbus.document(fp)
+            old = doc.get(node_id) if doc is not None else None
+            if not isinstance(old, dict):
+                return
+            for k, v in fields.items():
+                old_v = old.get(k)
+                if isinstance(old_v, str) and old_v != '' and isinstance(v, str) and v == '':
+                    logger_sink.log_user_message(self._session_id, f"[AUDIT] update_overwrite_empty: id={node_id} key={k} old_len={len(old_v)} -> new_len=0")
+        except Exception:
+            pass
+
     def _save_all_to_file(self):
         """从当前树结构重建完整 JSON，并全量写回当前项目文件。静默失败。"""
         try:
@@ -2037,28 +2478,9 @@ class ProjectPage(QWidget):
             path = Path(fp)
             if not (str(path.name).endswith('.subtree.json') or str(path.name).endswith('.json')):
                 return False
-            # 读取原始根，保持其除 children 外的字段
-            root = self._read_json(path)
-            if not isinstance(root, dict):
-                return False
-            # 定位该文件的顶层项
-            file_item = None
-            for i in range(self.tree.topLevelItemCount()):
-                it = self.tree.topLevelItem(i)
-                data = it.data(0, Qt.ItemDataRole.UserRole) or {}
-                if data.get('type') == 'file' and Path(data.get('path','')) == path:
-                    file_item = it
-                    break
-            if file_item is None:
+            new_children = self._collect_tree_children(path)
+            if new_children is None:
                 return False
-            # 从 file_item 的直接子项（节点）重建 children
-            new_children = []
-            for i in range(file_item.childCount()):
-                ch = file_item.child(i)
-                node = self._collect_node_from_item(ch)
-                if node is not None:
-                    new_children.append(node)
-            root['children'] = new_children
             # 诊断埋点：统计空 topic 的节点数量
             try:
                 def _cnt_empty_topic(n):
@@ -2072,11 +2494,12 @@ class ProjectPage(QWidget):
                         for s in n:
                             c += _cnt_empty_topic(s)
                     return c
-                empty_cnt = _cnt_empty_topic(root.get('children') or [])
+                empty_cnt = _cnt_empty_topic(new_children)
                 logger_sink.log_user_message(self._session_id, f"[AUDIT] save_all_children_rebuilt: total={len(new_children)} empty_topic_count={empty_cnt}")
             except Exception:
                 pass
-            return self._write_json_atomic(path, root)
+            # 经持久化总线替换根的 children（保留根的其余字段）；SQLite 模式下写入存储而非整份 JSON
+            return self._pbus.save_full_tree(path, new_children, session_id=self._session_id, reason="ui.full_save").ok
         except Exception:
             return False
 
@@ -2106,10 +2529,19 @@ class ProjectPage(QWidget):
                         logger_sink.log_user_message(self._session_id, f"[AUDIT] collect_node_empty_topic: id={(node.get('id') or '<unknown>')} prev_topic_len={(len(prev_topic) if isinstance(prev_topic, str) else 'n/a')} display='{display_text}'")
             except Exception:
                 pass
-            # 递归 children
+            # 递归 children（未填充的子节点直接取懒加载暂存的 JSON）
             children = []
             for i in range(item.childCount()):
                 ch = item.child(i)
+                ch_data = ch.data(0, Qt.ItemDataRole.UserRole) or {}
+                if ch_data.get('type') == 'placeholder':
+                    lazy = self._lazy_children.get(ch_data.get('key'))
+                    if isinstance(lazy, str):
+                        # SQLite 模式：未展开的子树从存储导出
+                        store = self._project_store(self._resolve_item_file_path(item))
+                        lazy = ((store.export_tree(lazy) if store is not None else None) or {}).get('children')
+                    children.extend(lazy or [])
+                    continue
                 sub = self._collect_node_from_item(ch)
                 if sub is not None:
                     children.append(sub)
@@ -2118,115 +2550,10 @@ class ProjectPage(QWidget):
         except Exception:
             return None
 
-    def _find_node_by_id(self, node: dict | list, node_id: str) -> dict | None:
-        try:
-            if isinstance(node, dict):
-                if node.get('id') == node_id:
-                    return node
-                children = node.get('children')
-                if isinstance(children, list):
-                    for ch in children:
-                        found = self._find_node_by_id(ch, node_id)
-                        if found is not None:
-                            return found
-            elif isinstance(node, list):
-                for ch in node:
-                    found = self._find_node_by_id(ch, node_id)
-                    if found is not None:
-                        return found
-        except Exception:
-            pass
-        return None
-
-    def _find_node_by_topic(self, node: dict | list, topic: str) -> dict | None:
-        """按 topic 精确匹配查找首个节点。"""
-        try:
-            if isinstance(node, dict):
-                if node.get('topic') == topic:
-                    return node
-                ch = node.get('children')
-                if isinstance(ch, list):
-                    for c in ch:
-                        f = self._find_node_by_topic(c, topic)
-                        if f is not None:
-                            return f
-            elif isinstance(node, list):
-                for c in node:
-                    f = self._find_node_by_topic(c, topic)
-                    if f is not None:
-                        return f
-        except Exception:
-            pass
-        return None
-
-    def _walk_nodes(self, node: dict | list, include_root: bool = False) -> list[dict]:
-        """深度优先遍历，返回所有节点 dict 列表。"""
-        out: list[dict] = []
-        try:
-            def walk(n: dict | list, is_root=False):
-                if isinstance(n, dict):
-                    if include_root or (not is_root):
-                        out.append(n)
-                    ch = n.get('children')
-                    if isinstance(ch, list):
-                        for c in ch:
-                            walk(c, False)
-                elif isinstance(n, list):
-                    for c in n:
-                        walk(c, False)
-            walk(node, True)
-        except Exception:
-            pass
-        return out
-
-    def _upsert_node_in_json(self, root: dict | list, parent_id: str | None, node_obj: dict) -> bool:
-        """将 node_obj 追加/更新到 parent_id 指定的父节点 children 下；
-        parent_id 为 None 表示根节点 root。
-        """
-        try:
-            # 定位父节点
-            if isinstance(root, list) and root:
-                # 如果根是列表，取第一个作为树根（兼容性处理）
-                root_node = root[0]
-            else:
-                root_node = root
-            if not isinstance(root_node, dict):
-                return False
-
-            parent_node = root_node if parent_id is None else self._find_node_by_id(root_node, parent_id)
-            if not isinstance(parent_node, dict):
-                return False
-
-            if 'children' not in parent_node or not isinstance(parent_node['children'], list):
-                parent_node['children'] = []
-
-            # 先尝试根据 id 更新
-            for ch in parent_node['children']:
-                if isinstance(ch, dict) and ch.get('id') == node_obj.get('id'):
-                    try:
-                        # 诊断埋点：记录可能的空值覆盖
-                        for k in ("topic", "content"):
-                            new_v = (node_obj.get(k) or '') if isinstance(node_obj, dict) else ''
-                            old_v = (ch.get(k) or '')
-                            if new_v == '' and old_v != '':
-                                logger_sink.log_user_message(self._session_id, f"[AUDIT] upsert_overwrite_empty: id={node_obj.get('id')} key={k} old_len={len(old_v)} -> new_len=0")
-                    except Exception:
-                        pass
-                    ch.update(node_obj)
-                    return True
-            # 否则追加
-            parent_node['children'].append(node_obj)
-            try:
-                if (node_obj.get('topic') or '').strip() == '':
-                    logger_sink.log_user_message(self._session_id, f"[AUDIT] upsert_append_empty_topic: id={node_obj.get('id')} parent={parent_id}")
-            except Exception:
-                pass
-            return True
-        except Exception:
-            return False
-
     def _read_json(self, path: Path) -> dict | list | None:
         try:
+            # 先落盘写回缓存中该文件的待写修改，保证读到最新内容
+            self._pbus.flush(Path(path))
             with open(path, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except Exception:
@@ -2235,6 +2562,8 @@ class ProjectPage(QWidget):
     def _write_json_atomic(self, path: Path, data: dict | list) -> bool:
         """原子写入：先写入临时文件，再替换目标。"""
         try:
+            # 整文件写入以本次内容为准：先落盘并丢弃写回缓存中的旧文档
+            self._pbus.invalidate(Path(path))
             dir_path = path.parent
             fd, tmp_path = tempfile.mkstemp(prefix=path.stem + '_', suffix='.tmp', dir=str(dir_path))
             os.close(fd)
@@ -2252,40 +2581,44 @@ class ProjectPage(QWidget):
         except Exception:
             return False
 
-    def _update_node_in_json(self, node: dict | list, node_id: str, updates: dict) -> bool:
-        """根据 id 递归更新节点的键值。返回是否更新成功。"""
-        try:
-            if isinstance(node, dict):
-                if node.get('id') == node_id:
-                    for k, v in updates.items():
-                        try:
-                            # 诊断埋点：若将非空旧值覆盖为空字符串，记录一次
-                            old_v = node.get(k)
-                            if isinstance(old_v, str) and old_v != '' and isinstance(v, str) and v == '':
-                                logger_sink.log_user_message(self._session_id, f"[AUDIT] update_overwrite_empty: id={node_id} key={k} old_len={len(old_v)} -> new_len=0")
-                        except Exception:
-                            pass
-                        node[k] = v
-                    return True
-                children = node.get('children')
-                if isinstance(children, list):
-                    for ch in children:
-                        if self._update_node_in_json(ch, node_id, updates):
-                            return True
-            elif isinstance(node, list):
-                for ch in node:
-                    if self._update_node_in_json(ch, node_id, updates):
-                        return True
-        except Exception:
-            pass
-        return False
-
     # ---------- 泳道（Kanban）方法 ----------
-    def _swimlane_load(self):
+    SWIMLANE_STATUSES = ("planned", "assigned", "doing", "done", "paused")
+
+    def _swimlane_scope_nodes(self, doc: TreeDocument | SqliteTreeStore) -> list[dict]:
+        """泳道收录范围：若存在 topic 为“用到的数据”的节点，仅取其子树中的节点；否则取全树（不含根）。
+        锚点经文档的 topic 索引查找；SQLite 模式下按状态列查询（走 status 索引），不读取整树。"""
+        anchor = doc.find_by_topic("用到的数据")
+        if isinstance(doc, SqliteTreeStore):
+            under = anchor.get('id') if isinstance(anchor, dict) else None
+            return [n for status in self.SWIMLANE_STATUSES
+                    for n in doc.swimlane(status, under=under, include_unset=False)]
+        if isinstance(anchor, dict):
+            return [n for c in anchor.get('children') or [] for n in TreeDocument.walk(c, include_root=True)]
+        return list(TreeDocument.walk(doc.root))
+
+    def _swimlane_ensure_index(self, rebuild: bool = False) -> SwimlaneIndex | None:
+        """取得当前项目文件的泳道索引；未建立、文件已切换或 rebuild=True 时遍历一次节点重建。"""
+        fp = getattr(self, '_current_project_file', None)
+        if not fp or not Path(fp).exists():
+            return None
+        if not rebuild and self._swimlane_index is not None and self._swimlane_index_file == str(fp):
+            return self._swimlane_index
+        # 仅装载显式标注了已知状态、且具有有效 id 的节点；缺省状态不再视为 planned
+        doc = self._project_doc(Path(fp))
+        if doc is None:
+            return None
+        index = SwimlaneIndex(self.SWIMLANE_STATUSES)
+        index.build(self._swimlane_scope_nodes(doc))
+        self._swimlane_index = index
+        self._swimlane_index_file = str(fp)
+        return index
+
+    def _swimlane_load(self, rebuild: bool = True):
         """从当前项目文件加载节点到泳道。
     - 状态模式：五列（planned/assigned/doing/done/paused）。status 缺省 -> 'planned'
     - 同列内按 kanban_order 升序显示（缺省视为 999999）
     - 可选锚点：若存在 topic 为“用到的数据”的节点，仅加载其子树中的节点；否则加载全树
+    - 节点先装入泳道索引（SwimlaneIndex），列表按索引渲染；rebuild=False 时复用已有索引
     """
         try:
             # 清空所有已注册列（避免硬编码）
@@ -2293,64 +2626,9 @@ class ProjectPage(QWidget):
                 lw = self._swimlane_lists.get(k)
                 if lw is not None:
                     lw.clear()
-            fp = getattr(self, '_current_project_file', None)
-            if not fp or not Path(fp).exists():
-                return
-            root = self._read_json(Path(fp))
-            if root is None:
+            if self._swimlane_ensure_index(rebuild=rebuild) is None:
                 return
-            # 选择锚点：优先“用到的数据”子树，否则全树
-            anchor = self._find_node_by_topic(root, "用到的数据")
-            scope_nodes = []
-            if isinstance(anchor, dict):
-                try:
-                    for c in anchor.get('children') or []:
-                        scope_nodes.extend(self._walk_nodes(c, include_root=True))
-                except Exception:
-                    pass
-            else:
-                scope_nodes = self._walk_nodes(root, include_root=False)
-
-            buckets = {"planned": [], "assigned": [], "doing": [], "done": [], "paused": []}
-            for n in scope_nodes:
-                if not isinstance(n, dict):
-                    continue
-                # 仅装载显式标注了已知状态的节点；缺省状态不再视为 planned
-                status = n.get('status')
-                if status not in buckets:
-                    continue
-                # 仅接纳具有有效 id 的节点，避免把文件/分组等无 id 的项加入
-                nid = n.get('id')
-                if not (isinstance(nid, str) and nid):
-                    continue
-                order = n.get('kanban_order')
-                try:
-                    order = int(order)
-                except Exception:
-                    order = 999999
-                buckets[status].append({
-                    'id': nid,
-                    'title': n.get('topic') or '',
-                    'order': order
-                })
-
-            # 渲染已存在的列（不强制创建未知列）
-            for key, arr in buckets.items():
-                lw = self._swimlane_lists.get(key)
-                if lw is None:
-                    continue
-                try:
-                    arr.sort(key=lambda x: x.get('order', 999999))
-                except Exception:
-                    pass
-                for it in arr:
-                    text = it.get('title') or ''
-                    item = QListWidgetItem(text)
-                    item.setData(Qt.ItemDataRole.UserRole, {
-                        'id': it.get('id'),
-                        'status': key
-                    })
-                    lw.addItem(item)
+            self._swimlane_render()
             try:
                 logger_sink.log_user_message(self._session_id, "swimlane_load")
             except Exception:
@@ -2358,6 +2636,23 @@ class ProjectPage(QWidget):
         except Exception:
             pass
 
+    def _swimlane_render(self):
+        """按泳道索引重绘已存在的列（不强制创建未知列）。"""
+        index = self._swimlane_index
+        for key, lw in self._swimlane_lists.items():
+            if lw is None:
+                continue
+            lw.clear()
+            if index is None:
+                continue
+            for it in index.column(key):
+                item = QListWidgetItem(it.get('title') or '')
+                item.setData(Qt.ItemDataRole.UserRole, {
+                    'id': it.get('id'),
+                    'status': key
+                })
+                lw.addItem(item)
+
     def _swimlane_clear(self):
         """清理泳道UI数据（仅前端显示，不写回JSON、不更改任何节点状态）。
         - 弹窗确认；确认后清空所有已注册列的 QListWidget 项。
@@ -2417,33 +2712,53 @@ class ProjectPage(QWidget):
             if not fp or not Path(fp).exists():
                 return False
             path = Path(fp)
-            root = self._read_json(path)
-            if root is None:
-                return False
-            # 扫描三列写回
-            for key, arr in state.items():
-                for nid, order in arr:
-                    if not nid:
-                        continue
-                    self._update_node_in_json(root, nid, {'status': key, 'kanban_order': int(order)})
-            if not self._write_json_atomic(path, root):
-                return False
-            return True
+            # 经写回缓存合并：连续拖拽只在去抖窗口结束时落盘一次
+            return self._pbus.save_swimlane_state(path, state, session_id=self._session_id).ok
         except Exception:
             return False
 
-    def _swimlane_after_drop(self):
-        """拖拽完成后的统一收集和持久化，并同步树缓存。"""
+    def _swimlane_after_drop(self, moved_ids: list | None = None, target_key: str | None = None):
+        """拖拽完成后的持久化，并同步树缓存。
+        - 已知被拖动的卡片与目标列时：在泳道索引上增量移动，只写回序号发生变化的节点
+        - 否则回退为收集全部列并整体写回
+        """
         try:
-            state = self._swimlane_collect_state()
-            ok = self._swimlane_persist(state)
+            index = self._swimlane_index
+            lw = self._swimlane_lists.get(target_key) if target_key else None
+            if moved_ids and lw is not None and index is not None:
+                changes = {}
+                for row in range(lw.count()):
+                    item = lw.item(row)
+                    data = item.data(Qt.ItemDataRole.UserRole) or {}
+                    nid = data.get('id')
+                    if nid in moved_ids:
+                        changes.update(index.move(nid, target_key, row, item.text()))
+                        if data.get('status') != target_key:
+                            data['status'] = target_key
+                            item.setData(Qt.ItemDataRole.UserRole, data)
+                state = SwimlaneIndex.to_state(changes)
+                full = False
+            else:
+                state = self._swimlane_collect_state()
+                full = True
+            ok = self._swimlane_persist(state) if state else True
             # 同步树中缓存的节点字段（status、kanban_order）
             if ok:
                 try:
+                    doc = self._project_doc()
                     for key, arr in state.items():
                         for nid, order in arr:
-                            it = self._find_item_by_node_id(nid)
+                            if self._tree_model is not None:
+                                self._tree_model.update_node(nid, {'status': key, 'kanban_order': int(order)})
+                                continue
+                            it = self._item_for_id(nid)
                             if it is None:
+                                # 未填充的子树：懒加载暂存的即文档中的节点（按 id 取），一并更新，避免后续全量保存写回旧值；
+                                # SQLite 模式下暂存的是 id，状态已写入存储
+                                lazy_node = doc.get(nid) if isinstance(doc, TreeDocument) else None
+                                if isinstance(lazy_node, dict):
+                                    lazy_node['status'] = key
+                                    lazy_node['kanban_order'] = int(order)
                                 continue
                             data = it.data(0, Qt.ItemDataRole.UserRole) or {}
                             if data.get('type') == 'node':
@@ -2455,8 +2770,11 @@ class ProjectPage(QWidget):
                                     it.setData(0, Qt.ItemDataRole.UserRole, data)
                 except Exception:
                     pass
+            # 整体写回或写回失败：拖放结束后以文件内容重建索引并重绘
+            if full or not ok:
+                QTimer.singleShot(0, self._swimlane_load)
             try:
-                logger_sink.log_user_message(self._session_id, "swimlane_drop_persist")
+                logger_sink.log_user_message(self._session_id, f"swimlane_drop_persist changed={sum(len(v) for v in state.values())}")
             except Exception:
                 pass
         except Exception:
@@ -2589,22 +2907,27 @@ class _SwimlaneList(QListWidget):
         self._status_key = status_key
 
     def dropEvent(self, event):
-        """先执行默认的接收/移动，再触发统一收集与持久化。"""
+        """先执行默认的接收/移动，再对被拖动的卡片做增量持久化。"""
         try:
+            moved_ids = []
+            try:
+                src = event.source()
+                if isinstance(src, QListWidget):
+                    for it in src.selectedItems():
+                        nid = (it.data(Qt.ItemDataRole.UserRole) or {}).get('id')
+                        if nid:
+                            moved_ids.append(nid)
+            except Exception:
+                moved_ids = []
             super().dropEvent(event)
             try:
                 # 记录一次操作
                 self._page.undo_stack.push(QUndoCommand("泳道拖拽"))
             except Exception:
                 pass
-            # 拖拽完成后：收集 -> 持久化 -> 同步树缓存
-            try:
-                self._page._swimlane_after_drop()
-            except Exception:
-                pass
-            # 立即刷新一次显示（可选）
+            # 拖拽完成后：增量移动 -> 只持久化变化的节点 -> 同步树缓存（列表已由默认拖放更新，无需重绘）
             try:
-                self._page._swimlane_load()
+                self._page._swimlane_after_drop(moved_ids, self._status_key)
             except Exception:
                 pass
             try:
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+项目树 Model/View（QAbstractItemModel + QTreeView）
+
+- 模型直接建立在内存中的 TreeDocument 上：不为每个节点创建树项对象，
+  视图只为可见行取数据，渲染开销与可见行数成正比
+- 多列显示：标题 / 状态 / ID；标题、状态可内联编辑
+- 拖放：默认移动，按住 Ctrl 复制（复制的子树重新分配 ID）
+- 保存时直接序列化 document().root，无需从界面控件反向重建 dict
+
+模型不负责落盘：编辑经 nodeEdited / structureChanged 信号通知页面，由页面决定持久化方式；
+structureChanged 携带与操作日志同格式的 insert / delete / move 操作，页面可逐条持久化而不必整树保存。
+"""
+from __future__ import annotations
+
+import copy as _copy
+import json
+from typing import Any, Dict, Iterator, List, Optional
+
+from PySide6.QtCore import QAbstractItemModel, QByteArray, QMimeData, QModelIndex, Qt, Signal
+from PySide6.QtWidgets import QAbstractItemView, QTreeView
+
+from services.tree_document import TreeDocument
+
+
+class ProjectTreeModel(QAbstractItemModel):
+    """以 TreeDocument 根节点的 children 为顶层行的树模型。index.internalPointer() 为节点 dict。"""
+
+    COLUMNS = (("topic", "标题"), ("status", "状态"), ("id", "ID"))
+    EDITABLE_COLUMNS = (0, 1)
+    MIME_TYPE = "application/x-project-node-ids"
+
+    nodeEdited = Signal(str, dict)  # (node_id, 变更字段)
+    structureChanged = Signal(dict)  # 插入/删除/移动/复制之后：{"op": "insert"|"delete"|"move", ...}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._doc: Optional[TreeDocument] = None
+
+    # —— 文档 ——
+    def set_document(self, doc: Optional[TreeDocument]) -> None:
+        """父节点一律经 doc.parent_of 查询：缺失或重复 id 的节点在此改配新 id，保证都在索引中。"""
+        self.beginResetModel()
+        if doc is not None:
+            fixed = False
+            for n in TreeDocument.walk(doc.root):
+                nid = n.get("id")
+                if not isinstance(nid, str) or not nid or doc.get(nid) is not n:
+                    n["id"] = doc.new_id()
+                    fixed = True
+            if fixed:
+                doc.rebuild()
+        self._doc = doc
+        self.endResetModel()
+
+    def document(self) -> Optional[TreeDocument]:
+        return self._doc
+
+    def _root(self) -> Optional[dict]:
+        return self._doc.root_node if self._doc is not None else None
+
+    @staticmethod
+    def _children(node: Any) -> List[Any]:
+        ch = node.get("children") if isinstance(node, dict) else None
+        return ch if isinstance(ch, list) else []
+
+    def node_from_index(self, index: QModelIndex) -> Optional[dict]:
+        """有效索引返回对应节点，无效索引返回根节点。"""
+        if not index.isValid():
+            return self._root()
+        node = index.internalPointer()
+        return node if isinstance(node, dict) else None
+
+    def _parent_node(self, node: dict) -> Optional[dict]:
+        nid = node.get("id")
+        p = self._doc.parent_of(nid) if self._doc is not None and isinstance(nid, str) else None
+        return p if p is not None else self._root()
+
+    def _row_in(self, parent: Optional[dict], node: dict) -> int:
+        for i, c in enumerate(self._children(parent)):
+            if c is node:
+                return i
+        return -1
+
+    def _index_of(self, node: Optional[dict], column: int = 0) -> QModelIndex:
+        if node is None or node is self._root():
+            return QModelIndex()
+        parent = self._parent_node(node)
+        row = self._row_in(parent, node)
+        if row < 0:
+            return QModelIndex()
+        return self.createIndex(row, column, node)
+
+    def index_for_id(self, node_id: str, column: int = 0) -> QModelIndex:
+        if self._doc is None:
+            return QModelIndex()
+        return self._index_of(self._doc.get(node_id), column)
+
+    # —— QAbstractItemModel ——
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        pnode = self.node_from_index(parent)
+        return self.createIndex(row, column, self._children(pnode)[row])
+
+    def parent(self, index: QModelIndex) -> QModelIndex:
+        if not index.isValid():
+            return QModelIndex()
+        node = index.internalPointer()
+        if not isinstance(node, dict):
+            return QModelIndex()
+        return self._index_of(self._parent_node(node))
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.column() > 0:
+            return 0
+        return len(self._children(self.node_from_index(parent)))
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return len(self.COLUMNS)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if not isinstance(node, dict):
+            return str(node) if role == Qt.ItemDataRole.DisplayRole else None
+        key = self.COLUMNS[index.column()][0]
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            value = node.get(key)
+            if key == "topic" and role == Qt.ItemDataRole.DisplayRole and not value:
+                return node.get("id") or ""
+            return "" if value is None else str(value)
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return node.get("id") or ""
+        if role == Qt.ItemDataRole.UserRole:
+            return node
+        return None
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole and 0 <= section < len(self.COLUMNS):
+            return self.COLUMNS[section][1]
+        return None
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+        if not index.isValid():
+            return Qt.ItemFlag.ItemIsDropEnabled
+        f = (Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+             | Qt.ItemFlag.ItemIsDragEnabled | Qt.ItemFlag.ItemIsDropEnabled)
+        if index.column() in self.EDITABLE_COLUMNS:
+            f |= Qt.ItemFlag.ItemIsEditable
+        return f
+
+    def setData(self, index: QModelIndex, value: Any, role: int = Qt.ItemDataRole.EditRole) -> bool:
+        if role != Qt.ItemDataRole.EditRole or not index.isValid() or index.column() not in self.EDITABLE_COLUMNS:
+            return False
+        node = index.internalPointer()
+        if not isinstance(node, dict) or not isinstance(node.get("id"), str):
+            return False
+        key = self.COLUMNS[index.column()][0]
+        text = str(value or "").strip()
+        if (node.get(key) or "") == text:
+            return False
+        fields = {key: text}
+        self._doc.update(node["id"], fields)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole])
+        self.nodeEdited.emit(node["id"], fields)
+        return True
+
+    # —— 拖放 ——
+    def supportedDropActions(self) -> Qt.DropAction:
+        return Qt.DropAction.MoveAction | Qt.DropAction.CopyAction
+
+    def supportedDragActions(self) -> Qt.DropAction:
+        return Qt.DropAction.MoveAction | Qt.DropAction.CopyAction
+
+    def mimeTypes(self) -> List[str]:
+        return [self.MIME_TYPE]
+
+    def mimeData(self, indexes) -> QMimeData:
+        ids: List[str] = []
+        for idx in indexes:
+            node = self.node_from_index(idx) if idx.isValid() else None
+            nid = node.get("id") if isinstance(node, dict) else None
+            if isinstance(nid, str) and nid not in ids:
+                ids.append(nid)
+        mime = QMimeData()
+        mime.setData(self.MIME_TYPE, QByteArray(json.dumps(ids).encode("utf-8")))
+        return mime
+
+    @classmethod
+    def decode_ids(cls, mime: QMimeData) -> List[str]:
+        try:
+            ids = json.loads(bytes(mime.data(cls.MIME_TYPE)).decode("utf-8"))
+            return [i for i in ids if isinstance(i, str)]
+        except Exception:
+            return []
+
+    # —— 结构修改（同时维护 TreeDocument 索引与视图） ——
+    def _is_within(self, node: Optional[dict], ancestor: dict) -> bool:
+        """node 是否为 ancestor 自身或其后代。"""
+        root = self._root()
+        cur = node
+        while cur is not None and cur is not root:
+            if cur is ancestor:
+                return True
+            cur = self._parent_node(cur)
+        return False
+
+    def _doc_parent_id(self, pnode: Optional[dict]) -> Optional[str]:
+        if pnode is None or pnode is self._root():
+            return None
+        return pnode.get("id")
+
+    def insert_node(self, parent: QModelIndex, row: Optional[int], node: dict) -> QModelIndex:
+        pnode = self.node_from_index(parent)
+        if self._doc is None or not isinstance(pnode, dict) or not isinstance(node, dict):
+            return QModelIndex()
+        if pnode is not self._root() and not isinstance(pnode.get("id"), str):
+            return QModelIndex()
+        n = len(self._children(pnode))
+        row = n if row is None or row < 0 or row > n else row
+        self.beginInsertRows(parent, row, row)
+        parent_id = self._doc_parent_id(pnode)
+        ok = self._doc.insert(parent_id, node, row)
+        self.endInsertRows()
+        if not ok:
+            return QModelIndex()
+        # 操作中的节点为副本：接收方（持久化总线）的文档不与模型共享节点对象
+        self.structureChanged.emit({"op": "insert", "parent": parent_id, "index": row, "node": _copy.deepcopy(node)})
+        return self.index(row, 0, parent)
+
+    def remove_node(self, index: QModelIndex) -> Optional[dict]:
+        node = self.node_from_index(index) if index.isValid() else None
+        if self._doc is None or not isinstance(node, dict) or not isinstance(node.get("id"), str):
+            return None
+        parent = self.parent(index)
+        self.beginRemoveRows(parent, index.row(), index.row())
+        removed = self._doc.delete(node["id"])
+        self.endRemoveRows()
+        if removed is not None:
+            self.structureChanged.emit({"op": "delete", "id": node["id"]})
+        return removed
+
+    def move_node(self, index: QModelIndex, dest_parent: QModelIndex, dest_row: Optional[int] = None) -> bool:
+        """移动到 dest_parent 下第 dest_row 行之前（None/越界为末尾）；不允许移入自身子树。"""
+        node = self.node_from_index(index) if index.isValid() else None
+        dest = self.node_from_index(dest_parent)
+        if self._doc is None or not isinstance(node, dict) or not isinstance(dest, dict):
+            return False
+        if not isinstance(node.get("id"), str) or self._is_within(dest, node):
+            return False
+        if dest is not self._root() and not isinstance(dest.get("id"), str):
+            return False
+        src_parent = self.parent(index)
+        src_row = index.row()
+        n = len(self._children(dest))
+        dest_row = n if dest_row is None or dest_row < 0 or dest_row > n else dest_row
+        same_parent = dest is self._parent_node(node)
+        if same_parent and dest_row in (src_row, src_row + 1):
+            return False  # 原地不动
+        if not self.beginMoveRows(src_parent, src_row, src_row, dest_parent.sibling(dest_parent.row(), 0) if dest_parent.isValid() else QModelIndex(), dest_row):
+            return False
+        # TreeDocument.move 先移除再插入：同父下移时目标行需减一
+        doc_row = dest_row - 1 if same_parent and dest_row > src_row else dest_row
+        dest_id = self._doc_parent_id(dest)
+        self._doc.move(node["id"], dest_id, doc_row)
+        self.endMoveRows()
+        self.structureChanged.emit({"op": "move", "id": node["id"], "parent": dest_id, "index": doc_row})
+        return True
+
+    def copy_node(self, index: QModelIndex, dest_parent: QModelIndex, dest_row: Optional[int] = None) -> QModelIndex:
+        """复制子树到目标位置，子树内全部节点重新分配 ID。"""
+        node = self.node_from_index(index) if index.isValid() else None
+        if self._doc is None or not isinstance(node, dict):
+            return QModelIndex()
+        clone = _copy.deepcopy(node)
+        for n in TreeDocument.walk(clone, include_root=True):
+            n["id"] = self._doc.new_id()
+        return self.insert_node(dest_parent, dest_row, clone)
+
+    def update_node(self, node_id: str, fields: Dict[str, Any]) -> bool:
+        """外部（详情面板、泳道等）修改节点字段后同步到模型与视图。"""
+        if self._doc is None or not self._doc.update(node_id, fields):
+            return False
+        first = self.index_for_id(node_id, 0)
+        if first.isValid():
+            self.dataChanged.emit(first, first.sibling(first.row(), len(self.COLUMNS) - 1))
+        return True
+
+    def expanded_indexes(self) -> Iterator[QModelIndex]:
+        """沿持久化为展开（expanded=True）的路径产出索引；折叠节点之下不再深入。"""
+        stack = [QModelIndex()]
+        while stack:
+            parent = stack.pop()
+            for row in range(self.rowCount(parent)):
+                idx = self.index(row, 0, parent)
+                node = idx.internalPointer()
+                if isinstance(node, dict) and node.get("expanded") is True and self._children(node):
+                    yield idx
+                    stack.append(idx)
+
+
+class ProjectTreeView(QTreeView):
+    """项目树视图：拖放由模型的 move_node/copy_node 完成（默认移动，Ctrl 复制）。"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.move_by_default = True
+        self.setUniformRowHeights(True)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.setDragEnabled(True)
+        self.setAcceptDrops(True)
+        self.setDropIndicatorShown(True)
+        self.setDragDropMode(QAbstractItemView.DragDropMode.DragDrop)
+        self.setDefaultDropAction(Qt.DropAction.MoveAction)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked
+                             | QAbstractItemView.EditTrigger.EditKeyPressed
+                             | QAbstractItemView.EditTrigger.SelectedClicked)
+
+    def _drop_action(self, event) -> Qt.DropAction:
+        if event.modifiers() & Qt.KeyboardModifier.ControlModifier or not self.move_by_default:
+            return Qt.DropAction.CopyAction
+        return Qt.DropAction.MoveAction
+
+    def dragEnterEvent(self, event):
+        super().dragEnterEvent(event)
+        if event.source() is self:
+            event.setDropAction(self._drop_action(event))
+            event.accept()
+
+    def dragMoveEvent(self, event):
+        super().dragMoveEvent(event)
+        if event.source() is self:
+            event.setDropAction(self._drop_action(event))
+            event.accept()
+
+    def dropEvent(self, event):
+        model = self.model()
+        if event.source() is not self or not isinstance(model, ProjectTreeModel):
+            super().dropEvent(event)
+            return
+        try:
+            ids = ProjectTreeModel.decode_ids(event.mimeData())
+            target = self.indexAt(event.position().toPoint())
+            pos = self.dropIndicatorPosition()
+            if not target.isValid() or pos == QAbstractItemView.DropIndicatorPosition.OnViewport:
+                dest_parent, dest_row = QModelIndex(), None
+            elif pos == QAbstractItemView.DropIndicatorPosition.OnItem:
+                dest_parent, dest_row = target.sibling(target.row(), 0), None
+            elif pos == QAbstractItemView.DropIndicatorPosition.AboveItem:
+                dest_parent, dest_row = target.parent(), target.row()
+            else:
+                dest_parent, dest_row = target.parent(), target.row() + 1
+            action = self._drop_action(event)
+            for nid in ids:
+                src = model.index_for_id(nid)
+                if not src.isValid():
+                    continue
+                if action == Qt.DropAction.CopyAction:
+                    model.copy_node(src, dest_parent, dest_row)
+                else:
+                    model.move_node(src, dest_parent, dest_row)
+            # 已在模型内完成移动/复制：以复制动作结束拖拽，避免视图再删除源行
+            event.setDropAction(Qt.DropAction.CopyAction)
+            event.accept()
+        except Exception:
+            event.ignore()
+        self.stopAutoScroll()
+        self.setState(QAbstractItemView.State.NoState)
+        self.viewport().update()
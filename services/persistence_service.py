@@ -3,10 +3,16 @@ from __future__ import annotations
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
+import atexit
 import json
 import os
 import tempfile
+import threading
+import weakref
 
+from services.tree_document import TreeDocument
+from services.tree_journal import TreeJournal, apply_op, oplog_path
+from services.tree_store import SqliteTreeStore
 from utils import logger_sink
 
 
@@ -16,29 +22,84 @@ class PersistResult:
     error: Optional[str] = None
 
 
+class _CachedDoc:
+    """写回缓存中的单个文件：内存文档（带 id 索引）+ 上次读/写时的磁盘签名 + 待落盘状态
+    （日志模式下还有该文件的操作日志；SQLite 模式下 doc 为 SqliteTreeStore，dirty 表示 JSON 待导出）。"""
+
+    __slots__ = ("doc", "stamp", "dirty", "timer", "journal")
+
+    def __init__(self, doc: Any, stamp: Optional[Tuple[int, int]], journal: Optional[TreeJournal] = None) -> None:
+        self.doc = doc
+        self.stamp = stamp
+        self.dirty = False
+        self.timer: Optional[threading.Timer] = None
+        self.journal = journal
+
+
+def _file_stamp(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+# 进程退出时落盘所有写回模式实例的待写文档
+_live_buses: "weakref.WeakSet[PersistenceBus]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_live_buses() -> None:
+    for bus in list(_live_buses):
+        try:
+            bus.close()
+        except Exception:
+            pass
+
+
 class PersistenceBus:
     """集中式持久化服务（最小可用版）。
     - 提供语义化接口，隐藏文件读/改/写细节
-    - 原子写入（临时文件 + os.replace）
+    - 原子写入（临时文件 + fsync + os.replace）
     - 字段级合并（仅更新传入的 fields）
+    - 节点定位经 TreeDocument 的 id 索引（O(1)），不再对每个节点递归查找
     - 失败不抛异常，返回 PersistResult 并记录日志
+    - 写回模式（write_behind=True）：每个文件在内存中保留一份文档，修改只改内存并标脏，
+      同一文件在 debounce_ms 窗口内的多次修改合并为一次落盘；flush()/close()/进程退出时立即落盘。
+      磁盘文件被其它写入方修改（mtime/size 变化）且内存无待写修改时自动重新加载。
+    - 日志模式（journal=True）：每次编辑追加一行到 <文件>.oplog（见 services.tree_journal），
+      读取时在快照上重放日志；累计 compact_ops 条或 flush()/close() 时压缩为新快照。
+      整树替换（save_full_tree）直接写新快照。
+    - SQLite 模式（sqlite=True）：编辑直接写入 <文件>.sqlite3（见 services.tree_store），
+      项目 JSON 作为交换格式在 debounce_ms 窗口后导出；flush()/close() 时立即导出。
     """
 
-    def __init__(self) -> None:
-        # 预留：去抖/批量合并可在此加入
-        pass
+    def __init__(self, write_behind: bool = False, debounce_ms: int = 300, journal: bool = False, compact_ops: int = 500,
+                 sqlite: bool = False) -> None:
+        self.sqlite = bool(sqlite)
+        self.journal = bool(journal) and not self.sqlite
+        self.write_behind = bool(write_behind) and not self.journal
+        self.debounce_sec = max(0, int(debounce_ms)) / 1000.0
+        self.compact_ops = max(1, int(compact_ops))
+        self._docs: Dict[str, _CachedDoc] = {}
+        self._lock = threading.RLock()
+        self._io_lock = threading.Lock()
+        if self.write_behind or self.journal or self.sqlite:
+            _live_buses.add(self)
 
     # —— 公共语义接口 ——
     def save_tree_expansion(self, file: Path, node_id: str, expanded: bool, *, session_id: Optional[str] = None, reason: str = "ui.expand") -> PersistResult:
         if not self._ensure_file(file):
             return PersistResult(False, "file_not_exists")
-        root = self._read_json(file)
-        if root is None:
-            return PersistResult(False, "read_json_failed")
-        if not self._update_node_in_json(root, node_id, {"expanded": bool(expanded)}):
-            return PersistResult(False, "node_not_found")
-        if not self._write_json_atomic(file, root):
-            return PersistResult(False, "write_failed")
+        with self._lock:
+            doc = self._load(file)
+            if doc is None:
+                return PersistResult(False, "read_json_failed")
+            fields = {"expanded": bool(expanded)}
+            if not doc.update(node_id, fields):
+                return PersistResult(False, "node_not_found")
+            if not self._store(file, doc, [{"op": "set", "id": node_id, "fields": fields}]):
+                return PersistResult(False, "write_failed")
         try:
             logger_sink.log_user_message(session_id or "-", f"[PBUS] save_tree_expansion ok id={node_id} expanded={expanded} file={file}")
         except Exception:
@@ -50,13 +111,14 @@ class PersistenceBus:
             return PersistResult(False, "empty_fields")
         if not self._ensure_file(file):
             return PersistResult(False, "file_not_exists")
-        root = self._read_json(file)
-        if root is None:
-            return PersistResult(False, "read_json_failed")
-        if not self._update_node_in_json(root, node_id, fields):
-            return PersistResult(False, "node_not_found")
-        if not self._write_json_atomic(file, root):
-            return PersistResult(False, "write_failed")
+        with self._lock:
+            doc = self._load(file)
+            if doc is None:
+                return PersistResult(False, "read_json_failed")
+            if not doc.update(node_id, fields):
+                return PersistResult(False, "node_not_found")
+            if not self._store(file, doc, [{"op": "set", "id": node_id, "fields": fields}]):
+                return PersistResult(False, "write_failed")
         try:
             logger_sink.log_user_message(session_id or "-", f"[PBUS] save_node_fields ok id={node_id} fields={list(fields.keys())} file={file}")
         except Exception:
@@ -66,19 +128,24 @@ class PersistenceBus:
     def save_swimlane_state(self, file: Path, state: Dict[str, List[Tuple[str, int]]], *, session_id: Optional[str] = None, reason: str = "ui.swimlane") -> PersistResult:
         if not self._ensure_file(file):
             return PersistResult(False, "file_not_exists")
-        root = self._read_json(file)
-        if root is None:
-            return PersistResult(False, "read_json_failed")
-        try:
-            for key, arr in (state or {}).items():
-                for nid, order in arr:
-                    if not nid:
-                        continue
-                    self._update_node_in_json(root, nid, {"status": key, "kanban_order": int(order)})
-        except Exception:
-            return PersistResult(False, "state_apply_failed")
-        if not self._write_json_atomic(file, root):
-            return PersistResult(False, "write_failed")
+        with self._lock:
+            doc = self._load(file)
+            if doc is None:
+                return PersistResult(False, "read_json_failed")
+            try:
+                updates = [
+                    (nid, {"status": key, "kanban_order": int(order)})
+                    for key, arr in (state or {}).items()
+                    for nid, order in arr
+                    if nid and nid in doc
+                ]
+                # SQLite 模式下 set_many 为单个事务
+                doc.set_many(updates)
+                ops: List[Dict[str, Any]] = [{"op": "set", "id": nid, "fields": fields} for nid, fields in updates]
+            except Exception:
+                return PersistResult(False, "state_apply_failed")
+            if not self._store(file, doc, ops):
+                return PersistResult(False, "write_failed")
         try:
             logger_sink.log_user_message(session_id or "-", f"[PBUS] save_swimlane_state ok file={file}")
         except Exception:
@@ -93,27 +160,248 @@ class PersistenceBus:
         """
         if not self._ensure_file(file):
             return PersistResult(False, "file_not_exists")
-        root = self._read_json(file)
-        if root is None:
-            return PersistResult(False, "read_json_failed")
+        with self._lock:
+            doc = self._load(file)
+            if doc is None:
+                return PersistResult(False, "read_json_failed")
+            try:
+                if not isinstance(children, list):
+                    return PersistResult(False, "invalid_children")
+                if not doc.replace_children(None, children):
+                    return PersistResult(False, "invalid_root")
+            except Exception:
+                return PersistResult(False, "apply_failed")
+            # 整树替换：日志模式下直接写新快照
+            if not self._store(file, doc, None):
+                return PersistResult(False, "write_failed")
         try:
-            if not isinstance(children, list):
-                return PersistResult(False, "invalid_children")
-            # 统一取得根节点对象
-            root_node = root[0] if isinstance(root, list) and root else root
-            if not isinstance(root_node, dict):
-                return PersistResult(False, "invalid_root")
-            root_node["children"] = children
+            logger_sink.log_user_message(session_id or "-", f"[PBUS] save_full_tree ok file={file} children_count={len(children)}")
         except Exception:
-            return PersistResult(False, "apply_failed")
-        if not self._write_json_atomic(file, root):
-            return PersistResult(False, "write_failed")
+            pass
+        return PersistResult(True)
+
+    def insert_node(self, file: Path, parent_id: Optional[str], node: Dict[str, Any], index: Optional[int] = None, *, session_id: Optional[str] = None) -> PersistResult:
+        """插入节点（可含子树）；parent_id 为 None 表示根节点。"""
+        return self._apply_op(file, {"op": "insert", "parent": parent_id, "index": index, "node": node}, session_id)
+
+    def delete_node(self, file: Path, node_id: str, *, session_id: Optional[str] = None) -> PersistResult:
+        return self._apply_op(file, {"op": "delete", "id": node_id}, session_id)
+
+    def move_node(self, file: Path, node_id: str, new_parent_id: Optional[str], index: Optional[int] = None, *, session_id: Optional[str] = None) -> PersistResult:
+        return self._apply_op(file, {"op": "move", "id": node_id, "parent": new_parent_id, "index": index}, session_id)
+
+    def _apply_op(self, file: Path, op: Dict[str, Any], session_id: Optional[str]) -> PersistResult:
+        if not self._ensure_file(file):
+            return PersistResult(False, "file_not_exists")
+        with self._lock:
+            doc = self._load(file)
+            if doc is None:
+                return PersistResult(False, "read_json_failed")
+            try:
+                if not apply_op(doc, op):
+                    return PersistResult(False, "node_not_found")
+            except Exception:
+                return PersistResult(False, "apply_failed")
+            if not self._store(file, doc, [op]):
+                return PersistResult(False, "write_failed")
         try:
-            logger_sink.log_user_message(session_id or "-", f"[PBUS] save_full_tree ok file={file} children_count={len(children)}")
+            logger_sink.log_user_message(session_id or "-", f"[PBUS] {op.get('op')}_node ok id={op.get('id') or (op.get('node') or {}).get('id')} file={file}")
         except Exception:
             pass
         return PersistResult(True)
 
+    # —— 写回缓存 / 操作日志 ——
+    def flush(self, file: Optional[Path] = None) -> bool:
+        """立即落盘待写文档（file 为空时落盘全部；日志模式下为压缩成快照）。返回是否全部成功。"""
+        with self._lock:
+            keys = [self._key(file)] if file is not None else list(self._docs.keys())
+        ok = True
+        for key in keys:
+            ok = self._flush_key(key) and ok
+        return ok
+
+    def invalidate(self, file: Path) -> None:
+        """丢弃某文件的内存文档（外部直接写盘后调用），未落盘的修改先落盘。"""
+        key = self._key(file)
+        self._flush_key(key)
+        with self._lock:
+            cached = self._docs.pop(key, None)
+            if cached is not None:
+                self._release(cached)
+
+    def close(self) -> None:
+        """落盘全部待写文档并清空缓存。"""
+        self.flush()
+        with self._lock:
+            for doc in self._docs.values():
+                if doc.timer is not None:
+                    doc.timer.cancel()
+                self._release(doc)
+            self._docs.clear()
+
+    def document(self, file: Path) -> Any:
+        """取得文件的树文档（只读使用；写回模式下为缓存中的最新内存文档，含未落盘修改；
+        SQLite 模式下为 SqliteTreeStore）。"""
+        with self._lock:
+            return self._load(file)
+
+    def has_pending(self, file: Optional[Path] = None) -> bool:
+        with self._lock:
+            if file is None:
+                return any(d.dirty for d in self._docs.values())
+            doc = self._docs.get(self._key(file))
+            return bool(doc and doc.dirty)
+
+    def _key(self, file: Path) -> str:
+        return os.path.normcase(os.path.abspath(str(file)))
+
+    def _release(self, cached: _CachedDoc) -> None:
+        if cached.journal is not None:
+            cached.journal.close()
+        if self.sqlite:
+            cached.doc.close()
+
+    def _load(self, file: Path) -> Any:
+        """取得文件的可修改文档：写回模式下复用内存文档（索引只在加载时建一次），否则每次从磁盘读取。
+        SQLite 模式下返回该文件的 SqliteTreeStore（JSON 被外部修改时重新导入）。"""
+        if not (self.write_behind or self.journal or self.sqlite):
+            root = self._read_json(file)
+            return None if root is None else TreeDocument(root)
+        key = self._key(file)
+        cached = self._docs.get(key)
+        stamp = _file_stamp(Path(file))
+        if cached is not None and (cached.dirty or cached.stamp == stamp):
+            return cached.doc
+        if self.sqlite:
+            if cached is not None:
+                self._release(cached)
+            try:
+                store = SqliteTreeStore.for_json(Path(file))
+            except Exception:
+                self._docs.pop(key, None)
+                return None
+            if store.root_id() is None:
+                store.close()
+                self._docs.pop(key, None)
+                return None
+            self._docs[key] = _CachedDoc(store, stamp)
+            return store
+        if self.journal:
+            # 快照 + 重放日志（加载不改动快照本身，签名在加载后取）
+            if cached is not None and cached.journal is not None:
+                cached.journal.close()
+            journal = TreeJournal(Path(file))
+            doc = journal.load()
+            if doc is None:
+                return None
+            entry = _CachedDoc(doc, _file_stamp(Path(file)), journal)
+            entry.dirty = journal.pending > 0
+            self._docs[key] = entry
+            return doc
+        root = self._read_json(file)
+        if root is None:
+            return None
+        doc = TreeDocument(root)
+        self._docs[key] = _CachedDoc(doc, stamp)
+        return doc
+
+    def _store(self, file: Path, tree: Any, ops: Optional[List[Dict[str, Any]]] = None) -> bool:
+        """保存修改后的文档：写回模式下标脏并安排去抖落盘；日志模式下追加 ops（None 表示整体替换，
+        直接写快照）；SQLite 模式下修改已入库，只安排去抖导出 JSON；否则立即原子写入。"""
+        if self.journal:
+            return self._store_journal(file, tree, ops)
+        if not (self.write_behind or self.sqlite):
+            return self._write_json_atomic(file, tree.root)
+        key = self._key(file)
+        doc = self._docs.get(key)
+        if doc is None:
+            doc = self._docs[key] = _CachedDoc(tree, None)
+        doc.doc = tree
+        doc.dirty = True
+        # 窗口内已有待执行的落盘则直接合并，不推迟（保证最长延迟为一个窗口）
+        if doc.timer is None:
+            t = threading.Timer(self.debounce_sec, self._flush_key, args=(key,))
+            t.daemon = True
+            doc.timer = t
+            t.start()
+        return True
+
+    def _store_journal(self, file: Path, tree: TreeDocument, ops: Optional[List[Dict[str, Any]]]) -> bool:
+        cached = self._docs.get(self._key(file))
+        if cached is None or cached.journal is None:
+            return False
+        journal = cached.journal
+        if ops is not None:
+            for op in ops:
+                if not journal.record(op):
+                    # 追加失败：内存文档已含全部修改，改为整体写快照
+                    ops = None
+                    break
+        if ops is None or journal.pending >= self.compact_ops:
+            if not journal.compact(tree):
+                cached.dirty = True
+                return False
+            cached.stamp = _file_stamp(Path(file))
+        cached.dirty = journal.pending > 0
+        return True
+
+    def _flush_key(self, key: str) -> bool:
+        # 串行化同一实例的落盘，避免定时器线程与显式 flush 交错写出旧快照
+        with self._io_lock:
+            return self._flush_key_locked(key)
+
+    def _flush_key_locked(self, key: str) -> bool:
+        if self.journal:
+            return self._compact_key(key)
+        with self._lock:
+            doc = self._docs.get(key)
+            if doc is None:
+                return True
+            if doc.timer is not None:
+                doc.timer.cancel()
+                doc.timer = None
+            if not doc.dirty:
+                return True
+            if self.sqlite:
+                # 导出期间的新修改会重新标脏并安排下一次导出（库自身加锁，导出读取一致快照）
+                doc.dirty = False
+                text = None
+            else:
+                # 在锁内序列化快照，落盘期间的新修改会重新标脏并安排下一次落盘
+                try:
+                    text = json.dumps(doc.doc.root, ensure_ascii=False, indent=2)
+                except Exception:
+                    return False
+                doc.dirty = False
+        if text is None:
+            ok = doc.doc.export_json(Path(key))
+        else:
+            ok = self._write_text_atomic(Path(key), text)
+        with self._lock:
+            if ok:
+                doc.stamp = _file_stamp(Path(key))
+            else:
+                doc.dirty = True
+        return ok
+
+    def _compact_key(self, key: str) -> bool:
+        with self._lock:
+            cached = self._docs.get(key)
+            if cached is None:
+                # 未加载过（如上次进程遗留的日志）：有待重放的操作时加载并压缩
+                if not oplog_path(Path(key)).exists() or not TreeJournal(Path(key)).has_ops():
+                    return True
+                if self._load(Path(key)) is None:
+                    return False
+                cached = self._docs.get(key)
+            if cached is None or cached.journal is None or cached.journal.pending == 0:
+                return True
+            if not cached.journal.compact(cached.doc):
+                return False
+            cached.stamp = _file_stamp(Path(key))
+            cached.dirty = False
+            return True
+
     # —— 内部：通用读/写/更新 ——
     def _ensure_file(self, file: Path) -> bool:
         try:
@@ -130,13 +418,23 @@ class PersistenceBus:
             return None
 
     def _write_json_atomic(self, path: Path, data: Any) -> bool:
+        try:
+            text = json.dumps(data, ensure_ascii=False, indent=2)
+        except Exception:
+            return False
+        return self._write_text_atomic(path, text)
+
+    def _write_text_atomic(self, path: Path, text: str) -> bool:
         try:
             dir_path = Path(path).parent
             fd, tmp_path = tempfile.mkstemp(prefix=Path(path).stem + "_", suffix=".tmp", dir=str(dir_path))
             os.close(fd)
             try:
                 with open(tmp_path, "w", encoding="utf-8") as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
+                    f.write(text)
+                    f.flush()
+                    # 替换前确保临时文件内容已落盘，避免崩溃后出现空/截断的目标文件
+                    os.fsync(f.fileno())
                 os.replace(tmp_path, path)
                 return True
             finally:
@@ -147,23 +445,3 @@ class PersistenceBus:
                     pass
         except Exception:
             return False
-
-    def _update_node_in_json(self, node: Any, node_id: str, updates: Dict[str, Any]) -> bool:
-        try:
-            if isinstance(node, dict):
-                if node.get("id") == node_id:
-                    for k, v in updates.items():
-                        node[k] = v
-                    return True
-                ch = node.get("children")
-                if isinstance(ch, list):
-                    for c in ch:
-                        if self._update_node_in_json(c, node_id, updates):
-                            return True
-            elif isinstance(node, list):
-                for c in node:
-                    if self._update_node_in_json(c, node_id, updates):
-                        return True
-        except Exception:
-            return False
-        return False
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+泳道（看板）索引：status -> 按 kanban_order 排序的节点列表
+
+- 加载时遍历一次节点建索引，之后的拖放只在索引上增量调整
+- kanban_order 使用留间隙的整数（ORDER_GAP）：移动一张卡片时取相邻两张卡片的中间值，
+  只改动被移动的节点；仅当相邻值之间没有空隙时，才对该列重新等距编号
+- 每次修改返回变更集 {node_id: (status, kanban_order)}，调用方只持久化这些节点
+
+用法：
+    idx = SwimlaneIndex(["planned", "doing", "done"])
+    idx.build(nodes)                       # 节点 dict：id / status / kanban_order / topic
+    changes = idx.move("n-1", "doing", 0)  # 移到 doing 列首位
+    bus.save_swimlane_state(path, SwimlaneIndex.to_state(changes))
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+ORDER_GAP = 1024
+MISSING_ORDER = 999999  # 与旧逻辑一致：缺省排序视为末尾
+
+Changes = Dict[str, Tuple[str, int]]
+
+
+class SwimlaneIndex:
+    """各列卡片的有序索引。列内条目为 {"id", "title", "order"}。"""
+
+    def __init__(self, statuses: Iterable[str], gap: int = ORDER_GAP) -> None:
+        self.gap = max(2, int(gap))
+        self._columns: Dict[str, List[Dict[str, Any]]] = {s: [] for s in statuses}
+        self._status_of: Dict[str, str] = {}
+
+    # —— 构建 ——
+    def build(self, nodes: Iterable[Dict[str, Any]]) -> None:
+        """从节点 dict 重建索引；只收录 status 属于已知列且带有效 id 的节点（重复 id 以首个为准）。"""
+        for col in self._columns.values():
+            col.clear()
+        self._status_of.clear()
+        for n in nodes:
+            if not isinstance(n, dict):
+                continue
+            status = n.get("status")
+            nid = n.get("id")
+            if status not in self._columns or not (isinstance(nid, str) and nid) or nid in self._status_of:
+                continue
+            try:
+                order = int(n.get("kanban_order"))
+            except Exception:
+                order = MISSING_ORDER
+            self._columns[status].append({"id": nid, "title": n.get("topic") or "", "order": order})
+            self._status_of[nid] = status
+        for col in self._columns.values():
+            col.sort(key=lambda e: e["order"])  # 稳定排序：同序号保持遍历顺序
+
+    # —— 查询 ——
+    @property
+    def statuses(self) -> List[str]:
+        return list(self._columns.keys())
+
+    def column(self, status: str) -> List[Dict[str, Any]]:
+        return list(self._columns.get(status) or [])
+
+    def status_of(self, node_id: str) -> Optional[str]:
+        return self._status_of.get(node_id)
+
+    def __contains__(self, node_id: object) -> bool:
+        return node_id in self._status_of
+
+    def __len__(self) -> int:
+        return len(self._status_of)
+
+    def _position(self, node_id: str) -> Tuple[Optional[str], int]:
+        status = self._status_of.get(node_id)
+        if status is None:
+            return None, -1
+        for i, e in enumerate(self._columns[status]):
+            if e["id"] == node_id:
+                return status, i
+        return None, -1
+
+    # —— 修改 ——
+    def move(self, node_id: str, status: str, row: Optional[int] = None, title: Optional[str] = None) -> Changes:
+        """把节点放到 status 列的第 row 位（按移除自身后的位置计；None 为末尾），返回变更集。
+        节点尚未在索引中时视为加入该列。"""
+        if status not in self._columns or not node_id:
+            return {}
+        old_status, old_row = self._position(node_id)
+        entry: Dict[str, Any]
+        if old_status is not None:
+            entry = self._columns[old_status].pop(old_row)
+        else:
+            entry = {"id": node_id, "title": title or "", "order": MISSING_ORDER}
+        if title is not None:
+            entry["title"] = title
+        col = self._columns[status]
+        row = len(col) if row is None or row < 0 or row > len(col) else row
+        if old_status == status and old_row == row:
+            col.insert(row, entry)
+            return {}
+        col.insert(row, entry)
+        self._status_of[node_id] = status
+        prev_order = col[row - 1]["order"] if row > 0 else None
+        next_order = col[row + 1]["order"] if row + 1 < len(col) else None
+        order = self._between(prev_order, next_order)
+        if order is None:
+            return self._renumber(status)
+        entry["order"] = order
+        return {node_id: (status, order)}
+
+    def append(self, node_id: str, status: str, title: Optional[str] = None) -> Changes:
+        return self.move(node_id, status, None, title)
+
+    def remove(self, node_id: str) -> bool:
+        status, row = self._position(node_id)
+        if status is None:
+            return False
+        self._columns[status].pop(row)
+        self._status_of.pop(node_id, None)
+        return True
+
+    def set_title(self, node_id: str, title: str) -> bool:
+        """更新卡片标题；返回是否有变化（不在索引中或标题相同为 False）。"""
+        status, row = self._position(node_id)
+        if status is None or self._columns[status][row]["title"] == (title or ""):
+            return False
+        self._columns[status][row]["title"] = title or ""
+        return True
+
+    def _between(self, prev_order: Optional[int], next_order: Optional[int]) -> Optional[int]:
+        """相邻两张卡片之间的新序号；没有空隙时返回 None。"""
+        if prev_order is None and next_order is None:
+            return 0
+        if prev_order is None:
+            return next_order - self.gap
+        if next_order is None:
+            return prev_order + self.gap
+        if next_order - prev_order > 1:
+            return (prev_order + next_order) // 2
+        return None
+
+    def _renumber(self, status: str) -> Changes:
+        """整列重新等距编号，返回序号实际变化的节点。"""
+        changes: Changes = {}
+        for i, e in enumerate(self._columns[status]):
+            order = i * self.gap
+            if e["order"] != order:
+                e["order"] = order
+                changes[e["id"]] = (status, order)
+        return changes
+
+    @staticmethod
+    def to_state(changes: Changes) -> Dict[str, List[Tuple[str, int]]]:
+        """变更集 -> PersistenceBus.save_swimlane_state 的 {status: [(node_id, order), ...]}。"""
+        state: Dict[str, List[Tuple[str, int]]] = {}
+        for nid, (status, order) in changes.items():
+            state.setdefault(status, []).append((nid, order))
+        return state
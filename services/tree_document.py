@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+项目树文档模型（共享）
+
+对项目树 JSON（根为 dict，或兼容的 [dict] 列表）建立 id→节点、id→父节点 两张索引：
+- 加载时一次遍历建索引，之后 get/update 为 O(1)
+- insert/delete/move 增量维护索引（仅涉及被移动/删除的子树与其兄弟列表）
+- 唯一 ID 分配直接查索引，不再每次遍历整棵树
+- 文档对象即原始 dict，修改后可直接 json.dump(doc.root)
+
+重复 id 时与原递归查找一致：以深度优先先遇到的节点为准。
+"""
+from __future__ import annotations
+
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+def allocate_id(used: Set[str], prefix: str = "n-") -> str:
+    """生成不在 used 中的新 ID 并加入 used。"""
+    while True:
+        cand = f"{prefix}{uuid.uuid4().hex[:8]}"
+        if cand not in used:
+            used.add(cand)
+            return cand
+
+
+class TreeDocument:
+    """带 id 索引的树文档。节点为含 id/children 的 dict。"""
+
+    def __init__(self, root: Any) -> None:
+        self.root = root
+        self._nodes: Dict[str, dict] = {}
+        self._parents: Dict[str, Optional[dict]] = {}
+        self._reserved: Set[str] = set()
+        self._topic_cache: Optional[Dict[str, str]] = None
+        self.rebuild()
+
+    # —— 索引 ——
+    @property
+    def root_node(self) -> Optional[dict]:
+        """统一取得根节点对象（根为列表时取第一个）。"""
+        r = self.root[0] if isinstance(self.root, list) and self.root else self.root
+        return r if isinstance(r, dict) else None
+
+    def rebuild(self) -> None:
+        self._nodes.clear()
+        self._parents.clear()
+        self._topic_cache = None
+        if isinstance(self.root, list):
+            for n in self.root:
+                self._index(n, None)
+        else:
+            self._index(self.root, None)
+
+    def _index(self, node: Any, parent: Optional[dict]) -> None:
+        # 显式栈，避免深树递归过深
+        stack = [(node, parent)]
+        while stack:
+            n, p = stack.pop()
+            if not isinstance(n, dict):
+                continue
+            nid = n.get("id")
+            if isinstance(nid, str) and nid and nid not in self._nodes:
+                self._nodes[nid] = n
+                self._parents[nid] = p
+            ch = n.get("children")
+            if isinstance(ch, list):
+                for c in reversed(ch):
+                    stack.append((c, n))
+
+    def _unindex(self, node: dict) -> None:
+        for n in self.walk(node, include_root=True):
+            nid = n.get("id")
+            if isinstance(nid, str) and self._nodes.get(nid) is n:
+                self._nodes.pop(nid, None)
+                self._parents.pop(nid, None)
+
+    # —— 查询 ——
+    def __contains__(self, node_id: object) -> bool:
+        return node_id in self._nodes
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def get(self, node_id: str) -> Optional[dict]:
+        return self._nodes.get(node_id)
+
+    def parent_of(self, node_id: str) -> Optional[dict]:
+        return self._parents.get(node_id)
+
+    def ids(self) -> Set[str]:
+        """当前已占用的全部 ID（含 reserve 预留的）。返回副本。"""
+        return set(self._nodes) | self._reserved
+
+    def find_by_topic(self, topic: str) -> Optional[dict]:
+        """按 topic 精确匹配查找首个节点（深度优先序）。索引懒构建，结构或 topic 变化后失效。"""
+        if self._topic_cache is None:
+            cache: Dict[str, str] = {}
+            for n in self.walk(self.root, include_root=True):
+                t = n.get("topic")
+                nid = n.get("id")
+                if isinstance(t, str) and isinstance(nid, str) and t not in cache and self._nodes.get(nid) is n:
+                    cache[t] = nid
+            self._topic_cache = cache
+        nid = self._topic_cache.get(topic)
+        if nid is not None:
+            return self._nodes.get(nid)
+        return None
+
+    @staticmethod
+    def walk(node: Any, include_root: bool = False) -> Iterator[dict]:
+        """深度优先遍历（先序）。"""
+        stack = [(node, True)]
+        while stack:
+            n, is_root = stack.pop()
+            if isinstance(n, list):
+                for c in reversed(n):
+                    stack.append((c, False))
+                continue
+            if not isinstance(n, dict):
+                continue
+            if include_root or not is_root:
+                yield n
+            ch = n.get("children")
+            if isinstance(ch, list):
+                for c in reversed(ch):
+                    stack.append((c, False))
+
+    # —— 修改 ——
+    def update(self, node_id: str, fields: Dict[str, Any]) -> bool:
+        node = self._nodes.get(node_id)
+        if node is None:
+            return False
+        if "children" in fields:
+            self._unindex(node)
+            node.update(fields)
+            self._index(node, self._parents.get(node_id))
+            self._topic_cache = None
+            return True
+        if "topic" in fields:
+            self._topic_cache = None
+        node.update(fields)
+        return True
+
+    def set_many(self, updates: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """批量 update，返回成功条数。"""
+        return sum(1 for nid, fields in updates if self.update(nid, fields))
+
+    def replace_children(self, node_id: Optional[str], children: List[dict]) -> bool:
+        """整体替换某节点（None 为根节点）的 children 并重建索引。"""
+        parent = self.root_node if node_id is None else self._nodes.get(node_id)
+        if not isinstance(parent, dict):
+            return False
+        parent["children"] = children
+        self.rebuild()
+        return True
+
+    def insert(self, parent_id: Optional[str], node: dict, index: Optional[int] = None) -> bool:
+        """将 node（可含子树）插入 parent_id 的 children；parent_id 为 None 表示根节点。"""
+        parent = self.root_node if parent_id is None else self._nodes.get(parent_id)
+        if not isinstance(parent, dict) or not isinstance(node, dict):
+            return False
+        ch = parent.get("children")
+        if not isinstance(ch, list):
+            ch = parent["children"] = []
+        if index is None or index >= len(ch):
+            ch.append(node)
+        else:
+            ch.insert(max(0, index), node)
+        self._index(node, parent)
+        self._topic_cache = None
+        return True
+
+    def delete(self, node_id: str) -> Optional[dict]:
+        """删除节点及其子树，返回被删除的节点。"""
+        node = self._nodes.get(node_id)
+        if node is None:
+            return None
+        parent = self._parents.get(node_id)
+        siblings = parent.get("children") if isinstance(parent, dict) else self.root
+        if isinstance(siblings, list):
+            for i, c in enumerate(siblings):
+                if c is node:
+                    del siblings[i]
+                    break
+        self._unindex(node)
+        self._topic_cache = None
+        return node
+
+    def move(self, node_id: str, new_parent_id: Optional[str], index: Optional[int] = None) -> bool:
+        """移动节点到新父节点下（不允许移动到自身子树内）。"""
+        node = self._nodes.get(node_id)
+        if node is None:
+            return False
+        target = self.root_node if new_parent_id is None else self._nodes.get(new_parent_id)
+        if not isinstance(target, dict):
+            return False
+        # 沿父链上溯检查环：O(深度)
+        p: Optional[dict] = target
+        while p is not None:
+            if p is node:
+                return False
+            pid = p.get("id")
+            p = self._parents.get(pid) if isinstance(pid, str) and self._nodes.get(pid) is p else None
+        old_parent = self._parents.get(node_id)
+        siblings = old_parent.get("children") if isinstance(old_parent, dict) else self.root
+        if isinstance(siblings, list):
+            for i, c in enumerate(siblings):
+                if c is node:
+                    del siblings[i]
+                    break
+        ch = target.get("children")
+        if not isinstance(ch, list):
+            ch = target["children"] = []
+        if index is None or index >= len(ch):
+            ch.append(node)
+        else:
+            ch.insert(max(0, index), node)
+        self._parents[node_id] = target
+        self._topic_cache = None
+        return True
+
+    # —— ID 分配 ——
+    def reserve(self, ids: Iterable[str]) -> None:
+        """预留 ID（如界面上尚未写回文件的节点），分配新 ID 时一并避开。"""
+        self._reserved.update(i for i in ids if isinstance(i, str) and i)
+
+    def taken(self, node_id: str) -> bool:
+        """ID 是否已被节点占用或已预留。"""
+        return node_id in self._nodes or node_id in self._reserved
+
+    def new_id(self, prefix: str = "n-") -> str:
+        while True:
+            cand = f"{prefix}{uuid.uuid4().hex[:8]}"
+            if not self.taken(cand):
+                self._reserved.add(cand)
+                return cand
+
+    def children_of(self, node_id: Optional[str]) -> List[dict]:
+        parent = self.root_node if node_id is None else self._nodes.get(node_id)
+        ch = parent.get("children") if isinstance(parent, dict) else None
+        return [c for c in ch if isinstance(c, dict)] if isinstance(ch, list) else []
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+项目树操作日志（<项目文件>.oplog）与压缩
+
+- 每次编辑（设字段/插入/删除/移动）追加一行 JSON 到 .oplog，O(1) 追加代替 O(文件) 重写
+- 读取 = 最近一次快照（项目 JSON 本身）+ 重放 .oplog
+- 压缩：把内存文档原子写成新快照，再以新快照签名重置 .oplog
+- .oplog 首行为头 {"v": 1, "base": [mtime_ns, size]}，记录其所基于的快照签名；
+  压缩在写完新快照后崩溃（旧日志未重置）时，签名不符的日志视为已并入快照而丢弃，不会重复重放
+- 进程在追加中途退出留下的半行在加载时截掉
+
+日志行格式：
+    {"op": "set", "id": ..., "fields": {...}}
+    {"op": "insert", "parent": id|null, "index": n|null, "node": {...}}
+    {"op": "delete", "id": ...}
+    {"op": "move", "id": ..., "parent": id|null, "index": n|null}
+"""
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.tree_document import TreeDocument
+
+OPLOG_SUFFIX = ".oplog"
+JOURNAL_VERSION = 1
+
+
+def oplog_path(path: Path) -> Path:
+    return Path(str(path) + OPLOG_SUFFIX)
+
+
+def _stamp(path: Path) -> Optional[List[int]]:
+    try:
+        st = os.stat(path)
+        return [st.st_mtime_ns, st.st_size]
+    except OSError:
+        return None
+
+
+def write_text_atomic(path: Path, text: str) -> bool:
+    """临时文件 + fsync + os.replace。"""
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix=Path(path).stem + "_", suffix=".tmp", dir=str(Path(path).parent))
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        tmp_path = None
+        return True
+    except Exception:
+        return False
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except Exception:
+                pass
+
+
+def apply_op(doc: TreeDocument, op: Dict[str, Any]) -> bool:
+    """将一条日志操作应用到文档。"""
+    kind = op.get("op")
+    if kind == "set":
+        return doc.update(op.get("id"), op.get("fields") or {})
+    if kind == "insert":
+        return doc.insert(op.get("parent"), op.get("node"), op.get("index"))
+    if kind == "delete":
+        return doc.delete(op.get("id")) not in (None, False)
+    if kind == "move":
+        return doc.move(op.get("id"), op.get("parent"), op.get("index"))
+    return False
+
+
+class TreeJournal:
+    """单个项目文件的操作日志。非线程安全，由调用方（PersistenceBus）加锁。"""
+
+    def __init__(self, path: Path, fsync: bool = False) -> None:
+        self.path = Path(path)
+        self.log_path = oplog_path(self.path)
+        self.fsync = fsync
+        self.pending = 0  # 日志中尚未并入快照的操作数
+        self._fh = None
+
+    # —— 读取 ——
+    def _read_log(self) -> Tuple[List[Dict[str, Any]], int]:
+        """返回 (有效操作, 有效字节长度)；头签名与当前快照不符时返回空。"""
+        try:
+            with open(self.log_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0
+        ops: List[Dict[str, Any]] = []
+        valid = 0
+        pos = 0
+        header_ok = False
+        while pos < len(data):
+            nl = data.find(b"\n", pos)
+            if nl < 0:
+                break  # 半行：追加中途退出
+            line = data[pos:nl]
+            try:
+                obj = json.loads(line.decode("utf-8"))
+            except (ValueError, UnicodeDecodeError):
+                break
+            if not header_ok:
+                if obj.get("v") != JOURNAL_VERSION or obj.get("base") != _stamp(self.path):
+                    return [], -1
+                header_ok = True
+            else:
+                ops.append(obj)
+            pos = valid = nl + 1
+        return ops, valid
+
+    def has_ops(self) -> bool:
+        ops, _ = self._read_log()
+        return bool(ops)
+
+    def load(self) -> Optional[TreeDocument]:
+        """读取快照并重放日志。"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                root = json.load(f)
+        except Exception:
+            return None
+        doc = TreeDocument(root)
+        ops, valid = self._read_log()
+        for op in ops:
+            try:
+                apply_op(doc, op)
+            except Exception:
+                pass
+        self.pending = len(ops)
+        self._close_handle()
+        if valid < 0 or not ops and valid == 0:
+            # 无日志或日志已过期：以当前快照为基重新开始
+            self._reset_log()
+        else:
+            # 截掉末尾半行，后续追加从完整行之后开始
+            try:
+                with open(self.log_path, "r+b") as f:
+                    f.truncate(valid)
+            except OSError:
+                pass
+        return doc
+
+    # —— 追加 ——
+    def record(self, op: Dict[str, Any]) -> bool:
+        try:
+            if self._fh is None:
+                self._fh = open(self.log_path, "a", encoding="utf-8", newline="\n")
+            self._fh.write(json.dumps(op, ensure_ascii=False) + "\n")
+            self._fh.flush()
+            if self.fsync:
+                os.fsync(self._fh.fileno())
+            self.pending += 1
+            return True
+        except Exception:
+            self._close_handle()
+            return False
+
+    # —— 压缩 ——
+    def compact(self, doc: TreeDocument) -> bool:
+        """把文档写成新快照并重置日志。"""
+        try:
+            text = json.dumps(doc.root, ensure_ascii=False, indent=2)
+        except Exception:
+            return False
+        self._close_handle()
+        if not write_text_atomic(self.path, text):
+            return False
+        # 此处若崩溃：旧日志签名与新快照不符，加载时被丢弃
+        self._reset_log()
+        return True
+
+    def _reset_log(self) -> None:
+        header = json.dumps({"v": JOURNAL_VERSION, "base": _stamp(self.path)}) + "\n"
+        if write_text_atomic(self.log_path, header):
+            self.pending = 0
+
+    def _close_handle(self) -> None:
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except Exception:
+                pass
+            self._fh = None
+
+    def close(self) -> None:
+        self._close_handle()
@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite 项目树存储（超大项目用）
+
+- 每个节点一行：id / parent_id / sort（兄弟间排序，浮点留间隙）/ status / kanban_order / topic / data（其余字段 JSON）
+- 索引：(parent_id, sort) 取子节点，(status, kanban_order) 供泳道按列查询
+- 子树、祖先查询使用递归 CTE，不在 Python 中整树遍历
+- 与现有 JSON 格式互相导入/导出（import_json / export_json），JSON 仍是交换与备份格式
+
+用法：
+    store = SqliteTreeStore.for_json(Path("config/projects/项目管理.json"))   # 首次自动从 JSON 导入
+    store.update("n-1", {"expanded": True})
+    store.move("n-2", "n-1")
+    store.swimlane("doing")
+    store.export_json(Path(...))
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from services.tree_journal import write_text_atomic
+
+DB_SUFFIX = ".sqlite3"
+SORT_GAP = 1024.0
+
+# 单独成列的字段；其余字段存 data
+_COLUMNS = ("status", "kanban_order", "topic")
+
+_DDL = (
+    "CREATE TABLE IF NOT EXISTS nodes ("
+    " id TEXT PRIMARY KEY,"
+    " parent_id TEXT,"
+    " sort REAL NOT NULL DEFAULT 0,"
+    " status TEXT,"
+    " kanban_order INTEGER,"
+    " topic TEXT,"
+    " data TEXT NOT NULL DEFAULT '{}'"
+    ")",
+    "CREATE INDEX IF NOT EXISTS idx_nodes_parent ON nodes(parent_id, sort)",
+    "CREATE INDEX IF NOT EXISTS idx_nodes_status ON nodes(status, kanban_order)",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+)
+
+_SUBTREE_SQL = (
+    "WITH RECURSIVE sub(id, depth) AS ("
+    " SELECT id, 0 FROM nodes WHERE id = ?"
+    " UNION ALL"
+    " SELECT n.id, sub.depth + 1 FROM nodes n JOIN sub ON n.parent_id = sub.id"
+    ") "
+)
+
+_ANCESTORS_SQL = (
+    "WITH RECURSIVE anc(id, parent_id) AS ("
+    " SELECT id, parent_id FROM nodes WHERE id = ?"
+    " UNION ALL"
+    " SELECT n.id, n.parent_id FROM nodes n JOIN anc ON n.id = anc.parent_id"
+    ") "
+)
+
+
+def db_path_for(json_path: Path) -> Path:
+    return Path(str(json_path) + DB_SUFFIX)
+
+
+def _json_stamp(path: Path) -> str:
+    try:
+        st = os.stat(path)
+        return f"{st.st_mtime_ns}:{st.st_size}"
+    except OSError:
+        return ""
+
+
+class SqliteTreeStore:
+    """SQLite 树存储。线程安全（单连接 + 锁）。
+
+    根节点（JSON 顶层对象）也存为一行，parent_id 为 NULL；根为列表的旧格式导入时取第一个元素。
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = Path(db_path)
+        self._lock = threading.RLock()
+        self._reserved: Set[str] = set()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for ddl in _DDL:
+            self._conn.execute(ddl)
+        self._conn.commit()
+
+    @classmethod
+    def for_json(cls, json_path: Path) -> "SqliteTreeStore":
+        """打开与 JSON 项目文件对应的库；库为空或 JSON 在上次导入/导出后被外部修改时重新导入。"""
+        store = cls(db_path_for(json_path))
+        if store.get_meta("json_stamp") != _json_stamp(Path(json_path)) or store.root_id() is None:
+            try:
+                with open(json_path, "r", encoding="utf-8") as f:
+                    store.import_json(json.load(f))
+                store.set_meta("json_stamp", _json_stamp(Path(json_path)))
+            except Exception:
+                pass
+        return store
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+
+    # —— meta ——
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?,?)", (key, value))
+
+    # —— 行 <-> 节点 ——
+    @staticmethod
+    def _split(node: Dict[str, Any]) -> Tuple[Optional[str], Optional[int], Optional[str], str]:
+        data = {k: v for k, v in node.items() if k not in _COLUMNS and k not in ("id", "children")}
+        ko = node.get("kanban_order")
+        try:
+            ko = int(ko) if ko is not None else None
+        except (TypeError, ValueError):
+            data["kanban_order"] = ko
+            ko = None
+        return node.get("status"), ko, node.get("topic"), json.dumps(data, ensure_ascii=False)
+
+    @staticmethod
+    def _row_to_node(row: Tuple) -> Dict[str, Any]:
+        nid, _parent, _sort, status, ko, topic, data = row
+        node: Dict[str, Any] = {"id": nid}
+        if topic is not None:
+            node["topic"] = topic
+        if status is not None:
+            node["status"] = status
+        if ko is not None:
+            node["kanban_order"] = ko
+        try:
+            node.update(json.loads(data or "{}"))
+        except ValueError:
+            pass
+        return node
+
+    def _rows_for(self, node: Dict[str, Any], parent_id: Optional[str], sort: float,
+                  used: Set[str], check_db: bool = False) -> Iterator[Tuple]:
+        """展开子树为行；缺失或重复的 id 重新分配（与树中其余节点保持唯一）。
+        used 为本批已产出的 id；check_db=True 时另按主键逐个查询库中是否已存在（单行查询，不取全表 id）。"""
+        def taken(cand: str) -> bool:
+            return cand in used or (check_db and self._id_exists(cand))
+
+        stack = [(node, parent_id, sort)]
+        while stack:
+            n, pid, srt = stack.pop()
+            if not isinstance(n, dict):
+                continue
+            nid = n.get("id")
+            if not isinstance(nid, str) or not nid or taken(nid):
+                nid = self._fresh_id(taken)
+                n["id"] = nid
+            used.add(nid)
+            status, ko, topic, data = self._split(n)
+            yield (nid, pid, srt, status, ko, topic, data)
+            ch = n.get("children")
+            if isinstance(ch, list):
+                for i in range(len(ch) - 1, -1, -1):
+                    stack.append((ch[i], nid, (i + 1) * SORT_GAP))
+
+    @staticmethod
+    def _fresh_id(taken, prefix: str = "n-") -> str:
+        while True:
+            cand = f"{prefix}{uuid.uuid4().hex[:8]}"
+            if not taken(cand):
+                return cand
+
+    def _id_exists(self, node_id: str) -> bool:
+        return self._conn.execute("SELECT 1 FROM nodes WHERE id=?", (node_id,)).fetchone() is not None
+
+    def taken(self, node_id: str) -> bool:
+        """ID 是否已在库中或已预留（与 TreeDocument.taken 相同语义）。"""
+        with self._lock:
+            return node_id in self._reserved or self._id_exists(node_id)
+
+    def reserve(self, ids: Iterable[str]) -> None:
+        """预留 ID（界面上尚未入库的节点），new_id 一并避开。"""
+        with self._lock:
+            self._reserved.update(i for i in ids if isinstance(i, str) and i)
+
+    def new_id(self, prefix: str = "n-") -> str:
+        """分配一个库中不存在且未预留的新 id（按主键查询碰撞），并预留。"""
+        with self._lock:
+            nid = self._fresh_id(lambda c: c in self._reserved or self._id_exists(c), prefix)
+            self._reserved.add(nid)
+            return nid
+
+    # —— 导入/导出 ——
+    def import_json(self, root: Any) -> None:
+        """以 JSON 树整体替换库内容。"""
+        node = root[0] if isinstance(root, list) and root else root
+        if not isinstance(node, dict):
+            raise ValueError("invalid project root")
+        used: Set[str] = set()
+        rows = list(self._rows_for(node, None, 0.0, used))
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM nodes")
+            self._conn.executemany("INSERT INTO nodes VALUES (?,?,?,?,?,?,?)", rows)
+
+    def export_tree(self, node_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """导出（子）树为嵌套 dict；默认导出整棵树。"""
+        start = node_id or self.root_id()
+        if start is None:
+            return None
+        with self._lock:
+            rows = self._conn.execute(
+                _SUBTREE_SQL + "SELECT n.id, n.parent_id, n.sort, n.status, n.kanban_order, n.topic, n.data"
+                " FROM nodes n JOIN sub ON n.id = sub.id ORDER BY n.parent_id, n.sort", (start,)
+            ).fetchall()
+        nodes: Dict[str, Dict[str, Any]] = {}
+        for r in rows:
+            nodes[r[0]] = self._row_to_node(r)
+            nodes[r[0]]["children"] = []
+        for r in rows:
+            if r[0] != start and r[1] in nodes:
+                nodes[r[1]]["children"].append(nodes[r[0]])
+        return nodes.get(start)
+
+    def export_json(self, json_path: Path) -> bool:
+        """原子写出 JSON（indent=2，与现有项目文件一致），并记录签名避免随后被当作外部修改重新导入。"""
+        tree = self.export_tree()
+        if tree is None:
+            return False
+        if not write_text_atomic(Path(json_path), json.dumps(tree, ensure_ascii=False, indent=2)):
+            return False
+        self.set_meta("json_stamp", _json_stamp(Path(json_path)))
+        return True
+
+    # —— 查询 ——
+    def root_id(self) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM nodes WHERE parent_id IS NULL ORDER BY sort LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def __contains__(self, node_id: object) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM nodes WHERE id=?", (node_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+
+    def get(self, node_id: str) -> Optional[Dict[str, Any]]:
+        """单个节点（不含 children）。"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM nodes WHERE id=?", (node_id,)).fetchone()
+        return self._row_to_node(row) if row else None
+
+    def parent_id_of(self, node_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT parent_id FROM nodes WHERE id=?", (node_id,)).fetchone()
+        return row[0] if row else None
+
+    def children(self, node_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """直接子节点（按 sort），不含孙节点；每项带 has_children 标记，供懒加载展示。"""
+        pid = node_id or self.root_id()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT n.*, EXISTS(SELECT 1 FROM nodes c WHERE c.parent_id = n.id)"
+                " FROM nodes n WHERE n.parent_id = ? ORDER BY n.sort", (pid,)
+            ).fetchall()
+        out = []
+        for r in rows:
+            node = self._row_to_node(r[:7])
+            node["has_children"] = bool(r[7])
+            out.append(node)
+        return out
+
+    def subtree_ids(self, node_id: str) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute(_SUBTREE_SQL + "SELECT id FROM sub", (node_id,))]
+
+    def ancestors(self, node_id: str) -> List[str]:
+        """从 node_id 的父节点到根的 id 链。"""
+        with self._lock:
+            ids = [r[0] for r in self._conn.execute(_ANCESTORS_SQL + "SELECT id FROM anc", (node_id,))]
+        return ids[1:]
+
+    def ids(self) -> Set[str]:
+        with self._lock:
+            return {r[0] for r in self._conn.execute("SELECT id FROM nodes")}
+
+    def find_by_topic(self, topic: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM nodes WHERE topic=? LIMIT 1", (topic,)).fetchone()
+        return self._row_to_node(row) if row else None
+
+    def swimlane(self, status: str, under: Optional[str] = None, include_unset: bool = True) -> List[Dict[str, Any]]:
+        """某状态列的节点，按 kanban_order 排序；under 限定在某子树内。
+        status='planned' 且 include_unset=True 时含未设置状态的节点。"""
+        cond = "(status = ? OR status IS NULL)" if status == "planned" and include_unset else "status = ?"
+        with self._lock:
+            if under:
+                rows = self._conn.execute(
+                    _SUBTREE_SQL + "SELECT n.* FROM nodes n JOIN sub ON n.id = sub.id"
+                    f" WHERE sub.depth > 0 AND {cond.replace('status', 'n.status')}"
+                    " ORDER BY n.kanban_order IS NULL, n.kanban_order", (under, status)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    f"SELECT * FROM nodes WHERE {cond} AND parent_id IS NOT NULL"
+                    " ORDER BY kanban_order IS NULL, kanban_order", (status,)
+                ).fetchall()
+        return [self._row_to_node(r) for r in rows]
+
+    # —— 修改 ——
+    def update(self, node_id: str, fields: Dict[str, Any]) -> bool:
+        with self._lock, self._conn:
+            return self._update_locked(node_id, fields)
+
+    def _update_locked(self, node_id: str, fields: Dict[str, Any]) -> bool:
+        fields = {k: v for k, v in fields.items() if k != "id"}
+        children = fields.pop("children", None)
+        row = self._conn.execute("SELECT * FROM nodes WHERE id=?", (node_id,)).fetchone()
+        if row is None:
+            return False
+        node = self._row_to_node(row)
+        node.update(fields)
+        status, ko, topic, data = self._split(node)
+        self._conn.execute(
+            "UPDATE nodes SET status=?, kanban_order=?, topic=?, data=? WHERE id=?",
+            (status, ko, topic, data, node_id),
+        )
+        if isinstance(children, list):
+            self._replace_children_locked(node_id, children)
+        return True
+
+    def replace_children(self, node_id: Optional[str], children: List[Dict[str, Any]]) -> bool:
+        pid = node_id or self.root_id()
+        if pid is None:
+            return False
+        with self._lock, self._conn:
+            self._replace_children_locked(pid, children)
+        return True
+
+    def _replace_children_locked(self, pid: str, children: List[Dict[str, Any]]) -> None:
+        self._conn.execute(
+            _SUBTREE_SQL + "DELETE FROM nodes WHERE id IN (SELECT id FROM sub WHERE depth > 0)", (pid,)
+        )
+        used: Set[str] = set()
+        rows: List[Tuple] = []
+        for i, ch in enumerate(children):
+            rows.extend(self._rows_for(ch, pid, (i + 1) * SORT_GAP, used, check_db=True))
+        self._conn.executemany("INSERT INTO nodes VALUES (?,?,?,?,?,?,?)", rows)
+
+    def _sort_at(self, parent_id: str, index: Optional[int], exclude: Optional[str] = None) -> float:
+        """计算插入到第 index 个位置所需的 sort 值（在相邻两项之间取中点，间隙耗尽时重排该父节点）。"""
+        sorts = [r[0] for r in self._conn.execute(
+            "SELECT sort FROM nodes WHERE parent_id=? AND id IS NOT ? ORDER BY sort", (parent_id, exclude))]
+        if index is None or index >= len(sorts):
+            return (sorts[-1] if sorts else 0.0) + SORT_GAP
+        index = max(0, index)
+        lo = sorts[index - 1] if index > 0 else 0.0
+        hi = sorts[index]
+        if hi - lo > 1e-6:
+            return (lo + hi) / 2.0
+        # 间隙耗尽：按当前顺序重排为等距
+        ids = [r[0] for r in self._conn.execute(
+            "SELECT id FROM nodes WHERE parent_id=? AND id IS NOT ? ORDER BY sort", (parent_id, exclude))]
+        self._conn.executemany("UPDATE nodes SET sort=? WHERE id=?",
+                               [((i + 1) * SORT_GAP, nid) for i, nid in enumerate(ids)])
+        return index * SORT_GAP + SORT_GAP / 2.0
+
+    def insert(self, parent_id: Optional[str], node: Dict[str, Any], index: Optional[int] = None) -> bool:
+        pid = parent_id or self.root_id()
+        if pid is None or not isinstance(node, dict):
+            return False
+        with self._lock, self._conn:
+            if self._conn.execute("SELECT 1 FROM nodes WHERE id=?", (pid,)).fetchone() is None:
+                return False
+            sort = self._sort_at(pid, index)
+            rows = list(self._rows_for(node, pid, sort, set(), check_db=True))
+            self._conn.executemany("INSERT INTO nodes VALUES (?,?,?,?,?,?,?)", rows)
+        return True
+
+    def delete(self, node_id: str) -> bool:
+        with self._lock, self._conn:
+            # 以 WITH 开头的语句 rowcount 不可靠，先确认节点存在
+            if self._conn.execute("SELECT 1 FROM nodes WHERE id=?", (node_id,)).fetchone() is None:
+                return False
+            self._conn.execute(
+                _SUBTREE_SQL + "DELETE FROM nodes WHERE id IN (SELECT id FROM sub)", (node_id,))
+            return True
+
+    def move(self, node_id: str, new_parent_id: Optional[str], index: Optional[int] = None) -> bool:
+        pid = new_parent_id or self.root_id()
+        if pid is None or pid == node_id:
+            return False
+        with self._lock, self._conn:
+            if self._conn.execute("SELECT 1 FROM nodes WHERE id=?", (node_id,)).fetchone() is None:
+                return False
+            # 目标不能在自身子树内：沿目标的祖先链（递归 CTE）检查
+            anc = {r[0] for r in self._conn.execute(_ANCESTORS_SQL + "SELECT id FROM anc", (pid,))}
+            if not anc or node_id in anc:
+                return False
+            sort = self._sort_at(pid, index, exclude=node_id)
+            self._conn.execute("UPDATE nodes SET parent_id=?, sort=? WHERE id=?", (pid, sort, node_id))
+        return True
+
+    def set_many(self, updates: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """批量更新（如泳道状态/排序），单事务提交。返回更新成功的条数。"""
+        n = 0
+        with self._lock, self._conn:
+            for nid, fields in updates:
+                if self._update_locked(nid, fields):
+                    n += 1
+        return n
@@ -2,45 +2,173 @@
 """
 MCP 文档解析服务（占位版）
 - 目标：作为 Autogen 0.7.1 的 MCP Server，后续由客户端通过内生 MCP 机制调用。
-- 当前占位：支持命令行直调，解析 .txt/.md/.pdf/.docx，为后续正式接入 MCP 协议打基础。
+- 当前占位：支持命令行直调，解析 .txt/.md/.log/.pdf/.docx，为后续正式接入 MCP 协议打基础。
 
 用法（命令行直调占位）：
   python tools/python/mcp/document_ingestion_server.py --files "D:/a.txt;D:/b.pdf"
 输出：JSON，形如 {"results":[{"text":..., "metadata":{...}}, ...], "errors": [...]}。
 
+批量模式（进程池 + 流式输出）：
+  python tools/python/mcp/document_ingestion_server.py --files "..." --workers 4 --timeout 60 --ndjson
+- --workers N：N>0 时使用 N 个子进程并行解析（PDF/DOCX 为 CPU 密集）；0 为串行（默认）。
+- --timeout S：单文件解析超时（秒，仅进程池模式生效），超时的文件记为 timeout 错误，其 worker 被终止重建。
+- --ndjson：分块按批（--chunk-batch，默认 CHUNK_BATCH）产出即逐行输出 {"text":..., "metadata":{...}}，
+  文件结束时输出其 {"error": "..."}；进程池模式下 worker 把分块写入临时 spool 文件，主进程按批读回。
+  最后一行为 {"done": true, "files": n, "chunks": m, "errors": k}。
+- --pdf-page-workers N：大 PDF（页数 >= PDF_PARALLEL_MIN_PAGES）按页段分发到 N 个子进程并行抽取（仅串行模式）。
+- --progress：向 stderr 输出页级进度，形如 [pdf] spec.pdf 32/300。
+
+增量模式：--manifest <sqlite> --collection <name>，未变化文件输出 {"unchanged": path} 且不解析；
+变化文件只输出新增分块（metadata.chunk_id 为稳定 id）及 {"file": path, "delete_ids": [...], "pending": true}。
+清单只暂存计划，消费方写入向量库成功后以 --confirm "a;b" 提交（同样需 --manifest/--collection）；
+未确认的文件下次仍视为已变化，不会丢分块。变空或无法抽取文本的文件其旧分块全部列入 delete_ids。
+
+抽取缓存：PDF/DOCX 的抽取文本按 (文件 sha256, 抽取器版本) 缓存到 data/cache/doc_text
+（可用 --cache-dir 或环境变量 DOC_INGEST_CACHE_DIR 覆盖，--no-cache 关闭）；命中时完全跳过解析。
+
 注意：正式 MCP 协议集成将在下一步完成（使用 autogen_ext.tools.mcp）。
 """
 from __future__ import annotations
 import argparse
+import concurrent.futures
+import hashlib
+import itertools
 import json
 import os
+import sys
+import tempfile
+import time
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Optional
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from utils.ingest_manifest import IngestManifest
+from utils.text_chunker import iter_chunks
+from utils.text_reader import iter_text
 
 CHUNK_SIZE = 1500
+CHUNK_OVERLAP = 0
+# 分块按批产出/规划/输出，内存只与批大小有关
+CHUNK_BATCH = 64
+DEFAULT_CACHE_DIR = ROOT / "data" / "cache" / "doc_text"
+
+# 抽取逻辑变化时递增版本号，使旧缓存自然失效
+PDF_EXTRACTOR_VERSION = "pypdf-1"
+DOCX_EXTRACTOR_VERSION = "docx-1"
+PDF_PARALLEL_MIN_PAGES = 64
+PDF_PAGES_PER_RANGE = 32
+
+
+def _read_text_file(p: Path) -> Iterator[str]:
+    """编码嗅探 + 增量解码（大文件 mmap），以文本块迭代器交给分块器，常量内存。"""
+    return iter_text(str(p))
+
+
+def _file_sha256(p: Path) -> str:
+    h = hashlib.sha256()
+    with open(p, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
 
 
-def _read_text_file(p: Path) -> str:
+def _cache_path(cache_dir: str, digest: str, version: str) -> Path:
+    return Path(cache_dir) / digest[:2] / f"{digest}.{version}.txt"
+
+
+def _cache_get(cache_dir: Optional[str], digest: str, version: str) -> Optional[str]:
+    if not cache_dir:
+        return None
+    try:
+        return _cache_path(cache_dir, digest, version).read_text(encoding="utf-8")
+    except Exception:
+        return None
+
+
+def _cache_put(cache_dir: Optional[str], digest: str, version: str, text: str) -> None:
+    if not cache_dir:
+        return
     try:
-        return p.read_text(encoding="utf-8", errors="ignore")
+        fp = _cache_path(cache_dir, digest, version)
+        fp.parent.mkdir(parents=True, exist_ok=True)
+        tmp = fp.with_name(f"{fp.name}.{os.getpid()}.tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, fp)
     except Exception:
+        pass
+
+
+def _cached_extract(p: Path, version: str, extract, cache_dir: Optional[str]) -> str:
+    """按 (sha256, 抽取器版本) 查缓存；未命中才调用 extract(p) 并回填（空结果不缓存）。"""
+    digest = None
+    if cache_dir:
         try:
-            return p.read_text(encoding="gbk", errors="ignore")
+            digest = _file_sha256(p)
         except Exception:
-            return ""
+            digest = None
+        if digest:
+            hit = _cache_get(cache_dir, digest, version)
+            if hit is not None:
+                return hit
+    txt = extract(p)
+    if digest and txt:
+        _cache_put(cache_dir, digest, version, txt)
+    return txt
+
+
+def _stderr_progress(name: str):
+    def report(done: int, total: int) -> None:
+        print(f"[pdf] {name} {done}/{total}", file=sys.stderr, flush=True)
+    return report
 
 
-def _read_pdf_file(p: Path) -> str:
+def _extract_pdf_range(path: str, start: int, end: int) -> List[str]:
+    """抽取 [start, end) 页文本；作为页段并行的 worker 入口，每个进程独立打开文件。"""
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    texts = []
+    for i in range(start, end):
+        try:
+            texts.append(reader.pages[i].extract_text() or "")
+        except Exception:
+            texts.append("")
+    return texts
+
+
+def _read_pdf_file(p: Path, page_workers: int = 0, progress=None) -> str:
     try:
         # 轻依赖：尝试使用 pypdf
         from pypdf import PdfReader
         reader = PdfReader(str(p))
+        total = len(reader.pages)
+        if page_workers and page_workers > 1 and total >= PDF_PARALLEL_MIN_PAGES:
+            ranges = [(i, min(i + PDF_PAGES_PER_RANGE, total)) for i in range(0, total, PDF_PAGES_PER_RANGE)]
+            parts: List[List[str]] = [[] for _ in ranges]
+            done = 0
+            with concurrent.futures.ProcessPoolExecutor(max_workers=page_workers) as ex:
+                futs = {ex.submit(_extract_pdf_range, str(p), a, b): k for k, (a, b) in enumerate(ranges)}
+                for fut in concurrent.futures.as_completed(futs):
+                    k = futs[fut]
+                    a, b = ranges[k]
+                    try:
+                        parts[k] = fut.result()
+                    except Exception:
+                        parts[k] = [""] * (b - a)
+                    done += b - a
+                    if progress:
+                        progress(done, total)
+            return "\n".join(t for part in parts for t in part)
         texts = []
-        for page in reader.pages:
+        for i, page in enumerate(reader.pages, 1):
             try:
                 texts.append(page.extract_text() or "")
             except Exception:
                 texts.append("")
+            if progress and (i % 10 == 0 or i == total):
+                progress(i, total)
         return "\n".join(texts)
     except Exception:
         return ""
@@ -58,44 +186,57 @@ def _read_docx_file(p: Path) -> str:
         return ""
 
 
-def _chunk(text: str, size: int = CHUNK_SIZE) -> List[str]:
-    text = (text or "").strip()
-    if not text:
-        return []
-    return [text[i:i+size] for i in range(0, len(text), size)]
-
-
 def _guess_mime(ext: str) -> str:
     e = ext.lower().lstrip('.')
     return {
         "txt": "text/plain",
+        "log": "text/plain",
         "md": "text/markdown",
         "pdf": "application/pdf",
         "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
     }.get(e, "application/octet-stream")
 
 
-def parse_files(paths: List[str]) -> Dict[str, Any]:
-    results: List[Dict[str, Any]] = []
+def _iter_parse_one(ap: str, opts: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """逐批解析单个文件：每项为 {"file":..., "results":[...], "errors":[...], "final": bool}，
+    results 不超过 chunk_batch 条；最后一项 final=True，带上全部错误（results 为空）。
+    opts 可含 cache_dir / page_workers / progress / chunk_size / chunk_overlap / chunk_unit / chunk_batch。
+    """
+    opts = opts or {}
+    cache_dir = opts.get("cache_dir")
+    batch_size = max(1, int(opts.get("chunk_batch") or CHUNK_BATCH))
     errors: List[str] = []
-    for ap in paths:
-        try:
-            p = Path(ap)
-            if not p.exists() or not p.is_file():
-                errors.append(f"not_found:{ap}")
-                continue
-            ext = p.suffix.lower().lstrip('.')
-            if ext in ("txt", "md"):
-                txt = _read_text_file(p)
-            elif ext == "pdf":
-                txt = _read_pdf_file(p)
-            elif ext == "docx":
-                txt = _read_docx_file(p)
-            else:
-                errors.append(f"unsupported:{ap}")
-                continue
-            chunks = _chunk(txt)
-            for idx, ck in enumerate(chunks):
+    try:
+        p = Path(ap)
+        if not p.exists() or not p.is_file():
+            errors.append(f"not_found:{ap}")
+            yield {"file": ap, "results": [], "errors": errors, "final": True}
+            return
+        ext = p.suffix.lower().lstrip('.')
+        if ext in ("txt", "md", "log"):
+            txt = _read_text_file(p)
+        elif ext == "pdf":
+            progress = _stderr_progress(p.name) if opts.get("progress") else None
+            page_workers = int(opts.get("page_workers") or 0)
+            txt = _cached_extract(p, PDF_EXTRACTOR_VERSION,
+                                  lambda fp: _read_pdf_file(fp, page_workers=page_workers, progress=progress),
+                                  cache_dir)
+        elif ext == "docx":
+            txt = _cached_extract(p, DOCX_EXTRACTOR_VERSION, _read_docx_file, cache_dir)
+        else:
+            errors.append(f"unsupported:{ap}")
+            yield {"file": ap, "results": [], "errors": errors, "final": True}
+            return
+        chunks = iter_chunks(txt, size=int(opts.get("chunk_size") or CHUNK_SIZE),
+                             overlap=int(opts.get("chunk_overlap") or CHUNK_OVERLAP),
+                             unit=opts.get("chunk_unit") or "char")
+        idx = 0
+        while True:
+            batch = list(itertools.islice(chunks, batch_size))
+            if not batch:
+                break
+            results = []
+            for ck in batch:
                 results.append({
                     "text": ck,
                     "metadata": {
@@ -106,18 +247,340 @@ def parse_files(paths: List[str]) -> Dict[str, Any]:
                         "size": len(ck),
                     }
                 })
+                idx += 1
+            yield {"file": ap, "results": results, "errors": [], "final": False}
+    except Exception as e:
+        errors.append(f"error:{ap}:{e}")
+    yield {"file": ap, "results": [], "errors": errors, "final": True}
+
+
+def _parse_one(ap: str, opts: Optional[Dict[str, Any]] = None, spool: Optional[str] = None) -> Dict[str, Any]:
+    """解析单个文件，返回 {"file":..., "results":[...], "errors":[...]}。
+    作为进程池 worker 入口，必须保持为模块级函数（可被 pickle）；opts 见 _iter_parse_one，以参数传入以兼容 spawn 启动的子进程。
+    给定 spool 时分块逐行写入该 NDJSON 文件而不随结果返回（results 为空，附 spool 路径），
+    由主进程按批读回，两端内存都与文件大小无关。
+    """
+    results: List[Dict[str, Any]] = []
+    errors: List[str] = []
+    out = open(spool, "w", encoding="utf-8") if spool else None
+    try:
+        for item in _iter_parse_one(ap, opts):
+            errors.extend(item["errors"])
+            if out is not None:
+                out.writelines(json.dumps(rec, ensure_ascii=False) + "\n" for rec in item["results"])
+            else:
+                results.extend(item["results"])
+    finally:
+        if out is not None:
+            out.close()
+    res: Dict[str, Any] = {"file": ap, "results": results, "errors": errors}
+    if spool:
+        res["spool"] = spool
+    return res
+
+
+def _remove_quietly(path: Optional[str]) -> None:
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _iter_spool(res: Dict[str, Any], batch_size: int) -> Iterator[Dict[str, Any]]:
+    """把 worker 的 spool 文件按批读回为逐批结果项（读完即删除）。"""
+    ap, spool = res["file"], res.get("spool")
+    try:
+        if spool and os.path.exists(spool):
+            with open(spool, "r", encoding="utf-8") as f:
+                while True:
+                    lines = list(itertools.islice(f, batch_size))
+                    if not lines:
+                        break
+                    yield {"file": ap, "results": [json.loads(line) for line in lines], "errors": [], "final": False}
+    finally:
+        _remove_quietly(spool)
+    yield {"file": ap, "results": list(res.get("results") or []), "errors": list(res["errors"]), "final": True}
+
+
+def _kill_pool(ex: concurrent.futures.ProcessPoolExecutor) -> None:
+    """强制终止进程池（用于单文件超时：卡死的 worker 无法被 cancel，只能终止后重建）。"""
+    try:
+        for proc in list((getattr(ex, "_processes", None) or {}).values()):
+            try:
+                proc.terminate()
+            except Exception:
+                pass
+    finally:
+        try:
+            ex.shutdown(wait=False, cancel_futures=True)
+        except Exception:
+            pass
+
+
+def _iter_parse_pool(paths: List[str], workers: int, timeout: Optional[float],
+                     opts: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """进程池解析：在途任务数不超过 workers，保证提交时刻≈开始时刻，从而可按提交时间计算单文件超时。"""
+    pending = list(paths)
+    pending.reverse()
+    batch_size = max(1, int(opts.get("chunk_batch") or CHUNK_BATCH))
+    spool_dir = opts.get("spool_dir") or None
+    ex = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    inflight: Dict[concurrent.futures.Future, tuple] = {}
+    spools: Dict[concurrent.futures.Future, str] = {}
+    try:
+        while pending or inflight:
+            while pending and len(inflight) < workers:
+                ap = pending.pop()
+                fd, spool = tempfile.mkstemp(prefix="ingest-", suffix=".ndjson", dir=spool_dir)
+                os.close(fd)
+                fut = ex.submit(_parse_one, ap, opts, spool)
+                inflight[fut] = (ap, time.monotonic())
+                spools[fut] = spool
+            wait_for = None
+            if timeout:
+                oldest = min(t0 for _, t0 in inflight.values())
+                wait_for = max(0.0, oldest + timeout - time.monotonic())
+            done, _ = concurrent.futures.wait(list(inflight), timeout=wait_for,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in done:
+                ap, _ = inflight.pop(fut)
+                spool = spools.pop(fut, None)
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    # worker 异常退出（如解析库崩溃）时整个池会 broken，下面统一重建
+                    _remove_quietly(spool)
+                    yield {"file": ap, "results": [], "errors": [f"error:{ap}:{e}"], "final": True}
+                    continue
+                yield from _iter_spool(res, batch_size)
+            now = time.monotonic()
+            expired = [f for f, (_, t0) in inflight.items() if timeout and now - t0 >= timeout]
+            broken = any(isinstance(f.exception(), concurrent.futures.process.BrokenProcessPool)
+                         for f in done if not f.cancelled() and f.exception() is not None)
+            if expired or broken:
+                for fut in expired:
+                    ap, _ = inflight.pop(fut)
+                    _remove_quietly(spools.pop(fut, None))
+                    yield {"file": ap, "results": [], "errors": [f"timeout:{ap}"], "final": True}
+                # 其余在途文件随池一起终止，放回队列重新解析
+                for ap, _ in inflight.values():
+                    pending.append(ap)
+                for spool in spools.values():
+                    _remove_quietly(spool)
+                inflight.clear()
+                spools.clear()
+                _kill_pool(ex)
+                ex = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    finally:
+        if inflight:
+            _kill_pool(ex)
+        else:
+            ex.shutdown(wait=True)
+        for spool in spools.values():
+            _remove_quietly(spool)
+
+
+def _iter_parse_raw(paths: List[str], workers: int, timeout: Optional[float],
+                    opts: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    if workers and workers > 0 and len(paths) > 0:
+        # 文件级已并行，关闭页段并行以免进程数叠加超额
+        opts["page_workers"] = 0
+        yield from _iter_parse_pool(paths, min(int(workers), len(paths)), timeout, opts)
+        return
+    for ap in paths:
+        yield from _iter_parse_one(ap, opts)
+
+
+def _chunk_params(opts: Dict[str, Any]) -> str:
+    return (f"size={int(opts.get('chunk_size') or CHUNK_SIZE)};"
+            f"overlap={int(opts.get('chunk_overlap') or CHUNK_OVERLAP)};"
+            f"unit={opts.get('chunk_unit') or 'char'}")
+
+
+def _apply_manifest(items: Iterator[Dict[str, Any]], manifest: IngestManifest, collection: str,
+                    params: str) -> Iterator[Dict[str, Any]]:
+    """按清单逐批只保留新增分块（metadata 附稳定 chunk_id）；文件的最后一项附需删除的旧分块 id。
+    解析成功但没有分块（文件变空或无法抽取文本）时同样计划，旧分块全部进入 delete_ids。
+    计划只暂存不提交（final 项的 plan），消费方写入向量库成功后再 commit/confirm。
+    """
+    session = None
+    failed = False
+    for item in items:
+        ap = item["file"]
+        try:
+            if item["results"] and not failed:
+                if session is None:
+                    session = manifest.begin(collection, ap)
+                base = len(session.plan.chunk_ids)
+                added = session.feed(r["text"] for r in item["results"])
+                keep = set(added.add_indexes)
+                for i, rec in enumerate(item["results"]):
+                    rec["metadata"]["chunk_id"] = session.plan.chunk_ids[base + i]
+                item["results"] = [rec for i, rec in enumerate(item["results"]) if base + i in keep]
+            if item.get("final") and not failed and not item["errors"]:
+                if session is None:
+                    session = manifest.begin(collection, ap)
+                plan = session.finish()
+                item["delete_ids"] = plan.delete_ids
+                item["plan"] = plan
+                manifest.stage(collection, ap, plan, params)
         except Exception as e:
-            errors.append(f"error:{ap}:{e}")
-    return {"results": results, "errors": errors}
+            # 本文件余下批次不再规划，也不暂存计划
+            failed = True
+            item["errors"].append(f"manifest_error:{ap}:{e}")
+            item["results"] = []
+        if item.get("final"):
+            session, failed = None, False
+        yield item
+
+
+def iter_parse_files(paths: List[str], workers: int = 0, timeout: Optional[float] = None,
+                     opts: Optional[Dict[str, Any]] = None, manifest: Optional[IngestManifest] = None,
+                     collection: str = "") -> Iterator[Dict[str, Any]]:
+    """逐批产出解析结果：每个文件产出若干批 {"file", "results", "errors", "final": False}，
+    最后一项 final=True（含该文件的全部错误）；同一文件的各批连续产出。
+    - workers<=0：当前进程串行解析，按输入顺序产出，timeout 不生效；
+    - workers>0：进程池并行解析，按完成顺序产出，单文件超过 timeout 秒记为 timeout:<path>；
+      worker 把分块写入临时 spool 文件，主进程按批读回。
+    - 给定 manifest 时按 collection 增量：未变化文件不解析（产出 unchanged=True），
+      变化文件只产出新增分块，final 项附 delete_ids 与 plan；清单不会自动提交，
+      调用方应用增删成功后调用 manifest.commit(collection, file, plan, params)（或 confirm）。
+    opts 见 _iter_parse_one；未指定 cache_dir 时使用 DEFAULT_CACHE_DIR。
+    """
+    opts = dict(opts or {})
+    opts.setdefault("cache_dir", os.getenv("DOC_INGEST_CACHE_DIR") or str(DEFAULT_CACHE_DIR))
+    if manifest is None:
+        yield from _iter_parse_raw(paths, workers, timeout, opts)
+        return
+    params = _chunk_params(opts)
+    todo: List[str] = []
+    for ap in paths:
+        try:
+            if manifest.is_unchanged(collection, ap, params):
+                yield {"file": ap, "results": [], "errors": [], "unchanged": True, "final": True}
+                continue
+        except Exception:
+            pass
+        todo.append(ap)
+    yield from _apply_manifest(_iter_parse_raw(todo, workers, timeout, opts), manifest, collection, params)
+
+
+def parse_files(paths: List[str], workers: int = 0, timeout: Optional[float] = None,
+                opts: Optional[Dict[str, Any]] = None, manifest: Optional[IngestManifest] = None,
+                collection: str = "") -> Dict[str, Any]:
+    results: List[Dict[str, Any]] = []
+    errors: List[str] = []
+    delete_ids: List[str] = []
+    unchanged: List[str] = []
+    pending: List[str] = []
+    for item in iter_parse_files(paths, workers=workers, timeout=timeout, opts=opts,
+                                 manifest=manifest, collection=collection):
+        results.extend(item["results"])
+        if not item.get("final"):
+            continue
+        errors.extend(item["errors"])
+        delete_ids.extend(item.get("delete_ids") or [])
+        if item.get("unchanged"):
+            unchanged.append(item["file"])
+        if item.get("plan") is not None:
+            pending.append(item["file"])
+    out: Dict[str, Any] = {"results": results, "errors": errors}
+    if manifest is not None:
+        out["delete_ids"] = delete_ids
+        out["unchanged"] = unchanged
+        out["pending"] = pending
+    return out
+
+
+def write_ndjson(paths: List[str], out=None, workers: int = 0, timeout: Optional[float] = None,
+                 opts: Optional[Dict[str, Any]] = None, manifest: Optional[IngestManifest] = None,
+                 collection: str = "") -> Dict[str, int]:
+    """以 NDJSON 流式输出解析结果：每批分段产出后立即写出并 flush，文件结束时写出其错误。
+    增量模式下额外输出 {"unchanged": path} 与 {"file": path, "delete_ids": [...], "pending": true}。
+    """
+    out = out or sys.stdout
+    stats = {"files": 0, "chunks": 0, "errors": 0, "unchanged": 0}
+    for item in iter_parse_files(paths, workers=workers, timeout=timeout, opts=opts,
+                                 manifest=manifest, collection=collection):
+        for rec in item["results"]:
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            stats["chunks"] += 1
+        if not item.get("final"):
+            out.flush()
+            continue
+        stats["files"] += 1
+        if item.get("unchanged"):
+            stats["unchanged"] += 1
+            out.write(json.dumps({"unchanged": item["file"]}, ensure_ascii=False) + "\n")
+        if item.get("plan") is not None:
+            out.write(json.dumps({"file": item["file"], "delete_ids": item["delete_ids"], "pending": True},
+                                 ensure_ascii=False) + "\n")
+        for err in item["errors"]:
+            out.write(json.dumps({"error": err}, ensure_ascii=False) + "\n")
+            stats["errors"] += 1
+        out.flush()
+    out.write(json.dumps({"done": True, **stats}, ensure_ascii=False) + "\n")
+    out.flush()
+    return stats
 
 
 def main():
     ap = argparse.ArgumentParser(description="文档解析占位（直调版本，后续替换为 MCP 协议）")
-    ap.add_argument("--files", required=True, help="以分号分隔的文件路径列表")
+    ap.add_argument("--files", default="", help="以分号分隔的文件路径列表")
+    ap.add_argument("--workers", type=int, default=0, help="解析进程数（0=串行；-1=CPU 核数）")
+    ap.add_argument("--timeout", type=float, default=None, help="单文件解析超时秒数（仅进程池模式）")
+    ap.add_argument("--ndjson", action="store_true", help="逐文件流式输出 NDJSON")
+    ap.add_argument("--pdf-page-workers", type=int, default=0, help="大 PDF 页段并行进程数（0=不并行；-1=CPU 核数）")
+    ap.add_argument("--progress", action="store_true", help="向 stderr 输出 PDF 页级进度")
+    ap.add_argument("--cache-dir", default=None, help="抽取文本缓存目录（默认 data/cache/doc_text）")
+    ap.add_argument("--no-cache", action="store_true", help="关闭抽取文本缓存")
+    ap.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="分块预算（字符或 token）")
+    ap.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP, help="相邻分块重叠预算")
+    ap.add_argument("--chunk-unit", choices=["char", "token"], default="char", help="分块预算单位")
+    ap.add_argument("--chunk-batch", type=int, default=CHUNK_BATCH, help="每批产出/规划的分块数")
+    ap.add_argument("--manifest", default=None, help="增量清单 SQLite 路径（需配合 --collection）")
+    ap.add_argument("--collection", default="", help="增量清单中的集合名")
+    ap.add_argument("--confirm", default=None, help="以分号分隔的文件列表：消费方已写入，提交其暂存计划")
     args = ap.parse_args()
+    if args.confirm is not None:
+        if not (args.manifest and args.collection):
+            ap.error("--confirm 需要 --manifest 与 --collection")
+        manifest = IngestManifest(args.manifest)
+        try:
+            done = [s for s in str(args.confirm).split(';') if s.strip() and manifest.confirm(args.collection, s)]
+        finally:
+            manifest.close()
+        print(json.dumps({"confirmed": done}, ensure_ascii=False))
+        return
+    if not str(args.files).strip():
+        ap.error("需要 --files")
     files = [s for s in str(args.files).split(';') if s.strip()]
-    out = parse_files(files)
-    print(json.dumps(out, ensure_ascii=False))
+    workers = (os.cpu_count() or 1) if args.workers < 0 else args.workers
+    opts: Dict[str, Any] = {
+        "page_workers": (os.cpu_count() or 1) if args.pdf_page_workers < 0 else args.pdf_page_workers,
+        "progress": bool(args.progress),
+        "chunk_size": args.chunk_size,
+        "chunk_overlap": args.chunk_overlap,
+        "chunk_unit": args.chunk_unit,
+        "chunk_batch": args.chunk_batch,
+    }
+    if args.no_cache:
+        opts["cache_dir"] = None
+    elif args.cache_dir:
+        opts["cache_dir"] = args.cache_dir
+    manifest = IngestManifest(args.manifest) if (args.manifest and args.collection) else None
+    try:
+        if args.ndjson:
+            write_ndjson(files, workers=workers, timeout=args.timeout, opts=opts,
+                         manifest=manifest, collection=args.collection)
+            return
+        out = parse_files(files, workers=workers, timeout=args.timeout, opts=opts,
+                          manifest=manifest, collection=args.collection)
+        print(json.dumps(out, ensure_ascii=False))
+    finally:
+        if manifest is not None:
+            manifest.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,275 @@
+"""
+表的物化聚合（增量维护）
+
+在 schema metadata.aggregates 中声明：
+    "aggregates": {"measures": ["amount", "qty"], "group_by": ["status"]}
+
+- measures：数值字段，维护 非空数值个数 / 和 / 离差平方和（m2）/ 最小值 / 最大值
+- group_by：分组字段，维护每个分组值的记录数，以及组内各 measure 的 个数 / 和 / 离差平方和
+- 方差由 m2 得出（Welford）：计入/移出一条或合并一批都按 Chan 的合并公式更新 m2，
+  移出即以 -1 条合并；不做 平方和 - 和²/n，均值远大于离散度时也不会因相减抵消而失准
+- 聚合表与记录在同一个 SQLite 库中，随增删改在同一事务内更新，读取为 O(分组数)
+- 删除或改掉当前最小/最大值时无法增量得出新极值，此时标记失效，下次读取前全量重算（精确回退）
+- check 对比存储值与全量重算结果，用于一致性校验；recompute 全量重建
+
+数值的判定与 pandas 分析一致：int/float（不含 bool），NaN 视为空；分组值为空或非标量的记录不计入分组，
+整数值的浮点分组值与整数同组（1 与 1.0 为同一分组）。
+"""
+import json
+import math
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_TABLES = ("agg_fields", "agg_groups", "agg_group_fields")
+
+_DDL = (
+    "CREATE TABLE IF NOT EXISTS agg_fields ("
+    " field TEXT PRIMARY KEY, n INTEGER NOT NULL, total REAL NOT NULL, m2 REAL NOT NULL,"
+    " min REAL, max REAL)",
+    "CREATE TABLE IF NOT EXISTS agg_groups ("
+    " field TEXT NOT NULL, value TEXT NOT NULL, n INTEGER NOT NULL, PRIMARY KEY (field, value))",
+    "CREATE TABLE IF NOT EXISTS agg_group_fields ("
+    " field TEXT NOT NULL, value TEXT NOT NULL, measure TEXT NOT NULL,"
+    " n INTEGER NOT NULL, total REAL NOT NULL, m2 REAL NOT NULL,"
+    " PRIMARY KEY (field, value, measure))",
+)
+
+# 已有 (n, total, m2) 与 excluded 中的一批 (n, total, m2) 合并（Chan）；excluded.n 为负即移出。
+# SQLite 的 SET 表达式读取的都是更新前的值
+_MERGE = (" n = n + excluded.n, total = total + excluded.total,"
+          " m2 = CASE WHEN n + excluded.n > 0 THEN m2 + excluded.m2"
+          " + (excluded.total / excluded.n - total / n) * (excluded.total / excluded.n - total / n)"
+          " * n * excluded.n / (n + excluded.n) ELSE 0.0 END")
+
+
+def parse_spec(schema: Optional[Dict[str, Any]]) -> Optional[Dict[str, List[str]]]:
+    """从 schema 读取聚合声明；未声明返回 None。"""
+    spec = ((schema or {}).get("metadata") or {}).get("aggregates")
+    if not isinstance(spec, dict):
+        return None
+    measures = [f for f in spec.get("measures") or [] if isinstance(f, str) and f]
+    group_by = [f for f in spec.get("group_by") or [] if isinstance(f, str) and f]
+    if not measures and not group_by:
+        return None
+    return {"measures": measures, "group_by": group_by}
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def _group_key(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, (list, dict)) or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, float) and value.is_integer() and abs(value) < 2 ** 53:
+        value = int(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _merge(acc: List[float], n: int, total: float, m2: float) -> None:
+    """把一批 (n, total, m2) 合并进 acc[0:3]（与 _MERGE 相同的公式）。"""
+    an, atotal = acc[0], acc[1]
+    if an + n <= 0:
+        acc[0], acc[1], acc[2] = 0, 0.0, 0.0
+        return
+    if an:
+        delta = total / n - atotal / an
+        acc[2] += m2 + delta * delta * an * n / (an + n)
+    else:
+        acc[2] = m2
+    acc[0] = an + n
+    acc[1] = atotal + total
+
+
+def _order_key(field: str, key: str) -> Tuple:
+    """分组按值排序（数值在前按大小，其余按字符串），与 pandas groupby 的排序结果一致。"""
+    value = json.loads(key)
+    if isinstance(value, (int, float)):
+        return field, 0, float(value), ""
+    return field, 1, 0.0, str(value)
+
+
+def _stats(n: int, total: float, m2: float) -> Dict[str, Optional[float]]:
+    """count / sum / mean / std（样本标准差，与 pandas 一致）。"""
+    mean = total / n if n else None
+    std = None
+    if n > 1:
+        var = m2 / (n - 1)
+        std = math.sqrt(var) if var > 0 else 0.0
+    return {"count": n, "sum": total, "mean": mean, "std": std}
+
+
+class TableAggregates:
+    """聚合维护器。所有 *_locked 方法须在调用方的锁与事务内执行。"""
+
+    def __init__(self, spec: Dict[str, List[str]]) -> None:
+        self.spec = spec
+        self.measures = list(spec.get("measures") or [])
+        self.group_by = list(spec.get("group_by") or [])
+
+    @staticmethod
+    def create_tables(conn: sqlite3.Connection) -> bool:
+        """建表；旧版（存平方和、分组键未归一）的聚合表先删除重建。返回是否需要全量重算。"""
+        columns = [r[1] for r in conn.execute("PRAGMA table_info(agg_fields)")]
+        legacy = "total_sq" in columns
+        if legacy:
+            for table in _TABLES:
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+        for ddl in _DDL:
+            conn.execute(ddl)
+        return legacy
+
+    # —— 增量 ——
+    def apply_locked(self, conn: sqlite3.Connection, record: Dict[str, Any], sign: int) -> bool:
+        """把一条记录计入（sign=1）或移出（sign=-1）聚合；返回极值是否因此失效。"""
+        stale = False
+        values = {m: _number(record.get(m)) for m in self.measures}
+        for m, v in values.items():
+            if v is None:
+                continue
+            if sign < 0:
+                row = conn.execute("SELECT min, max FROM agg_fields WHERE field=?", (m,)).fetchone()
+                if row is None or v <= row[0] or v >= row[1]:
+                    stale = True
+            # 移出时 min/max 的合并结果不变（已按需标记失效）
+            conn.execute(
+                "INSERT INTO agg_fields(field, n, total, m2, min, max) VALUES (?, ?, ?, 0.0, ?, ?)"
+                " ON CONFLICT(field) DO UPDATE SET" + _MERGE + ","
+                " min = CASE WHEN excluded.n < 0 THEN min WHEN min IS NULL OR excluded.min < min THEN excluded.min ELSE min END,"
+                " max = CASE WHEN excluded.n < 0 THEN max WHEN max IS NULL OR excluded.max > max THEN excluded.max ELSE max END",
+                (m, sign, sign * v, v, v))
+        for g in self.group_by:
+            key = _group_key(record.get(g))
+            if key is None:
+                continue
+            conn.execute(
+                "INSERT INTO agg_groups(field, value, n) VALUES (?, ?, ?)"
+                " ON CONFLICT(field, value) DO UPDATE SET n = n + excluded.n", (g, key, sign))
+            for m, v in values.items():
+                if v is None:
+                    continue
+                conn.execute(
+                    "INSERT INTO agg_group_fields(field, value, measure, n, total, m2) VALUES (?, ?, ?, ?, ?, 0.0)"
+                    " ON CONFLICT(field, value, measure) DO UPDATE SET" + _MERGE,
+                    (g, key, m, sign, sign * v))
+        if sign < 0:
+            conn.execute("DELETE FROM agg_groups WHERE n <= 0")
+            conn.execute("DELETE FROM agg_group_fields WHERE n <= 0")
+            conn.execute("DELETE FROM agg_fields WHERE n <= 0")
+        return stale
+
+    def add_many_locked(self, conn: sqlite3.Connection, records: Iterable[Dict[str, Any]]) -> None:
+        """批量计入一批新记录：先在内存中汇总，再按键合并（只增不减，极值不会失效）。"""
+        fields, groups, group_fields = self.compute(records)
+        conn.executemany(
+            "INSERT INTO agg_fields(field, n, total, m2, min, max) VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(field) DO UPDATE SET" + _MERGE + ","
+            " min = CASE WHEN min IS NULL OR excluded.min < min THEN excluded.min ELSE min END,"
+            " max = CASE WHEN max IS NULL OR excluded.max > max THEN excluded.max ELSE max END",
+            [(m, *acc) for m, acc in fields.items()])
+        conn.executemany(
+            "INSERT INTO agg_groups(field, value, n) VALUES (?, ?, ?)"
+            " ON CONFLICT(field, value) DO UPDATE SET n = n + excluded.n",
+            [(g, k, n) for (g, k), n in groups.items()])
+        conn.executemany(
+            "INSERT INTO agg_group_fields(field, value, measure, n, total, m2) VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(field, value, measure) DO UPDATE SET" + _MERGE,
+            [(g, k, m, *acc) for (g, k, m), acc in group_fields.items()])
+
+    # —— 全量 ——
+    def compute(self, records: Iterable[Dict[str, Any]]) -> Tuple[Dict, Dict, Dict]:
+        """全量计算 (fields, groups, group_fields)，键与存储表一致。"""
+        fields: Dict[str, List[float]] = {}
+        groups: Dict[Tuple[str, str], int] = {}
+        group_fields: Dict[Tuple[str, str, str], List[float]] = {}
+        for record in records:
+            values = {m: _number(record.get(m)) for m in self.measures}
+            for m, v in values.items():
+                if v is None:
+                    continue
+                acc = fields.get(m)
+                if acc is None:
+                    fields[m] = [1, v, 0.0, v, v]
+                else:
+                    _merge(acc, 1, v, 0.0)
+                    acc[3] = min(acc[3], v)
+                    acc[4] = max(acc[4], v)
+            for g in self.group_by:
+                key = _group_key(record.get(g))
+                if key is None:
+                    continue
+                groups[(g, key)] = groups.get((g, key), 0) + 1
+                for m, v in values.items():
+                    if v is None:
+                        continue
+                    _merge(group_fields.setdefault((g, key, m), [0, 0.0, 0.0]), 1, v, 0.0)
+        return fields, groups, group_fields
+
+    def recompute_locked(self, conn: sqlite3.Connection, records: Iterable[Dict[str, Any]]) -> None:
+        fields, groups, group_fields = self.compute(records)
+        conn.execute("DELETE FROM agg_fields")
+        conn.execute("DELETE FROM agg_groups")
+        conn.execute("DELETE FROM agg_group_fields")
+        conn.executemany("INSERT INTO agg_fields(field, n, total, m2, min, max) VALUES (?,?,?,?,?,?)",
+                         [(m, *acc) for m, acc in fields.items()])
+        conn.executemany("INSERT INTO agg_groups(field, value, n) VALUES (?,?,?)",
+                         [(g, k, n) for (g, k), n in groups.items()])
+        conn.executemany(
+            "INSERT INTO agg_group_fields(field, value, measure, n, total, m2) VALUES (?,?,?,?,?,?)",
+            [(g, k, m, *acc) for (g, k, m), acc in group_fields.items()])
+
+    # —— 读取 ——
+    def read_locked(self, conn: sqlite3.Connection) -> Tuple[Dict, Dict, Dict]:
+        fields = {r[0]: list(r[1:]) for r in conn.execute(
+            "SELECT field, n, total, m2, min, max FROM agg_fields")}
+        groups = {(r[0], r[1]): r[2] for r in conn.execute("SELECT field, value, n FROM agg_groups")}
+        group_fields = {(r[0], r[1], r[2]): list(r[3:]) for r in conn.execute(
+            "SELECT field, value, measure, n, total, m2 FROM agg_group_fields")}
+        return fields, groups, group_fields
+
+    def format(self, raw: Tuple[Dict, Dict, Dict], record_count: int) -> Dict[str, Any]:
+        """整理为 {"record_count", "fields": {...}, "groups": {字段: {分组值: {...}}}}。"""
+        fields, groups, group_fields = raw
+        out_fields: Dict[str, Any] = {}
+        for m in self.measures:
+            n, total, m2, vmin, vmax = fields.get(m) or [0, 0.0, 0.0, None, None]
+            stats = _stats(int(n), float(total), float(m2))
+            stats.update({"min": vmin, "max": vmax, "null_count": record_count - int(n)})
+            out_fields[m] = stats
+        out_groups: Dict[str, Dict[str, Any]] = {g: {} for g in self.group_by}
+        for (g, key), n in sorted(groups.items(), key=lambda kv: _order_key(kv[0][0], kv[0][1])):
+            if g not in out_groups:
+                continue
+            measures = {}
+            for m in self.measures:
+                gn, total, m2 = group_fields.get((g, key, m)) or [0, 0.0, 0.0]
+                measures[m] = _stats(int(gn), float(total), float(m2))
+            out_groups[g][str(json.loads(key))] = {"count": n, "measures": measures}
+        return {"record_count": record_count, "measures": self.measures, "group_by": self.group_by,
+                "fields": out_fields, "groups": out_groups}
+
+    def diff(self, stored: Tuple[Dict, Dict, Dict], exact: Tuple[Dict, Dict, Dict],
+             tolerance: float = 1e-6) -> List[str]:
+        """对比两份聚合，返回不一致项的描述。"""
+        problems: List[str] = []
+        names = ("fields", "groups", "group_fields")
+        for name, a, b in zip(names, stored, exact):
+            for key in set(a) | set(b):
+                va, vb = a.get(key), b.get(key)
+                if va is None or vb is None:
+                    problems.append(f"{name}{key}: {va} != {vb}")
+                    continue
+                la = va if isinstance(va, list) else [va]
+                lb = vb if isinstance(vb, list) else [vb]
+                for x, y in zip(la, lb):
+                    if x is None or y is None:
+                        if x is not y:
+                            problems.append(f"{name}{key}: {va} != {vb}")
+                            break
+                    elif abs(float(x) - float(y)) > tolerance * max(1.0, abs(float(y))):
+                        problems.append(f"{name}{key}: {va} != {vb}")
+                        break
+        return problems
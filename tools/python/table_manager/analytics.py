@@ -4,24 +4,88 @@
 from typing import Dict, List, Any, Optional, Union
 import os
 import json
+import threading
 import pandas as pd
 from autogen_ext.tools import PythonToolProvider
+from .record_store import RecordStore, db_path_for
+from .schema_manager import SchemaManager
+from .snapshot_cache import DEFAULT_BUDGET_MB, FrameSnapshot, SnapshotCache, schema_dtypes
+from . import time_series
 
 class TableAnalytics(PythonToolProvider):
     """表数据分析工具"""
     
-    def __init__(self, data_dir: str):
+    def __init__(self, data_dir: str, schema_dir: Optional[str] = None,
+                 cache_mb: float = DEFAULT_BUDGET_MB, snapshot_dir: Optional[str] = None):
         """初始化分析工具
         
         Args:
             data_dir: 表数据存储目录
+            schema_dir: 表结构定义目录，用于推断列类型（可选）
+            cache_mb: 快照缓存内存预算（MB）
+            snapshot_dir: 快照列文件目录，默认 <data_dir>/.snapshots（需要 pyarrow）
         """
         self.data_dir = data_dir
         os.makedirs(data_dir, exist_ok=True)
+        self.schema_manager = SchemaManager(schema_dir) if schema_dir else None
+        self.snapshots = SnapshotCache(cache_mb, snapshot_dir or os.path.join(data_dir, ".snapshots"))
+        self._stores: Dict[str, RecordStore] = {}
+        self._stores_lock = threading.Lock()
         super().__init__()
     
+    def _get_store(self, table_name: str) -> Optional[RecordStore]:
+        """已迁移到记录存储的表返回其存储（按表缓存连接），否则返回None
+        
+        只读打开：不做 for_table 的 JSON 重新导入，库的写入只由表格管理工具负责
+        """
+        with self._stores_lock:
+            store = self._stores.get(table_name)
+            if store is None:
+                db_path = db_path_for(self.data_dir, table_name)
+                if not os.path.exists(db_path):
+                    return None
+                store = RecordStore(db_path)
+                self._stores[table_name] = store
+            return store
+    
+    def _read_json_records(self, table_name: str) -> List[Dict[str, Any]]:
+        data_path = os.path.join(self.data_dir, f"{table_name}.json")
+        with open(data_path, 'r', encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except:
+                return []
+        return data if isinstance(data, list) else []
+    
+    def _load_snapshot(self, table_name: str) -> Optional[FrameSnapshot]:
+        """取表数据快照，数据未变化时复用缓存
+        
+        Args:
+            table_name: 表名
+            
+        Returns:
+            表数据快照，表不存在时返回None
+        """
+        schema = self.schema_manager.get_schema(table_name) if self.schema_manager else None
+        dtypes = schema_dtypes(schema)
+        try:
+            # 已迁移到记录存储的表以库为准（JSON 可能是旧的导出）
+            store = self._get_store(table_name)
+            if store is not None:
+                signature = ("db", os.stat(store.db_path).st_ino, store.version)
+                return self.snapshots.get(table_name, signature, store.records, dtypes)
+            
+            data_path = os.path.join(self.data_dir, f"{table_name}.json")
+            if not os.path.exists(data_path):
+                return None
+            st = os.stat(data_path)
+            signature = ("json", st.st_mtime_ns, st.st_size)
+            return self.snapshots.get(table_name, signature, lambda: self._read_json_records(table_name), dtypes)
+        except Exception:
+            return None
+    
     def _load_table_data(self, table_name: str) -> pd.DataFrame:
-        """加载表数据到DataFrame
+        """加载表数据到DataFrame（缓存快照，只读）
         
         Args:
             table_name: 表名
@@ -29,16 +93,80 @@ class TableAnalytics(PythonToolProvider):
         Returns:
             包含表数据的DataFrame
         """
-        data_path = os.path.join(self.data_dir, f"{table_name}.json")
-        if not os.path.exists(data_path):
-            return pd.DataFrame()
+        snap = self._load_snapshot(table_name)
+        return snap.frame if snap is not None else pd.DataFrame()
+    
+    def get_table_aggregates(self, table_name: str, verify: bool = False) -> Dict[str, Any]:
+        """获取表的物化聚合（schema metadata.aggregates 声明的计数/求和/均值/标准差/极值与分组计数）
+        
+        Args:
+            table_name: 表名
+            verify: 是否与全量重算结果做一致性校验，不一致时以重算结果修正
             
-        with open(data_path, 'r', encoding='utf-8') as f:
-            try:
-                data = json.load(f)
-                return pd.DataFrame(data)
-            except:
-                return pd.DataFrame()
+        Returns:
+            聚合结果
+        """
+        try:
+            store = self._get_store(table_name)
+        except Exception:
+            store = None
+        if store is None or not store.has_aggregates:
+            return {
+                "error": f"表 '{table_name}' 未声明物化聚合"
+            }
+            
+        try:
+            problems: List[str] = []
+            if verify:
+                problems = store.check_aggregates()
+                if problems:
+                    store.recompute_aggregates()
+            result = store.aggregates() or {}
+            result["table_name"] = table_name
+            if verify:
+                result["consistent"] = not problems
+                result["inconsistencies"] = problems[:20]
+            return result
+        except Exception as e:
+            return {
+                "error": f"读取物化聚合错误: {str(e)}"
+            }
+    
+    def _materialized_group_statistics(self, table_name: str, group_by: str,
+                                       measure_columns: Optional[List[str]],
+                                       aggregations: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+        """分组统计可由物化聚合回答时返回结果（格式与 get_group_statistics 一致），否则返回None"""
+        aggregations = aggregations or ['count', 'mean', 'sum']
+        if not measure_columns or not set(aggregations) <= {'count', 'mean', 'sum', 'std'}:
+            return None
+        try:
+            store = self._get_store(table_name)
+            aggs = store.aggregates() if store is not None else None
+        except Exception:
+            return None
+        if not aggs or group_by not in aggs["group_by"] or not set(measure_columns) <= set(aggs["measures"]):
+            return None
+            
+        groups = aggs["groups"].get(group_by) or {}
+        if not groups and aggs["record_count"]:
+            # 有记录却没有分组结果（物化表尚未就绪等），以表数据为准
+            return None
+        result_dict = {}
+        for group_key, group in groups.items():
+            result_dict[group_key] = {}
+            for measure in measure_columns:
+                stats = group["measures"].get(measure) or {}
+                result_dict[group_key][measure] = {
+                    agg: (float(stats[agg]) if stats.get(agg) is not None else None) for agg in aggregations
+                }
+                
+        return {
+            "table_name": table_name,
+            "group_by": group_by,
+            "measures": list(measure_columns),
+            "aggregations": aggregations,
+            "results": result_dict
+        }
     
     def get_summary_statistics(self, table_name: str) -> Dict[str, Any]:
         """获取表数据统计摘要
@@ -112,6 +240,11 @@ class TableAnalytics(PythonToolProvider):
         Returns:
             分组统计结果
         """
+        # 命中物化聚合时直接读取，不加载表数据
+        materialized = self._materialized_group_statistics(table_name, group_by, measure_columns, aggregations)
+        if materialized is not None:
+            return materialized
+        
         df = self._load_table_data(table_name)
         
         if df.empty:
@@ -231,19 +364,36 @@ class TableAnalytics(PythonToolProvider):
     def get_time_series_analysis(self, table_name: str, 
                                date_column: str,
                                value_column: str,
-                               frequency: str = 'M') -> Dict[str, Any]:
-        """获取时间序列分析
+                               frequency: Optional[str] = 'M',
+                               closed: Optional[str] = None,
+                               label: Optional[str] = None,
+                               stats: Optional[List[str]] = None,
+                               fill: Optional[str] = None,
+                               rolling_window: Optional[Union[int, str]] = None,
+                               rolling_stat: str = 'mean',
+                               max_points: int = 500,
+                               digits: int = 6) -> Dict[str, Any]:
+        """获取时间序列分析（列式输出，点数不超过预算）
         
         Args:
             table_name: 表名
             date_column: 日期列名
             value_column: 值列名
-            frequency: 重采样频率，默认为月(M)
+            frequency: 重采样频率，默认为月(M)；为空时不重采样，直接使用原始点
+            closed: 周期区间闭合的一侧，left或right
+            label: 周期标签取区间的哪一端，left或right
+            stats: 每个周期的统计量，默认 mean/sum/count/min/max
+            fill: 空周期的填充方式：zero、ffill或interpolate，默认不填充
+            rolling_window: 滚动窗口（周期数或时间跨度如"7D"），在主序列上计算
+            rolling_stat: 滚动窗口统计量，默认mean
+            max_points: 输出点数上限，超出时用LTTB降采样
+            digits: 数值保留的有效位数
             
         Returns:
-            时间序列分析结果
+            时间序列分析结果，time_series_data 为 {"index": [...], 统计量: [...]} 列式数据
         """
-        df = self._load_table_data(table_name)
+        snap = self._load_snapshot(table_name)
+        df = snap.frame if snap is not None else pd.DataFrame()
         
         if df.empty:
             return {
@@ -259,44 +409,61 @@ class TableAnalytics(PythonToolProvider):
             return {
                 "error": f"值列 '{value_column}' 不存在"
             }
+        
+        stats = list(stats or ["mean", "sum", "count", "min", "max"])
+        invalid = [s for s in stats if s not in time_series.STATS]
+        if invalid:
+            return {"error": f"不支持的统计量: {', '.join(invalid)}"}
+        if closed not in (None, "left", "right") or label not in (None, "left", "right"):
+            return {"error": "closed 和 label 只能为 left 或 right"}
+        if fill and fill not in time_series.FILL_METHODS:
+            return {"error": f"不支持的填充方式: {fill}"}
             
         try:
-            # 转换日期列
-            df[date_column] = pd.to_datetime(df[date_column], errors='coerce')
-            df = df.dropna(subset=[date_column])
-            
-            # 确保值列是数值型
-            if not pd.api.types.is_numeric_dtype(df[value_column]):
-                try:
-                    df[value_column] = pd.to_numeric(df[value_column], errors='coerce')
-                except:
-                    return {
-                        "error": f"值列 '{value_column}' 不能转换为数值类型"
-                    }
+            # 日期与数值转换结果随快照缓存，快照本身不修改
+            dates = snap.datetime(date_column)
+            try:
+                values = snap.numeric(value_column)
+            except:
+                return {
+                    "error": f"值列 '{value_column}' 不能转换为数值类型"
+                }
+            valid = dates.notna()
+            series = pd.Series(values[valid].to_numpy(), index=pd.DatetimeIndex(dates[valid])).sort_index()
             
-            # 设置日期索引
-            df_ts = df.set_index(date_column)
+            gaps = 0
+            if frequency:
+                # 按指定频率重采样，每个统计量一列
+                frame = time_series.resample(series, frequency, stats, closed, label)
+                gaps = int((frame["count"] == 0).sum())
+                frame = time_series.fill_gaps(frame, fill)
+                if "count" not in stats:
+                    frame = frame.drop(columns="count")
+                primary = next((s for s in stats if s != "count"), stats[0])
+            else:
+                frame = series.to_frame("value")
+                primary = "value"
             
-            # 按指定频率重采样并计算统计值
-            resampled = df_ts[value_column].resample(frequency)
-            result_dict = {
-                "mean": resampled.mean().to_dict(),
-                "sum": resampled.sum().to_dict(),
-                "count": resampled.count().to_dict(),
-                "min": resampled.min().to_dict(),
-                "max": resampled.max().to_dict()
-            }
+            if rolling_window:
+                frame[f"rolling_{rolling_stat}"] = time_series.rolling(frame, primary, rolling_window, rolling_stat)
             
-            # 确保键是字符串
-            for stat, data in result_dict.items():
-                result_dict[stat] = {str(k): float(v) if not pd.isna(v) else None for k, v in data.items()}
+            # 超出点数预算时按主序列形状降采样，所有列取同一组点
+            total_points = len(frame)
+            frame = time_series.downsample(frame, primary, int(max_points))
             
             return {
                 "table_name": table_name,
                 "date_column": date_column,
                 "value_column": value_column,
-                "frequency": frequency,
-                "time_series_data": result_dict
+                "frequency": time_series.normalize_rule(frequency) if frequency else None,
+                "closed": closed,
+                "label": label,
+                "fill": fill,
+                "total_points": total_points,
+                "points": len(frame),
+                "downsampled": len(frame) < total_points,
+                "gaps": gaps,
+                "time_series_data": time_series.to_columnar(frame, digits)
             }
         except Exception as e:
             return {
@@ -0,0 +1,365 @@
+"""
+表数据批量导入/导出的流式读写（csv / jsonl / parquet / json）
+
+- 读取按批产出 (行号, 记录, 错误)：解析失败的行带错误信息，由调用方计入拒绝行
+- CSV 单元格按 schema 类型转换：integer/number/boolean 转为对应值，array/object 按 JSON 解析，
+  空单元格视为缺失；转换失败保留原字符串，交由 schema 校验报告
+- Parquet 需要 pyarrow，按批读取；空值视为缺失，数组/对象列的 JSON 文本解析回原值
+- 写出从记录迭代器逐批写入临时文件后 os.replace，内存占用与批大小成正比，与表大小无关；
+  CSV/Parquet 的列为 schema 属性加其余出现过的字段（需额外扫描一遍取列名）
+- Parquet 列类型：schema 声明的 integer/number/boolean 用对应 Arrow 类型，未声明的字段在取列名时
+  按出现过的值推断；值与列类型不符（如 integer 列中的 "12"）的行不写出，经 on_reject 报告
+"""
+import csv
+import json
+import math
+import os
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Parquet 读写（可选）
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+FORMATS = ("csv", "jsonl", "parquet", "json")
+
+_EXTENSIONS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet", ".json": "json"}
+
+Row = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+Reject = Callable[[int, List[str]], None]
+
+
+def detect_format(path: str, fmt: Optional[str] = None) -> Optional[str]:
+    """显式格式优先，否则按扩展名判断；不支持时返回 None。"""
+    if fmt:
+        fmt = fmt.lower()
+        return fmt if fmt in FORMATS else None
+    return _EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def _prop_kind(prop: Any) -> Optional[str]:
+    if not isinstance(prop, dict):
+        return None
+    t = prop.get("type")
+    types = [x for x in (t if isinstance(t, list) else [t]) if x and x != "null"]
+    return types[0] if len(types) == 1 else None
+
+
+def schema_kinds(schema: Optional[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+    """schema 属性 -> 单一 JSON 类型（多类型或未声明为 None），保持属性顺序。"""
+    return {name: _prop_kind(prop) for name, prop in ((schema or {}).get("properties") or {}).items()}
+
+
+# —— 读取 ——
+def _coerce_cell(kind: Optional[str], text: str) -> Any:
+    """CSV 单元格按 schema 类型转换；失败返回原字符串。"""
+    try:
+        stripped = text.strip()
+        if kind in ("integer", "number") and stripped.lstrip("+-").isdigit():
+            # 纯整数直接 int()，不经 float，超过 2**53 的大整数（如外部系统 ID）不丢精度
+            return int(stripped)
+        if kind == "integer":
+            # 仅 "1e3"、"3.0" 这类写法走 float
+            number = float(stripped)
+            return int(number) if number.is_integer() else text
+        if kind == "number":
+            number = float(stripped)
+            return number if math.isfinite(number) else text
+        if kind == "boolean":
+            lowered = text.strip().lower()
+            if lowered in ("true", "1", "yes", "是"):
+                return True
+            if lowered in ("false", "0", "no", "否"):
+                return False
+            return text
+        if kind in ("array", "object"):
+            return json.loads(text)
+    except (ValueError, OverflowError):
+        return text
+    return text
+
+
+def _read_csv(path: str, kinds: Dict[str, Optional[str]]) -> Iterator[Row]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            line = reader.line_num
+            if None in row:
+                yield line, None, "列数多于表头"
+                continue
+            record = {k: _coerce_cell(kinds.get(k), v) for k, v in row.items() if k and v not in (None, "")}
+            yield line, record, None
+
+
+def _read_jsonl(path: str) -> Iterator[Row]:
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for line, text in enumerate(f, 1):
+            if not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+            except ValueError as e:
+                yield line, None, f"JSON 解析失败: {e}"
+                continue
+            if isinstance(record, dict):
+                yield line, record, None
+            else:
+                yield line, None, "不是 JSON 对象"
+
+
+def _plain(value: Any) -> Any:
+    """Arrow 取出的值转为 JSON 可表示的值。"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    return value
+
+
+def _read_parquet(path: str, batch_size: int, kinds: Dict[str, Optional[str]]) -> Iterator[Row]:
+    # 数组/对象列导出时存为 JSON 文本，读回时解析
+    nested = {k for k, kind in kinds.items() if kind in ("array", "object")}
+    line = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        for item in batch.to_pylist():
+            line += 1
+            record = {}
+            for k, v in item.items():
+                if v is None:
+                    continue
+                record[k] = _coerce_cell(kinds[k], v) if k in nested and isinstance(v, str) else _plain(v)
+            yield line, record, None
+
+
+def _read_json(path: str) -> Iterator[Row]:
+    """整体 JSON 数组（原数据文件格式），需一次读入。"""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        data = json.load(f)
+    if not isinstance(data, list):
+        raise ValueError("JSON 文件须为记录数组")
+    for line, record in enumerate(data, 1):
+        if isinstance(record, dict):
+            yield line, record, None
+        else:
+            yield line, None, "不是 JSON 对象"
+
+
+def read_batches(path: str, fmt: str, schema: Optional[Dict[str, Any]] = None,
+                 batch_size: int = 1000) -> Iterator[List[Row]]:
+    """按批读取文件，每批为 [(行号, 记录或 None, 错误或 None)]。
+
+    Args:
+        path: 文件路径
+        fmt: 文件格式（csv / jsonl / parquet / json）
+        schema: 表结构定义，用于 CSV / Parquet 的类型转换
+        batch_size: 每批行数
+
+    Returns:
+        批次迭代器
+    """
+    if fmt == "csv":
+        rows: Iterator[Row] = _read_csv(path, schema_kinds(schema))
+    elif fmt == "jsonl":
+        rows = _read_jsonl(path)
+    elif fmt == "parquet":
+        if not PARQUET_AVAILABLE:
+            raise RuntimeError("读取 Parquet 需要安装 pyarrow")
+        rows = _read_parquet(path, batch_size, schema_kinds(schema))
+    elif fmt == "json":
+        rows = _read_json(path)
+    else:
+        raise ValueError(f"不支持的格式: {fmt}")
+    batch: List[Row] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# —— 写出 ——
+def _value_kind(value: Any) -> str:
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "number"
+    return "string"
+
+
+def _merge_kind(a: Optional[str], b: str) -> str:
+    """两种值类型的公共列类型：整数与浮点合为 number，其余不同类型退为 string（JSON 文本）。"""
+    if a is None or a == b:
+        return b
+    if {a, b} == {"integer", "number"}:
+        return "number"
+    return "string"
+
+
+def _columns(schema: Optional[Dict[str, Any]],
+             batches: Callable[[], Iterable[List[Dict[str, Any]]]],
+             infer: bool = False) -> Tuple[List[str], Dict[str, Optional[str]]]:
+    """schema 属性在前，其余字段按首次出现顺序（额外扫描一遍，只保留列名）。
+    infer=True 时同时按非空值推断未声明字段的类型，返回 (列名, 推断类型)。"""
+    columns = list(((schema or {}).get("properties") or {}).keys())
+    seen = set(columns)
+    inferred: Dict[str, Optional[str]] = {}
+    for batch in batches():
+        for record in batch:
+            for key, value in record.items():
+                if key not in seen:
+                    seen.add(key)
+                    columns.append(key)
+                    inferred[key] = None
+                if infer and key in inferred and value is not None:
+                    inferred[key] = _merge_kind(inferred[key], _value_kind(value))
+    return columns, inferred
+
+
+def _csv_cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _write_csv(f, batches: Iterable[List[Dict[str, Any]]], columns: List[str]) -> int:
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    count = 0
+    for batch in batches:
+        writer.writerows([_csv_cell(r.get(c)) for c in columns] for r in batch)
+        count += len(batch)
+    return count
+
+
+def _write_jsonl(f, batches: Iterable[List[Dict[str, Any]]]) -> int:
+    count = 0
+    for batch in batches:
+        f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in batch))
+        count += len(batch)
+    return count
+
+
+def _write_json(f, batches: Iterable[List[Dict[str, Any]]]) -> int:
+    """逐条写出，结果与 json.dumps(records, ensure_ascii=False, indent=2) 相同。"""
+    count = 0
+    for batch in batches:
+        for record in batch:
+            f.write("[\n  " if count == 0 else ",\n  ")
+            f.write(json.dumps(record, ensure_ascii=False, indent=2).replace("\n", "\n  "))
+            count += 1
+    f.write("\n]" if count else "[]")
+    return count
+
+
+_ARROW_TYPES = {"integer": "int64", "number": "float64", "boolean": "bool_"}
+
+_MISMATCH = object()
+
+
+def _arrow_value(kind: Optional[str], value: Any) -> Any:
+    """按列类型取值；类型不符返回 _MISMATCH（整数值的浮点数写入 integer 列视为相符），
+    数组/对象/其它类型列存为 JSON 文本。"""
+    if value is None:
+        return None
+    if kind == "integer":
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value if isinstance(value, int) and not isinstance(value, bool) else _MISMATCH
+    if kind == "number":
+        return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else _MISMATCH
+    if kind == "boolean":
+        return value if isinstance(value, bool) else _MISMATCH
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def _write_parquet(path: str, batches: Iterable[List[Dict[str, Any]]], columns: List[str],
+                   kinds: Dict[str, Optional[str]], on_reject: Optional[Reject] = None) -> int:
+    col_kinds = {c: (kinds.get(c) if kinds.get(c) in _ARROW_TYPES else None) for c in columns}
+    arrow_schema = pa.schema([(c, getattr(pa, _ARROW_TYPES.get(col_kinds[c], "string"))()) for c in columns])
+    count = 0
+    line = 0
+    with pq.ParquetWriter(path, arrow_schema) as writer:
+        for batch in batches:
+            arrays: Dict[str, List[Any]] = {c: [] for c in columns}
+            written = 0
+            for record in batch:
+                line += 1
+                values = [_arrow_value(col_kinds[c], record.get(c)) for c in columns]
+                errors = [f"字段 '{c}': {record.get(c)!r} 与列类型 {col_kinds[c]} 不符"
+                          for c, v in zip(columns, values) if v is _MISMATCH]
+                if errors:
+                    if on_reject is not None:
+                        on_reject(line, errors)
+                    continue
+                for c, v in zip(columns, values):
+                    arrays[c].append(v)
+                written += 1
+            if written:
+                writer.write_table(pa.Table.from_pydict(arrays, schema=arrow_schema))
+                count += written
+    return count
+
+
+def write_records(path: str, fmt: str, batches: Callable[[], Iterable[List[Dict[str, Any]]]],
+                  schema: Optional[Dict[str, Any]] = None, on_reject: Optional[Reject] = None) -> int:
+    """把记录流式写入文件（临时文件 + os.replace），返回写出条数。
+
+    Args:
+        path: 目标文件路径
+        fmt: 文件格式（csv / jsonl / parquet / json）
+        batches: 返回记录批次迭代器的函数；CSV/Parquet 会调用两次（先取列名再写出）
+        schema: 表结构定义，决定列顺序与 Parquet 列类型
+        on_reject: Parquet 中值与列类型不符、未写出的行以 (行号, 错误列表) 调用
+
+    Returns:
+        写出的记录数
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的格式: {fmt}")
+    if fmt == "parquet" and not PARQUET_AVAILABLE:
+        raise RuntimeError("写出 Parquet 需要安装 pyarrow")
+    columns, inferred = _columns(schema, batches, infer=fmt == "parquet") if fmt in ("csv", "parquet") else ([], {})
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        if fmt == "parquet":
+            os.close(fd)
+            count = _write_parquet(tmp_path, batches(), columns, {**inferred, **schema_kinds(schema)}, on_reject)
+        else:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="" if fmt == "csv" else None) as f:
+                if fmt == "csv":
+                    count = _write_csv(f, batches(), columns)
+                elif fmt == "jsonl":
+                    count = _write_jsonl(f, batches())
+                else:
+                    count = _write_json(f, batches())
+        os.replace(tmp_path, path)
+        tmp_path = None
+        return count
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except Exception:
+                pass
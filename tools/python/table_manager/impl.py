@@ -1,34 +1,247 @@
 """
 结构化数据表管理工具
 """
-from typing import Dict, List, Any, Optional, Union
+from typing import Callable, Dict, List, Any, Optional, Union
 import os
 import json
 import pandas as pd
 import uuid
 from datetime import datetime
+import threading
 import jsonschema
 from autogen_ext.tools import PythonToolProvider
 from .schema_manager import SchemaManager
 from .vector_connector import TableVectorConnector
+from .record_store import DB_SUFFIX, RecordStore, schema_indexes, schema_signature
+from .query_engine import QueryEngine, QueryError, TableSnapshot, is_simple_conditions
+from .bulk_io import FORMATS, detect_format, read_batches, write_records
 
 class TableToolProvider(PythonToolProvider):
     """结构化数据表管理工具提供者"""
     
-    def __init__(self, schema_dir: str, data_dir: str):
+    def __init__(self, schema_dir: str, data_dir: str, fast_validation: bool = False,
+                 transfer_dir: Optional[str] = None, allow_any_path: bool = False):
         """初始化表格管理工具
         
         Args:
             schema_dir: 表结构定义目录
             data_dir: 表数据存储目录
+            fast_validation: 安装了fastjsonschema时使用其编译的校验器
+            transfer_dir: 导入/导出文件目录，默认为数据目录；文件路径按该目录解析，不能越出
+            allow_any_path: 允许导入/导出任意主机路径（默认关闭）
         """
         self.schema_dir = schema_dir
         self.data_dir = data_dir
+        self.transfer_dir = transfer_dir or data_dir
+        self.allow_any_path = allow_any_path
         os.makedirs(schema_dir, exist_ok=True)
         os.makedirs(data_dir, exist_ok=True)
-        self.schema_manager = SchemaManager(schema_dir)
+        os.makedirs(self.transfer_dir, exist_ok=True)
+        self.schema_manager = SchemaManager(schema_dir, use_fast_validator=fast_validation)
+        self._stores: Dict[str, RecordStore] = {}
+        self._schema_applied: Dict[str, str] = {}  # 表名 -> 已应用到存储的 schema 签名
+        self._stores_lock = threading.Lock()
+        self.query_engine = QueryEngine()
         super().__init__()
     
+    def _get_store(self, table_name: str, schema: Optional[Dict[str, Any]] = None) -> RecordStore:
+        """获取表的记录存储（按表缓存连接，首次打开时从 JSON 导入）
+        
+        Args:
+            table_name: 表名
+            schema: 表结构定义，用于生成列与索引
+            
+        Returns:
+            记录存储
+        """
+        signature = schema_signature(schema) if schema else None
+        with self._stores_lock:
+            store = self._stores.get(table_name)
+            if store is None:
+                store = RecordStore.for_table(self.data_dir, table_name, schema)
+                self._stores[table_name] = store
+                if signature:
+                    self._schema_applied[table_name] = signature
+                return store
+            if not signature or self._schema_applied.get(table_name) == signature:
+                return store
+        # schema 有变化时才补齐列/索引/聚合（在存储自身的锁内进行，不占用全局锁）
+        store.ensure_schema(schema)
+        with self._stores_lock:
+            self._schema_applied[table_name] = signature
+        return store
+    
+    def _resolve_transfer_path(self, path: str, table_name: Optional[str] = None) -> Union[str, Dict[str, Any]]:
+        """把导入/导出路径解析到导入导出目录内
+        
+        Args:
+            path: 相对导入导出目录的文件路径
+            table_name: 导出时传入；不允许覆盖表库文件或其它表的 JSON 数据文件
+            
+        Returns:
+            绝对路径，不允许时返回错误
+        """
+        if self.allow_any_path:
+            resolved = os.path.realpath(path if os.path.isabs(path) else os.path.join(self.transfer_dir, path))
+        else:
+            if os.path.isabs(path):
+                return {"error": f"路径 '{path}' 须为相对导入导出目录的路径"}
+            base = os.path.realpath(self.transfer_dir)
+            resolved = os.path.realpath(os.path.join(base, path))
+            if os.path.commonpath([base, resolved]) != base or resolved == base:
+                return {"error": f"路径 '{path}' 超出导入导出目录"}
+        if table_name is not None:
+            name = os.path.basename(resolved)
+            in_data_dir = os.path.dirname(resolved) == os.path.realpath(self.data_dir)
+            if (in_data_dir and name.endswith(".json") and name != f"{table_name}.json") or \
+                    any(name.endswith(DB_SUFFIX + tail) for tail in ("", "-wal", "-shm", "-journal")):
+                return {"error": f"不能覆盖表数据文件 '{name}'"}
+        return resolved
+    
+    def export_table(self, table_name: str, path: Optional[str] = None,
+                     format: Optional[str] = None, batch_size: int = 1000,
+                     max_rejected: int = 100) -> Dict[str, Any]:
+        """导出表数据，逐批流式写出，内存占用与表大小无关
+        
+        不指定路径与格式时写回 <表名>.json（原 JSON 数组格式）。
+        Parquet 中值与列类型不符的记录不写出，计入拒绝条数。
+        
+        Args:
+            table_name: 表名
+            path: 导出文件路径（相对导入导出目录），默认为数据目录下的 <表名>.<格式扩展名>
+            format: 导出格式（csv / jsonl / parquet / json），默认按扩展名判断，无扩展名时为 json
+            batch_size: 每批读出的记录数
+            max_rejected: 结果中最多列出的拒绝行数
+            
+        Returns:
+            导出结果
+        """
+        schema = self.schema_manager.get_schema(table_name)
+        if not schema:
+            return {"error": f"表 '{table_name}' 不存在"}
+        if format or (path and os.path.splitext(path)[1]):
+            fmt = detect_format(path or "", format)
+        else:
+            fmt = "json"
+        if fmt is None:
+            return {"error": f"不支持的导出格式，可选: {', '.join(FORMATS)}"}
+        default_path = os.path.join(self.data_dir, f"{table_name}.{fmt}")
+        if path:
+            path = self._resolve_transfer_path(path, table_name)
+            if isinstance(path, dict):
+                return path
+        store = self._get_store(table_name, schema)
+        if fmt == "json" and (not path or path == os.path.realpath(default_path)):
+            # 写回数据文件，同时记录签名
+            if not store.export_json(default_path):
+                return {"error": f"导出表 '{table_name}' 失败"}
+            return {"success": True, "path": default_path, "format": fmt, "record_count": store.count()}
+        path = path or default_path
+        rejected: List[Dict[str, Any]] = []
+        stats = {"rejected_count": 0}
+        
+        def reject(row: int, errors: List[str]) -> None:
+            stats["rejected_count"] += 1
+            if len(rejected) < max_rejected:
+                rejected.append({"row": row, "errors": errors})
+        
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            count = write_records(path, fmt, lambda: store.iter_batches(max(1, int(batch_size))), schema,
+                                  on_reject=reject)
+        except Exception as e:
+            return {"error": f"导出表 '{table_name}' 失败: {str(e)}"}
+        result = {"success": True, "path": path, "format": fmt, "record_count": count}
+        if stats["rejected_count"]:
+            result.update(rejected_count=stats["rejected_count"], rejected=rejected)
+        return result
+    
+    def import_table(self, table_name: str, path: str, format: Optional[str] = None,
+                     mode: str = "append", batch_size: int = 1000, max_rejected: int = 100,
+                     conversation_id: Optional[str] = None,
+                     progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """从 csv / jsonl / parquet 文件批量导入记录
+        
+        按批读取并校验，通过校验的记录在同一个事务内写入；读取或写入出错时整体回滚。
+        
+        Args:
+            table_name: 表名
+            path: 导入文件路径（相对导入导出目录）
+            format: 文件格式（csv / jsonl / parquet / json），默认按扩展名判断
+            mode: append 追加，replace 清空后导入
+            batch_size: 每批读取、校验的行数
+            max_rejected: 结果中最多列出的拒绝行数
+            conversation_id: 会话ID，用于审计
+            progress_callback: 每批写入后以当前进度调用
+            
+        Returns:
+            导入结果，包含处理行数、导入条数、拒绝条数及拒绝原因
+        """
+        schema = self.schema_manager.get_schema(table_name)
+        if not schema:
+            return {"error": f"表 '{table_name}' 不存在"}
+        fmt = detect_format(path, format)
+        if fmt is None:
+            return {"error": f"不支持的导入格式，可选: {', '.join(FORMATS)}"}
+        if mode not in ("append", "replace"):
+            return {"error": f"不支持的导入模式: {mode}"}
+        display_path, path = path, self._resolve_transfer_path(path)
+        if isinstance(path, dict):
+            return path
+        if not os.path.isfile(path):
+            return {"error": f"文件 '{display_path}' 不存在"}
+        
+        stats = {"processed": 0, "imported": 0, "rejected_count": 0, "batches": 0}
+        rejected: List[Dict[str, Any]] = []
+        created_at = datetime.now().isoformat()
+        
+        def reject(row: int, errors: List[str]) -> None:
+            stats["rejected_count"] += 1
+            if len(rejected) < max_rejected:
+                rejected.append({"row": row, "errors": errors})
+        
+        def valid_batches():
+            for batch in read_batches(path, fmt, schema, max(1, int(batch_size))):
+                rows = [(line, record) for line, record, error in batch if record is not None]
+                for line, record, error in batch:
+                    if record is None:
+                        reject(line, [error])
+                failures = self.schema_manager.validate_many(table_name, [r for _, r in rows])
+                valid = []
+                for i, (line, record) in enumerate(rows):
+                    if i in failures:
+                        reject(line, failures[i])
+                        continue
+                    record.setdefault("created_at", created_at)
+                    if conversation_id:
+                        record.setdefault("created_by", conversation_id)
+                    valid.append(record)
+                stats["processed"] += len(batch)
+                stats["imported"] += len(valid)
+                stats["batches"] += 1
+                yield valid
+                # 生成器恢复时该批已写入
+                if progress_callback:
+                    try:
+                        progress_callback(dict(stats))
+                    except Exception:
+                        pass
+        
+        try:
+            self._get_store(table_name, schema).insert_many(valid_batches(), replace=(mode == "replace"))
+        except Exception as e:
+            stats["imported"] = 0
+            return {"error": f"导入表 '{table_name}' 失败，已回滚: {str(e)}", **stats, "rejected": rejected}
+        
+        return {
+            "success": True,
+            "message": f"已导入 {stats['imported']} 条记录，拒绝 {stats['rejected_count']} 条",
+            "format": fmt,
+            "mode": mode,
+            **stats,
+            "rejected": rejected
+        }
+    
     def list_tables(self) -> List[Dict[str, Any]]:
         """列出所有可用的数据表"""
         tables = []
@@ -39,16 +252,11 @@ class TableToolProvider(PythonToolProvider):
                 with open(schema_path, 'r', encoding='utf-8') as f:
                     schema = json.load(f)
                 
-                # 获取表数据记录数
-                data_path = os.path.join(self.data_dir, f"{table_name}.json")
-                record_count = 0
-                if os.path.exists(data_path):
-                    with open(data_path, 'r', encoding='utf-8') as f:
-                        try:
-                            data = json.load(f)
-                            record_count = len(data)
-                        except:
-                            record_count = 0
+                # 获取表数据记录数（取自存储元数据）
+                try:
+                    record_count = self._get_store(table_name, schema).count()
+                except Exception:
+                    record_count = 0
                 
                 tables.append({
                     "name": table_name,
@@ -81,7 +289,8 @@ class TableToolProvider(PythonToolProvider):
         
         Args:
             table_name: 表名
-            conditions: 查询条件，键为字段名，值为查询值
+            conditions: 查询条件，键为字段名，值为查询值或运算符对象
+                （$gt/$gte/$lt/$lte/$ne/$in/$nin/$like/$contains/$null），可用 $and/$or 组合
             limit: 返回记录数限制
             offset: 查询偏移量
             sort_by: 排序字段
@@ -95,43 +304,23 @@ class TableToolProvider(PythonToolProvider):
         if not schema:
             return {"error": f"表 '{table_name}' 不存在"}
             
-        # 读取表数据
-        data_path = os.path.join(self.data_dir, f"{table_name}.json")
-        if not os.path.exists(data_path):
-            return {
-                "total": 0,
-                "records": [],
-                "schema": schema
-            }
+        if sort_by and sort_by not in schema.get("properties", {}):
+            sort_by = None
+        indexed = schema_indexes(schema)
         
-        with open(data_path, 'r', encoding='utf-8') as f:
-            try:
-                data = json.load(f)
-            except:
-                return {"error": f"读取表 '{table_name}' 数据失败"}
-        
-        # 应用过滤条件
-        if conditions:
-            filtered_data = []
-            for record in data:
-                match = True
-                for field, value in conditions.items():
-                    if field not in record or record[field] != value:
-                        match = False
-                        break
-                if match:
-                    filtered_data.append(record)
-        else:
-            filtered_data = data
-            
-        # 应用排序
-        if sort_by and sort_by in schema.get("properties", {}):
-            reverse = sort_order.lower() == "desc"
-            filtered_data.sort(key=lambda x: x.get(sort_by, ""), reverse=reverse)
-            
-        # 应用分页
-        total = len(filtered_data)
-        paged_data = filtered_data[offset:offset+limit]
+        try:
+            store = self._get_store(table_name, schema)
+            if conditions and is_simple_conditions(conditions) and all(f in indexed for f in conditions):
+                # 索引字段等值查询：由存储层按索引取出，只在命中记录上排序分页
+                snap = TableSnapshot(store.find(conditions), store.version, indexed)
+                total, paged_data = self.query_engine.query(snap, None, sort_by, sort_order, limit, offset)
+            else:
+                snap = self.query_engine.snapshot(table_name, store, indexed)
+                total, paged_data = self.query_engine.query(snap, conditions, sort_by, sort_order, limit, offset)
+        except QueryError as e:
+            return {"error": f"查询条件错误: {str(e)}"}
+        except Exception:
+            return {"error": f"读取表 '{table_name}' 数据失败"}
         
         return {
             "total": total,
@@ -152,19 +341,19 @@ class TableToolProvider(PythonToolProvider):
         Returns:
             记录数据
         """
-        result = self.query_table(
-            table_name=table_name,
-            conditions={record_id_field: record_id},
-            limit=1
-        )
+        schema = self.schema_manager.get_schema(table_name)
+        if not schema:
+            return {"error": f"表 '{table_name}' 不存在"}
         
-        if "error" in result:
-            return result
+        try:
+            record = self._get_store(table_name, schema).get(record_id_field, record_id)
+        except Exception:
+            return {"error": f"读取表 '{table_name}' 数据失败"}
             
-        if not result["records"]:
+        if record is None:
             return {"error": f"记录 {record_id} 不存在"}
             
-        return {"record": result["records"][0], "schema": result["schema"]}
+        return {"record": record, "schema": schema}
     
     def update_table(self, table_name: str, record_id_field: str, record_id: str,
                     data: Dict[str, Any], conversation_id: Optional[str] = None) -> Dict[str, Any]:
@@ -190,46 +379,20 @@ class TableToolProvider(PythonToolProvider):
         if validation_errors:
             return {"error": f"数据验证失败", "validation_errors": validation_errors}
         
-        # 读取表数据
-        data_path = os.path.join(self.data_dir, f"{table_name}.json")
-        if not os.path.exists(data_path):
-            return {"error": f"表 '{table_name}' 不存在记录"}
-        
-        with open(data_path, 'r', encoding='utf-8') as f:
-            try:
-                all_data = json.load(f)
-            except:
-                return {"error": f"读取表 '{table_name}' 数据失败"}
-        
-        # 查找并更新记录
-        record_found = False
-        for i, record in enumerate(all_data):
-            if record.get(record_id_field) == record_id:
-                # 保存原始记录用于审计
-                original_record = record.copy()
-                
-                # 更新记录
-                for field, value in data.items():
-                    record[field] = value
-                    
-                # 添加更新时间
-                record['updated_at'] = datetime.now().isoformat()
-                if conversation_id:
-                    record['updated_by'] = conversation_id
-                    
-                all_data[i] = record
-                record_found = True
-                break
+        # 更新数据并添加更新时间
+        fields = dict(data)
+        fields['updated_at'] = datetime.now().isoformat()
+        if conversation_id:
+            fields['updated_by'] = conversation_id
         
-        if not record_found:
-            return {"error": f"记录 {record_id} 不存在"}
-            
-        # 保存更新后的数据
+        # 按索引定位并更新记录（仅改写该行）
         try:
-            with open(data_path, 'w', encoding='utf-8') as f:
-                json.dump(all_data, f, ensure_ascii=False, indent=2)
+            record = self._get_store(table_name, schema).update_first(record_id_field, record_id, fields)
         except Exception as e:
             return {"error": f"保存数据失败: {str(e)}"}
+        
+        if record is None:
+            return {"error": f"记录 {record_id} 不存在"}
             
         return {
             "success": True,
@@ -264,26 +427,9 @@ class TableToolProvider(PythonToolProvider):
         if conversation_id:
             data['created_by'] = conversation_id
         
-        # 读取现有数据或创建新数组
-        data_path = os.path.join(self.data_dir, f"{table_name}.json")
-        if os.path.exists(data_path):
-            with open(data_path, 'r', encoding='utf-8') as f:
-                try:
-                    all_data = json.load(f)
-                except:
-                    all_data = []
-        else:
-            all_data = []
-        
-        # 添加新记录
-        all_data.append(data)
-        
-        # 保存数据
-        try:
-            with open(data_path, 'w', encoding='utf-8') as f:
-                json.dump(all_data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            return {"error": f"保存数据失败: {str(e)}"}
+        # 追加新记录
+        if not self._get_store(table_name, schema).insert(data):
+            return {"error": f"保存数据失败"}
             
         return {
             "success": True,
@@ -309,38 +455,15 @@ class TableToolProvider(PythonToolProvider):
         if not schema:
             return {"error": f"表 '{table_name}' 不存在"}
             
-        # 读取表数据
-        data_path = os.path.join(self.data_dir, f"{table_name}.json")
-        if not os.path.exists(data_path):
-            return {"error": f"表 '{table_name}' 不存在记录"}
-        
-        with open(data_path, 'r', encoding='utf-8') as f:
-            try:
-                all_data = json.load(f)
-            except:
-                return {"error": f"读取表 '{table_name}' 数据失败"}
-        
-        # 查找并删除记录
-        record_found = False
-        deleted_record = None
-        new_data = []
-        
-        for record in all_data:
-            if record.get(record_id_field) == record_id:
-                deleted_record = record
-                record_found = True
-            else:
-                new_data.append(record)
-        
-        if not record_found:
-            return {"error": f"记录 {record_id} 不存在"}
-            
-        # 保存更新后的数据
+        # 按索引查找并删除记录
         try:
-            with open(data_path, 'w', encoding='utf-8') as f:
-                json.dump(new_data, f, ensure_ascii=False, indent=2)
+            deleted = self._get_store(table_name, schema).delete_where(record_id_field, record_id)
         except Exception as e:
             return {"error": f"保存数据失败: {str(e)}"}
+        
+        if not deleted:
+            return {"error": f"记录 {record_id} 不存在"}
+        deleted_record = deleted[-1]
             
         # 记录删除操作到审计日志
         if conversation_id:
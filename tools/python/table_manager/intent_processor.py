@@ -1,28 +1,201 @@
 """
 结构化数据表意图处理工具
 """
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Tuple, Union
+import os
 import re
 import json
+import threading
+import time
+from collections import deque
 from autogen_ext.tools import PythonToolProvider
+from .schema_manager import SchemaManager
+
+# 意图关键词：动词 -> 可能的意图
+_INTENT_VERBS = {
+    "查询": ("查询",), "搜索": ("查询",), "查找": ("查询",), "获取": ("查询",),
+    "列出": ("查询", "列表"), "显示": ("查询", "列表"), "列举": ("列表",),
+    "添加": ("添加",), "新增": ("添加",), "插入": ("添加",), "创建": ("添加", "创建表"),
+    "新建": ("创建表",), "生成": ("创建表",),
+    "更新": ("更新",), "修改": ("更新",), "编辑": ("更新",), "变更": ("更新",),
+    "删除": ("删除",), "移除": ("删除",), "撤销": ("删除",),
+    "分析": ("分析",), "统计": ("分析",), "计算": ("分析",), "汇总": ("分析",),
+}
+
+# 意图的宾语：出现在动词之后时加分；必需宾语的意图缺少宾语时不成立
+_INTENT_OBJECTS = {
+    "查询": ("表格", "表", "数据"),
+    "添加": ("记录", "数据", "行", "条目"),
+    "更新": ("记录", "数据", "行", "条目"),
+    "删除": ("记录", "数据", "行", "条目"),
+    "分析": ("数据", "表格", "表"),
+    "创建表": ("表格", "表", "数据表"),
+    "列表": ("表格", "表"),
+}
+_REQUIRED_OBJECT = {"创建表", "列表"}
+
+# 同分时的优先级（与原模式顺序一致）
+_INTENT_ORDER = ("查询", "添加", "更新", "删除", "分析", "创建表", "列表")
+
+_TOKEN_RE = re.compile("|".join(re.escape(t) for t in sorted(
+    set(_INTENT_VERBS) | {o for objs in _INTENT_OBJECTS.values() for o in objs} | {"数据表"},
+    key=len, reverse=True)))
+
+_TABLE_PATTERNS = (
+    re.compile(r"(?:表格|表|数据表)[：:]*\s*([^\s,，.。]+)"),
+    re.compile(r"([^\s,，.。]+?)(?:表格|表)"),
+    re.compile(r"在\s*([^\s,，.。]+)\s*中"),
+)
+# 表结构目录变化检查的最小间隔（秒）：每次扫描都要 stat 全部 schema 文件，按调用频率节流
+_SCHEMA_CHECK_INTERVAL = 1.0
+
+_KV_RE = re.compile(r"([^\s=:：]+)\s*[=:：]\s*([^\s,，;；]+)")
+_ID_RE = re.compile(r"ID\s*[为是:：=]\s*([^\s,，;；]+)")
+
+
+def _schema_dir_stamp(schema_dir: str) -> Tuple[int, int, int, int]:
+    """表结构目录签名：(目录 mtime_ns, 文件数, 文件最大 mtime_ns, 文件总大小)
+    
+    目录 mtime 只反映增删；就地修改 schema 文件（如改标题）由文件自身的 mtime/大小反映
+    """
+    count = newest = size = 0
+    with os.scandir(schema_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json") and entry.is_file():
+                st = entry.stat()
+                count += 1
+                newest = max(newest, st.st_mtime_ns)
+                size += st.st_size
+    return os.stat(schema_dir).st_mtime_ns, count, newest, size
+
+
+class _TableNameMatcher:
+    """已知表名/表标题的 Aho-Corasick 自动机，一次扫描找出最左最长的命中"""
+    
+    def __init__(self, names: Dict[str, str]):
+        """
+        Args:
+            names: 匹配词 -> 表名（表名本身与表标题都作为匹配词）
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Optional[Tuple[int, str]]] = [None]  # (词长, 表名)，取该状态可达的最长词
+        for word, table in names.items():
+            if not word:
+                continue
+            state = 0
+            for ch in word:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(None)
+                state = nxt
+            self._out[state] = (len(word), table)
+        
+        # 广度优先建失败指针
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                if self._out[nxt] is None:
+                    self._out[nxt] = self._out[self._fail[nxt]]
+    
+    def find(self, text: str) -> Optional[str]:
+        """返回文本中最左（同起点取最长）出现的表名"""
+        best: Optional[Tuple[int, int, str]] = None  # (起点, -长度, 表名)
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            # 在 i 处结束的最长词起点最靠左，只需看当前状态
+            out = self._out[state]
+            if out is not None:
+                length, table = out
+                cand = (i - length + 1, -length, table)
+                if best is None or cand < best:
+                    best = cand
+        return best[2] if best else None
+
 
 class IntentProcessorTool(PythonToolProvider):
     """结构化数据表意图处理工具"""
     
-    def __init__(self):
-        """初始化意图处理工具"""
+    def __init__(self, schema_dir: Optional[str] = None):
+        """初始化意图处理工具
+        
+        Args:
+            schema_dir: 表结构定义目录；提供时按已知表名/表标题识别表，表结构变化后自动刷新
+        """
         super().__init__()
         
-        # 意图模式匹配
-        self.intent_patterns = {
-            "查询": r"(?:查询|搜索|查找|获取|列出|显示).*?(?:表格|表|数据)?",
-            "添加": r"(?:添加|新增|创建|插入).*?(?:记录|数据|行|条目)?",
-            "更新": r"(?:更新|修改|编辑|变更).*?(?:记录|数据|行|条目)?",
-            "删除": r"(?:删除|移除|撤销).*?(?:记录|数据|行|条目)?",
-            "分析": r"(?:分析|统计|计算|汇总).*?(?:数据|表格|表)?",
-            "创建表": r"(?:创建|新建|生成).*?(?:表格|表|数据表)",
-            "列表": r"(?:列出|列举|显示).*?(?:所有|全部)?.*?(?:表格|表)"
-        }
+        self.schema_manager = SchemaManager(schema_dir) if schema_dir else None
+        self._table_matcher: Optional[_TableNameMatcher] = None
+        self._schema_stamp: Optional[Tuple[int, int, int, int]] = None
+        self._schema_checked = 0.0  # 上次检查表结构目录的 time.monotonic()
+        self._matcher_lock = threading.Lock()
+    
+    def refresh_tables(self) -> None:
+        """重新从表结构目录构建表名匹配器"""
+        if not self.schema_manager:
+            return
+        try:
+            stamp = _schema_dir_stamp(self.schema_manager.schema_dir)
+            titles: Dict[str, str] = {}
+            names: Dict[str, str] = {}
+            for info in self.schema_manager.list_schemas():
+                title = info.get("title")
+                if isinstance(title, str) and title and title not in titles:
+                    titles[title] = info["name"]
+                names[info["name"]] = info["name"]
+            names = {**titles, **names}  # 表名优先于同名标题
+        except Exception:
+            return
+        with self._matcher_lock:
+            self._table_matcher = _TableNameMatcher(names)
+            self._schema_stamp = stamp
+            self._schema_checked = time.monotonic()
+    
+    def _get_table_matcher(self) -> Optional[_TableNameMatcher]:
+        """取表名匹配器，表结构文件有增删改时重建（至多每秒检查一次；需要立即生效时调用 refresh_tables）"""
+        if not self.schema_manager:
+            return None
+        now = time.monotonic()
+        if self._table_matcher is not None and now - self._schema_checked < _SCHEMA_CHECK_INTERVAL:
+            return self._table_matcher
+        self._schema_checked = now
+        try:
+            stamp = _schema_dir_stamp(self.schema_manager.schema_dir)
+        except OSError:
+            return None
+        if stamp != self._schema_stamp:
+            self.refresh_tables()
+        return self._table_matcher
+    
+    def _score_intents(self, query: str) -> Dict[str, float]:
+        """一次扫描关键词，为所有意图打分：动词命中 1 分，其后出现对应宾语再加 1 分，
+        必需宾语的意图（创建表/列表）更具体，另加 0.5 分"""
+        scores: Dict[str, float] = {}
+        tokens = [(m.start(), m.group()) for m in _TOKEN_RE.finditer(query)]
+        for i, (_, token) in enumerate(tokens):
+            for intent in _INTENT_VERBS.get(token, ()):
+                objects = _INTENT_OBJECTS[intent]
+                has_object = any(t in objects or (t == "数据表" and "表" in objects)
+                                 for _, t in tokens[i + 1:])
+                if intent in _REQUIRED_OBJECT and not has_object:
+                    continue
+                score = 1.0 + (1.0 if has_object else 0.0) + (0.5 if intent in _REQUIRED_OBJECT else 0.0)
+                scores[intent] = max(scores.get(intent, 0.0), score)
+        return scores
     
     def extract_intent(self, query: str) -> Dict[str, Any]:
         """从用户查询中提取意图
@@ -39,12 +212,11 @@ class IntentProcessorTool(PythonToolProvider):
         intent_type = "查询"
         confidence = 0.5
         
-        # 匹配意图模式
-        for intent, pattern in self.intent_patterns.items():
-            if re.search(pattern, query):
-                intent_type = intent
-                confidence = 0.8
-                break
+        # 为所有意图打分，取最高分（同分按固定优先级）
+        scores = self._score_intents(query)
+        if scores:
+            intent_type = max(scores, key=lambda k: (scores[k], -_INTENT_ORDER.index(k)))
+            confidence = 0.9 if scores[intent_type] >= 2 else 0.8
         
         # 提取表名
         table_name = self._extract_table_name(query)
@@ -57,7 +229,8 @@ class IntentProcessorTool(PythonToolProvider):
             "table_name": table_name,
             "conditions": conditions,
             "raw_query": query,
-            "confidence": confidence
+            "confidence": confidence,
+            "intent_scores": scores
         }
     
     def _extract_table_name(self, query: str) -> Optional[str]:
@@ -69,15 +242,16 @@ class IntentProcessorTool(PythonToolProvider):
         Returns:
             提取的表名，如果未找到则为None
         """
+        # 优先匹配已知表名/表标题
+        matcher = self._get_table_matcher()
+        if matcher is not None:
+            table_name = matcher.find(query)
+            if table_name:
+                return table_name
+        
         # 表名模式匹配
-        table_patterns = [
-            r"(?:表格|表|数据表)[：:]*\s*([^\s,，.。]+)",
-            r"([^\s,，.。]+?)(?:表格|表)",
-            r"在\s*([^\s,，.。]+)\s*中"
-        ]
-        
-        for pattern in table_patterns:
-            match = re.search(pattern, query)
+        for pattern in _TABLE_PATTERNS:
+            match = pattern.search(query)
             if match:
                 return match.group(1)
         
@@ -95,8 +269,7 @@ class IntentProcessorTool(PythonToolProvider):
         conditions = {}
         
         # 提取键值对条件，如"字段=值"
-        kv_pattern = r"([^\s=:：]+)\s*[=:：]\s*([^\s,，;；]+)"
-        for match in re.finditer(kv_pattern, query):
+        for match in _KV_RE.finditer(query):
             field = match.group(1)
             value = match.group(2)
             
@@ -108,8 +281,7 @@ class IntentProcessorTool(PythonToolProvider):
             conditions[field] = value
         
         # 提取ID条件
-        id_pattern = r"ID\s*[为是:：=]\s*([^\s,，;；]+)"
-        id_match = re.search(id_pattern, query)
+        id_match = _ID_RE.search(query)
         if id_match:
             conditions["id"] = id_match.group(1)
         
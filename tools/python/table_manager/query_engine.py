@@ -0,0 +1,333 @@
+"""
+表查询引擎：列式条件求值 + 排序索引 + top-k 分页
+
+条件语法（与原等值条件兼容）：
+    {"status": "open"}                              等值
+    {"amount": {"$gte": 10, "$lt": 100}}            范围：$gt / $gte / $lt / $lte
+    {"status": {"$ne": "closed"}}                   不等
+    {"city": {"$in": ["北京", "上海"]}}              IN / $nin
+    {"name": {"$like": "张%"}}                       LIKE（% 任意串，_ 单字符，不区分大小写）
+    {"title": {"$contains": "报告"}}                 子串（字符串）或成员（数组）
+    {"remark": {"$null": True}}                     为空（缺失或 null）；False 为非空
+    {"$or": [{...}, {...}], "$and": [...]}          组合；同一层多个键之间为 AND
+
+- 每张表按存储数据版本缓存一份快照：原记录列表 + pandas 列，条件在列上向量化求值；
+  版本变化时按存储的变更日志在旧快照上追加/替换/删除行，日志接不上才整表重读；按 LRU 最多缓存 max_tables 张表
+- schema metadata.indexes 声明的字段在快照上维护排序索引：范围条件用 searchsorted 取区间，
+  按该字段排序分页时直接按索引顺序取前 offset+limit 条
+- 其余字段排序用 argpartition 只选出前 k 条再排序，不做全量排序；空值（缺失/null）排在最后
+"""
+import copy
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+_RANGE_OPS = {"$gt", "$gte", "$lt", "$lte"}
+_FIELD_OPS = _RANGE_OPS | {"$eq", "$ne", "$in", "$nin", "$like", "$contains", "$null"}
+
+
+class QueryError(ValueError):
+    """查询条件格式错误。"""
+
+
+def is_operator_dict(value: Any) -> bool:
+    return isinstance(value, dict) and bool(value) and all(isinstance(k, str) and k.startswith("$") for k in value)
+
+
+def is_simple_conditions(conditions: Optional[Dict[str, Any]]) -> bool:
+    """是否仅为原有的字段等值条件（无运算符、无组合）。"""
+    return all(not k.startswith("$") and not is_operator_dict(v) for k, v in (conditions or {}).items())
+
+
+def _like_regex(pattern: str) -> str:
+    out = []
+    for ch in pattern:
+        if ch == "%":
+            out.append(".*")
+        elif ch == "_":
+            out.append(".")
+        else:
+            out.append(re.escape(ch))
+    return "^" + "".join(out) + "$"
+
+
+def _concat(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame()
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+class TableSnapshot:
+    """某一数据版本的表快照。排序键与排序索引按需计算并缓存。"""
+
+    def __init__(self, records: List[Dict[str, Any]], version: int, indexed: List[str],
+                 rowids: Optional[List[int]] = None, frame: Optional[pd.DataFrame] = None) -> None:
+        self.records = records
+        self.version = version
+        self.indexed = set(indexed)
+        # 与 records 对齐的存储 rowid（升序），有时才能按变更日志增量更新
+        self.rowids = np.asarray(rowids, dtype=np.int64) if rowids is not None else None
+        if frame is None:
+            frame = pd.DataFrame.from_records(records) if records else pd.DataFrame()
+        self.frame = frame
+        self._keys: Dict[str, Tuple[np.ndarray, bool]] = {}
+        self._orders: Dict[Tuple[str, bool], np.ndarray] = {}
+        self._strings: Dict[str, Tuple[np.ndarray, pd.Series]] = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def patched(self, changes: List[Tuple], version: int, indexed: List[str]) -> Optional["TableSnapshot"]:
+        """按变更日志生成新版本快照（本快照不变，进行中的查询不受影响）；rowid 对不上时返回 None。"""
+        if self.rowids is None:
+            return None
+        records, rowids, frame = list(self.records), self.rowids, self.frame
+        for change in changes:
+            if change[0] == "append":
+                records.extend(change[2])
+                rowids = np.concatenate([rowids, np.asarray(change[1], dtype=np.int64)])
+                frame = _concat([frame, pd.DataFrame.from_records(change[2])])
+                continue
+            targets = np.asarray(change[1] if change[0] == "delete" else [change[1]], dtype=np.int64)
+            pos = np.searchsorted(rowids, targets)
+            if (pos >= len(rowids)).any() or (rowids[pos] != targets).any():
+                return None
+            if change[0] == "delete":
+                keep = np.ones(len(rowids), dtype=bool)
+                keep[pos] = False
+                records = [r for r, k in zip(records, keep) if k]
+                rowids = rowids[keep]
+                frame = frame[keep].reset_index(drop=True)
+            else:
+                i = int(pos[0])
+                records[i] = change[2]
+                frame = _concat([frame.iloc[:i], pd.DataFrame.from_records([change[2]]), frame.iloc[i + 1:]])
+        return TableSnapshot(records, version, indexed, rowids, frame)
+
+    def column(self, field: str) -> pd.Series:
+        if field in self.frame.columns:
+            return self.frame[field]
+        return pd.Series([None] * len(self.records), dtype=object)
+
+    def strings(self, field: str) -> Tuple[np.ndarray, pd.Series]:
+        """(字符串值掩码, 这些字符串组成的 Series)，按字段缓存。"""
+        cached = self._strings.get(field)
+        if cached is None:
+            col = self.column(field)
+            is_str = col.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+            cached = (is_str, col[is_str].astype(str))
+            self._strings[field] = cached
+        return cached
+
+    def sort_key(self, field: str) -> Tuple[np.ndarray, bool]:
+        """(float 排序键, 是否数值列)。数值列取原值；否则按字符串取密集名次。空值为 NaN。"""
+        cached = self._keys.get(field)
+        if cached is not None:
+            return cached
+        col = self.column(field)
+        null = col.isna().to_numpy()
+        numeric = pd.to_numeric(col, errors="coerce")
+        is_bool = col.map(lambda v: isinstance(v, bool)).to_numpy()
+        if not (numeric.isna().to_numpy() & ~null).any() and not is_bool.any():
+            key = numeric.to_numpy(dtype=float)
+            result = (key, True)
+        else:
+            key = np.full(len(col), np.nan)
+            present = ~null
+            if present.any():
+                _, inverse = np.unique(col[present].astype(str).to_numpy(), return_inverse=True)
+                key[present] = inverse
+            result = (key, False)
+        self._keys[field] = result
+        return result
+
+    def sorted_order(self, field: str, descending: bool = False) -> np.ndarray:
+        """字段的稳定排序下标（同值保持插入顺序，空值在最后）。"""
+        order = self._orders.get((field, descending))
+        if order is None:
+            key, _ = self.sort_key(field)
+            order = np.argsort(-key if descending else key, kind="stable")  # NaN 排在末尾
+            self._orders[(field, descending)] = order
+        return order
+
+
+class QueryEngine:
+    """按表缓存快照的查询引擎（LRU，最多 max_tables 张表）。线程安全。"""
+
+    def __init__(self, max_tables: int = 8) -> None:
+        self._snapshots: "OrderedDict[str, TableSnapshot]" = OrderedDict()
+        self._max_tables = max(1, int(max_tables))
+        self._lock = threading.Lock()
+
+    def snapshot(self, table_name: str, store: Any, indexed: Optional[List[str]] = None) -> TableSnapshot:
+        """取表快照；存储数据版本变化时按变更日志增量更新，接不上时重建。"""
+        version = store.version
+        with self._lock:
+            snap = self._snapshots.get(table_name)
+            if snap is not None:
+                self._snapshots.move_to_end(table_name)
+                if snap.version == version:
+                    return snap
+        fresh = None
+        if snap is not None:
+            logged = store.changes_since(snap.version)
+            if logged is not None:
+                fresh = snap.patched(logged[1], logged[0], indexed or [])
+        if fresh is None:
+            version, rowids, records = store.versioned_records()
+            fresh = TableSnapshot(records, version, indexed or [], rowids)
+        with self._lock:
+            current = self._snapshots.get(table_name)
+            if current is None or current.version <= fresh.version:
+                self._snapshots[table_name] = fresh
+                self._snapshots.move_to_end(table_name)
+            while len(self._snapshots) > self._max_tables:
+                self._snapshots.popitem(last=False)
+        return fresh
+
+    def invalidate(self, table_name: Optional[str] = None) -> None:
+        with self._lock:
+            if table_name is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(table_name, None)
+
+    # —— 条件求值 ——
+    def evaluate(self, snap: TableSnapshot, conditions: Optional[Dict[str, Any]]) -> np.ndarray:
+        """返回匹配记录的布尔掩码。"""
+        mask = np.ones(len(snap), dtype=bool)
+        if not conditions:
+            return mask
+        if not isinstance(conditions, dict):
+            raise QueryError("查询条件必须为对象")
+        for key, value in conditions.items():
+            if key in ("$and", "$or"):
+                if not isinstance(value, list) or not value:
+                    raise QueryError(f"{key} 需要非空条件数组")
+                parts = [self.evaluate(snap, c) for c in value]
+                combined = np.logical_and.reduce(parts) if key == "$and" else np.logical_or.reduce(parts)
+                mask &= combined
+            elif key.startswith("$"):
+                raise QueryError(f"不支持的组合运算符: {key}")
+            elif is_operator_dict(value):
+                for op, arg in value.items():
+                    mask &= self._field_mask(snap, key, op, arg)
+            else:
+                mask &= self._field_mask(snap, key, "$eq", value)
+        return mask
+
+    def _field_mask(self, snap: TableSnapshot, field: str, op: str, arg: Any) -> np.ndarray:
+        if op not in _FIELD_OPS:
+            raise QueryError(f"不支持的运算符: {op}")
+        col = snap.column(field)
+        present = col.notna().to_numpy()
+        if op == "$null":
+            return ~present if arg else present
+        if op == "$eq":
+            if isinstance(arg, (list, dict)):
+                return col.map(lambda v: v == arg).to_numpy(dtype=bool)
+            if arg is None:
+                return ~present
+            return (col == arg).to_numpy(dtype=bool) & present
+        if op == "$ne":
+            return ~self._field_mask(snap, field, "$eq", arg)
+        if op in ("$in", "$nin"):
+            if not isinstance(arg, list):
+                raise QueryError(f"{op} 需要数组参数")
+            scalars = [a for a in arg if not isinstance(a, (list, dict))]
+            hit = col.isin(scalars).to_numpy(dtype=bool) & present if scalars else np.zeros(len(col), dtype=bool)
+            if None in arg:
+                hit |= ~present
+            return hit if op == "$in" else ~hit
+        if op == "$like":
+            if not isinstance(arg, str):
+                raise QueryError("$like 需要字符串参数")
+            is_str, values = snap.strings(field)
+            hit = np.zeros(len(col), dtype=bool)
+            if is_str.any():
+                hit[is_str] = values.str.match(_like_regex(arg), case=False).to_numpy(dtype=bool)
+            return hit
+        if op == "$contains":
+            hit = np.zeros(len(col), dtype=bool)
+            if isinstance(arg, str):
+                is_str, values = snap.strings(field)
+                if is_str.any():
+                    hit[is_str] = values.str.contains(arg, regex=False).to_numpy(dtype=bool)
+            is_list = col.map(lambda v: isinstance(v, list)).to_numpy(dtype=bool)
+            if is_list.any():
+                hit[is_list] = col[is_list].map(lambda v: arg in v).to_numpy(dtype=bool)
+            return hit
+        return self._range_mask(snap, field, op, arg)
+
+    def _range_mask(self, snap: TableSnapshot, field: str, op: str, arg: Any) -> np.ndarray:
+        if isinstance(arg, bool) or not isinstance(arg, (int, float, str)):
+            raise QueryError(f"{op} 需要数值或字符串参数")
+        if isinstance(arg, str):
+            # 字符串比较（如 ISO 日期），只比较字符串值
+            is_str, strings = snap.strings(field)
+            hit = np.zeros(len(snap), dtype=bool)
+            if is_str.any():
+                values = strings.to_numpy()
+                hit[is_str] = {"$gt": values > arg, "$gte": values >= arg,
+                               "$lt": values < arg, "$lte": values <= arg}[op]
+            return hit
+        key, numeric = snap.sort_key(field)
+        if not numeric:
+            values = pd.to_numeric(snap.column(field), errors="coerce").to_numpy(dtype=float)
+        elif field in snap.indexed:
+            # 有序索引：二分取区间
+            order = snap.sorted_order(field)
+            ordered = key[order]
+            valid = int(np.count_nonzero(~np.isnan(ordered)))
+            ordered = ordered[:valid]
+            if op in ("$gt", "$gte"):
+                lo, hi = np.searchsorted(ordered, arg, side="right" if op == "$gt" else "left"), valid
+            else:
+                lo, hi = 0, np.searchsorted(ordered, arg, side="left" if op == "$lt" else "right")
+            hit = np.zeros(len(key), dtype=bool)
+            hit[order[lo:hi]] = True
+            return hit
+        else:
+            values = key
+        with np.errstate(invalid="ignore"):
+            return {"$gt": values > arg, "$gte": values >= arg,
+                    "$lt": values < arg, "$lte": values <= arg}[op]
+
+    # —— 排序分页 ——
+    def select(self, snap: TableSnapshot, mask: np.ndarray, sort_by: Optional[str],
+               descending: bool, offset: int, limit: int) -> List[int]:
+        """返回当前页的记录下标。同值按插入顺序（稳定）。"""
+        offset = max(0, int(offset))
+        limit = max(0, int(limit))
+        candidates = np.flatnonzero(mask)
+        k = offset + limit
+        if not sort_by or k == 0 or len(candidates) == 0:
+            return candidates[offset:k].tolist()
+        key, _ = snap.sort_key(sort_by)
+        if sort_by in snap.indexed:
+            order = snap.sorted_order(sort_by, descending)
+            return order[mask[order]][offset:k].tolist()
+        values = key[candidates]
+        if descending:
+            values = -values
+        values = np.where(np.isnan(values), np.inf, values)  # 空值排最后
+        if k < len(candidates):
+            # 只保留不大于第 k 小值的候选（含并列），再做稳定排序
+            kth = np.partition(values, k - 1)[k - 1]
+            keep = values <= kth
+            candidates, values = candidates[keep], values[keep]
+        order = np.lexsort((candidates, values))
+        return candidates[order][offset:k].tolist()
+
+    def query(self, snap: TableSnapshot, conditions: Optional[Dict[str, Any]] = None,
+              sort_by: Optional[str] = None, sort_order: str = "asc",
+              limit: int = 100, offset: int = 0) -> Tuple[int, List[Dict[str, Any]]]:
+        """返回 (匹配总数, 当前页记录副本)。"""
+        mask = self.evaluate(snap, conditions)
+        rows = self.select(snap, mask, sort_by, str(sort_order).lower() == "desc", offset, limit)
+        return int(np.count_nonzero(mask)), [copy.deepcopy(snap.records[i]) for i in rows]
@@ -0,0 +1,545 @@
+"""
+表记录存储引擎（SQLite）
+
+- 每张表一个库文件 <data_dir>/<表名>.sqlite3，记录一行：_rowid（插入顺序）+ _doc（完整记录 JSON）
+- schema 中标量类型（string/integer/number/boolean）的属性生成同名列，值由 _doc 派生，供按字段查找；
+  主键字段（metadata.primary_key，缺省 id）与 metadata.indexes 中声明的字段建 B-tree 索引，
+  按这些字段增删改查为 O(log n)
+- 记录数保存在 meta 表中随写入事务维护，list_tables 不再解析数据文件
+- schema metadata.aggregates 声明的聚合（见 aggregates.py）与记录在同一事务内增量维护
+- 原 <表名>.json 作为导入/导出格式：首次打开或 JSON 被外部修改后自动导入，export_json 写回
+- insert_many 在单个事务内逐批写入（批量导入用），iter_batches 按批读出（流式导出用）
+- 最近的写入（追加/更新/删除的行）按数据版本记入内存变更日志，查询快照据此增量更新而不必整表重读
+"""
+import json
+import os
+import sqlite3
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .aggregates import TableAggregates, parse_spec
+from .bulk_io import write_records
+
+DB_SUFFIX = ".sqlite3"
+
+# 变更日志保留的写入次数；单次追加超过 CHANGE_LOG_ROWS 行时只记为整体变化
+CHANGE_LOG_SIZE = 64
+CHANGE_LOG_ROWS = 5000
+
+# schema 类型 -> 可生成列的标量类型
+_SCALAR_TYPES = {"string", "integer", "number", "boolean"}
+
+_DDL = (
+    "CREATE TABLE IF NOT EXISTS records (_rowid INTEGER PRIMARY KEY AUTOINCREMENT, _doc TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+)
+
+
+def db_path_for(data_dir: str, table_name: str) -> str:
+    return os.path.join(data_dir, f"{table_name}{DB_SUFFIX}")
+
+
+def json_path_for(data_dir: str, table_name: str) -> str:
+    return os.path.join(data_dir, f"{table_name}.json")
+
+
+def _json_stamp(path: str) -> str:
+    try:
+        st = os.stat(path)
+        return f"{st.st_mtime_ns}:{st.st_size}"
+    except OSError:
+        return ""
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _json_key(name: str) -> str:
+    return '$."' + name + '"'
+
+
+def _is_scalar(value: Any) -> bool:
+    return isinstance(value, (str, int, float)) and not (isinstance(value, float) and value != value)
+
+
+def _field_type(prop: Any) -> Optional[str]:
+    t = prop.get("type") if isinstance(prop, dict) else None
+    if isinstance(t, list):
+        t = next((x for x in t if x != "null"), None)
+    return t
+
+
+def schema_columns(schema: Optional[Dict[str, Any]]) -> List[str]:
+    """schema 中可生成列的属性名（标量类型，且不与内部列冲突）。"""
+    props = (schema or {}).get("properties") or {}
+    cols = []
+    for name, prop in props.items():
+        if not isinstance(name, str) or not name or name.startswith("_") or '"' in name:
+            continue
+        if _field_type(prop) in _SCALAR_TYPES:
+            cols.append(name)
+    return cols
+
+
+def schema_primary_key(schema: Optional[Dict[str, Any]]) -> Optional[str]:
+    meta = (schema or {}).get("metadata") or {}
+    pk = meta.get("primary_key")
+    if isinstance(pk, str) and pk:
+        return pk
+    return "id" if "id" in ((schema or {}).get("properties") or {}) else None
+
+
+def schema_indexes(schema: Optional[Dict[str, Any]]) -> List[str]:
+    """需要建索引的字段：主键 + metadata.indexes。"""
+    meta = (schema or {}).get("metadata") or {}
+    fields = []
+    pk = schema_primary_key(schema)
+    if pk:
+        fields.append(pk)
+    for f in meta.get("indexes") or []:
+        if isinstance(f, str) and f not in fields:
+            fields.append(f)
+    return fields
+
+
+def schema_signature(schema: Optional[Dict[str, Any]]) -> str:
+    """ensure_schema 实际用到的部分（生成列、索引、聚合声明）的签名；相同则无需重复应用。"""
+    return json.dumps([schema_columns(schema), schema_indexes(schema), parse_spec(schema)],
+                      ensure_ascii=False, sort_keys=True)
+
+
+class RecordStore:
+    """单张表的记录存储。线程安全（单连接 + 锁）。
+
+    与原 JSON 实现语义一致：记录按插入顺序排列；按字段查找取第一条匹配，删除删除全部匹配。
+    """
+
+    def __init__(self, db_path: str, schema: Optional[Dict[str, Any]] = None) -> None:
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for ddl in _DDL:
+            self._conn.execute(ddl)
+        if TableAggregates.create_tables(self._conn):
+            # 旧版聚合表已重建为空：标记失效，读取前全量重算
+            self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('agg_stale', '1')")
+        self._conn.execute(
+            "INSERT OR IGNORE INTO meta(key, value) SELECT 'record_count', COUNT(*) FROM records")
+        self._conn.commit()
+        # (数据版本, 变更)；变更为 ("append", rowids, 记录) / ("update", rowid, 记录) / ("delete", rowids)，
+        # None 表示无法增量描述（整表替换等）。只记录已提交的事务
+        self._changes: Deque[Tuple[int, Optional[Tuple]]] = deque(maxlen=CHANGE_LOG_SIZE)
+        self._pending: List[Tuple[int, Optional[Tuple]]] = []
+        self._columns: List[str] = []
+        self._load_columns()
+        self._aggregates: Optional[TableAggregates] = None
+        self._agg_spec_raw: Optional[str] = None
+        self._sync_aggregates_locked()
+        if schema:
+            self.ensure_schema(schema)
+
+    @classmethod
+    def for_table(cls, data_dir: str, table_name: str,
+                  schema: Optional[Dict[str, Any]] = None) -> "RecordStore":
+        """打开表对应的库；存在 <表名>.json 且自上次导入/导出后有变化时重新导入。"""
+        store = cls(db_path_for(data_dir, table_name), schema)
+        json_path = json_path_for(data_dir, table_name)
+        stamp = _json_stamp(json_path)
+        if stamp and store.get_meta("json_stamp") != stamp:
+            try:
+                with open(json_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception:
+                data = []
+            store.import_records(data if isinstance(data, list) else [])
+            store.set_meta("json_stamp", stamp)
+        return store
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+
+    # —— meta ——
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?,?)", (key, value))
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """写入事务；提交成功后才把事务内的变更记入变更日志，回滚则丢弃。"""
+        with self._lock:
+            self._sync_aggregates_locked()
+            self._pending = []
+            try:
+                with self._conn:
+                    yield
+                self._changes.extend(self._pending)
+            finally:
+                self._pending = []
+
+    def _touch_locked(self, delta: int = 0, change: Optional[Tuple] = None) -> None:
+        """写入事务内维护记录数与数据版本号（供快照缓存判断失效），并暂存本次变更。"""
+        if delta:
+            self._conn.execute(
+                "UPDATE meta SET value = CAST(value AS INTEGER) + ? WHERE key='record_count'", (delta,))
+        self._conn.execute(
+            "INSERT INTO meta(key, value) VALUES ('data_version', '1')"
+            " ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+        version = self._conn.execute("SELECT value FROM meta WHERE key='data_version'").fetchone()[0]
+        self._pending.append((int(version), change))
+
+    @property
+    def version(self) -> int:
+        """数据版本号，每次写入递增。"""
+        try:
+            return int(self.get_meta("data_version") or 0)
+        except ValueError:
+            return 0
+
+    def changes_since(self, version: int) -> Optional[Tuple[int, List[Tuple]]]:
+        """(当前版本, version 之后的变更列表)；日志接不上（已被挤出、其它连接写入、整表替换）时返回 None。"""
+        with self._lock:
+            current = self.version
+            if current < version or current - version > len(self._changes):
+                return None
+            logged = {v: change for v, change in self._changes if version < v <= current}
+            changes = [logged.get(v) for v in range(version + 1, current + 1)]
+        if any(change is None for change in changes):
+            return None
+        return current, changes
+
+    def count(self) -> int:
+        """记录数（取自 meta，缺失时统计一次并写回）。"""
+        value = self.get_meta("record_count")
+        if value is not None:
+            try:
+                return int(value)
+            except ValueError:
+                pass
+        with self._lock, self._conn:
+            n = self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+            self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('record_count', ?)", (str(n),))
+        return n
+
+    # —— 列 ——
+    def _load_columns(self) -> None:
+        rows = self._conn.execute("PRAGMA table_info(records)").fetchall()
+        self._columns = [r[1] for r in rows if r[1] not in ("_rowid", "_doc")]
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._columns)
+
+    def ensure_schema(self, schema: Dict[str, Any]) -> None:
+        """按 schema 补齐生成列与索引；已有列不删除（多余列只是不再被新 schema 使用）。"""
+        wanted = schema_columns(schema)
+        indexed = [f for f in schema_indexes(schema) if f in wanted]
+        with self._lock, self._conn:
+            for name in wanted:
+                if name in self._columns:
+                    continue
+                self._conn.execute(f"ALTER TABLE records ADD COLUMN {_quote(name)}")
+                # 回填：仅标量值成列，对象/数组留在 _doc 中
+                self._conn.execute(
+                    f"UPDATE records SET {_quote(name)} = CASE json_type(_doc, ?)"
+                    f" WHEN 'text' THEN json_extract(_doc, ?) WHEN 'integer' THEN json_extract(_doc, ?)"
+                    f" WHEN 'real' THEN json_extract(_doc, ?) WHEN 'true' THEN 1 WHEN 'false' THEN 0 END",
+                    (_json_key(name),) * 4,
+                )
+                self._columns.append(name)
+            for name in indexed:
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_quote('idx_' + name)} ON records({_quote(name)})")
+        self._configure_aggregates(parse_spec(schema))
+
+    # —— 聚合 ——
+    def _sync_aggregates_locked(self) -> None:
+        """按 meta 中的 agg_spec 切换维护器：同一个库可能由另一连接（如分析工具与表格工具各持一个）改了聚合声明。"""
+        raw = self.get_meta("agg_spec")
+        if raw == self._agg_spec_raw:
+            return
+        self._agg_spec_raw = raw
+        try:
+            spec = json.loads(raw or "null")
+        except ValueError:
+            spec = None
+        self._aggregates = TableAggregates(spec) if spec else None
+
+    def _configure_aggregates(self, spec: Optional[Dict[str, List[str]]]) -> None:
+        """聚合声明变化时切换维护器并全量重建。"""
+        with self._lock:
+            self._sync_aggregates_locked()
+            current = self._aggregates.spec if self._aggregates else None
+            if spec == current:
+                return
+        raw = json.dumps(spec, ensure_ascii=False)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('agg_spec', ?)", (raw,))
+            self._agg_spec_raw = raw
+            self._aggregates = TableAggregates(spec) if spec else None
+            if self._aggregates is None:
+                for table in ("agg_fields", "agg_groups", "agg_group_fields"):
+                    self._conn.execute(f"DELETE FROM {table}")
+            else:
+                self._recompute_aggregates_locked()
+
+    def _recompute_aggregates_locked(self) -> None:
+        self._aggregates.recompute_locked(self._conn, (r for _, r in self._scan()))
+        self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('agg_stale', '0')")
+
+    def _apply_aggregates_locked(self, record: Dict[str, Any], sign: int) -> None:
+        if self._aggregates is not None and self._aggregates.apply_locked(self._conn, record, sign):
+            self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('agg_stale', '1')")
+
+    @property
+    def has_aggregates(self) -> bool:
+        with self._lock:
+            self._sync_aggregates_locked()
+            return self._aggregates is not None
+
+    def aggregates(self) -> Optional[Dict[str, Any]]:
+        """物化聚合结果；未声明聚合时返回 None。极值失效时先全量重算。"""
+        with self._lock:
+            self._sync_aggregates_locked()
+            if self._aggregates is None:
+                return None
+            if self.get_meta("agg_stale") == "1":
+                with self._conn:
+                    self._recompute_aggregates_locked()
+            raw = self._aggregates.read_locked(self._conn)
+            return self._aggregates.format(raw, self.count())
+
+    def check_aggregates(self, tolerance: float = 1e-6) -> List[str]:
+        """对比物化聚合与全量重算结果，返回不一致项（空列表表示一致）。"""
+        with self._lock:
+            self._sync_aggregates_locked()
+            if self._aggregates is None:
+                return []
+            exact = self._aggregates.compute(r for _, r in self._scan())
+            stored = self._aggregates.read_locked(self._conn)
+            if self.get_meta("agg_stale") == "1":
+                # 极值已知失效（下次读取时重算），只比较可增量维护的部分
+                fields = {}
+                for k, v in stored[0].items():
+                    e = exact[0].get(k)
+                    fields[k] = v[:3] + (e[3:] if e else v[3:])
+                stored = (fields, stored[1], stored[2])
+            return self._aggregates.diff(stored, exact, tolerance)
+
+    def recompute_aggregates(self) -> bool:
+        """全量重建物化聚合。"""
+        with self._lock:
+            self._sync_aggregates_locked()
+            if self._aggregates is None:
+                return False
+            with self._conn:
+                self._recompute_aggregates_locked()
+            return True
+
+    def _row_values(self, record: Dict[str, Any]) -> Tuple:
+        values: List[Any] = [json.dumps(record, ensure_ascii=False)]
+        for name in self._columns:
+            v = record.get(name)
+            values.append(v if _is_scalar(v) else None)
+        return tuple(values)
+
+    def _insert_sql(self) -> str:
+        cols = ", ".join(["_doc"] + [_quote(c) for c in self._columns])
+        marks = ", ".join("?" * (len(self._columns) + 1))
+        return f"INSERT INTO records ({cols}) VALUES ({marks})"
+
+    # —— 查找 ——
+    def _match_sql(self, field: str, value: Any) -> Optional[Tuple[str, Tuple]]:
+        """字段等值条件的 SQL；值非标量时返回 None（由调用方在 Python 中比较）。"""
+        if not _is_scalar(value):
+            return None
+        if field in self._columns:
+            return f"{_quote(field)} = ?", (value,)
+        if '"' in field:
+            return None
+        # 未生成列的字段：json_extract 比较（布尔在 JSON 中取出为 1/0，与 Python True == 1 一致）
+        return "json_extract(_doc, ?) = ?", (_json_key(field), value)
+
+    def _scan(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT _rowid, _doc FROM records ORDER BY _rowid").fetchall()
+        for rowid, doc in rows:
+            try:
+                yield rowid, json.loads(doc)
+            except ValueError:
+                continue
+
+    def _matches(self, conditions: Dict[str, Any]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        sql_parts: List[str] = []
+        params: List[Any] = []
+        rest: Dict[str, Any] = {}
+        for field, value in (conditions or {}).items():
+            m = self._match_sql(field, value)
+            if m is None:
+                rest[field] = value
+            else:
+                sql_parts.append(m[0])
+                params.extend(m[1])
+        if not sql_parts and rest:
+            rows: Iterable[Tuple[int, Dict[str, Any]]] = self._scan()
+        else:
+            where = (" WHERE " + " AND ".join(sql_parts)) if sql_parts else ""
+            with self._lock:
+                raw = self._conn.execute(
+                    f"SELECT _rowid, _doc FROM records{where} ORDER BY _rowid", params).fetchall()
+            rows = ((rid, json.loads(doc)) for rid, doc in raw)
+        for rowid, record in rows:
+            # SQL 预筛后按原语义复核（字段存在且值相等）
+            if all(f in record and record[f] == v for f, v in (conditions or {}).items()):
+                yield rowid, record
+
+    def find(self, conditions: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """等值条件查询，按插入顺序返回。"""
+        return [r for _, r in self._matches(conditions or {})]
+
+    def get(self, field: str, value: Any) -> Optional[Dict[str, Any]]:
+        for _, record in self._matches({field: value}):
+            return record
+        return None
+
+    def records(self) -> List[Dict[str, Any]]:
+        return [r for _, r in self._scan()]
+
+    def versioned_records(self) -> Tuple[int, List[int], List[Dict[str, Any]]]:
+        """(数据版本, rowid 列表, 记录列表)，在同一把锁内读取，版本与内容一致。"""
+        with self._lock:
+            version = self.version
+            rows = list(self._scan())
+        return version, [rowid for rowid, _ in rows], [r for _, r in rows]
+
+    def iter_batches(self, batch_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """按插入顺序分批读出开始时已有的记录（按 _rowid 键集分页，每批单独加锁）。"""
+        with self._lock:
+            last, end = 0, self._conn.execute("SELECT COALESCE(MAX(_rowid), 0) FROM records").fetchone()[0]
+        while last < end:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT _rowid, _doc FROM records WHERE _rowid > ? AND _rowid <= ? ORDER BY _rowid LIMIT ?",
+                    (last, end, batch_size)).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            batch = []
+            for _, doc in rows:
+                try:
+                    batch.append(json.loads(doc))
+                except ValueError:
+                    continue
+            yield batch
+
+    # —— 修改 ——
+    def insert(self, record: Dict[str, Any]) -> bool:
+        try:
+            values = self._row_values(record)
+            with self._writing():
+                rowid = self._conn.execute(self._insert_sql(), values).lastrowid
+                self._apply_aggregates_locked(record, 1)
+                self._touch_locked(1, ("append", [rowid], [json.loads(values[0])]))
+            return True
+        except Exception:
+            return False
+
+    def update_first(self, field: str, value: Any, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """更新第一条 field == value 的记录，返回更新后的记录；未找到返回 None。"""
+        with self._lock:
+            for rowid, record in self._matches({field: value}):
+                old = dict(record)
+                record.update(fields)
+                sets = ", ".join(["_doc = ?"] + [f"{_quote(c)} = ?" for c in self._columns])
+                values = self._row_values(record)
+                with self._writing():
+                    self._conn.execute(f"UPDATE records SET {sets} WHERE _rowid = ?", values + (rowid,))
+                    self._apply_aggregates_locked(old, -1)
+                    self._apply_aggregates_locked(record, 1)
+                    self._touch_locked(0, ("update", rowid, json.loads(values[0])))
+                return record
+        return None
+
+    def delete_where(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """删除全部 field == value 的记录，返回被删除的记录。"""
+        with self._lock:
+            hits = list(self._matches({field: value}))
+            if not hits:
+                return []
+            with self._writing():
+                self._conn.executemany("DELETE FROM records WHERE _rowid = ?", [(rid,) for rid, _ in hits])
+                for _, record in hits:
+                    self._apply_aggregates_locked(record, -1)
+                self._touch_locked(-len(hits), ("delete", [rid for rid, _ in hits]))
+        return [r for _, r in hits]
+
+    def insert_many(self, batches: Iterable[List[Dict[str, Any]]], replace: bool = False) -> int:
+        """在一个事务内逐批插入（batches 可为边读边校验的生成器），replace 时先清空。
+
+        任一批出错则整体回滚并抛出异常。返回插入条数。
+        """
+        total = 0
+        with self._writing():
+            if replace:
+                self._conn.execute("DELETE FROM records")
+            # 本事务新插入的行 _rowid 均大于此值（AUTOINCREMENT 单调递增）
+            last = self._conn.execute("SELECT COALESCE(MAX(_rowid), 0) FROM records").fetchone()[0]
+            sql = self._insert_sql()
+            for batch in batches:
+                batch = [r for r in batch if isinstance(r, dict)]
+                if not batch:
+                    continue
+                self._conn.executemany(sql, [self._row_values(r) for r in batch])
+                if self._aggregates is not None and not replace:
+                    self._aggregates.add_many_locked(self._conn, batch)
+                total += len(batch)
+            if replace:
+                self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('record_count', ?)",
+                                   (str(total),))
+                if self._aggregates is not None:
+                    self._recompute_aggregates_locked()
+                self._touch_locked()
+            elif total <= CHANGE_LOG_ROWS:
+                rows = self._conn.execute(
+                    "SELECT _rowid, _doc FROM records WHERE _rowid > ? ORDER BY _rowid", (last,)).fetchall()
+                self._touch_locked(total, ("append", [r[0] for r in rows], [json.loads(r[1]) for r in rows]))
+            else:
+                self._touch_locked(total)
+        return total
+
+    def import_records(self, records: Iterable[Any]) -> int:
+        """清空并批量导入记录（非 dict 条目跳过），返回导入条数。"""
+        records = [r for r in records if isinstance(r, dict)]
+        rows = [self._row_values(r) for r in records]
+        with self._writing():
+            self._conn.execute("DELETE FROM records")
+            self._conn.executemany(self._insert_sql(), rows)
+            self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('record_count', ?)",
+                               (str(len(rows)),))
+            if self._aggregates is not None:
+                self._aggregates.recompute_locked(self._conn, records)
+                self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('agg_stale', '0')")
+            self._touch_locked()
+        return len(rows)
+
+    def export_json(self, json_path: str) -> bool:
+        """导出为原 JSON 数组格式（逐批流式写出），并记录签名（避免下次打开时重复导入）。"""
+        try:
+            write_records(json_path, "json", self.iter_batches)
+        except Exception:
+            return False
+        self.set_meta("json_stamp", _json_stamp(json_path))
+        return True
@@ -3,20 +3,94 @@
 """
 import os
 import json
+import copy
+import threading
 import jsonschema
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+
+# 编译型校验器（可选）
+try:
+    import fastjsonschema
+    FASTJSONSCHEMA_AVAILABLE = True
+except ImportError:
+    FASTJSONSCHEMA_AVAILABLE = False
+
+class _CompiledSchema:
+    """某一版本 schema 文件的解析结果与编译好的校验器"""
+    
+    def __init__(self, stamp: Tuple[int, int], schema: Dict[str, Any], use_fast: bool):
+        self.stamp = stamp
+        self.schema = schema
+        self.validator = jsonschema.validators.validator_for(schema)(schema)
+        self.fast_validate = None
+        if use_fast:
+            try:
+                # use_default=False：只校验，不把 schema 中的 default 写入被校验的记录
+                self.fast_validate = fastjsonschema.compile(schema, use_default=False)
+            except Exception:
+                # 个别 schema 特性不被支持时退回 jsonschema
+                self.fast_validate = None
 
 class SchemaManager:
     """表结构定义管理器"""
     
-    def __init__(self, schema_dir: str):
+    def __init__(self, schema_dir: str, use_fast_validator: bool = False):
         """初始化Schema管理器
         
         Args:
             schema_dir: 表结构定义目录
+            use_fast_validator: 安装了fastjsonschema时用其编译的校验器先行校验
+                （通过即返回；不通过再由jsonschema给出完整错误列表）
         """
         self.schema_dir = schema_dir
+        self.use_fast_validator = use_fast_validator and FASTJSONSCHEMA_AVAILABLE
         os.makedirs(schema_dir, exist_ok=True)
+        # 表名 -> 编译结果，按schema文件 (mtime_ns, size) 失效
+        self._compiled: Dict[str, _CompiledSchema] = {}
+        self._lock = threading.Lock()
+    
+    def _schema_path(self, name: str) -> str:
+        return os.path.join(self.schema_dir, f"{name}.json")
+    
+    def _get_compiled(self, name: str) -> Optional[_CompiledSchema]:
+        """取表的编译结果，schema文件变化后重新解析编译
+        
+        Args:
+            name: 表名
+            
+        Returns:
+            编译结果，schema不存在时返回None
+        """
+        try:
+            st = os.stat(self._schema_path(name))
+        except OSError:
+            with self._lock:
+                self._compiled.pop(name, None)
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            compiled = self._compiled.get(name)
+        if compiled is not None and compiled.stamp == stamp:
+            return compiled
+        
+        with open(self._schema_path(name), 'r', encoding='utf-8') as f:
+            schema = json.load(f)
+        compiled = _CompiledSchema(stamp, schema, self.use_fast_validator)
+        with self._lock:
+            self._compiled[name] = compiled
+        return compiled
+    
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """清除编译缓存
+        
+        Args:
+            name: 表名，为None时清除全部
+        """
+        with self._lock:
+            if name is None:
+                self._compiled.clear()
+            else:
+                self._compiled.pop(name, None)
     
     def register_schema(self, name: str, schema: Dict[str, Any]) -> bool:
         """注册新的表结构
@@ -43,6 +117,7 @@ class SchemaManager:
             schema_path = os.path.join(self.schema_dir, f"{name}.json")
             with open(schema_path, 'w', encoding='utf-8') as f:
                 json.dump(schema, f, ensure_ascii=False, indent=2)
+            self.invalidate(name)
             return True
         except Exception as e:
             print(f"Schema注册错误: {e}")
@@ -77,12 +152,24 @@ class SchemaManager:
         Returns:
             表结构定义，如果不存在则返回None
         """
-        schema_path = os.path.join(self.schema_dir, f"{name}.json")
-        if not os.path.exists(schema_path):
+        compiled = self._get_compiled(name)
+        if compiled is None:
             return None
-        
-        with open(schema_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        # 返回副本，调用方修改不影响缓存
+        return copy.deepcopy(compiled.schema)
+    
+    @staticmethod
+    def _collect_errors(compiled: _CompiledSchema, data: Any) -> List[str]:
+        """校验单条记录，返回全部错误"""
+        if compiled.fast_validate is not None:
+            try:
+                compiled.fast_validate(data)
+                return []
+            except fastjsonschema.JsonSchemaException:
+                pass
+        errors = sorted(compiled.validator.iter_errors(data), key=lambda e: [str(p) for p in e.path])
+        # 格式化验证错误信息
+        return [f"字段 '{'.'.join(str(p) for p in e.path)}': {e.message}" for e in errors]
     
     def validate_data(self, name: str, data: Dict[str, Any]) -> List[str]:
         """验证数据是否符合schema
@@ -92,20 +179,34 @@ class SchemaManager:
             data: 数据记录
             
         Returns:
-            验证错误信息列表，如果验证通过则为空列表
+            验证错误信息列表（全部错误），如果验证通过则为空列表
         """
-        schema = self.get_schema(name)
-        if not schema:
+        compiled = self._get_compiled(name)
+        if compiled is None:
             return ["表结构不存在"]
         
-        try:
-            jsonschema.validate(instance=data, schema=schema)
-            return []
-        except jsonschema.exceptions.ValidationError as e:
-            # 格式化验证错误信息
-            error_path = '.'.join(str(p) for p in e.path)
-            error_message = e.message
-            return [f"字段 '{error_path}': {error_message}"]
+        return self._collect_errors(compiled, data)
+    
+    def validate_many(self, name: str, records: List[Dict[str, Any]]) -> Dict[int, List[str]]:
+        """批量验证数据，schema只解析、编译一次
+        
+        Args:
+            name: 表名
+            records: 数据记录列表
+            
+        Returns:
+            {记录下标: 错误信息列表}，只包含未通过的记录
+        """
+        compiled = self._get_compiled(name)
+        if compiled is None:
+            return {i: ["表结构不存在"] for i in range(len(records))}
+        
+        failures: Dict[int, List[str]] = {}
+        for i, record in enumerate(records):
+            errors = self._collect_errors(compiled, record)
+            if errors:
+                failures[i] = errors
+        return failures
             
     def list_schemas(self) -> List[Dict[str, Any]]:
         """列出所有表结构
@@ -160,6 +261,7 @@ class SchemaManager:
             schema_path = os.path.join(self.schema_dir, f"{name}.json")
             with open(schema_path, 'w', encoding='utf-8') as f:
                 json.dump(schema, f, ensure_ascii=False, indent=2)
+            self.invalidate(name)
             return True
         except Exception as e:
             print(f"Schema更新错误: {e}")
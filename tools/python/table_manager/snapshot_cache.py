@@ -0,0 +1,186 @@
+"""
+表数据快照缓存（分析工具用）
+
+- 每张表缓存一份带类型的 DataFrame，键为数据签名：
+  记录库为 (inode, 数据版本号)，旧 JSON 文件为 (mtime_ns, size)；签名不变即复用，不再重复解析
+- 列类型按 schema 推断：integer/number 转数值，format 为 date/date-time 的字符串预解析为日期；
+  其它列的日期/数值转换在首次使用时计算并随快照缓存
+- 内存按 LRU 淘汰，总量不超过预算（至少保留最近一份）
+- 可选持久化为 Parquet（需要 pyarrow），冷启动时按签名直接读取列文件，跳过 JSON 解析
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# Parquet 持久化（可选）
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+DEFAULT_BUDGET_MB = 256
+
+_DATE_FORMATS = {"date", "date-time"}
+
+
+def schema_dtypes(schema: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """schema 属性 -> 快照列类型（"numeric" / "datetime"）。"""
+    result: Dict[str, str] = {}
+    for name, prop in ((schema or {}).get("properties") or {}).items():
+        if not isinstance(prop, dict):
+            continue
+        t = prop.get("type")
+        types = set(t) if isinstance(t, list) else {t}
+        if types & {"integer", "number"} and not types & {"string", "boolean", "object", "array"}:
+            result[name] = "numeric"
+        elif "string" in types and prop.get("format") in _DATE_FORMATS:
+            result[name] = "datetime"
+    return result
+
+
+class FrameSnapshot:
+    """某一签名下的表数据。frame 只读，调用方不得原地修改。"""
+
+    def __init__(self, frame: pd.DataFrame, signature: Tuple, dtypes: Dict[str, str]) -> None:
+        self.frame = frame
+        self.signature = signature
+        self._datetimes: Dict[str, pd.Series] = {}
+        self._numerics: Dict[str, pd.Series] = {}
+        self.nbytes = 0
+        for col, kind in dtypes.items():
+            if col not in frame.columns:
+                continue
+            if kind == "numeric" and not pd.api.types.is_numeric_dtype(frame[col]):
+                frame[col] = pd.to_numeric(frame[col], errors="coerce")
+            elif kind == "datetime":
+                self.datetime(col)
+        self.nbytes += int(frame.memory_usage(deep=True).sum())
+
+    def datetime(self, col: str) -> pd.Series:
+        """列的日期解析结果（无法解析为 NaT），缓存。"""
+        s = self._datetimes.get(col)
+        if s is None:
+            src = self.frame[col]
+            s = src if pd.api.types.is_datetime64_any_dtype(src) else pd.to_datetime(src, errors="coerce")
+            self._datetimes[col] = s
+            self.nbytes += int(s.memory_usage(deep=False))
+        return s
+
+    def numeric(self, col: str) -> pd.Series:
+        """列的数值转换结果（无法转换为 NaN），缓存。"""
+        src = self.frame[col]
+        if pd.api.types.is_numeric_dtype(src):
+            return src
+        s = self._numerics.get(col)
+        if s is None:
+            s = pd.to_numeric(src, errors="coerce")
+            self._numerics[col] = s
+            self.nbytes += int(s.memory_usage(deep=False))
+        return s
+
+
+class SnapshotCache:
+    """按表的快照 LRU 缓存。线程安全。"""
+
+    def __init__(self, budget_mb: float = DEFAULT_BUDGET_MB, persist_dir: Optional[str] = None) -> None:
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.persist_dir = persist_dir if (persist_dir and PARQUET_AVAILABLE) else None
+        self._items: "OrderedDict[str, FrameSnapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+
+    def get(self, table_name: str, signature: Tuple,
+            loader: Callable[[], List[Dict[str, Any]]],
+            dtypes: Optional[Dict[str, str]] = None) -> FrameSnapshot:
+        """取签名匹配的快照；否则依次尝试 Parquet 冷加载、loader 读取记录并建立快照。"""
+        with self._lock:
+            snap = self._items.get(table_name)
+            if snap is not None and snap.signature == signature:
+                self._items.move_to_end(table_name)
+                return snap
+            load_lock = self._loading.setdefault(table_name, threading.Lock())
+        # 同一张表只由一个线程构建，其它线程等待后复用
+        with load_lock:
+            with self._lock:
+                snap = self._items.get(table_name)
+                if snap is not None and snap.signature == signature:
+                    self._items.move_to_end(table_name)
+                    return snap
+            frame = self._read_persisted(table_name, signature)
+            from_disk = frame is not None
+            if frame is None:
+                records = loader()
+                frame = pd.DataFrame(records) if records else pd.DataFrame()
+            snap = FrameSnapshot(frame, signature, dtypes or {})
+            if not from_disk:
+                self._write_persisted(table_name, signature, snap.frame)
+            with self._lock:
+                self._items[table_name] = snap
+                self._items.move_to_end(table_name)
+                self._evict_locked()
+            return snap
+
+    def invalidate(self, table_name: Optional[str] = None) -> None:
+        with self._lock:
+            if table_name is None:
+                self._items.clear()
+            else:
+                self._items.pop(table_name, None)
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(s.nbytes for s in self._items.values())
+
+    def _evict_locked(self) -> None:
+        total = sum(s.nbytes for s in self._items.values())
+        while total > self.budget and len(self._items) > 1:
+            _, old = self._items.popitem(last=False)
+            total -= old.nbytes
+
+    # —— Parquet 持久化 ——
+    def _persist_path(self, table_name: str, signature: Tuple) -> str:
+        digest = hashlib.sha1(repr(signature).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.persist_dir, f"{table_name}-{digest}.parquet")
+
+    def _read_persisted(self, table_name: str, signature: Tuple) -> Optional[pd.DataFrame]:
+        if not self.persist_dir:
+            return None
+        path = self._persist_path(table_name, signature)
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_parquet(path)
+        except Exception:
+            return None
+
+    def _write_persisted(self, table_name: str, signature: Tuple, frame: pd.DataFrame) -> None:
+        if not self.persist_dir or frame.empty:
+            return
+        # 对象列须为纯字符串（含空值）才能无损往返；含数组/对象/混合类型的表不持久化
+        for col in frame.columns:
+            if frame[col].dtype == object and not frame[col].map(lambda v: v is None or isinstance(v, str)).all():
+                return
+        try:
+            os.makedirs(self.persist_dir, exist_ok=True)
+            path = self._persist_path(table_name, signature)
+            tmp_path = path + ".tmp"
+            frame.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            return
+        # 清理该表旧签名的列文件
+        prefix = f"{table_name}-"
+        try:
+            for name in os.listdir(self.persist_dir):
+                full = os.path.join(self.persist_dir, name)
+                if name.startswith(prefix) and name.endswith(".parquet") and full != path \
+                        and len(name) == len(prefix) + 16 + len(".parquet"):
+                    os.remove(full)
+        except Exception:
+            pass
@@ -0,0 +1,141 @@
+"""
+时间序列的重采样、滚动窗口、缺口填充与降采样（分析工具用）
+
+- 重采样在 pandas 上向量化完成，支持 closed / label；旧频率别名（M、Q、Y、H 等）自动换成新写法
+- 缺口为没有数据的周期，可填 0、前向填充或按时间线性插值，count 保持为 0
+- 点数超过预算时用 LTTB（largest-triangle-three-buckets）选点，保留序列形状；所有列取同一组点
+- 输出为列式 JSON：{"index": [...], "<列>": [...]}，数值按有效位数截短
+"""
+import math
+import re
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+STATS = ("mean", "sum", "count", "min", "max", "median", "std", "first", "last")
+FILL_METHODS = ("zero", "ffill", "interpolate")
+
+# pandas 2.2 起废弃/移除的频率别名
+_LEGACY_ALIASES = {"M": "ME", "BM": "BME", "SM": "SME", "Q": "QE", "BQ": "BQE", "Y": "YE", "A": "YE",
+                   "BY": "BYE", "BA": "BYE", "H": "h", "BH": "bh", "T": "min", "S": "s", "L": "ms",
+                   "U": "us", "N": "ns"}
+_RULE_RE = re.compile(r"^(\d*)([A-Za-z]+)(-\w+)?$")
+
+
+def normalize_rule(rule: str) -> str:
+    """当前 pandas 不认的旧频率别名换成新写法；其它原样返回，由 pandas 报错。"""
+    try:
+        pd.tseries.frequencies.to_offset(rule)
+        return rule
+    except ValueError:
+        m = _RULE_RE.match(rule.strip())
+        if m and m.group(2).upper() in _LEGACY_ALIASES:
+            return f"{m.group(1)}{_LEGACY_ALIASES[m.group(2).upper()]}{m.group(3) or ''}"
+        return rule
+
+
+def resample(series: pd.Series, rule: str, stats: List[str],
+             closed: Optional[str] = None, label: Optional[str] = None) -> pd.DataFrame:
+    """按周期聚合，每个统计量一列；总包含 count 列（用于识别缺口）。"""
+    grouped = series.resample(normalize_rule(rule), closed=closed, label=label)
+    names = list(dict.fromkeys(["count"] + list(stats)))
+    return grouped.agg(names)
+
+
+def fill_gaps(frame: pd.DataFrame, method: Optional[str]) -> pd.DataFrame:
+    """填充没有数据的周期（count 为 0）；count 与 sum 保持原值。"""
+    if not method or "count" not in frame.columns:
+        return frame
+    empty = frame["count"].to_numpy() == 0
+    if not empty.any():
+        return frame
+    frame = frame.copy()
+    for col in frame.columns:
+        if col in ("count", "sum"):
+            continue
+        values = frame[col].astype(float).mask(empty)
+        if method == "zero":
+            values = values.fillna(0.0)
+        elif method == "ffill":
+            values = values.ffill()
+        elif method == "interpolate":
+            values = values.interpolate(method="time", limit_area="inside")
+        frame[col] = values
+    return frame
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """LTTB 选点，返回保留点的下标（含首尾，升序）。
+
+    每个桶内三角形面积一次向量化求出，只在桶之间循环，总复杂度 O(n)。
+    y 中的 NaN 在选点时按 0 处理。
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float), nan=0.0)
+    # 中间 n-2 个点均分到 threshold-2 个桶
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # 下一个桶的均值点（最后一个桶用末点）
+        if i + 2 < len(edges):
+            nlo, nhi = edges[i + 1], edges[i + 2]
+            cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        else:
+            cx, cy = x[-1], y[-1]
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample(frame: pd.DataFrame, column: str, max_points: int) -> pd.DataFrame:
+    """按 column 的形状用 LTTB 降到 max_points 行；不超过预算时原样返回。"""
+    if max_points <= 0 or len(frame) <= max_points:
+        return frame
+    x = frame.index.asi8.astype(float) if isinstance(frame.index, pd.DatetimeIndex) else np.arange(len(frame))
+    y = frame[column].astype(float).to_numpy()
+    return frame.iloc[lttb_indices(x, y, max(3, max_points))]
+
+
+def _compact(value: Any, digits: int) -> Any:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    value = float(value)
+    if math.isinf(value):
+        return None
+    rounded = float(f"{value:.{digits}g}")
+    return int(rounded) if rounded.is_integer() and abs(rounded) < 2 ** 53 else rounded
+
+
+def to_columnar(frame: pd.DataFrame, digits: int = 6) -> Dict[str, List[Any]]:
+    """列式 JSON：时间索引全为零点时只保留日期，数值保留 digits 位有效数字。"""
+    index = frame.index
+    if isinstance(index, pd.DatetimeIndex):
+        if index.tz is None and (index.normalize() == index).all():
+            labels = [ts.strftime("%Y-%m-%d") for ts in index]
+        else:
+            labels = [ts.isoformat() for ts in index]
+    else:
+        labels = [str(v) for v in index]
+    result: Dict[str, List[Any]] = {"index": labels}
+    for col in frame.columns:
+        if col == "count":
+            result[col] = [int(v) for v in frame[col].to_numpy()]
+        else:
+            result[str(col)] = [_compact(v, digits) for v in frame[col].to_numpy()]
+    return result
+
+
+def rolling(frame: pd.DataFrame, column: str, window: Union[int, str], stat: str = "mean") -> pd.Series:
+    """对 column 做滚动窗口统计；window 为周期数或时间跨度（如 "7D"）。"""
+    roller = frame[column].astype(float).rolling(window, min_periods=1)
+    return getattr(roller, stat)()
@@ -4,30 +4,132 @@
 import os
 import json
 import hashlib
-from typing import Dict, List, Any, Optional
+import heapq
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, List, Any, Optional, Tuple
 import chromadb
 from chromadb.utils import embedding_functions
 
+# 嵌入缓存条目上限（all-MiniLM-L6-v2 每条约 1.5KB）
+EMBEDDING_CACHE_SIZE = 20000
+
 class TableVectorConnector:
-    """表数据向量存储连接器"""
+    """表数据向量存储连接器
+    
+    向量由本连接器计算后以 embeddings 写入/查询集合（不依赖集合自带的嵌入函数）：
+    模型在首次需要嵌入时才加载；相同文档文本（sha256）的向量在内存中缓存；
+    集合元数据记录文本哈希，文本未变化的记录在批量索引时直接跳过。
+    """
     
-    def __init__(self, chroma_db_path: str, collection_prefix: str = "table_"):
+    def __init__(self, chroma_db_path: str, collection_prefix: str = "table_",
+                 model_name: str = "all-MiniLM-L6-v2", batch_size: int = 256,
+                 max_workers: int = 8):
         """初始化向量存储连接器
         
         Args:
             chroma_db_path: ChromaDB存储路径
             collection_prefix: 集合名称前缀
+            model_name: SentenceTransformer模型名称
+            batch_size: 批量嵌入/写入的条数
+            max_workers: 多表并发搜索的线程数
         """
         self.chroma_db_path = chroma_db_path
         self.collection_prefix = collection_prefix
+        self.model_name = model_name
+        self.batch_size = max(1, int(batch_size))
+        self.max_workers = max(1, int(max_workers))
         
         # 初始化ChromaDB客户端
         self.client = chromadb.PersistentClient(path=chroma_db_path)
         
-        # 使用默认的OpenAI嵌入函数
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2"
-        )
+        self._embedding_function = None
+        self._model_lock = threading.Lock()
+        self._collections: Dict[str, Any] = {}
+        self._collections_lock = threading.Lock()
+        self._embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    @property
+    def embedding_function(self):
+        """嵌入函数（首次访问时加载模型）"""
+        if self._embedding_function is None:
+            with self._model_lock:
+                if self._embedding_function is None:
+                    self._embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
+                        model_name=self.model_name
+                    )
+        return self._embedding_function
+    
+    @staticmethod
+    def _text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        """批量计算嵌入向量，命中缓存的文本不再重复计算
+        
+        Args:
+            texts: 文本列表
+            
+        Returns:
+            与texts一一对应的向量列表
+        """
+        keys = [self._text_hash(t) for t in texts]
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                cached = self._embedding_cache.get(key)
+                if cached is not None:
+                    self._embedding_cache.move_to_end(key)
+                    vectors[i] = cached
+                else:
+                    missing.setdefault(key, []).append(i)
+        
+        if missing:
+            order = list(missing)
+            fresh: List[List[float]] = []
+            for start in range(0, len(order), self.batch_size):
+                chunk = order[start:start + self.batch_size]
+                embedded = self.embedding_function([texts[missing[k][0]] for k in chunk])
+                fresh.extend([float(x) for x in v] for v in embedded)
+            with self._cache_lock:
+                for key, vector in zip(order, fresh):
+                    for i in missing[key]:
+                        vectors[i] = vector
+                    self._embedding_cache[key] = vector
+                    self._embedding_cache.move_to_end(key)
+                while len(self._embedding_cache) > EMBEDDING_CACHE_SIZE:
+                    self._embedding_cache.popitem(last=False)
+        return vectors  # type: ignore[return-value]
+    
+    def _get_collection(self, table_name: str, create: bool = False):
+        """获取表对应的集合句柄（缓存）
+        
+        Args:
+            table_name: 表名
+            create: 集合不存在时是否创建
+            
+        Returns:
+            集合对象，不存在且不创建时返回None
+        """
+        collection_name = self._get_collection_name(table_name)
+        with self._collections_lock:
+            collection = self._collections.get(collection_name)
+            if collection is not None:
+                return collection
+            try:
+                if create:
+                    collection = self.client.get_or_create_collection(name=collection_name)
+                else:
+                    collection = self.client.get_collection(name=collection_name)
+            except Exception:
+                return None
+            self._collections[collection_name] = collection
+            return collection
     
     def _get_collection_name(self, table_name: str) -> str:
         """获取表对应的向量集合名称
@@ -103,42 +205,96 @@ class TableVectorConnector:
         Returns:
             索引是否成功
         """
-        try:
-            collection_name = self._get_collection_name(table_name)
+        result = self._index_batch(table_name, [(record_id, record)], schema, skip_unchanged=False)
+        return result["failed"] == 0
+    
+    def index_records_many(self, table_name: str, records: List[Dict[str, Any]],
+                           schema: Dict[str, Any], record_id_field: str = "id",
+                           skip_unchanged: bool = True) -> Dict[str, int]:
+        """批量索引记录到向量库
+        
+        Args:
+            table_name: 表名
+            records: 记录列表
+            schema: 表结构定义
+            record_id_field: 记录ID字段名
+            skip_unchanged: 文档文本与已索引内容相同时跳过
             
-            # 获取或创建集合
+        Returns:
+            统计结果：indexed 已写入 / skipped 未变化跳过 / failed 失败（含缺少ID的记录）
+        """
+        items = []
+        missing_id = 0
+        for record in records:
+            record_id = record.get(record_id_field) if isinstance(record, dict) else None
+            if record_id is None or record_id == "":
+                missing_id += 1
+                continue
+            items.append((str(record_id), record))
+        result = self._index_batch(table_name, items, schema, skip_unchanged)
+        result["failed"] += missing_id
+        return result
+    
+    @staticmethod
+    def _build_metadata(table_name: str, record_id: str, text_hash: str,
+                        record: Dict[str, Any]) -> Dict[str, Any]:
+        """向量元数据：记录的标量字段（供 search 的 where 过滤）+ 表名/记录ID/文本哈希"""
+        metadata = {k: v for k, v in record.items()
+                    if isinstance(k, str) and isinstance(v, (str, int, float, bool))}
+        metadata.update({
+            "table_name": table_name,
+            "record_id": record_id,
+            "text_hash": text_hash
+        })
+        return metadata
+    
+    def _index_batch(self, table_name: str, items: List[Tuple[str, Dict[str, Any]]],
+                     schema: Dict[str, Any], skip_unchanged: bool) -> Dict[str, int]:
+        """分批嵌入并写入集合"""
+        result = {"indexed": 0, "skipped": 0, "failed": 0}
+        if not items:
+            return result
+        collection = self._get_collection(table_name, create=True)
+        if collection is None:
+            print(f"索引记录错误: 无法创建集合 {self._get_collection_name(table_name)}")
+            result["failed"] = len(items)
+            return result
+        
+        for start in range(0, len(items), self.batch_size):
+            chunk = items[start:start + self.batch_size]
             try:
-                collection = self.client.get_collection(
-                    name=collection_name,
-                    embedding_function=self.embedding_function
-                )
-            except:
-                collection = self.client.create_collection(
-                    name=collection_name,
-                    embedding_function=self.embedding_function
+                # 同一批内重复的记录以最后一条为准
+                prepared: Dict[str, Tuple[str, str, str]] = {}
+                records_by_id = dict(chunk)
+                for record_id, record in chunk:
+                    document_text = self._prepare_document_text(record, schema)
+                    prepared[self._generate_vector_id(table_name, record_id)] = (
+                        record_id, document_text, self._text_hash(document_text))
+                ids = list(prepared)
+                
+                if skip_unchanged:
+                    existing = collection.get(ids=ids, include=["metadatas"])
+                    for vid, meta in zip(existing.get("ids") or [], existing.get("metadatas") or []):
+                        if vid in prepared and (meta or {}).get("text_hash") == prepared[vid][2]:
+                            del prepared[vid]
+                            result["skipped"] += 1
+                    ids = list(prepared)
+                    if not ids:
+                        continue
+                
+                documents = [prepared[vid][1] for vid in ids]
+                collection.upsert(
+                    ids=ids,
+                    documents=documents,
+                    embeddings=self._embed(documents),
+                    metadatas=[self._build_metadata(table_name, prepared[vid][0], prepared[vid][2],
+                                                    records_by_id[prepared[vid][0]]) for vid in ids]
                 )
-            
-            # 准备文档
-            vector_id = self._generate_vector_id(table_name, record_id)
-            document_text = self._prepare_document_text(record, schema)
-            
-            # 准备元数据
-            metadata = {
-                "table_name": table_name,
-                "record_id": record_id
-            }
-            
-            # 将记录添加到集合
-            collection.upsert(
-                ids=[vector_id],
-                documents=[document_text],
-                metadatas=[metadata]
-            )
-            
-            return True
-        except Exception as e:
-            print(f"索引记录错误: {e}")
-            return False
+                result["indexed"] += len(ids)
+            except Exception as e:
+                print(f"索引记录错误: {e}")
+                result["failed"] += len(chunk)
+        return result
     
     def delete_record_vector(self, table_name: str, record_id: str) -> bool:
         """从向量库删除记录
@@ -151,15 +307,9 @@ class TableVectorConnector:
             删除是否成功
         """
         try:
-            collection_name = self._get_collection_name(table_name)
-            
             # 获取集合
-            try:
-                collection = self.client.get_collection(
-                    name=collection_name,
-                    embedding_function=self.embedding_function
-                )
-            except:
+            collection = self._get_collection(table_name)
+            if collection is None:
                 return True  # 集合不存在视为删除成功
             
             # 生成向量ID
@@ -173,55 +323,92 @@ class TableVectorConnector:
             print(f"删除向量记录错误: {e}")
             return False
     
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._collections_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="table-vector-search")
+            return self._executor
+    
+    def _search_collection(self, table_name: str, query_embedding: List[float], limit: int,
+                           where: Optional[Dict[str, Any]],
+                           max_distance: Optional[float]) -> List[Dict[str, Any]]:
+        """在单个表的集合中搜索，返回按距离升序的结果（已按阈值截断）"""
+        collection = self._get_collection(table_name)
+        if collection is None:
+            raise ValueError(f"集合 {self._get_collection_name(table_name)} 不存在")
+        
+        query_args: Dict[str, Any] = {"query_embeddings": [query_embedding], "n_results": limit}
+        if where:
+            query_args["where"] = where
+        search_results = collection.query(**query_args)
+        
+        results = []
+        if search_results and search_results.get("ids"):
+            distances = (search_results.get("distances") or [[]])[0]
+            documents = (search_results.get("documents") or [[]])[0]
+            metadatas = (search_results.get("metadatas") or [[]])[0]
+            for i, result_id in enumerate(search_results["ids"][0]):
+                distance = distances[i] if i < len(distances) else None
+                # 结果按距离升序，超过阈值即可停止
+                if max_distance is not None and distance is not None and distance > max_distance:
+                    break
+                metadata = (metadatas[i] if i < len(metadatas) else None) or {}
+                results.append({
+                    "table_name": metadata.get("table_name", table_name),
+                    "record_id": metadata.get("record_id", ""),
+                    "document": documents[i] if i < len(documents) else "",
+                    "distance": distance,
+                    "id": result_id
+                })
+        return results
+    
     def search(self, table_names: List[str], query: str, 
-              limit: int = 10) -> List[Dict[str, Any]]:
+              limit: int = 10, where: Optional[Dict[str, Any]] = None,
+              max_distance: Optional[float] = None) -> List[Dict[str, Any]]:
         """搜索表数据
         
+        查询只嵌入一次，各表集合在线程池中并发搜索，再对各表的有序结果做 k 路归并取前 limit 条。
+        
         Args:
             table_names: 要搜索的表名列表
             query: 搜索查询
             limit: 返回结果限制
+            where: 元数据过滤条件（Chroma where 语法，可用记录的标量字段）
+            max_distance: 距离阈值，超过该距离的结果不返回
             
         Returns:
             搜索结果列表
         """
-        results = []
+        if not table_names or limit <= 0:
+            return []
+        try:
+            query_embedding = self._embed([query])[0]
+        except Exception as e:
+            print(f"搜索查询嵌入错误: {e}")
+            return []
         
-        for table_name in table_names:
-            collection_name = self._get_collection_name(table_name)
-            
-            # 获取集合
+        per_table: List[List[Dict[str, Any]]] = []
+        if len(table_names) == 1:
             try:
-                collection = self.client.get_collection(
-                    name=collection_name,
-                    embedding_function=self.embedding_function
-                )
-                
-                # 执行搜索
-                search_results = collection.query(
-                    query_texts=[query],
-                    n_results=limit
-                )
-                
-                # 处理结果
-                if search_results and search_results.get("ids"):
-                    for i, result_id in enumerate(search_results["ids"][0]):
-                        distance = search_results["distances"][0][i] if "distances" in search_results else None
-                        document = search_results["documents"][0][i] if "documents" in search_results else ""
-                        metadata = search_results["metadatas"][0][i] if "metadatas" in search_results else {}
-                        
-                        results.append({
-                            "table_name": metadata.get("table_name", table_name),
-                            "record_id": metadata.get("record_id", ""),
-                            "document": document,
-                            "distance": distance,
-                            "id": result_id
-                        })
+                per_table.append(self._search_collection(table_names[0], query_embedding, limit,
+                                                         where, max_distance))
             except Exception as e:
-                print(f"搜索表 {table_name} 错误: {e}")
+                print(f"搜索表 {table_names[0]} 错误: {e}")
+        else:
+            executor = self._get_executor()
+            futures = [executor.submit(self._search_collection, table_name, query_embedding, limit,
+                                       where, max_distance) for table_name in table_names]
+            # 按表顺序收集，距离相同时保持表顺序
+            for table_name, future in zip(table_names, futures):
+                try:
+                    per_table.append(future.result())
+                except Exception as e:
+                    print(f"搜索表 {table_name} 错误: {e}")
         
-        # 按相关性排序
-        if results:
-            results.sort(key=lambda x: x.get("distance", float('inf')))
-            
-        return results[:limit]
+        # 各表结果已按距离有序：堆归并，只取前 limit 条
+        def distance_key(item: Dict[str, Any]) -> float:
+            distance = item.get("distance")
+            return float('inf') if distance is None else distance
+        
+        return list(islice(heapq.merge(*per_table, key=distance_key), limit))
@@ -1,21 +1,24 @@
 import argparse
+import atexit
 import datetime as dt
 import json
 import os
 import hashlib
+import queue
 import time
 import threading
-import concurrent.futures
 import io
+import sys
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
 from mcp.server.fastmcp import FastMCP
 
-# 文件操作锁
-_file_locks = {}
-_locks_mutex = threading.RLock()
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
 
+from utils import session_index  # noqa: E402
 
 APP_NAME = "windsurf-sink"
 APP_VERSION = "0.1.0"
@@ -59,55 +62,262 @@ def _sanitize_title(text: str, max_len: int = 80) -> str:
     return line
 
 
-def _md_has_open_pair(md_fp: Path, sep: str) -> bool:
-    """Return True if the markdown file exists and DOES NOT end with the separator.
-    This indicates a previous user section is open awaiting assistant reply.
-    """
-    if not md_fp.exists():
-        return False
+def _read_tail(md_fp: Path, max_bytes: int = 4096) -> str:
+    """读取文件末尾（仅在首次打开某会话文件或整文件重写后调用一次，用于恢复配对状态）。"""
     try:
-        # 添加文件存在二次检查和文件大小检查
-        if not os.path.exists(str(md_fp)):
-            return False
-            
         size = md_fp.stat().st_size
         if size == 0:
-            return False
-            
-        # 使用线程超时代替signal（Windows兼容）
-        import io
-        import threading
-        import concurrent.futures
-        
-        def read_file_with_timeout():
+            return ""
+        with io.open(str(md_fp), "rb") as f:
+            read_len = min(max_bytes, size)
+            f.seek(size - read_len)
+            return f.read().decode("utf-8", errors="ignore")
+    except Exception as e:
+        print(f"[WARNING] 读取文件末尾失败: {md_fp} - {e}", flush=True)
+        return ""
+
+
+def _disk_len(text: str) -> int:
+    """文本模式写入后在磁盘上占用的字节数（含换行转换）。"""
+    n = len(text.encode("utf-8"))
+    if os.linesep != "\n":
+        n += text.count("\n") * (len(os.linesep) - 1)
+    return n
+
+
+def _tail_has_open_pair(tail: str, sep: str) -> bool:
+    """Return True if the file content DOES NOT end with the separator.
+    This indicates a previous user section is open awaiting assistant reply.
+    """
+    if not tail:
+        return False
+    return not tail.rstrip("\n").endswith(sep.rstrip("\n"))
+
+
+class _MdFileState:
+    """单个会话 Markdown 文件的常驻状态：打开的追加句柄 + 内存中的文件尾部（推断配对状态）
+    + 当前字节长度与待落盘的侧车索引记录。"""
+
+    TAIL_KEEP = 512
+
+    def __init__(self, md_fp: Path) -> None:
+        self.path = md_fp
+        self.existed = md_fp.exists() and md_fp.stat().st_size > 0
+        self.tail = _read_tail(md_fp) if self.existed else ""
+        if self.existed:
+            # 补齐旧文件（或其它写入方追加部分）的索引，之后只需追加
             try:
-                with io.open(str(md_fp), "rb") as f:
-                    read_len = min(4096, size)
-                    f.seek(size - read_len)
-                    return f.read().decode("utf-8", errors="ignore")
+                session_index.load_index(str(md_fp))
             except Exception as e:
-                print(f"[WARNING] 读取文件出错: {e}", flush=True)
-                raise
-        
-        # 使用线程池实现超时控制（3秒超时）
+                print(f"[WARNING] 补齐会话索引失败: {md_fp} - {e}", flush=True)
+        self.fh = io.open(str(md_fp), "a", encoding="utf-8")
+        self.size = md_fp.stat().st_size
+        self.index_pending: List[Dict[str, Any]] = []
+        self.last_used = time.monotonic()
+
+    def append(self, preamble: str, body: str, role: str, ts: str, kind: str) -> None:
+        text = preamble + body
+        self.fh.write(text)
+        self.tail = (self.tail + text)[-self.TAIL_KEEP:]
+        self.existed = True
+        offset = self.size + _disk_len(preamble)
+        length = _disk_len(body)
+        self.size = offset + length
+        self.index_pending.append(session_index.make_entry(offset, length, ts, role, kind))
+
+    def close(self) -> None:
         try:
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(read_file_with_timeout)
-                tail = future.result(timeout=3)
-        except concurrent.futures.TimeoutError:
-            print(f"[WARNING] 检查文件末尾超时: {md_fp}", flush=True)
-            return False
-        except (PermissionError, IOError) as e:
-            print(f"[WARNING] 无法访问文件: {md_fp} - {e}", flush=True)
-            return False
-            
-        tail = tail.rstrip("\n")
-        return not (tail.endswith(sep.rstrip("\n")))
-    except Exception as e:
-        # 更详细的错误日志
-        print(f"[ERROR] _md_has_open_pair失败: {md_fp} - {e}", flush=True)
-        # If any error reading, fall back to conservative (closed)
-        return False
+            self.fh.close()
+        except Exception:
+            pass
+
+
+class _WriteRequest:
+    __slots__ = ("kind", "md_fp", "payload", "done", "result", "error")
+
+    def __init__(self, kind: str, md_fp: Path, payload: Dict[str, Any]) -> None:
+        self.kind = kind          # "message" | "rewrite"
+        self.md_fp = md_fp
+        self.payload = payload
+        self.done = threading.Event()
+        self.result: Dict[str, Any] = {}
+        self.error: Optional[BaseException] = None
+
+
+class MdWriter:
+    """长驻写线程：所有会话文件的写入经无锁队列（SimpleQueue）交给单线程处理。
+    - 每个会话文件保持打开的句柄，配对状态在内存中维护，不再每条消息回读文件尾
+    - 组提交：一次取出队列中已积压的多条消息，按文件合并为一次 write + flush + fsync
+    - 打开的句柄数超过 MAX_OPEN_FILES 时关闭最久未用的文件（跨日会话文件自然轮换）
+    """
+
+    MAX_BATCH = 256
+    MAX_OPEN_FILES = 64
+
+    def __init__(self, fsync: bool = True) -> None:
+        self.fsync = fsync
+        self._q: "queue.SimpleQueue[Optional[_WriteRequest]]" = queue.SimpleQueue()
+        self._files: Dict[str, _MdFileState] = {}
+        self._thread = threading.Thread(target=self._run, name="md-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, kind: str, md_fp: Path, payload: Dict[str, Any]) -> _WriteRequest:
+        req = _WriteRequest(kind, md_fp, payload)
+        self._q.put(req)
+        return req
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._q.put(None)
+        self._thread.join(timeout)
+
+    # —— 写线程 ——
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            first = self._q.get()
+            batch = [first]
+            while len(batch) < self.MAX_BATCH:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            if any(r is None for r in batch):
+                stop = True
+                batch = [r for r in batch if r is not None]
+            self._process(batch)
+        for st in self._files.values():
+            st.close()
+        self._files.clear()
+
+    def _state(self, md_fp: Path) -> _MdFileState:
+        key = str(md_fp)
+        st = self._files.get(key)
+        if st is None:
+            if len(self._files) >= self.MAX_OPEN_FILES:
+                oldest = min(self._files, key=lambda k: self._files[k].last_used)
+                self._files.pop(oldest).close()
+            st = _MdFileState(md_fp)
+            self._files[key] = st
+        st.last_used = time.monotonic()
+        return st
+
+    def _process(self, batch: List[_WriteRequest]) -> None:
+        dirty: Dict[str, _MdFileState] = {}
+        pending: List[_WriteRequest] = []
+        for req in batch:
+            try:
+                if req.kind == "rewrite":
+                    # 整文件重写前先落盘已合并的追加内容，保证顺序
+                    self._commit(dirty, pending)
+                    dirty, pending = {}, []
+                    self._rewrite(req)
+                    req.done.set()
+                    continue
+                st = self._state(req.md_fp)
+                preamble, body, kind = _render_message(st, req.payload)
+                st.append(preamble, body, req.payload["role"], req.payload["ts"], kind)
+                dirty[str(req.md_fp)] = st
+                pending.append(req)
+            except BaseException as e:
+                req.error = e
+                req.done.set()
+        self._commit(dirty, pending)
+
+    def _commit(self, dirty: Dict[str, _MdFileState], pending: List[_WriteRequest]) -> None:
+        errors: Dict[str, BaseException] = {}
+        sizes: Dict[str, int] = {}
+        for key, st in dirty.items():
+            # 正文落盘与追加索引在同一把锁内完成，读取方不会在两者之间补齐回写索引
+            with session_index.index_lock(key):
+                try:
+                    st.fh.flush()
+                    if self.fsync:
+                        os.fsync(st.fh.fileno())
+                    sizes[key] = st.fh.tell()
+                except BaseException as e:
+                    errors[key] = e
+                    self._files.pop(key, None)
+                    st.close()
+                    continue
+                # 索引在正文落盘之后追加：索引只会落后于正文（读取方可增量补齐），不会超前
+                try:
+                    session_index.append_entries(key, st.index_pending)
+                except Exception as e:
+                    print(f"[WARNING] 写入会话索引失败: {key} - {e}", flush=True)
+            st.index_pending = []
+        for req in pending:
+            key = str(req.md_fp)
+            if key in errors:
+                req.error = errors[key]
+            else:
+                req.result = {"path": key, "bytes": sizes.get(key, 0)}
+            req.done.set()
+
+    def _rewrite(self, req: _WriteRequest) -> None:
+        key = str(req.md_fp)
+        st = self._files.pop(key, None)
+        if st is not None:
+            st.close()
+        with session_index.index_lock(key):
+            with io.open(key, "w", encoding="utf-8") as f:
+                f.write(req.payload["text"])
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            try:
+                session_index.rebuild_index(key)
+            except Exception as e:
+                print(f"[WARNING] 重建会话索引失败: {key} - {e}", flush=True)
+        req.result = {"path": key, "bytes": req.md_fp.stat().st_size if req.md_fp.exists() else 0}
+
+
+def _render_message(st: _MdFileState, p: Dict[str, Any]) -> Tuple[str, str, str]:
+    """按文件当前状态渲染一条消息的 Markdown 片段（标题/元信息/正文/分隔符）。
+    返回 (文件标题前缀, 消息片段, 索引类型)；索引类型为 "section"（带小节标题）或 "message"。"""
+    role = p["role"]
+    content = p["content"] or ""
+    ts = p["ts"]
+    sep = p["sep"]
+    md_title = p["md_title"]
+    parts: List[str] = []
+    # On first write, add a conversation title
+    preamble = "" if st.existed else f"# Conversation {p['session_id']}\n\n"
+    kind = "message"
+    # Detect if there is an open user section awaiting assistant
+    open_pair = _tail_has_open_pair(st.tail, sep)
+    # Decide whether to write heading
+    if not (role == "assistant" and open_pair):
+        # Start a new section (user, or assistant without preceding user)
+        base_title = _sanitize_title(content) if (not md_title and role == "user") else None
+        title_final = md_title.strip() if md_title else (base_title if base_title else f"[{role}]")
+        heading = "#" * p["heading_level"]
+        kind = "section"
+        if p["include_date"]:
+            parts.append(f"{heading} {title_final} - {ts.split('T')[0]}\n\n")
+        else:
+            parts.append(f"{heading} {title_final}\n\n")
+    # Write meta + content
+    parts.append(f"> role: {role} | timestamp: {ts}\n\n")
+    parts.append(content)
+    parts.append("\n\n")
+    # Section closing policy: close only after assistant when pairing
+    if role == "assistant" and sep:
+        parts.append(sep if sep.endswith("\n") else sep + "\n")
+    return preamble, "".join(parts), kind
+
+
+_writer: Optional[MdWriter] = None
+_writer_mutex = threading.Lock()
+
+
+def get_writer() -> MdWriter:
+    global _writer
+    if _writer is None:
+        with _writer_mutex:
+            if _writer is None:
+                _writer = MdWriter()
+                atexit.register(_writer.close)
+    return _writer
 
 
 class SinkContext:
@@ -177,12 +387,8 @@ def _should_skip(session_id: str, role: str, content: str) -> Tuple[bool, str]:
     return False, ""
 
 
-def get_file_lock(file_path: str):
-    """获取指定文件的线程锁"""
-    with _locks_mutex:
-        if file_path not in _file_locks:
-            _file_locks[file_path] = threading.RLock()
-        return _file_locks[file_path]
+# 等待写线程组提交完成的上限（秒）
+_WRITE_WAIT_SEC = 5.0
 
 @mcp.tool()
 def save_message(
@@ -229,102 +435,34 @@ def save_message(
             print(f"[DEBUG] save_message跳过: {reason}", flush=True)
             return out
 
-        # Markdown append (default on)
+        # Markdown append (default on)：交给长驻写线程组提交
         if write_markdown:
             md_fp = _ctx.session_md(session_id)
-            # 获取文件锁
-            file_lock = get_file_lock(str(md_fp))
-            
-            # 使用超时锁定，防止死锁
-            lock_acquired = False
-            try:
-                lock_acquired = file_lock.acquire(timeout=2)  # 2秒超时
-                if not lock_acquired:
-                    print(f"[WARNING] 获取文件锁超时: {md_fp}", flush=True)
-                    out["skipped"] = True
-                    out["reason"] = "file_lock_timeout"
-                    return out
-                    
-                # 成功获取锁，处理文件操作
-                # Determine heading level and separator
-                heading_level = _ctx.md_heading_level if md_heading_level is None else max(1, min(6, int(md_heading_level)))
-                sep = _ctx.md_separator if (md_separator is None) else md_separator
-                heading = "#" * heading_level
-                file_exists = md_fp.exists()
-                
-                # 使用线程池执行文件写入，带超时控制
-                def write_file_operation():
-                    try:
-                        with io.open(str(md_fp), "a", encoding="utf-8") as f:
-                            # On first write, add a conversation title
-                            if not file_exists:
-                                f.write(f"# Conversation {session_id}\n\n")
-                            # Detect if there is an open user section awaiting assistant
-                            open_pair = _md_has_open_pair(md_fp, sep)
-
-                            def write_heading_for(current_role: str) -> None:
-                                """Write a heading line for a new section using current context."""
-                                base_title_local = None
-                                if (not md_title) and current_role == "user":
-                                    base_title_local = _sanitize_title(content)
-                                title_final = (md_title.strip() if md_title else (base_title_local if base_title_local else f"[{current_role}]"))
-                                date_str_local = ts.split("T")[0]
-                                if md_title_include_date:
-                                    heading_line_local = f"{heading} {title_final} - {date_str_local}"
-                                else:
-                                    heading_line_local = f"{heading} {title_final}"
-                                f.write(heading_line_local + "\n\n")
-
-                            # Decide whether to write heading
-                            if role == "assistant" and open_pair:
-                                # Continue the existing open user section: no new heading
-                                pass
-                            else:
-                                # Start a new section (user, or assistant without preceding user)
-                                write_heading_for(role)
-
-                            # Write meta + content
-                            f.write(f"> role: {role} | timestamp: {ts}\n\n")
-                            f.write(content)
-                            f.write("\n\n")
-
-                            # Section closing policy: close only after assistant when pairing
-                            if role == "assistant":
-                                if sep:
-                                    f.write(sep)
-                                    if not sep.endswith("\n"):
-                                        f.write("\n")
-                            else:
-                                # For user (or other roles), do not close here to allow pairing.
-                                # Keep as is (open).
-                                pass
-                    except Exception as e:
-                        print(f"[ERROR] 写入文件失败: {md_fp} - {e}", flush=True)
-                        raise
-                
-                # 使用线程池执行文件操作，设置超时时间
-                try:
-                    with concurrent.futures.ThreadPoolExecutor() as executor:
-                        future = executor.submit(write_file_operation)
-                        future.result(timeout=5)  # 5秒超时
-                except concurrent.futures.TimeoutError:
-                    print(f"[ERROR] 写入文件超时: {md_fp}", flush=True)
-                    out["skipped"] = True
-                    out["reason"] = "file_write_timeout"
-                    return out
-                except Exception as e:
-                    print(f"[ERROR] 写入文件时发生错误: {e}", flush=True)
-                    out["skipped"] = True
-                    out["reason"] = f"file_write_error:{str(e)}"
-                    return out
-                    
-                # 文件写入成功，更新输出信息
-                out["markdown"] = {"path": str(md_fp), "bytes": md_fp.stat().st_size if md_fp.exists() else 0}
-            finally:
-                # 确保释放锁
-                if lock_acquired:
-                    file_lock.release()
-                    
+            heading_level = _ctx.md_heading_level if md_heading_level is None else max(1, min(6, int(md_heading_level)))
+            sep = _ctx.md_separator if (md_separator is None) else md_separator
+            req = get_writer().submit("message", md_fp, {
+                "session_id": session_id,
+                "role": role,
+                "content": content,
+                "ts": ts,
+                "sep": sep,
+                "heading_level": heading_level,
+                "md_title": md_title,
+                "include_date": md_title_include_date,
+            })
+            if not req.done.wait(_WRITE_WAIT_SEC):
+                # 消息仍在队列中，稍后会被写入；此处仅不再等待
+                print(f"[ERROR] 写入文件超时: {md_fp}", flush=True)
+                out["skipped"] = True
+                out["reason"] = "file_write_timeout"
+                return out
+            if req.error is not None:
+                print(f"[ERROR] 写入文件时发生错误: {req.error}", flush=True)
+                out["skipped"] = True
+                out["reason"] = f"file_write_error:{str(req.error)}"
+                return out
+            out["markdown"] = req.result
+
         # 所有操作成功完成
         out["skipped"] = False
         out["reason"] = ""
@@ -363,63 +501,30 @@ def save_conversation(
         assert _ctx is not None, "Server context is not initialized"
         # Markdown only
         out: Dict[str, Any] = {}
-        md_fp = None
-        
         if write_markdown:
             md_fp = _ctx.session_md(session_id)
-            # 获取文件锁
-            file_lock = get_file_lock(str(md_fp))
-            
-            # 使用超时锁定，防止死锁
-            lock_acquired = False
-            try:
-                lock_acquired = file_lock.acquire(timeout=2)  # 2秒超时
-                if not lock_acquired:
-                    print(f"[WARNING] 获取文件锁超时: {md_fp}", flush=True)
-                    out["skipped"] = True
-                    out["reason"] = "file_lock_timeout"
-                    return out
-                
-                # 定义文件写入操作
-                def write_conversation_file():
-                    try:
-                        with io.open(str(md_fp), "w", encoding="utf-8") as f:
-                            f.write(f"# Conversation {session_id}\n\n")
-                            for msg in conversation:
-                                ts = msg.get("timestamp") or iso_now()
-                                role = msg.get("role", "assistant")
-                                content = msg.get("content", "")
-                                f.write(f"## [{role}] {ts}\n\n")
-                                f.write(content)
-                                f.write("\n\n")
-                    except Exception as e:
-                        print(f"[ERROR] 写入会话内容失败: {md_fp} - {e}", flush=True)
-                        raise
-                
-                # 使用线程池执行文件操作，设置超时时间
-                try:
-                    with concurrent.futures.ThreadPoolExecutor() as executor:
-                        future = executor.submit(write_conversation_file)
-                        future.result(timeout=5)  # 5秒超时
-                except concurrent.futures.TimeoutError:
-                    print(f"[ERROR] 写入会话超时: {md_fp}", flush=True)
-                    out["skipped"] = True
-                    out["reason"] = "file_write_timeout"
-                    return out
-                except Exception as e:
-                    print(f"[ERROR] 写入会话时发生错误: {e}", flush=True)
-                    out["skipped"] = True
-                    out["reason"] = f"file_write_error:{str(e)}"
-                    return out
-                    
-                # 文件写入成功
-                if md_fp is not None:
-                    out["markdown"] = {"path": str(md_fp), "bytes": md_fp.stat().st_size if md_fp.exists() else 0}
-            finally:
-                # 确保释放锁
-                if lock_acquired:
-                    file_lock.release()
-        
+            parts = [f"# Conversation {session_id}\n\n"]
+            for msg in conversation:
+                ts = msg.get("timestamp") or iso_now()
+                role = msg.get("role", "assistant")
+                content = msg.get("content", "")
+                parts.append(f"## [{role}] {ts}\n\n")
+                parts.append(content)
+                parts.append("\n\n")
+            # 经写线程整文件重写，与 save_message 的追加严格串行，并重置该文件的内存状态
+            req = get_writer().submit("rewrite", md_fp, {"text": "".join(parts)})
+            if not req.done.wait(_WRITE_WAIT_SEC):
+                print(f"[ERROR] 写入会话超时: {md_fp}", flush=True)
+                out["skipped"] = True
+                out["reason"] = "file_write_timeout"
+                return out
+            if req.error is not None:
+                print(f"[ERROR] 写入会话时发生错误: {req.error}", flush=True)
+                out["skipped"] = True
+                out["reason"] = f"file_write_error:{str(req.error)}"
+                return out
+            out["markdown"] = req.result
+
         duration = time.time() - start_time
         print(f"[DEBUG] save_conversation完成: 用时={duration:.3f}秒", flush=True)
         out["skipped"] = False
@@ -436,6 +541,43 @@ def save_conversation(
         }
 
 
+@mcp.tool()
+def read_session(
+    session_id: str,
+    start: int = 0,
+    limit: int = 50,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    date: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Page through a session's Markdown log via its sidecar index.
+
+    Args:
+      start: Index of the first message to return (ignored when since/until is given).
+      limit: Maximum number of messages to return.
+      since/until: ISO timestamp bounds [since, until), compared as string prefixes.
+      date: Day folder (YYYY-MM-DD); defaults to today.
+
+    Returns: dict with total count, returned messages and the next start index.
+    """
+    try:
+        assert _ctx is not None, "Server context is not initialized"
+        folder = (_ctx.log_dir / "logs" / date) if date else day_folder(_ctx.log_dir)
+        md_fp = folder / f"session-{session_id}.md"
+        if not md_fp.exists():
+            return {"total": 0, "messages": [], "next": None, "reason": "not_found"}
+        reader = session_index.SessionReader(str(md_fp))
+        if since or until:
+            start, end = reader.time_range(since, until)
+            limit = min(limit, end - start)
+        msgs = reader.page(start, limit)
+        nxt = start + len(msgs)
+        return {"total": len(reader), "messages": msgs, "next": nxt if nxt < len(reader) else None}
+    except Exception as e:
+        print(f"[ERROR] read_session异常: {e}", flush=True)
+        return {"total": 0, "messages": [], "next": None, "reason": f"sink_error:{str(e)}"}
+
+
 @mcp.tool()
 def ping() -> str:
     return "ok"
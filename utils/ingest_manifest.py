@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+增量灌注清单（SQLite）
+
+按 collection 记录每个已灌注文件的 (path, size, mtime, sha256) 及其分块哈希，用于：
+- 跳过未变化文件：size+mtime 一致直接跳过；不一致时再比 sha256（仅 touch 过的文件只刷新 stat）
+- 只重嵌入变化的分块：分块 id 由 (路径, 分块内容哈希) 派生，内容不变的分块 id 不变
+- 清理已删除文件的分块：目录重灌时，清单中存在但本次未出现的文件，其分块 id 一并返回供删除
+- params 记录影响分块结果的参数（如预处理开关/块大小/重叠），参数变化时文件视为已变化
+
+用法：
+    m = IngestManifest(os.path.join(persistence, "ingest_manifest.sqlite3"))
+    if m.is_unchanged(coll, path, params):
+        continue
+    plan = m.plan(coll, path, chunks)
+    col.delete(ids=plan.delete_ids); col.add(ids=plan.add_ids, documents=plan.add_docs, ...)
+    m.commit(coll, path, plan, params)
+
+大文件流式（分块按批产出，不在内存中保留全部分块文本）：
+    session = m.begin(coll, path)
+    for batch in batches:
+        b = session.feed(batch); col.upsert(ids=b.add_ids, documents=b.add_docs, ...)
+    plan = session.finish(); col.delete(ids=plan.delete_ids)
+    m.commit(coll, path, plan, params)
+
+清单只能在向量库写入成功后提交，否则中断后文件会被误判为未变化、分块永久丢失。
+跨进程消费（如解析服务输出 NDJSON）时先 stage 暂存计划，消费方写入成功后再 confirm。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Sequence
+
+MANIFEST_FILE = "ingest_manifest.sqlite3"
+
+_DDL = (
+    "CREATE TABLE IF NOT EXISTS files ("
+    " collection TEXT NOT NULL,"
+    " path TEXT NOT NULL,"
+    " size INTEGER NOT NULL,"
+    " mtime REAL NOT NULL,"
+    " sha256 TEXT NOT NULL,"
+    " params TEXT NOT NULL DEFAULT '',"
+    " updated_at REAL NOT NULL,"
+    " PRIMARY KEY (collection, path)"
+    ")",
+    "CREATE TABLE IF NOT EXISTS chunks ("
+    " collection TEXT NOT NULL,"
+    " path TEXT NOT NULL,"
+    " idx INTEGER NOT NULL,"
+    " chunk_hash TEXT NOT NULL,"
+    " chunk_id TEXT NOT NULL,"
+    " PRIMARY KEY (collection, path, idx)"
+    ")",
+    # 已产出但消费方尚未确认写入的计划（跨进程消费时使用，见 stage/confirm）
+    "CREATE TABLE IF NOT EXISTS pending ("
+    " collection TEXT NOT NULL,"
+    " path TEXT NOT NULL,"
+    " size INTEGER NOT NULL,"
+    " mtime REAL NOT NULL,"
+    " sha256 TEXT NOT NULL,"
+    " params TEXT NOT NULL DEFAULT '',"
+    " chunk_hashes TEXT NOT NULL,"
+    " chunk_ids TEXT NOT NULL,"
+    " staged_at REAL NOT NULL,"
+    " PRIMARY KEY (collection, path)"
+    ")",
+)
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8", errors="ignore")).hexdigest()
+
+
+def _norm_path(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+@dataclass
+class IngestPlan:
+    """单个文件的增量计划。add_* 三个列表等长，对应需要新嵌入的分块。"""
+    path: str
+    size: int
+    mtime: float
+    sha256: str
+    chunk_ids: List[str] = field(default_factory=list)      # 本次全部分块 id（按顺序）
+    chunk_hashes: List[str] = field(default_factory=list)
+    add_ids: List[str] = field(default_factory=list)
+    add_docs: List[str] = field(default_factory=list)
+    add_indexes: List[int] = field(default_factory=list)
+    delete_ids: List[str] = field(default_factory=list)     # 旧版本中已不存在的分块
+    kept: int = 0
+
+
+class IngestManifest:
+    """增量灌注清单。线程安全（单连接 + 锁），失败由调用方兜底。"""
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        d = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(d, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for ddl in _DDL:
+            self._conn.execute(ddl)
+        self._conn.commit()
+
+    @classmethod
+    def for_store(cls, persistence_dir: str) -> "IngestManifest":
+        """在向量库持久化目录下打开（或创建）清单。"""
+        return cls(os.path.join(persistence_dir, MANIFEST_FILE))
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+
+    # —— 文件级 ——
+    def is_unchanged(self, collection: str, path: str, params: str = "") -> bool:
+        """参数一致且 size+mtime 一致即视为未变化；否则比较 sha256，内容相同时仅刷新 stat 并返回 True。"""
+        key = _norm_path(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime, sha256, params FROM files WHERE collection=? AND path=?", (collection, key)
+            ).fetchone()
+        if row is None or row[3] != (params or ""):
+            return False
+        size, mtime, sha, _ = row
+        if int(size) == st.st_size and float(mtime) == st.st_mtime:
+            return True
+        if int(size) != st.st_size:
+            return False
+        try:
+            if file_sha256(path) != sha:
+                return False
+        except OSError:
+            return False
+        with self._lock:
+            self._conn.execute(
+                "UPDATE files SET mtime=?, updated_at=? WHERE collection=? AND path=?",
+                (st.st_mtime, time.time(), collection, key),
+            )
+            self._conn.commit()
+        return True
+
+    def begin(self, collection: str, path: str) -> "IngestSession":
+        """开始一个文件的流式计划：分批 feed 分块，写完后 finish。"""
+        return IngestSession(self, collection, path)
+
+    def plan(self, collection: str, path: str, chunks: Iterable[str]) -> IngestPlan:
+        """对比旧分块哈希，得出需新增/删除的分块。分块 id 形如 <路径哈希>-<内容哈希>[-序号]。"""
+        session = self.begin(collection, path)
+        batch = session.feed(chunks)
+        plan = session.finish()
+        plan.add_ids, plan.add_docs, plan.add_indexes = batch.add_ids, batch.add_docs, batch.add_indexes
+        return plan
+
+    def commit(self, collection: str, path: str, plan: IngestPlan, params: str = "") -> None:
+        """向量库写入成功后调用：以本次分块替换清单中的旧记录。"""
+        key = _norm_path(path)
+        with self._lock:
+            with self._conn:
+                self._commit_locked(collection, key, plan.size, plan.mtime, plan.sha256, params,
+                                    plan.chunk_hashes, plan.chunk_ids)
+
+    def _commit_locked(self, collection: str, key: str, size: int, mtime: float, sha256: str, params: str,
+                       hashes: Sequence[str], ids: Sequence[str]) -> None:
+        self._conn.execute("DELETE FROM chunks WHERE collection=? AND path=?", (collection, key))
+        self._conn.executemany(
+            "INSERT INTO chunks(collection, path, idx, chunk_hash, chunk_id) VALUES (?,?,?,?,?)",
+            [(collection, key, i, h, cid) for i, (h, cid) in enumerate(zip(hashes, ids))],
+        )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files(collection, path, size, mtime, sha256, params, updated_at)"
+            " VALUES (?,?,?,?,?,?,?)",
+            (collection, key, size, mtime, sha256, params or "", time.time()),
+        )
+        self._conn.execute("DELETE FROM pending WHERE collection=? AND path=?", (collection, key))
+
+    # —— 跨进程确认 ——
+    def stage(self, collection: str, path: str, plan: IngestPlan, params: str = "") -> None:
+        """暂存计划（不影响 is_unchanged）；消费方写入成功后 confirm 才生效。"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO pending(collection, path, size, mtime, sha256, params,"
+                    " chunk_hashes, chunk_ids, staged_at) VALUES (?,?,?,?,?,?,?,?,?)",
+                    (collection, _norm_path(path), plan.size, plan.mtime, plan.sha256, params or "",
+                     json.dumps(plan.chunk_hashes), json.dumps(plan.chunk_ids), time.time()),
+                )
+
+    def confirm(self, collection: str, path: str) -> bool:
+        """提交已暂存的计划；没有暂存计划时返回 False。"""
+        key = _norm_path(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime, sha256, params, chunk_hashes, chunk_ids FROM pending"
+                " WHERE collection=? AND path=?", (collection, key)).fetchone()
+            if row is None:
+                return False
+            with self._conn:
+                self._commit_locked(collection, key, row[0], row[1], row[2], row[3],
+                                    json.loads(row[4]), json.loads(row[5]))
+        return True
+
+    def discard(self, collection: str, path: str) -> None:
+        """放弃暂存计划（消费方写入失败时调用；不调用也无妨，下次按已变化重新解析）。"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM pending WHERE collection=? AND path=?",
+                                   (collection, _norm_path(path)))
+
+    # —— 删除检测 ——
+    def stale_files(self, collection: str, seen_paths: Sequence[str], under_dir: Optional[str] = None) -> List[str]:
+        """返回清单中（under_dir 下）本次未出现的文件。
+        调用方应先按 chunk_ids_of 删除向量库中的分块，成功后再 forget，避免残留孤儿分块。
+        """
+        seen = {_norm_path(p) for p in seen_paths}
+        prefix = _norm_path(under_dir).rstrip("\\/") + os.sep if under_dir else ""
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM files WHERE collection=?", (collection,)).fetchall()
+        return [r[0] for r in rows if r[0] not in seen and (not prefix or r[0].startswith(prefix))]
+
+    def chunk_ids_of(self, collection: str, path: str) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                "SELECT chunk_id FROM chunks WHERE collection=? AND path=? ORDER BY idx",
+                (collection, _norm_path(path)))]
+
+    def forget(self, collection: str, path: str) -> None:
+        key = _norm_path(path)
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM chunks WHERE collection=? AND path=?", (collection, key))
+                self._conn.execute("DELETE FROM files WHERE collection=? AND path=?", (collection, key))
+
+
+class IngestSession:
+    """单个文件的流式增量计划。只累积分块 id 与哈希（每块几十字节），分块文本随批次释放。"""
+
+    def __init__(self, manifest: IngestManifest, collection: str, path: str) -> None:
+        key = _norm_path(path)
+        st = os.stat(path)
+        self.plan = IngestPlan(path=key, size=st.st_size, mtime=st.st_mtime, sha256=file_sha256(path))
+        self._path_key = hashlib.sha1(key.encode("utf-8", errors="ignore")).hexdigest()[:16]
+        with manifest._lock:
+            self._old_ids = {r[0] for r in manifest._conn.execute(
+                "SELECT chunk_id FROM chunks WHERE collection=? AND path=?", (collection, key))}
+        self._seen: dict = {}
+
+    def feed(self, chunks: Iterable[str]) -> IngestPlan:
+        """登记一批分块，返回只含本批新增分块的计划（add_indexes 为文件内的全局序号）。"""
+        plan = self.plan
+        batch = IngestPlan(path=plan.path, size=plan.size, mtime=plan.mtime, sha256=plan.sha256)
+        for text in chunks:
+            idx = len(plan.chunk_ids)
+            h = chunk_hash(text)
+            n = self._seen.get(h, 0)
+            self._seen[h] = n + 1
+            cid = f"{self._path_key}-{h[:24]}" + (f"-{n}" if n else "")
+            plan.chunk_ids.append(cid)
+            plan.chunk_hashes.append(h)
+            if cid in self._old_ids:
+                plan.kept += 1
+                continue
+            batch.add_ids.append(cid)
+            batch.add_docs.append(text)
+            batch.add_indexes.append(idx)
+        return batch
+
+    def finish(self) -> IngestPlan:
+        """全部分块登记完后得出旧版本中已不存在的分块；返回的计划用于 commit/stage。"""
+        self.plan.delete_ids = sorted(self._old_ids - set(self.plan.chunk_ids))
+        return self.plan
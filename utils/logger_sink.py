@@ -6,6 +6,9 @@ This module enforces:
 - content filters: drop ephemeral/system/thought-like messages
 - dedup/rate-limit within a short window
 - per-turn idempotency for assistant messages (optional hook)
+- non-blocking dispatch: messages are queued (bounded) and sent by a
+  background thread in per-session batches, so UI threads never wait on
+  the sink's I/O; the queue is flushed at interpreter exit
 
 Actual sending is delegated to a pluggable callable to avoid
 hard-coupling with any specific MCP client at import time.
@@ -16,15 +19,29 @@ Usage:
   (session_id: str, role: str, content: str, meta: dict, **kwargs) -> dict
 - log_user_message(session_id, content, meta=None, **kwargs)
 - log_assistant_message(session_id, content, meta=None, **kwargs)
+- configure_dispatch(async_mode=True, max_queue=1000, policy="drop_oldest", ...)
+  switch between async (default) and synchronous sending, and pick what
+  happens when the queue is full: "drop_oldest", "drop_new" or "block"
+  (wait up to block_timeout seconds, then drop the new message)
+- flush(timeout): wait until queued messages have been handed to the sink
+
+If the sink callable also accepts a batch (register it with
+set_sink_callable(fn, batch_fn=...), signature
+(session_id: str, messages: list[dict]) -> dict), each session's queued
+messages are sent in one call; otherwise fn is called per message on the
+sender thread.
 
 If no sink callable is registered, messages are skipped with reason
 "no_sink_callable".
 """
 from __future__ import annotations
 
+import atexit
+import collections
 import hashlib
+import threading
 import time
-from typing import Callable, Dict, Optional, Tuple
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
 
 _ALLOWED_ROLES = {"user", "assistant"}
 _BLOCK_MARKERS = (
@@ -32,17 +49,66 @@ _BLOCK_MARKERS = (
     "Thought for ",
 )
 
-_recent: Dict[Tuple[str, str], float] = {}
+
+
+class _BoundedTTLMap:
+    """Insertion-ordered map with optional TTL and max size; O(1) amortized eviction.
+
+    Entries are kept in last-write order, so expired/overflowing entries are
+    always at the front and eviction never scans the whole map.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "collections.OrderedDict[Any, Tuple[float, Any]]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            if self.ttl is not None and time.monotonic() - item[0] >= self.ttl:
+                return default
+            return item[1]
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (now, value)
+            self._data.move_to_end(key)
+            self._evict(now)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _evict(self, now: float) -> None:
+        data = self._data
+        while len(data) > self.maxsize:
+            data.popitem(last=False)
+        if self.ttl is not None:
+            while data:
+                ts0 = next(iter(data.values()))[0]
+                if now - ts0 < self.ttl:
+                    break
+                data.popitem(last=False)
+
+
 _recent_ttl_sec: float = 7.0
+# (session_id, hash) -> True, expires after _recent_ttl_sec
+_recent = _BoundedTTLMap(maxsize=4096, ttl=_recent_ttl_sec)
 _sink_callable: Optional[Callable[..., Dict]] = None
+_sink_batch_callable: Optional[Callable[..., Dict]] = None
 
-# Optional per-turn assistant idempotency flag map: session_id -> bool
-_assistant_saved_this_turn: Dict[str, bool] = {}
+# Optional per-turn assistant idempotency flag map: session_id -> bool (LRU-bounded)
+_assistant_saved_this_turn = _BoundedTTLMap(maxsize=1024)
 
 
-def set_sink_callable(fn: Callable[..., Dict]) -> None:
-    global _sink_callable
+def set_sink_callable(fn: Callable[..., Dict], batch_fn: Optional[Callable[..., Dict]] = None) -> None:
+    global _sink_callable, _sink_batch_callable
     _sink_callable = fn
+    _sink_batch_callable = batch_fn
 
 
 def reset_turn(session_id: str) -> None:
@@ -68,24 +134,23 @@ def _should_skip(session_id: str, role: str, content: str, *, is_assistant: bool
             return True, "assistant_idempotent"
 
     # Dedup/rate-limit
-    now = time.time()
-    h = _hash(role, content)
-    key = (session_id, h)
-    last = _recent.get(key)
-    if last is not None and (now - last) < _recent_ttl_sec:
+    if _recent.get((session_id, _hash(role, content))):
         return True, "dedup_rate_limited"
-    _recent[key] = now
-
-    # GC
-    if len(_recent) > 2048:
-        cutoff = now - _recent_ttl_sec
-        for k, ts0 in list(_recent.items()):
-            if ts0 < cutoff:
-                _recent.pop(k, None)
 
     return False, ""
 
 
+def _mark_logged(session_id: str, role: str, content: str, result: Dict) -> Dict:
+    """Record dedup/idempotency state only once the message was accepted
+    (queued, or sent in sync mode), so a queue_full drop can be retried."""
+    if not (isinstance(result, dict) and result.get("skipped")):
+        _recent[(session_id, _hash(role, content))] = True
+        if role == "assistant":
+            # Mark assistant saved for this turn
+            _assistant_saved_this_turn[session_id] = True
+    return result
+
+
 def _send(session_id: str, role: str, content: str, meta: Optional[Dict] = None, **kwargs) -> Dict:
     if _sink_callable is None:
         return {"skipped": True, "reason": "no_sink_callable"}
@@ -95,19 +160,184 @@ def _send(session_id: str, role: str, content: str, meta: Optional[Dict] = None,
         return {"skipped": True, "reason": f"sink_error:{type(e).__name__}"}
 
 
+class _AsyncDispatcher:
+    """Bounded queue + one background sender thread.
+
+    The sender drains up to batch_size messages at a time, groups them by
+    session (keeping per-session order) and hands each group to the sink.
+    """
+
+    def __init__(self, max_queue: int = 1000, policy: str = "drop_oldest",
+                 batch_size: int = 64, block_timeout: float = 0.5) -> None:
+        self.max_queue = max(1, int(max_queue))
+        self.policy = policy if policy in ("drop_oldest", "drop_new", "block") else "drop_oldest"
+        self.batch_size = max(1, int(batch_size))
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self.sent = 0
+        self._q: Deque[Tuple[str, str, str, Optional[Dict], Dict]] = collections.deque()
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="logger-sink", daemon=True)
+        self._thread.start()
+
+    def submit(self, session_id: str, role: str, content: str, meta: Optional[Dict], kwargs: Dict) -> Dict:
+        item = (session_id, role, content, meta, kwargs)
+        with self._cond:
+            if len(self._q) >= self.max_queue:
+                if self.policy == "drop_oldest":
+                    self._q.popleft()
+                    self.dropped += 1
+                elif self.policy == "block":
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._q) >= self.max_queue and not self._stopping:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    if len(self._q) >= self.max_queue:
+                        self.dropped += 1
+                        return {"skipped": True, "reason": "queue_full"}
+                else:
+                    self.dropped += 1
+                    return {"skipped": True, "reason": "queue_full"}
+            self._q.append(item)
+            self._cond.notify_all()
+        return {"skipped": False, "reason": "", "queued": True}
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._q or self._inflight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 5.0) -> None:
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._q and not self._stopping:
+                    self._cond.wait()
+                if not self._q:
+                    return
+                batch = [self._q.popleft() for _ in range(min(self.batch_size, len(self._q)))]
+                self._inflight = len(batch)
+                self._cond.notify_all()
+            delivered = 0
+            try:
+                delivered = self._deliver(batch)
+            finally:
+                with self._cond:
+                    self.sent += delivered
+                    self.dropped += len(batch) - delivered
+                    self._inflight = 0
+                    self._cond.notify_all()
+
+    def _deliver(self, batch: List[Tuple[str, str, str, Optional[Dict], Dict]]) -> int:
+        """Hand the batch to the sink; returns how many messages were delivered
+        (sink errors are counted by the caller as dropped)."""
+        delivered = 0
+        by_session: "collections.OrderedDict[str, List[Tuple[str, str, str, Optional[Dict], Dict]]]" = collections.OrderedDict()
+        for item in batch:
+            by_session.setdefault(item[0], []).append(item)
+        for session_id, items in by_session.items():
+            batch_fn = _sink_batch_callable
+            if batch_fn is not None and (len(items) > 1 or _sink_callable is None):
+                msgs = [dict(kw, role=role, content=content, meta=meta or {}) for _, role, content, meta, kw in items]
+                try:
+                    batch_fn(session_id=session_id, messages=msgs)
+                    delivered += len(items)
+                except Exception:
+                    pass
+                continue
+            for _, role, content, meta, kw in items:
+                res = _send(session_id, role, content, meta, **kw)
+                if not str((res or {}).get("reason", "")).startswith("sink_error:"):
+                    delivered += 1
+        return delivered
+
+
+_dispatcher: Optional[_AsyncDispatcher] = None
+_dispatch_lock = threading.Lock()
+_async_mode = True
+_dispatch_opts: Dict[str, Any] = {}
+
+
+def configure_dispatch(async_mode: bool = True, max_queue: int = 1000, policy: str = "drop_oldest",
+                       batch_size: int = 64, block_timeout: float = 0.5) -> None:
+    """Select async (default) or synchronous dispatch and the queue-full policy."""
+    global _dispatcher, _async_mode, _dispatch_opts
+    with _dispatch_lock:
+        old = _dispatcher
+        _dispatcher = None
+        _async_mode = bool(async_mode)
+        _dispatch_opts = {"max_queue": max_queue, "policy": policy,
+                          "batch_size": batch_size, "block_timeout": block_timeout}
+    if old is not None:
+        old.close()
+
+
+def _get_dispatcher() -> _AsyncDispatcher:
+    global _dispatcher
+    d = _dispatcher
+    if d is None:
+        with _dispatch_lock:
+            if _dispatcher is None:
+                _dispatcher = _AsyncDispatcher(**_dispatch_opts)
+            d = _dispatcher
+    return d
+
+
+def _dispatch(session_id: str, role: str, content: str, meta: Optional[Dict], **kwargs) -> Dict:
+    if not _async_mode:
+        return _send(session_id, role, content, meta, **kwargs)
+    if _sink_callable is None and _sink_batch_callable is None:
+        return {"skipped": True, "reason": "no_sink_callable"}
+    return _get_dispatcher().submit(session_id, role, content, meta, kwargs)
+
+
+def flush(timeout: Optional[float] = 5.0) -> bool:
+    """Block until queued messages have been handed to the sink (or timeout)."""
+    d = _dispatcher
+    return True if d is None else d.flush(timeout)
+
+
+def dispatch_stats() -> Dict[str, int]:
+    d = _dispatcher
+    if d is None:
+        return {"queued": 0, "sent": 0, "dropped": 0}
+    return {"queued": len(d._q), "sent": d.sent, "dropped": d.dropped}
+
+
+@atexit.register
+def _shutdown() -> None:
+    d = _dispatcher
+    if d is not None:
+        d.close()
+
+
 def log_user_message(session_id: str, content: str, meta: Optional[Dict] = None, **kwargs) -> Dict:
     skipped, reason = _should_skip(session_id, "user", content or "", is_assistant=False)
     if skipped:
         return {"skipped": True, "reason": reason}
     # New user turn: reset assistant idempotency
     _assistant_saved_this_turn[session_id] = False
-    return _send(session_id, "user", content, meta, **kwargs)
+    return _mark_logged(session_id, "user", content or "", _dispatch(session_id, "user", content, meta, **kwargs))
 
 
 def log_assistant_message(session_id: str, content: str, meta: Optional[Dict] = None, **kwargs) -> Dict:
     skipped, reason = _should_skip(session_id, "assistant", content or "", is_assistant=True)
     if skipped:
         return {"skipped": True, "reason": reason}
-    # Mark assistant saved for this turn
-    _assistant_saved_this_turn[session_id] = True
-    return _send(session_id, "assistant", content, meta, **kwargs)
+    return _mark_logged(session_id, "assistant", content or "",
+                        _dispatch(session_id, "assistant", content, meta, **kwargs))
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+会话日志侧车索引（<日志文件>.idx）与分页读取
+
+- 索引为 JSONL，每条记录一个消息/小节：{"o": 字节偏移, "n": 字节长度, "t": 时间戳, "r": 角色, "k": 类型}
+- 写入方（如 windsurf sink）在追加消息时同步追加索引，读取方无需扫描全文
+- 没有索引或索引落后于日志（其它写入方追加）时，只从索引末条记录处增量扫描补齐
+- 同一进程内写入方（正文落盘 + 追加索引）与读取方（补齐回写索引）在 index_lock(path) 上串行；
+  跨进程时 append_entries 跳过偏移已被索引覆盖的记录，避免读取方补齐后再重复追加
+- 读取按字节偏移 seek，仅解码当前页，几十 MB 的会话也能即时打开
+
+支持的日志格式：
+- .md：sink 写入的会话 Markdown（"> role: x | timestamp: y" 元信息行，或 "## [role] ts" 整体导出格式）
+- .jsonl：每行一条记录（时间取 ts/timestamp，角色取 role）
+- 其它文本：按 LOG_BLOCK_LINES 行一块
+
+用法：
+    reader = SessionReader(path)
+    page = reader.page(start=0, limit=100)          # [{"index", "offset", "ts", "role", "kind", "text"}, ...]
+    start, end = reader.time_range("2026-10-01", "2026-10-02")
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+INDEX_SUFFIX = ".idx"
+LOG_BLOCK_LINES = 200
+
+_MD_META_RE = re.compile(rb"^> role: (\S+) \| timestamp: (\S+)")
+_MD_DUMP_RE = re.compile(rb"^#{1,6} \[([^\]]+)\] (\S+)")
+_MD_HEADING_RE = re.compile(rb"^#{1,6} ")
+
+Entry = Dict[str, Any]
+
+_locks: Dict[str, threading.RLock] = {}
+_locks_guard = threading.Lock()
+
+
+def index_path(log_path: str) -> str:
+    return str(log_path) + INDEX_SUFFIX
+
+
+def index_lock(log_path: str) -> threading.RLock:
+    """同一日志文件的进程内锁：写入方在正文落盘与追加索引期间持有，load_index 补齐时持有。"""
+    key = os.path.abspath(str(log_path))
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = threading.RLock()
+        return lock
+
+
+def make_entry(offset: int, length: int, ts: str = "", role: str = "", kind: str = "message") -> Entry:
+    return {"o": int(offset), "n": int(length), "t": ts or "", "r": role or "", "k": kind}
+
+
+def _covered_end(log_path: str) -> int:
+    """索引已覆盖到的日志字节位置（末条记录的 o + n）；只读索引文件尾部。"""
+    try:
+        with open(index_path(log_path), "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - 4096))
+            tail = f.read()
+    except FileNotFoundError:
+        return 0
+    for line in reversed(tail.splitlines()):
+        try:
+            e = json.loads(line)
+            return int(e["o"]) + int(e["n"])
+        except (ValueError, KeyError, TypeError):
+            continue
+    return 0
+
+
+def append_entries(log_path: str, entries: Iterable[Entry]) -> None:
+    """追加索引记录（写入方在日志落盘后调用）。
+    读取方可能已在正文落盘与本次追加之间扫描补齐了这些记录，偏移低于已覆盖位置的记录跳过。"""
+    entries = list(entries)
+    if not entries:
+        return
+    with index_lock(log_path):
+        covered = _covered_end(log_path)
+        lines = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries if e["o"] >= covered)
+        if not lines:
+            return
+        with open(index_path(log_path), "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+def _write_index(log_path: str, entries: List[Entry]) -> None:
+    idx = index_path(log_path)
+    tmp = idx + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for e in entries:
+            f.write(json.dumps(e, ensure_ascii=False) + "\n")
+    os.replace(tmp, idx)
+
+
+def _read_index(log_path: str) -> List[Entry]:
+    entries: List[Entry] = []
+    try:
+        with open(index_path(log_path), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # 写入中断留下的半行：丢弃，后续由增量扫描补齐
+                    break
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+# —— 扫描 ——
+def _scan_md(f, start: int, end: int) -> List[Entry]:
+    entries: List[Entry] = []
+    pos = start
+    heading_at: Optional[int] = None  # 紧邻元信息行之前的标题，计入同一条目
+
+    def close_last(at: int) -> None:
+        if entries:
+            entries[-1]["n"] = at - entries[-1]["o"]
+
+    f.seek(start)
+    while pos < end:
+        line = f.readline()
+        if not line:
+            break
+        m = _MD_DUMP_RE.match(line)
+        if m:
+            close_last(pos)
+            entries.append(make_entry(pos, 0, m.group(2).decode("utf-8", "replace"),
+                                      m.group(1).decode("utf-8", "replace"), "section"))
+            heading_at = None
+        elif _MD_HEADING_RE.match(line):
+            heading_at = pos
+        else:
+            m = _MD_META_RE.match(line)
+            if m:
+                at = heading_at if heading_at is not None else pos
+                close_last(at)
+                entries.append(make_entry(at, 0, m.group(2).decode("utf-8", "replace"),
+                                          m.group(1).decode("utf-8", "replace"),
+                                          "section" if heading_at is not None else "message"))
+                heading_at = None
+            elif line.strip():
+                heading_at = None
+        pos += len(line)
+    close_last(pos)
+    return entries
+
+
+def _scan_jsonl(f, start: int, end: int) -> List[Entry]:
+    entries: List[Entry] = []
+    pos = start
+    f.seek(start)
+    while pos < end:
+        line = f.readline()
+        if not line:
+            break
+        if line.strip():
+            ts = role = ""
+            try:
+                obj = json.loads(line)
+                if isinstance(obj, dict):
+                    ts = str(obj.get("ts") or obj.get("timestamp") or "")
+                    role = str(obj.get("role") or "")
+            except ValueError:
+                pass
+            entries.append(make_entry(pos, len(line), ts, role, "record"))
+        pos += len(line)
+    return entries
+
+
+def _scan_lines(f, start: int, end: int) -> List[Entry]:
+    entries: List[Entry] = []
+    pos = start
+    f.seek(start)
+    while pos < end:
+        block_at, count = pos, 0
+        while count < LOG_BLOCK_LINES and pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            count += 1
+        if pos == block_at:
+            break
+        entries.append(make_entry(block_at, pos - block_at, "", "", "block"))
+    return entries
+
+
+def scan(log_path: str, start: int = 0) -> List[Entry]:
+    """从 start 字节处扫描日志，产出索引记录。"""
+    ext = os.path.splitext(str(log_path))[1].lower()
+    fn = _scan_md if ext == ".md" else _scan_jsonl if ext == ".jsonl" else _scan_lines
+    end = os.path.getsize(log_path)
+    with open(log_path, "rb") as f:
+        return fn(f, start, end)
+
+
+def load_index(log_path: str) -> List[Entry]:
+    """读取侧车索引；缺失、损坏或落后于日志时增量补齐并回写。"""
+    with index_lock(log_path):
+        return _load_index_locked(log_path)
+
+
+def _load_index_locked(log_path: str) -> List[Entry]:
+    size = os.path.getsize(log_path)
+    entries = _read_index(log_path)
+    covered = entries[-1]["o"] + entries[-1]["n"] if entries else 0
+    if covered == size:
+        return entries
+    if covered > size:
+        # 日志被截断或重写：全量重建
+        entries = []
+    # 末条记录（如未闭合的 Markdown 小节）可能随追加而变长，从它开始重扫
+    rescan_from = entries.pop()["o"] if entries else 0
+    entries.extend(scan(log_path, rescan_from))
+    try:
+        _write_index(log_path, entries)
+    except OSError:
+        pass
+    return entries
+
+
+def rebuild_index(log_path: str) -> List[Entry]:
+    """整文件重写后调用：丢弃旧索引并全量重建。"""
+    with index_lock(log_path):
+        entries = scan(log_path) if os.path.exists(log_path) else []
+        _write_index(log_path, entries)
+        return entries
+
+
+class SessionReader:
+    """按索引分页读取会话日志；只 seek 并解码所需的条目。"""
+
+    def __init__(self, path: str) -> None:
+        self.path = str(path)
+        self.entries: List[Entry] = load_index(self.path)
+        # 缺失时间戳的条目沿用前一条，保证可二分
+        keys: List[str] = []
+        last = ""
+        for e in self.entries:
+            last = e.get("t") or last
+            keys.append(last)
+        self._ts_keys = keys
+        self._starts = [e["o"] for e in self.entries]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def page(self, start: int = 0, limit: int = 100) -> List[Entry]:
+        """读取第 start 条起的至多 limit 条，附带 index/text 字段。"""
+        start = max(0, int(start))
+        chosen = self.entries[start:start + max(0, int(limit))]
+        if not chosen:
+            return []
+        out: List[Entry] = []
+        with open(self.path, "rb") as f:
+            # 同一页内条目连续：一次读取整段再切分
+            base = chosen[0]["o"]
+            f.seek(base)
+            blob = f.read(chosen[-1]["o"] + chosen[-1]["n"] - base)
+        for i, e in enumerate(chosen):
+            raw = blob[e["o"] - base:e["o"] - base + e["n"]]
+            out.append({
+                "index": start + i,
+                "offset": e["o"],
+                "ts": e.get("t", ""),
+                "role": e.get("r", ""),
+                "kind": e.get("k", ""),
+                "text": raw.decode("utf-8", errors="replace"),
+            })
+        return out
+
+    def index_at_offset(self, offset: int) -> int:
+        """返回包含字节偏移 offset 的条目序号。"""
+        return max(0, bisect.bisect_right(self._starts, int(offset)) - 1)
+
+    def time_range(self, since: Optional[str] = None, until: Optional[str] = None) -> Tuple[int, int]:
+        """返回时间落在 [since, until) 内的条目序号区间 [start, end)（ISO 时间字符串前缀比较）。"""
+        start = bisect.bisect_left(self._ts_keys, since) if since else 0
+        end = bisect.bisect_left(self._ts_keys, until) if until else len(self.entries)
+        return start, max(start, end)
+
+    def page_by_time(self, since: Optional[str] = None, until: Optional[str] = None,
+                     limit: int = 100) -> List[Entry]:
+        start, end = self.time_range(since, until)
+        return self.page(start, min(limit, end - start))
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+结构感知的文本分块引擎（所有灌注路径共用）
+
+- 边界优先级：Markdown 标题 > 段落（空行）> 句子（中英文句末标点）> 硬切
+- 支持 overlap（优先按整句回带，整句放不下时按字符回带）
+- 预算单位：char（字符数）或 token（优先 tiktoken，缺失时按 CJK 1 字 1 token、其余约 4 字符 1 token 估算）
+- 输入可以是整段字符串，也可以是按块产出的字符串迭代器（大文件流式读取）；
+  输出为生成器，内存占用与单个分块同阶，而非与全文同阶
+
+用法：
+    from utils.text_chunker import iter_chunks
+    for chunk in iter_chunks(text, size=1500, overlap=100):
+        ...
+"""
+from __future__ import annotations
+
+import re
+from typing import Callable, Iterable, Iterator, List, Optional, Union
+
+CHUNK_SIZE = 1500
+CHUNK_OVERLAP = 0
+
+_HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s")
+# 句末：中文句号/叹号/问号/分号/省略号（可带右引号、右括号），或英文 .!? 后跟空白
+_SENTENCE_RE = re.compile(r"[^。！？；…\n]*?(?:[。！？；…]+[”’」』）)]*|[.!?]+(?=\s)|\n|$)")
+_CJK_RE = re.compile(r"[　-〿㐀-䶿一-鿿豈-﫿＀-￯]")
+# 流式输入中单行过长（无换行的大文件）时的强制切分点
+_MAX_LINE_CHARS = 64 * 1024
+
+TextSource = Union[str, Iterable[str]]
+
+
+def _approx_tokens(s: str) -> int:
+    cjk = len(_CJK_RE.findall(s))
+    rest = len(s) - cjk
+    return cjk + (rest + 3) // 4
+
+
+_token_len_fn: Optional[Callable[[str], int]] = None
+
+
+def _token_length(s: str) -> int:
+    global _token_len_fn
+    if _token_len_fn is None:
+        try:
+            import tiktoken  # 可选依赖
+            enc = tiktoken.get_encoding("cl100k_base")
+            _token_len_fn = lambda t: len(enc.encode(t, disallowed_special=()))
+        except Exception:
+            _token_len_fn = _approx_tokens
+    return _token_len_fn(s)
+
+
+def split_sentences(text: str) -> List[str]:
+    """按中英文句末标点与换行切句；各句拼接后与原文一致。"""
+    return [m.group(0) for m in _SENTENCE_RE.finditer(text or "") if m.group(0)]
+
+
+def _iter_lines(source: TextSource) -> Iterator[str]:
+    """将字符串或字符串块迭代器统一为按行产出（保留行尾换行符）。"""
+    if isinstance(source, str):
+        yield from source.splitlines(keepends=True)
+        return
+    carry = ""
+    for piece in source:
+        if not piece:
+            continue
+        carry += piece
+        cut = carry.rfind("\n")
+        if cut >= 0:
+            yield from carry[:cut + 1].splitlines(keepends=True)
+            carry = carry[cut + 1:]
+        while len(carry) > _MAX_LINE_CHARS:
+            yield carry[:_MAX_LINE_CHARS]
+            carry = carry[_MAX_LINE_CHARS:]
+    if carry:
+        yield carry
+
+
+class TextChunker:
+    """结构感知分块器。
+
+    Args:
+        size: 单块预算（按 unit 计量）
+        overlap: 相邻块重叠预算（按 unit 计量，自动限制在 size 的一半以内）
+        unit: "char" 或 "token"
+        length_fn: 自定义计量函数，优先于 unit
+        min_size: 遇到标题时，当前块不足该预算则不强制断开（避免大量碎小分块），默认 size//4
+    """
+
+    def __init__(self, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP, unit: str = "char",
+                 length_fn: Optional[Callable[[str], int]] = None, min_size: Optional[int] = None) -> None:
+        self.size = max(1, int(size))
+        self.overlap = max(0, min(int(overlap or 0), self.size // 2))
+        self.unit = "token" if unit == "token" else "char"
+        self.measure = length_fn or (_token_length if self.unit == "token" else len)
+        self.min_size = self.size // 4 if min_size is None else max(0, int(min_size))
+
+    def chunks(self, source: TextSource) -> Iterator[str]:
+        """流式产出分块（已去除首尾空白，空块跳过）。"""
+        self._buf: List[str] = []
+        self._buf_len = 0
+        # 缓冲区内是否有尚未产出的新内容（仅有回带重叠时不产出）
+        self._fresh = False
+        para: List[str] = []
+        para_len = 0
+        for line in _iter_lines(source):
+            if _HEADING_RE.match(line):
+                yield from self._add_paragraph("".join(para), para_len)
+                para, para_len = [], 0
+                if self._buf_len >= self.min_size:
+                    # 新章节起新块，且不跨章节回带重叠
+                    yield from self._emit(carry_overlap=False)
+                para.append(line)
+                para_len = self.measure(line)
+                continue
+            para.append(line)
+            para_len += self.measure(line)
+            if not line.strip() or para_len > self.size:
+                yield from self._add_paragraph("".join(para), para_len)
+                para, para_len = [], 0
+        yield from self._add_paragraph("".join(para), para_len)
+        yield from self._emit(carry_overlap=False)
+
+    # —— 内部：装箱 ——
+    def _add_paragraph(self, text: str, length: int) -> Iterator[str]:
+        if not text:
+            return
+        if self._buf_len + length <= self.size:
+            self._push(text, length)
+            return
+        if length <= self.size:
+            yield from self._emit()
+            if self._buf_len + length > self.size:
+                # 回带的重叠放不下整段时丢弃重叠，保证块不超预算
+                self._buf, self._buf_len = [], 0
+            self._push(text, length)
+            return
+        for sent in split_sentences(text):
+            yield from self._add_sentence(sent)
+
+    def _add_sentence(self, sent: str) -> Iterator[str]:
+        n = self.measure(sent)
+        if self._buf_len + n <= self.size:
+            self._push(sent, n)
+            return
+        yield from self._emit()
+        if n <= self.size - self._buf_len:
+            self._push(sent, n)
+            return
+        if self._buf and n <= self.size:
+            self._buf, self._buf_len = [], 0
+            self._push(sent, n)
+            return
+        for piece in self._hard_split(sent):
+            yield from self._emit()
+            self._buf, self._buf_len = [], 0
+            self._push(piece, self.measure(piece))
+
+    def _hard_split(self, s: str) -> Iterator[str]:
+        i = 0
+        while i < len(s):
+            step = self.size
+            if self.unit == "token" or self.measure is not len:
+                # 按整体密度估算字符步长，再向下修正到不超预算
+                step = max(1, int(len(s) * self.size / max(1, self.measure(s))))
+                while step > 1 and self.measure(s[i:i + step]) > self.size:
+                    step = max(1, step * 3 // 4)
+            yield s[i:i + step]
+            i += step
+
+    def _push(self, text: str, length: int) -> None:
+        self._buf.append(text)
+        self._buf_len += length
+        self._fresh = True
+
+    def _emit(self, carry_overlap: bool = True) -> Iterator[str]:
+        if not self._fresh:
+            if not carry_overlap:
+                self._buf, self._buf_len = [], 0
+            return
+        self._fresh = False
+        text = "".join(self._buf).strip()
+        tail: List[str] = []
+        tail_len = 0
+        if carry_overlap and self.overlap and text:
+            for sent in reversed(split_sentences(text)):
+                n = self.measure(sent)
+                if tail_len + n > self.overlap:
+                    break
+                tail.insert(0, sent)
+                tail_len += n
+            if not tail and self.measure is len:
+                tail = [text[-self.overlap:]]
+                tail_len = len(tail[0])
+        self._buf, self._buf_len = tail, tail_len
+        if text:
+            yield text
+
+
+def iter_chunks(source: TextSource, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP,
+                unit: str = "char", length_fn: Optional[Callable[[str], int]] = None) -> Iterator[str]:
+    """便捷入口：见 TextChunker。"""
+    yield from TextChunker(size=size, overlap=overlap, unit=unit, length_fn=length_fn).chunks(source)
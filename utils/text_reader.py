@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+大文本文件读取（灌注用）
+
+- 编码嗅探：BOM（utf-8-sig / utf-16 / utf-32）> 无 BOM 的 utf-16 > utf-8 严格校验 > GB18030 严格校验 > utf-8 替换
+- 解码错误以替换字符（U+FFFD）保留位置，不再 errors='ignore' 静默丢字节
+- 大文件（>= MMAP_THRESHOLD）使用 mmap 按块增量解码，配合 utils.text_chunker.iter_chunks 可在常量内存下分块
+
+用法：
+    from utils.text_reader import iter_text, read_text, open_text
+    for chunk in iter_chunks(iter_text(path)):
+        ...
+"""
+from __future__ import annotations
+
+import codecs
+import io
+import mmap
+import os
+from typing import IO, Iterable, Iterator, Optional, Union
+
+SNIFF_BYTES = 64 * 1024
+READ_BYTES = 1024 * 1024
+MMAP_THRESHOLD = 8 * 1024 * 1024
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def _decodes(sample: bytes, encoding: str) -> bool:
+    """严格增量解码样本；样本末尾被截断的多字节序列不视为错误。"""
+    try:
+        codecs.getincrementaldecoder(encoding)("strict").decode(sample, final=False)
+        return True
+    except (UnicodeDecodeError, LookupError):
+        return False
+
+
+def sniff_encoding(sample: bytes) -> str:
+    """根据样本字节推断编码。"""
+    for bom, enc in _BOMS:
+        if sample.startswith(bom):
+            return enc
+    if not sample:
+        return "utf-8"
+    # 无 BOM 的 UTF-16：ASCII 为主的文本会在奇/偶位置出现大量 NUL
+    probe = sample[:4096]
+    if len(probe) >= 4:
+        even_nul = probe[0::2].count(0) / max(1, len(probe[0::2]))
+        odd_nul = probe[1::2].count(0) / max(1, len(probe[1::2]))
+        if odd_nul > 0.3 and even_nul < 0.05:
+            return "utf-16-le"
+        if even_nul > 0.3 and odd_nul < 0.05:
+            return "utf-16-be"
+    if _decodes(sample, "utf-8"):
+        return "utf-8"
+    if _decodes(sample, "gb18030"):
+        return "gb18030"
+    return "utf-8"
+
+
+def detect_encoding(path: str) -> str:
+    with open(path, "rb") as f:
+        return sniff_encoding(f.read(SNIFF_BYTES))
+
+
+def _iter_bytes(path: str, block: int) -> Iterator[bytes]:
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for i in range(0, size, block):
+                    yield mm[i:i + block]
+            return
+        for data in iter(lambda: f.read(block), b""):
+            yield data
+
+
+def iter_text(path: str, encoding: Optional[str] = None, block: int = READ_BYTES) -> Iterator[str]:
+    """按块产出解码后的文本（跨块的多字节字符由增量解码器拼接）。"""
+    enc = encoding or detect_encoding(path)
+    decoder = codecs.getincrementaldecoder(enc)("replace")
+    for data in _iter_bytes(path, block):
+        piece = decoder.decode(data)
+        if piece:
+            yield piece
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def read_text(path: str, encoding: Optional[str] = None) -> str:
+    """读取整个文件（小文件便捷入口）；读取失败返回空串。"""
+    try:
+        return "".join(iter_text(path, encoding=encoding))
+    except Exception:
+        return ""
+
+
+def open_text(path: str, encoding: Optional[str] = None, newline: Optional[str] = None) -> IO[str]:
+    """以嗅探到的编码打开文本流（如供 csv.reader 使用）。"""
+    enc = encoding or detect_encoding(path)
+    return io.open(path, "r", encoding=enc, errors="replace", newline=newline)
+
+
+def normalize_lines(source: Union[str, Iterable[str]]) -> Iterator[str]:
+    """流式轻度清洗：统一换行、去行首尾空白、合并连续空行，并去掉首尾空行。"""
+    pieces = [source] if isinstance(source, str) else source
+    carry = ""
+    blank_run = True  # 开头的空行直接丢弃
+    pending_blank = False
+
+    def emit(line: str):
+        nonlocal blank_run, pending_blank
+        ln = line.strip()
+        if not ln:
+            if not blank_run:
+                pending_blank = True
+            blank_run = True
+            return None
+        out = ("\n" if pending_blank else "") + ln + "\n"
+        blank_run = False
+        pending_blank = False
+        return out
+
+    for piece in pieces:
+        if not piece:
+            continue
+        carry += piece
+        # 块尾的 \r 可能是跨块 \r\n 的前半，留到下一块再统一换行
+        held = "\r" if carry.endswith("\r") else ""
+        text = (carry[:-1] if held else carry).replace("\r\n", "\n").replace("\r", "\n")
+        cut = text.rfind("\n")
+        if cut < 0:
+            carry = text + held
+            continue
+        lines = text[:cut].split("\n")
+        carry = text[cut + 1:] + held
+        buf = []
+        for line in lines:
+            out = emit(line)
+            if out:
+                buf.append(out)
+        if buf:
+            yield "".join(buf)
+    if carry:
+        out = emit(carry.rstrip("\r"))
+        if out:
+            yield out